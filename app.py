@@ -1,8 +1,8 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, after_this_request
+from flask import Flask, Response, render_template, request, jsonify, send_file, session, redirect, url_for, after_this_request, g, make_response
 from flask_cors import CORS
 import sqlite3
-import pandas as pd
 import json
+import codecs
 from datetime import datetime, timedelta, timezone
 import os
 import math
@@ -12,12 +12,55 @@ import time
 import uuid
 import string
 import hashlib
+import hmac
+import functools
 import glob
 from urllib.parse import quote
 import urllib.parse
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from werkzeug.security import safe_join
+
+from change_feed import (
+    CHANGES_MAX_PAGE_SIZE, CHANGES_PAGE_SIZE, InvalidCursorError, ensure_change_tracking, feed_cursor, fetch_changes,
+    latest_seq, parse_since, since_condition,
+)
+from class_workbook import (
+    DEFAULT_HEADER_COLOR, THEME_COLORS, UNKNOWN_CLASS, XLSX_MIMETYPE, class_sort_key, default_processes,
+    iter_class_workbook, iter_class_zip, reset_render_pool
+)
+from columnar_export import (
+    ARROW_STREAM_MIMETYPE, COLUMNAR_BATCH_SIZE, COMPRESSIONS, PARQUET_MIMETYPE, ConversionStats,
+    columnar_available, columnar_select_list, iter_columnar
+)
+from compression import init_compression
+from db_pool import ConnectionPool
+from live_events import EVENTS_MIMETYPE, BrokerFullError, ChangeBroker
+from export_frames import (
+    column_positions, export_records, export_rows, load_export_frame, relabel_columns, reorder_columns
+)
+from json_stream import NDJSON_MIMETYPE, STREAM_BATCH_SIZE, RowEncoder, iter_json_document, iter_ndjson
+from idempotency import IDEMPOTENCY_HEADER, IdempotencyStore, InvalidKeyError, fingerprint, validate_key
+from export_profiler import NULL_PROFILER, ExportMemoryProfiler, ProfilerBusyError
+from health_analytics import FLAGGED_LIMIT, HealthAnalysis, frame_health_columns, load_health_columns
+from pg_copy import iter_copy
+from response_cache import ResponseCache, body_etag
+from pdf_export import (
+    COLUMN_WEIGHTS, DEFAULT_COLUMN_WEIGHT, PDF_MIMETYPE, FontError, find_font, format_cell,
+    iter_class_pdf, iter_class_pdf_zip, iter_table_pdf
+)
+from sqlite_writer import SQLiteWriter, WriterBusyError, connect_sqlite, connect_sqlite_readonly
+from static_cache import StaticAssetCache
+from statements import StatementRegistry
+from student_cache import RedisStudentCache, StudentCache
+from submission_journal import SubmissionJournal
+from student_import import ImportFormatError, StudentImporter, iter_csv_rows, iter_xlsx_rows
+from student_stats import ensure_stats_tracking, format_stats, rebuild_stats, stored_stats
+from student_schema import (
+    EXPORT_COLUMN_LABELS, STUDENT_COLUMN_MAP, TABLE_FIELDS, InvalidFieldsError, StudentSchema,
+    build_student_payload, parse_fields, project
+)
 
 # Vietnam timezone (UTC+7)
 VIETNAM_TZ = timezone(timedelta(hours=7))
@@ -151,8 +194,21 @@ def emergency_ensure_eye_diseases(student_dict):
     
     return student_dict
 
+# Các key chỉ tồn tại để tương thích frontend cũ (trùng giá trị với eye_diseases)
+COMPAT_DUPLICATE_KEYS = ('eyeDiseases', 'eyeConditions')
+
+def wants_compat_payload():
+    """compat=0 bỏ các key trùng lặp để giảm kích thước response"""
+    return request.args.get('compat', '1') != '0'
+
+def strip_compat_keys(student_dict):
+    for key in COMPAT_DUPLICATE_KEYS:
+        student_dict.pop(key, None)
+    return student_dict
+
 app = Flask(__name__)
 CORS(app)
+init_compression(app)
 app.secret_key = os.getenv('SECRET_KEY', 'thpt-di-an-secret-key-2025')
 
 EMAIL_CONFIG = {
@@ -163,15 +219,10 @@ EMAIL_CONFIG = {
     'timeout': 30
 }
 
-# Database Configuration - Support both SQLite (local) and PostgreSQL (Heroku)
-DATABASE_URL = os.getenv('DATABASE_URL')
-if DATABASE_URL and POSTGRES_AVAILABLE:
-    # Parse Heroku PostgreSQL URL
-    if DATABASE_URL.startswith('postgres://'):
-        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://')
-    
-    url = urllib.parse.urlparse(DATABASE_URL)
-    DB_CONFIG = {
+def parse_postgres_url(database_url):
+    """Connection settings from a postgres:// URL (Heroku style)"""
+    url = urllib.parse.urlparse(database_url)
+    return {
         'type': 'postgresql',
         'host': url.hostname,
         'port': url.port,
@@ -179,14 +230,26 @@ if DATABASE_URL and POSTGRES_AVAILABLE:
         'user': url.username,
         'password': url.password
     }
+
+# Database Configuration - Support both SQLite (local) and PostgreSQL (Heroku)
+DATABASE_URL = os.getenv('DATABASE_URL')
+if DATABASE_URL and POSTGRES_AVAILABLE:
+    # Parse Heroku PostgreSQL URL
+    if DATABASE_URL.startswith('postgres://'):
+        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://')
+    
+    DB_CONFIG = parse_postgres_url(DATABASE_URL)
     print("🐘 Using PostgreSQL database (Heroku) - v2")
 else:
     DB_CONFIG = {
         'type': 'sqlite',
-        'path': 'students.db'
+        'path': os.getenv('SQLITE_DB_PATH', 'students.db')
     }
     print("📁 Using SQLite database (local)")
 
+# Thời gian (giây) một kết nối SQLite chờ khóa ghi trước khi báo "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+
 def get_db_connection():
     """Get database connection based on configuration"""
     if DB_CONFIG['type'] == 'postgresql':
@@ -199,7 +262,122 @@ def get_db_connection():
             password=DB_CONFIG['password']
         )
     else:
-        return sqlite3.connect(DB_CONFIG['path'])
+        return connect_sqlite(DB_CONFIG['path'], SQLITE_BUSY_TIMEOUT)
+
+# Các endpoint chỉ đọc (danh sách, chi tiết, export...) dùng kết nối riêng để export nặng
+# không tranh chấp với bài nộp: PostgreSQL đọc từ replica (nếu có), SQLite mở read-only
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_CONFIG = (parse_postgres_url(DATABASE_REPLICA_URL)
+                  if DB_CONFIG['type'] == 'postgresql' and DATABASE_REPLICA_URL else None)
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', '3'))
+# Replica lỗi thì đọc từ primary trong khoảng này rồi mới thử lại replica
+REPLICA_RETRY_SECONDS = 30
+_replica_down_until = 0.0
+
+def open_read_connection():
+    """New connection for read-only endpoints; the session refuses writes.
+
+    PostgreSQL: the replica from DATABASE_REPLICA_URL, falling back to the primary
+    while it is unreachable. SQLite: a mode=ro connection.
+    """
+    global _replica_down_until
+    if DB_CONFIG['type'] != 'postgresql':
+        # Kết nối của pool được dùng ở nhiều thread (lần lượt)
+        return connect_sqlite_readonly(DB_CONFIG['path'], SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+
+    import psycopg2
+    conn = None
+    if REPLICA_CONFIG is not None and time.monotonic() >= _replica_down_until:
+        try:
+            conn = psycopg2.connect(
+                host=REPLICA_CONFIG['host'],
+                port=REPLICA_CONFIG['port'],
+                database=REPLICA_CONFIG['database'],
+                user=REPLICA_CONFIG['user'],
+                password=REPLICA_CONFIG['password'],
+                connect_timeout=REPLICA_CONNECT_TIMEOUT
+            )
+        except psycopg2.OperationalError as e:
+            _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+            print(f"[DB] ⚠️ Read replica unavailable, reading from primary for {REPLICA_RETRY_SECONDS}s: {e}")
+    if conn is None:
+        conn = get_db_connection()
+    conn.set_session(readonly=True)
+    return conn
+
+def reset_read_connection(conn):
+    if DB_CONFIG['type'] == 'sqlite':
+        conn.row_factory = None
+    elif conn.closed:
+        raise RuntimeError('connection closed')
+
+# Kết nối đọc được giữ lại giữa các request (xem db_pool); số kết nối rảnh tối đa mỗi process
+READ_POOL_SIZE = int(os.getenv('READ_POOL_SIZE', '0')) or int(os.getenv('GUNICORN_THREADS', '4'))
+READ_POOL = ConnectionPool(open_read_connection, READ_POOL_SIZE, reset_read_connection)
+
+def get_read_connection():
+    """Read-only connection from the per-process pool; conn.close() returns it"""
+    return READ_POOL.acquire()
+
+# Câu SQL cố định của các truy vấn đọc nóng (xem statements)
+STATEMENTS = StatementRegistry(DB_CONFIG['type'])
+STATEMENTS.define('student_by_id', lambda fields: f'SELECT {fields or "*"} FROM students WHERE id = ?')
+STATEMENTS.define(
+    'student_by_email',
+    lambda fields: f'''
+        SELECT {fields or '*'} FROM students WHERE email = ?
+        ORDER BY datetime(created_at) DESC, id DESC LIMIT 1
+    ''',
+    postgresql=lambda fields: f'''
+        SELECT {fields or '*'} FROM students WHERE email = ?
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    '''
+)
+# Tìm kiếm của trang danh sách; số tham số (search_param) theo backend
+STUDENT_SEARCH_SQL = {
+    'sqlite': 'WHERE full_name LIKE ? OR email LIKE ? OR class LIKE ? OR phone LIKE ? OR nickname LIKE ?',
+    'postgresql': 'WHERE ho_ten ILIKE ? OR email ILIKE ? OR lop ILIKE ? OR sdt ILIKE ?',
+}
+STUDENT_SEARCH_PARAMS = STUDENT_SEARCH_SQL[DB_CONFIG['type']].count('?')
+STATEMENTS.define(
+    'students_count',
+    lambda search: 'SELECT COUNT(*) as total FROM students ' + (STUDENT_SEARCH_SQL['sqlite'] if search else ''),
+    postgresql=lambda search: 'SELECT COUNT(*) as total FROM students ' + (STUDENT_SEARCH_SQL['postgresql'] if search else '')
+)
+STATEMENTS.define(
+    'students_page',
+    lambda variant: f'''
+        SELECT {variant[0] or """id, email, full_name, nickname, class, birth_date, gender,
+                                 phone, created_at, eye_diseases, current_province"""}
+        FROM students {STUDENT_SEARCH_SQL['sqlite'] if variant[1] else ''}
+        ORDER BY created_at DESC LIMIT ? OFFSET ?
+    ''',
+    # PostgreSQL (schema cũ) - always include eye_diseases since we know it exists
+    postgresql=lambda variant: f'''
+        SELECT {variant[0] or """id, email, ho_ten as full_name, email as nickname, lop as class,
+                                 ngay_sinh as birth_date, gioi_tinh as gender, sdt as phone, created_at,
+                                 eye_diseases, tinh_thanh as current_province"""}
+        FROM students {STUDENT_SEARCH_SQL['postgresql'] if variant[1] else ''}
+        ORDER BY created_at DESC LIMIT ? OFFSET ?
+    '''
+)
+
+# Số dòng mỗi lần FETCH của server-side cursor khi export trên PostgreSQL
+EXPORT_ITERSIZE = 2000
+
+def export_cursor(conn, name='export'):
+    """Cursor for one large export query.
+
+    On PostgreSQL a named (server-side) cursor, so rows arrive FETCH by FETCH
+    instead of psycopg2 buffering the whole result at execute(). It can run only
+    one query and has a description only after the first fetch. SQLite cursors
+    already step through the result lazily.
+    """
+    if DB_CONFIG['type'] == 'postgresql':
+        cursor = conn.cursor(name=f'{name}_{uuid.uuid4().hex[:8]}')
+        cursor.itersize = EXPORT_ITERSIZE
+        return cursor
+    return conn.cursor()
 
 def init_database():
     """Initialize database with students table"""
@@ -262,8 +440,106 @@ def init_database():
         print(f"[DB] ❌ Database initialization failed: {e}")
 
 # Initialize database on startup
+# Với gunicorn preload_app (xem gunicorn.conf.py) phần này chỉ chạy một lần trong master
 init_database()
 
+# Danh sách cột của bảng students, đọc lười một lần cho mỗi process
+STUDENT_SCHEMA = StudentSchema(get_db_connection, DB_CONFIG['type'])
+
+def init_change_tracking():
+    """Create updated_at, the student_changes log and its triggers (see change_feed)"""
+    try:
+        conn = get_db_connection()
+        try:
+            ensure_change_tracking(conn, DB_CONFIG['type'], STUDENT_SCHEMA.columns())
+        finally:
+            conn.close()
+        STUDENT_SCHEMA.columns(refresh=True)
+    except Exception as e:
+        print(f"[CHANGES] ❌ Change tracking setup failed: {e}")
+
+init_change_tracking()
+
+def init_stats_tracking():
+    """Create the student_stats aggregates and their triggers (see student_stats)"""
+    try:
+        conn = get_db_connection()
+        try:
+            ensure_stats_tracking(conn, DB_CONFIG['type'], STUDENT_SCHEMA.columns())
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[STATS] ❌ Statistics setup failed: {e}")
+
+init_stats_tracking()
+
+def rebuild_student_stats(check_only=False):
+    """Recompute student_stats from the students table; see rebuild_stats.py"""
+    conn = get_db_connection()
+    try:
+        return rebuild_stats(conn, DB_CONFIG['type'], STUDENT_SCHEMA.columns(refresh=True), check_only)
+    finally:
+        conn.close()
+
+def delta_export_filter(placeholder=None):
+    """WHERE condition and params for since= (delta export), or (None, []) without it.
+
+    The response gets X-Changes-Cursor: the cursor to pass as since= next time.
+    Raises InvalidCursorError for a malformed since=.
+    """
+    since = request.args.get('since')
+    if not since:
+        return None, []
+    since = parse_since(since)
+    # Đọc cursor trước khi export: thay đổi xảy ra trong lúc export sẽ có lại ở lần sau
+    conn = get_read_connection()
+    try:
+        next_cursor = feed_cursor(conn.cursor(), DB_CONFIG['type'])
+    finally:
+        conn.close()
+
+    @after_this_request
+    def add_cursor_header(response):
+        response.headers['X-Changes-Cursor'] = str(next_cursor)
+        return response
+
+    return since_condition(since, placeholder or get_placeholder())
+
+def requested_fields():
+    """Parse fields= and return (fields, select_list), or (None, None) for all fields.
+
+    Raises InvalidFieldsError for names that are not in the schema registry.
+    """
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return None, None
+    return fields, STUDENT_SCHEMA.select_list(fields)
+
+def invalid_fields_response(e):
+    return jsonify({'error': str(e), 'allowed': e.allowed}), 400
+
+# Hooks reset tài nguyên riêng của từng process (pool kết nối, thread nền, ...)
+_FORK_RESET_HOOKS = []
+
+def register_fork_reset(func):
+    """Register a callable to run in every gunicorn worker right after fork"""
+    _FORK_RESET_HOOKS.append(func)
+    return func
+
+def reset_after_fork():
+    """Reset per-process state inherited from the gunicorn master.
+
+    With preload_app the module is imported once in the master and the workers
+    are forked from it, so anything stateful created at import time (DB handles,
+    the random generator used for OTPs) must not be shared between workers.
+    """
+    random.seed()
+    for hook in _FORK_RESET_HOOKS:
+        try:
+            hook()
+        except Exception as e:
+            print(f"[FORK] ⚠️ Reset hook {hook.__name__} failed: {e}")
+
 otp_storage = {}
 
 def parse_admin_accounts():
@@ -281,6 +557,167 @@ def parse_admin_accounts():
 
 ADMIN_ACCOUNTS = parse_admin_accounts()
 
+# Giới hạn số học sinh ảo tạo qua API (CLI sample_data_generator.py không giới hạn)
+SAMPLE_DATA_MAX_ROWS = int(os.getenv('SAMPLE_DATA_MAX_ROWS', '100000'))
+
+# Số process render sheet cho export theo lớp (mặc định: số core, tối đa 4)
+EXPORT_RENDER_PROCESSES = int(os.getenv('EXPORT_RENDER_PROCESSES', '0')) or default_processes()
+register_fork_reset(reset_render_pool)
+
+# Ghi SQLite của save-student/delete-student đi qua một thread writer mỗi process (group commit)
+SQLITE_WRITER = SQLiteWriter(DB_CONFIG.get('path', 'students.db'), SQLITE_BUSY_TIMEOUT)
+SQLITE_WRITE_TIMEOUT = float(os.getenv('SQLITE_WRITE_TIMEOUT', '60'))
+register_fork_reset(SQLITE_WRITER.reset)
+register_fork_reset(READ_POOL.reset)
+
+def run_db_write(func, *args):
+    """Run func(cursor, *args) in a committed write transaction and return its result.
+
+    SQLite goes through the process writer thread (raises WriterBusyError on timeout).
+    """
+    if DB_CONFIG['type'] == 'sqlite':
+        return SQLITE_WRITER.run(func, *args, timeout=SQLITE_WRITE_TIMEOUT)
+    conn = get_db_connection()
+    try:
+        result = func(conn.cursor(), *args)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+# Response đã trả cho từng Idempotency-Key của save-student (xem idempotency)
+IDEMPOTENCY = IdempotencyStore(get_db_connection, run_db_write, DB_CONFIG['type'], get_placeholder(),
+                               ttl=int(os.getenv('IDEMPOTENCY_TTL', '86400')),
+                               max_keys=int(os.getenv('IDEMPOTENCY_MAX_KEYS', '100000')),
+                               stale_after=SQLITE_WRITE_TIMEOUT)
+
+def init_idempotency():
+    try:
+        conn = get_db_connection()
+        try:
+            IDEMPOTENCY.ensure_table(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[IDEMPOTENCY] ❌ Table setup failed: {e}")
+
+init_idempotency()
+
+# Journal ghi trước cho save-student (xem submission_journal): bài nộp được fsync xuống
+# đĩa rồi ghi DB ở thread nền; request chờ lần ghi DB tối đa SUBMISSION_WAIT_SECONDS,
+# quá thì trả 202 và done.html hỏi lại /api/submission-status. Trên Heroku đĩa của dyno
+# mất khi restart, bài nộp chưa kịp ghi DB lúc đó sẽ mất; dùng thư mục trên volume bền nếu có
+SUBMISSION_JOURNAL_ENABLED = os.getenv('SUBMISSION_JOURNAL', 'true').lower() == 'true'
+SUBMISSION_WAIT_SECONDS = float(os.getenv('SUBMISSION_WAIT_SECONDS', '5'))
+
+def default_journal_dir():
+    """Journal directory of the configured DB, so submissions are never replayed into another database.
+
+    SQLite: `<file>.journal` next to the DB file. PostgreSQL: `journal/<hash of host, port,
+    database>` under the app directory.
+    """
+    if DB_CONFIG['type'] == 'sqlite':
+        return os.path.abspath(DB_CONFIG['path']) + '.journal'
+    target = f"{DB_CONFIG.get('host')}:{DB_CONFIG.get('port')}/{DB_CONFIG.get('database')}"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal',
+                        hashlib.sha256(target.encode('utf-8')).hexdigest()[:12])
+
+SUBMISSION_JOURNAL_DIR = os.getenv('SUBMISSION_JOURNAL_DIR') or default_journal_dir()
+
+# Server-Sent Events cho trang admin (xem live_events). Mỗi stream giữ một thread của
+# worker nên số stream mỗi process mặc định bằng nửa số thread gunicorn
+EVENTS_MAX_CLIENTS = int(os.getenv('EVENTS_MAX_CLIENTS', '0')) or max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 2)
+EVENTS_STREAM_SECONDS = int(os.getenv('EVENTS_STREAM_SECONDS', '300'))
+CHANGE_BROKER = ChangeBroker(get_read_connection, get_placeholder(), lambda: STUDENT_SCHEMA.select_list(TABLE_FIELDS),
+                             EVENTS_MAX_CLIENTS, db_type=DB_CONFIG['type'])
+register_fork_reset(CHANGE_BROKER.reset)
+
+# Cache hồ sơ học sinh đã chuẩn hóa của /api/student/<id> và /api/student-by-email
+# (xem student_cache). STUDENT_CACHE_REDIS_URL: dùng chung qua Redis cho mọi worker;
+# STUDENT_CACHE_TTL=0 tắt cache
+STUDENT_CACHE_TTL = int(os.getenv('STUDENT_CACHE_TTL', '60'))
+STUDENT_CACHE_SIZE = int(os.getenv('STUDENT_CACHE_SIZE', '2000'))
+STUDENT_CACHE_REDIS_URL = os.getenv('STUDENT_CACHE_REDIS_URL', '')
+
+def create_student_cache():
+    if STUDENT_CACHE_TTL <= 0:
+        return None
+    if STUDENT_CACHE_REDIS_URL:
+        try:
+            return RedisStudentCache(STUDENT_CACHE_REDIS_URL, STUDENT_CACHE_TTL, dumps=app.json.dumps)
+        except ImportError:
+            print("[CACHE] ⚠️ redis not installed, using the in-process student cache")
+    return StudentCache(STUDENT_CACHE_SIZE, STUDENT_CACHE_TTL)
+
+STUDENT_CACHE = create_student_cache()
+if STUDENT_CACHE is not None:
+    register_fork_reset(STUDENT_CACHE.reset)
+
+def cached_student(kind, key, select_list, fetch):
+    """Normalized student dict by 'id' or 'email' from STUDENT_CACHE, else fetch(key, select_list).
+
+    The result is the caller's to modify. Lookups that find nothing are not cached.
+    The in-process cache only answers at the current change-feed seq, since
+    other workers' writes cannot invalidate it.
+    """
+    if STUDENT_CACHE is None:
+        return fetch(key, select_list)
+    version = None
+    if not STUDENT_CACHE.shared:
+        conn = get_read_connection()
+        try:
+            version = students_data_version(conn)
+        finally:
+            conn.close()
+        if version is None:
+            return fetch(key, select_list)
+    student = STUDENT_CACHE.get(kind, key, select_list, version)
+    if student is None:
+        generation = STUDENT_CACHE.generation()
+        student = fetch(key, select_list)
+        if student is not None:
+            STUDENT_CACHE.set(kind, key, select_list, student, generation, version)
+    return student
+
+def invalidate_students(ids=(), emails=()):
+    """Drop cached students after a committed write to these ids/emails"""
+    if STUDENT_CACHE is not None:
+        STUDENT_CACHE.invalidate(ids, emails)
+
+def clear_student_cache():
+    """Drop every cached student after a bulk write"""
+    if STUDENT_CACHE is not None:
+        STUDENT_CACHE.clear()
+
+# Response JSON của /api/students theo tham số + phiên bản dữ liệu (xem response_cache);
+# LIST_CACHE_MAX_BYTES=0 tắt cache
+LIST_CACHE_MAX_BYTES = int(os.getenv('LIST_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+LIST_CACHE = ResponseCache(LIST_CACHE_MAX_BYTES) if LIST_CACHE_MAX_BYTES > 0 else None
+if LIST_CACHE is not None:
+    register_fork_reset(LIST_CACHE.reset)
+
+def students_data_version(conn):
+    """Latest change-feed seq seen by conn, or None if it cannot be read (no caching then)"""
+    try:
+        return latest_seq(conn.cursor())
+    except Exception as e:
+        print(f"[CACHE] ⚠️ Data version unavailable, list cache bypassed: {e}")
+        conn.rollback()
+        return None
+
+def list_response(body, etag):
+    """JSON response with a weak ETag; 304 when the client already has it"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Font TrueType nhúng vào PDF (để trống: tự tìm DejaVu/Noto/Arial trên máy)
+PDF_FONT_PATH = os.getenv('PDF_FONT_PATH', '')
+# Cột mặc định của bản in PDF; chọn cột khác bằng fields=
+PDF_DEFAULT_FIELDS = ('full_name', 'class', 'birth_date', 'gender', 'ethnicity', 'phone', 'father_name', 'mother_name')
+PDF_FETCH_SIZE = 500
+
 def cleanup_file(filepath):
     """Helper function to delete a file safely with retry mechanism"""
     import threading
@@ -314,6 +751,10 @@ def cleanup_file(filepath):
 
 def send_file_with_cleanup(filepath, **kwargs):
     """Send file and schedule it for deletion after download"""
+    # send_file resolves relative paths against app.root_path, not the working
+    # directory the export was written to
+    filepath = os.path.abspath(filepath)
+
     @after_this_request
     def remove_file(response):
         cleanup_file(filepath)
@@ -334,6 +775,209 @@ def send_file_with_cleanup(filepath, **kwargs):
     
     return send_file(filepath, **kwargs)
 
+# Token cho các chức năng chẩn đoán chỉ dành cho admin (vd. ?profile_memory=1); để trống = tắt
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+def _has_admin_token():
+    """True if the request carries ADMIN_API_TOKEN (Bearer header, X-Admin-Token or adminToken cookie)"""
+    if not ADMIN_API_TOKEN:
+        return False
+    token = request.headers.get('X-Admin-Token') or request.cookies.get('adminToken') or ''
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token = auth_header[7:]
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_API_TOKEN.encode('utf-8'))
+
+def profile_export_memory(tag):
+    """Decorator: with ?profile_memory=1 (admin only) run the export under
+    ExportMemoryProfiler and answer with the per-stage memory report instead of the file.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.args.get('profile_memory') != '1':
+                return view(*args, **kwargs)
+            if not _has_admin_token():
+                return jsonify({'error': 'profile_memory chỉ dành cho quản trị viên'}), 403
+            try:
+                profiler = ExportMemoryProfiler(tag).start()
+            except ProfilerBusyError as e:
+                return jsonify({'error': str(e)}), 409
+            g.export_profiler = profiler
+
+            @after_this_request
+            def memory_report(response):
+                if profiler.finished:
+                    return response
+                # Giai đoạn send: đọc hết body như khi gửi cho client
+                profiler.stage('send')
+                sent = 0
+                try:
+                    if response.direct_passthrough:
+                        for chunk in response.response:
+                            sent += len(chunk)
+                    else:
+                        sent = len(response.get_data())
+                finally:
+                    response.close()
+                    report = profiler.finish(status=response.status_code, response_bytes=sent)
+                print(f"[MEMORY] {tag}: peak {report['peak_traced_mb']} MB ({report['peak_stage']}), "
+                      f"RSS {report['rss_start_mb']} -> {report['rss_end_mb']} MB")
+                return jsonify(report)
+
+            try:
+                return view(*args, **kwargs)
+            except BaseException:
+                # View lỗi: memory_report có thể không chạy, nhả khóa profile và tracemalloc ngay
+                profiler.finish(status=500, response_bytes=0)
+                raise
+        return wrapper
+    return decorator
+
+def export_stage(name):
+    """Mark the start of an export stage (no-op unless the request is being profiled)"""
+    g.get('export_profiler', NULL_PROFILER).stage(name)
+
+def send_class_workbook(df_export, class_values, filename, bundle_zip, preamble, header_color, font_size, file_prefix,
+                        extra_sheets=()):
+    """Stream df_export split by class: one XLSX with a sheet per class, or a ZIP of per-class XLSX files"""
+    keys = class_values.astype(object)
+    keys = keys.where(keys.notna() & (keys != ''), UNKNOWN_CLASS).to_numpy()
+    groups = {}
+    for position, key in enumerate(keys):
+        groups.setdefault(str(key).strip() or UNKNOWN_CLASS, []).append(position)
+
+    sheets = []
+    for name in sorted(groups, key=class_sort_key):
+        rows = list(export_rows(df_export.iloc[groups[name]], header=False, dates_as_text=True))
+        sheets.append((name, rows, preamble(name, len(rows))))
+    header = [str(c) for c in df_export.columns]
+    print(f"[BY_CLASS] {len(sheets)} classes, {len(keys)} rows, {EXPORT_RENDER_PROCESSES} render processes")
+
+    if bundle_zip:
+        body = iter_class_zip(sheets, header, file_prefix, header_color, font_size, EXPORT_RENDER_PROCESSES, extra_sheets)
+        mimetype = 'application/zip'
+    else:
+        body = iter_class_workbook(sheets, header, header_color, font_size, EXPORT_RENDER_PROCESSES, extra_sheets)
+        mimetype = XLSX_MIMETYPE
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'), safe='')}"
+    return response
+
+def detect_export_type(export_type):
+    """Turn 'all' into grade/class/custom when the matching filter parameters are present"""
+    if export_type == 'all':
+        if request.args.get('grade'):
+            export_type = 'grade'
+        elif request.args.get('classes'):
+            export_type = 'class'
+        elif (request.args.get('gender') or 
+              request.args.get('fromYear') or 
+              request.args.get('toYear') or 
+              request.args.get('hasPhone') or
+              request.args.get('province') or request.args.get('ethnicity')):
+            export_type = 'custom'
+    return export_type
+
+def build_export_filters(export_type, use_old_schema, tag):
+    """WHERE conditions and params for the export filters (grade, classes, gender, hasPhone, province, ethnicity, since).
+
+    Shared by export-xlsx and export-pdf so both accept the same query string.
+    """
+    grade = request.args.get('grade')
+    classes = request.args.get('classes')
+    province = request.args.get('province')
+    ethnicity = request.args.get('ethnicity')
+    class_column = 'lop' if use_old_schema else 'class'
+    gender_column = 'gioi_tinh' if use_old_schema else 'gender'
+    ethnicity_column = 'dan_toc' if use_old_schema else 'ethnicity'
+    phone_column = 'sdt' if use_old_schema else 'phone'
+
+    where_conditions = []
+    query_params = []
+
+    if export_type == 'grade' and grade:
+        # Filter theo khối học chính xác - chỉ lấy các lớp thuộc khối đó
+        placeholder = get_placeholder()
+        if DB_CONFIG['type'] == 'postgres':
+            where_conditions.append(f"substring({class_column}, 1, LENGTH({placeholder})) = {placeholder}")
+        else:
+            where_conditions.append(f"SUBSTR({class_column}, 1, LENGTH({placeholder})) = {placeholder}")
+        query_params.extend([grade, grade])
+        print(f"[{tag}] Filtering by grade: {grade}")
+    elif export_type == 'class' and classes:
+        class_list = [cls.strip() for cls in classes.split(',')]
+        placeholder = get_placeholder()
+        placeholders = ','.join([placeholder for _ in class_list])
+        where_conditions.append(f"{class_column} IN ({placeholders})")
+        query_params.extend(class_list)
+        print(f"[{tag}] Filtering by classes: {class_list}")
+    elif export_type == 'custom':
+        # Handle custom filters
+        gender = request.args.get('gender')
+        has_phone = request.args.get('hasPhone') == 'true'
+
+        print(f"[{tag}] Custom filters - Gender: {gender}, HasPhone: {has_phone}")
+
+        if gender:
+            gender_list = [g.strip() for g in gender.split(',')]
+            placeholder = get_placeholder()
+            gender_placeholders = ','.join([placeholder for _ in gender_list])
+            where_conditions.append(f"{gender_column} IN ({gender_placeholders})")
+            query_params.extend(gender_list)
+
+        if has_phone:
+            where_conditions.append(f"{phone_column} IS NOT NULL AND {phone_column} != ''")
+
+    # Apply province and ethnicity filters for ALL export types
+    if province:
+        placeholder = get_placeholder()
+        # Map short province names to full names for better matching
+        province_mapping = {
+            'Đồng Nai': 'Tỉnh Đồng Nai',
+            'Hà Nội': 'Thành phố Hà Nội', 
+            'Hồ Chí Minh': 'Thành phố Hồ Chí Minh',
+            'Đà Nẵng': 'Thành phố Đà Nẵng',
+            'Cần Thơ': 'Thành phố Cần Thơ',
+            'Hải Phòng': 'Thành phố Hải Phòng',
+            'Huế': 'Thành phố Huế'
+        }
+        # Use full name if mapping exists, otherwise use original
+        search_province = province_mapping.get(province, province)
+        print(f"[{tag}] Province filter: '{province}' -> searching for '{search_province}'")
+        # Flexible province matching - case insensitive and partial match
+        where_conditions.append(f"LOWER(permanent_province) LIKE LOWER({placeholder})")
+        query_params.append(f"%{search_province}%")
+        print(f"[{tag}] Filtering by province: %{search_province}%")
+
+    if ethnicity:
+        placeholder = get_placeholder()
+        # Flexible ethnicity matching - case insensitive and partial match
+        where_conditions.append(f"LOWER({ethnicity_column}) LIKE LOWER({placeholder})")
+        query_params.append(f"%{ethnicity}%")
+        print(f"[{tag}] Filtering by ethnicity: %{ethnicity}%")
+
+    since_sql, since_params = delta_export_filter()
+    if since_sql:
+        where_conditions.append(since_sql)
+        query_params.extend(since_params)
+        print(f"[{tag}] Delta export since: {request.args.get('since')}")
+
+    return where_conditions, query_params
+
+def export_scope_suffix(export_type):
+    """Filename part describing the filter: _khoi_10, _lop_10A1, _3_lop, _tuy_chinh or _tat_ca"""
+    grade = request.args.get('grade')
+    classes = request.args.get('classes')
+    if export_type == 'grade' and grade:
+        return f'_khoi_{grade}'
+    if export_type == 'class' and classes:
+        class_list = [cls.strip() for cls in classes.split(',')]
+        return f'_lop_{class_list[0]}' if len(class_list) == 1 else f'_{len(class_list)}_lop'
+    if export_type == 'custom':
+        return '_tuy_chinh'
+    return '_tat_ca'
+
 DEBUG_OTP = os.getenv('DEBUG_OTP', 'true').lower() == 'true'
 FORCE_CONSOLE_OTP = os.getenv('FORCE_CONSOLE_OTP', 'false').lower() == 'true'
 SHOW_ADMIN_CREDENTIALS = os.getenv('SHOW_ADMIN_CREDENTIALS', 'false').lower() == 'true'
@@ -805,56 +1449,56 @@ def generate_sample_data(count=150):
     finally:
         conn.close()
 
+# Static pages & icons served from memory (see static_cache.py)
+STATIC_ASSETS = StaticAssetCache(os.path.dirname(os.path.abspath(__file__)))
+STATIC_PAGES = [
+    'page.html', 'page1.html', 'page2.html', 'page3.html', 'page4.html', 'page5.html',
+    'done.html', 'admin.html', 'admin-login.html'
+]
+# HTML không có hash trong tên file nên luôn revalidate (304 nếu không đổi);
+# icon được cache lâu hơn, đổi icon thì dùng ?v=... như /test-favicon.html
+HTML_CACHE_CONTROL = 'no-cache'
+ICON_CACHE_CONTROL = f"public, max-age={int(os.getenv('STATIC_ICON_MAX_AGE', 86400))}"
+
+def prewarm_static_assets():
+    """Load static pages and logo/ icons into memory (called from gunicorn when_ready)"""
+    logo_dir = os.path.join(STATIC_ASSETS.base_dir, 'logo')
+    logo_files = [f'logo/{name}' for name in sorted(os.listdir(logo_dir))] if os.path.isdir(logo_dir) else []
+    return STATIC_ASSETS.preload(STATIC_PAGES + logo_files)
+
+def serve_static_asset(relpath, cache_control=HTML_CACHE_CONTROL):
+    response = STATIC_ASSETS.response(relpath, request, cache_control)
+    if response is None:
+        return jsonify({'error': 'Không tìm thấy file'}), 404
+    return response
+
 @app.route('/')
 def index():
-    return send_file('page.html')
+    return serve_static_asset('page.html')
 
 # Favicon routes
 @app.route('/favicon.ico')
 def favicon():
-    response = app.response_class(
-        response=open('logo/favicon.ico', 'rb').read(),
-        status=200,
-        mimetype='image/x-icon'
-    )
-    # No cache để force reload favicon mới
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return serve_static_asset('logo/favicon.ico', ICON_CACHE_CONTROL)
 
 @app.route('/logo/<path:filename>')
 def serve_logo(filename):
-    response = send_file(f'logo/{filename}')
-    # No cache để force reload logo mới
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache' 
-    response.headers['Expires'] = '0'
-    return response
+    relpath = safe_join('logo', filename)  # chặn ../ thoát khỏi thư mục logo
+    if relpath is None:
+        return jsonify({'error': 'Không tìm thấy file'}), 404
+    return serve_static_asset(relpath, ICON_CACHE_CONTROL)
 
 @app.route('/apple-touch-icon.png')
 def apple_touch_icon():
-    response = send_file('logo/apple-touch-icon.png')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return serve_static_asset('logo/apple-touch-icon.png', ICON_CACHE_CONTROL)
 
 @app.route('/android-chrome-192x192.png')
 def android_chrome_192():
-    response = send_file('logo/android-chrome-192x192.png')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return serve_static_asset('logo/android-chrome-192x192.png', ICON_CACHE_CONTROL)
 
 @app.route('/android-chrome-512x512.png')
 def android_chrome_512():
-    response = send_file('logo/android-chrome-512x512.png')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return serve_static_asset('logo/android-chrome-512x512.png', ICON_CACHE_CONTROL)
 
 # Test favicon page để kiểm tra favicon với timestamp
 @app.route('/test-favicon.html')
@@ -913,37 +1557,206 @@ def test_favicon():
 
 @app.route('/page.html')
 def page():
-    return send_file('page.html')
+    return serve_static_asset('page.html')
 
 @app.route('/page1.html')
 def page1():
-    return send_file('page1.html')
+    return serve_static_asset('page1.html')
 
 @app.route('/page2.html')
 def page2():
-    return send_file('page2.html')
+    return serve_static_asset('page2.html')
 
 @app.route('/page3.html')
 def page3():
-    return send_file('page3.html')
+    return serve_static_asset('page3.html')
 
 @app.route('/page4.html')
 def page4():
-    return send_file('page4.html')
+    return serve_static_asset('page4.html')
 
 @app.route('/page5.html')
 def page5():
-    return send_file('page5.html')
+    return serve_static_asset('page5.html')
 
 @app.route('/done.html')
 def done():
-    return send_file('done.html')
+    return serve_static_asset('done.html')
+
+def write_student(cursor, payload, email, placeholder):
+    """Insert the submission, or update the student with the same email.
+
+    Returns ('inserted', None) or ('updated', id of the updated student).
+    """
+    cursor.execute(f'SELECT id FROM students WHERE email = {placeholder}', (email,))
+    existing = cursor.fetchone()
+
+    col_map = STUDENT_COLUMN_MAP
+
+    if existing:
+        # CRITICAL FIX: Only update fields that are present in payload (non-empty)
+        update_cols = [c for c, _ in col_map if c != 'email' and c in payload]
+        if update_cols:  # Only update if there are fields to update
+            set_clause = ', '.join([f"{c} = {placeholder}" for c in update_cols])
+            set_clause = f"{set_clause}, created_at = CURRENT_TIMESTAMP"
+            values = [payload[c] for c in update_cols]
+            values.append(email)
+            cursor.execute(f"UPDATE students SET {set_clause} WHERE email = {placeholder}", values)
+        else:
+            # If no fields to update, just update timestamp
+            cursor.execute(f"UPDATE students SET created_at = CURRENT_TIMESTAMP WHERE email = {placeholder}", (email,))
+        return 'updated', existing[0]
+
+    insert_cols = [c for c, _ in col_map]
+    placeholders = ', '.join([placeholder] * len(insert_cols))
+    values = [payload[c] for c in insert_cols]
+    cursor.execute(
+        f"INSERT INTO students ({', '.join(insert_cols)}) VALUES ({placeholders})",
+        values
+    )
+    return 'inserted', None
+
+def write_journal_entry(cursor, entry, placeholder):
+    return write_student(cursor, build_student_payload(entry['data']), entry['email'], placeholder)
+
+def apply_journal_entries(entries):
+    """Write a batch of journaled submissions; returns one exception (or None) per entry"""
+    if DB_CONFIG['type'] == 'sqlite':
+        futures = [SQLITE_WRITER.submit(write_journal_entry, entry, '?') for entry in entries]
+        errors = [future.exception() for future in futures]
+        invalidate_students([future.result()[1] for future, error in zip(futures, errors) if error is None],
+                            [entry['email'] for entry, error in zip(entries, errors) if error is None])
+        return errors
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        errors = []
+        ids = []
+        for entry in entries:
+            cursor.execute('SAVEPOINT journal_entry')
+            try:
+                ids.append(write_journal_entry(cursor, entry, '%s')[1])
+                cursor.execute('RELEASE SAVEPOINT journal_entry')
+                errors.append(None)
+            except Exception as e:
+                if is_transient_db_error(e):
+                    raise
+                cursor.execute('ROLLBACK TO SAVEPOINT journal_entry')
+                errors.append(e)
+        conn.commit()
+        invalidate_students(ids, [entry['email'] for entry, error in zip(entries, errors) if error is None])
+        return errors
+    finally:
+        conn.close()
+
+def is_transient_db_error(error):
+    """True for DB outages and lock contention (retry later), False for errors caused by the entry"""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return 'no such' not in message and 'has no column' not in message
+    if DB_CONFIG['type'] == 'postgresql':
+        import psycopg2
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    return False
+
+def open_submission_journal(directory):
+    """SubmissionJournal in `directory` with the leftovers of earlier runs replayed, or None if disabled"""
+    global SUBMISSION_JOURNAL_DISABLED
+    if not SUBMISSION_JOURNAL_ENABLED:
+        SUBMISSION_JOURNAL_DISABLED = 'SUBMISSION_JOURNAL=false'
+        return None
+    try:
+        journal = SubmissionJournal(directory, apply_journal_entries, is_transient_db_error,
+                                    on_flushed=CHANGE_BROKER.notify)
+    except OSError as e:
+        SUBMISSION_JOURNAL_DISABLED = f'{directory} not writable: {e}'
+        print(f"[JOURNAL] ⚠️ Journal disabled, {SUBMISSION_JOURNAL_DISABLED}")
+        return None
+    SUBMISSION_JOURNAL_DISABLED = None
+    try:
+        # Bài nộp còn trong journal từ lần chạy trước (crash, deploy) vào DB trước khi nhận request
+        journal.replay_orphans()
+    except Exception as e:
+        print(f"[JOURNAL] ⚠️ Replay at startup failed, retrying in the background: {e}")
+    return journal
+
+def reset_submission_journal():
+    if SUBMISSION_JOURNAL is not None:
+        SUBMISSION_JOURNAL.reset()
+
+# Lý do journal bị tắt, báo qua /api/journal/status
+SUBMISSION_JOURNAL_DISABLED = None
+SUBMISSION_JOURNAL = open_submission_journal(SUBMISSION_JOURNAL_DIR)
+register_fork_reset(reset_submission_journal)
+
+def reconfigure_database(journal_dir=None):
+    """Point the per-process DB resources at DB_CONFIG again after it was changed.
+
+    Benchmarks and tests switch DB_CONFIG['path'] after import; the writer thread,
+    the read pool, the caches and the journal otherwise keep using the old database.
+    The schema extras (change log, stats, idempotency) are set up on the new one and
+    the journal moves to `journal_dir` (default: next to the new database).
+    """
+    global SUBMISSION_JOURNAL, SUBMISSION_JOURNAL_DIR
+    if SUBMISSION_JOURNAL is not None:
+        SUBMISSION_JOURNAL.close()
+    if DB_CONFIG['type'] == 'sqlite':
+        SQLITE_WRITER.reconfigure(DB_CONFIG['path'])
+    READ_POOL.clear()
+    STUDENT_SCHEMA.invalidate()
+    clear_student_cache()
+    if LIST_CACHE is not None:
+        LIST_CACHE.reset()
+    init_change_tracking()
+    init_stats_tracking()
+    init_idempotency()
+    SUBMISSION_JOURNAL_DIR = journal_dir or default_journal_dir()
+    SUBMISSION_JOURNAL = open_submission_journal(SUBMISSION_JOURNAL_DIR)
 
 @app.route('/api/save-student', methods=['POST', 'OPTIONS'])
 @app.route('/api/save-student/', methods=['POST', 'OPTIONS'])
 def save_student():
     if request.method == 'OPTIONS':
         return ('', 200)
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return process_save_student()
+
+    try:
+        key = validate_key(key)
+        body_hash = fingerprint(request.get_data())
+        state, stored = IDEMPOTENCY.lookup(key, body_hash)
+        if state is None:
+            state, stored = IDEMPOTENCY.claim(key, body_hash)
+    except InvalidKeyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        # Không kiểm tra được key thì vẫn xử lý bình thường (save-student là upsert)
+        print(f"[IDEMPOTENCY] ⚠️ Key check failed, processing without it: {e}")
+        return process_save_student()
+
+    if state == 'done':
+        print(f"[IDEMPOTENCY] Replaying stored response for key {key[:40]}")
+        response = Response(stored[1], status=stored[0], mimetype='application/json')
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    if state == 'busy':
+        response = jsonify({'success': False, 'message': 'Yêu cầu trước với cùng Idempotency-Key đang được xử lý'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    if state == 'mismatch':
+        return jsonify({'success': False,
+                        'message': 'Idempotency-Key đã được dùng cho một nội dung khác'}), 422
+
+    response = make_response(process_save_student())
+    try:
+        IDEMPOTENCY.complete(key, response.status_code, response.get_data(as_text=True))
+    except Exception as e:
+        print(f"[IDEMPOTENCY] ⚠️ Storing response failed: {e}")
+    return response
+
+def process_save_student():
     try:
         data = request.get_json()
         print(f"[DEBUG] Received data keys: {list(data.keys()) if data else 'None'}")
@@ -954,185 +1767,116 @@ def save_student():
         if not data or not data.get('email'):
             return jsonify({'success': False, 'message': 'Thiếu email đăng ký'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        if DB_CONFIG['type'] == 'postgresql':
-            cursor.execute('SELECT id FROM students WHERE email = %s', (data.get('email'),))
-        else:
-            cursor.execute('SELECT id FROM students WHERE email = ?', (data.get('email'),))
-        existing = cursor.fetchone()
-
-        col_map = [
-            ('email', 'email'),
-            ('ho_ten', 'fullName'),
-            ('lop', 'class'),
-            ('khoi', 'grade'),
-            ('ngay_sinh', 'birthDate'),
-            ('gioi_tinh', 'gender'),
-            ('sdt', 'phone'),
-            ('dan_toc', 'ethnicity'),
-            ('ton_giao', 'religion'),
-            ('dia_chi', 'currentAddressDetail'),
-            ('tinh_thanh', 'currentProvince'),
-            ('ho_ten_cha', 'fatherName'),
-            ('nghe_nghiep_cha', 'fatherJob'),
-            ('ho_ten_me', 'motherName'),
-            ('nghe_nghiep_me', 'motherJob'),
-            # Personal info extended
-            ('nickname', 'nickname'),
-            ('nationality', 'nationality'),
-            ('citizen_id', 'citizenId'),
-            ('cccd_date', 'cccdDate'),
-            ('cccd_place', 'cccdPlace'),
-            ('personal_id', 'personalId'),
-            ('passport', 'passport'),
-            ('passport_date', 'passportDate'),
-            ('passport_place', 'passportPlace'),
-            ('occupation', 'occupation'),
-            ('organization', 'organization'),
-            # Address info
-            ('permanent_province', 'permanentProvince'),
-            ('permanent_ward', 'permanentWard'),
-            ('permanent_hamlet', 'permanentHamlet'),
-            ('permanent_street', 'permanentStreet'),
-            ('hometown_province', 'hometownProvince'),
-            ('hometown_ward', 'hometownWard'),
-            ('hometown_hamlet', 'hometownHamlet'),
-            ('current_ward', 'currentWard'),
-            ('current_hamlet', 'currentHamlet'),
-            ('birthplace_province', 'birthplaceProvince'),
-            ('birthplace_ward', 'birthplaceWard'),
-            ('birthplace_detail', 'birthplaceDetail'),
-            ('birth_cert_province', 'birthCertProvince'),
-            ('birth_cert_ward', 'birthCertWard'),
-            # Health info
-            ('height', 'height'),
-            ('weight', 'weight'),
-            ('eye_diseases', 'eyeConditions'),  # Fixed: Map eyeConditions from frontend
-            ('swimming_skill', 'swimmingSkill'),
-            # Device info
-            ('smartphone', 'smartphone'),
-            ('computer', 'computer'),
-            # Family info
-            ('father_ethnicity', 'fatherEthnicity'),
-            ('father_birth_year', 'fatherBirthYear'),
-            ('father_phone', 'fatherPhone'),
-            ('father_cccd', 'fatherCCCD'),
-            ('mother_ethnicity', 'motherEthnicity'),
-            ('mother_birth_year', 'motherBirthYear'),
-            ('mother_phone', 'motherPhone'),
-            ('mother_cccd', 'motherCCCD'),
-            ('guardian_name', 'guardianName'),
-            ('guardian_job', 'guardianJob'),
-            ('guardian_birth_year', 'guardianBirthYear'),
-            ('guardian_phone', 'guardianPhone'),
-            ('guardian_cccd', 'guardianCCCD'),
-            ('guardian_gender', 'guardianGender')
-        ]
+        payload = build_student_payload(data)
+        email = payload.get('email') or data.get('email')
 
-        def normalize_value(db_col, val):
-            if db_col == 'eye_diseases':
-                # Handle the new eyeConditions format
-                if isinstance(val, str) and val and val != 'Chưa có thông tin':
-                    return val  # Store as simple string
-                return 'Chưa có thông tin'  # Default value
-            elif db_col in ['ngay_sinh', 'cccd_date', 'passport_date']:
-                # Convert dd/mm/yyyy to yyyy-mm-dd for PostgreSQL
-                if val and isinstance(val, str) and val.strip():
-                    try:
-                        # Handle dd/mm/yyyy format
-                        if '/' in val:
-                            parts = val.split('/')
-                            if len(parts) == 3:
-                                day, month, year = parts
-                                return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                        # Handle yyyy-mm-dd format (already correct)
-                        elif '-' in val and len(val) == 10:
-                            return val
-                    except:
-                        pass
-                # Return None for empty or invalid dates
-                return None
-            elif db_col in ['height', 'weight', 'father_birth_year', 'mother_birth_year', 'guardian_birth_year']:
-                # Handle integer fields - convert empty string to None
-                if val and isinstance(val, str) and val.strip():
-                    try:
-                        return int(val)
-                    except ValueError:
-                        return None
-                elif isinstance(val, int):
-                    return val
-                return None
-            return val
-
-        payload = {}
-        for db_col, json_key in col_map:
-            if json_key in data and data[json_key] is not None and data[json_key] != '':
-                # Field has actual data
-                payload[db_col] = normalize_value(db_col, data.get(json_key))
-            else:
-                # Field is missing or empty - set appropriate default
-                if db_col == 'eye_diseases':
-                    payload[db_col] = 'Chưa có thông tin'  # Default value for eye diseases
-                else:
-                    payload[db_col] = None  # Set to NULL for all other missing fields
-        
-        # Extract grade (khoi) from class if not provided directly
-        if not payload.get('khoi') and payload.get('lop'):
-            class_value = payload['lop']
-            if class_value and len(class_value) >= 2:
-                khoi = class_value[:2]  # Extract first 2 characters (10, 11, 12)
-                payload['khoi'] = khoi
-
-        if existing:
-            # CRITICAL FIX: Only update fields that are present in payload (non-empty)
-            update_cols = [c for c, _ in col_map if c != 'email' and c in payload]
-            if update_cols:  # Only update if there are fields to update
-                if DB_CONFIG['type'] == 'postgresql':
-                    set_clause = ', '.join([f"{c} = %s" for c in update_cols])
-                    set_clause = f"{set_clause}, created_at = CURRENT_TIMESTAMP"
-                    values = [payload[c] for c in update_cols]
-                    values.append(payload['email'])
-                    cursor.execute(f"UPDATE students SET {set_clause} WHERE email = %s", values)
-                else:
-                    set_clause = ', '.join([f"{c} = ?" for c in update_cols])
-                    set_clause = f"{set_clause}, created_at = CURRENT_TIMESTAMP"
-                    values = [payload[c] for c in update_cols]
-                    values.append(payload['email'])
-                    cursor.execute(f"UPDATE students SET {set_clause} WHERE email = ?", values)
-            else:
-                # If no fields to update, just update timestamp
-                if DB_CONFIG['type'] == 'postgresql':
-                    cursor.execute("UPDATE students SET created_at = CURRENT_TIMESTAMP WHERE email = %s", (payload.get('email', data.get('email')),))
-                else:
-                    cursor.execute("UPDATE students SET created_at = CURRENT_TIMESTAMP WHERE email = ?", (payload.get('email', data.get('email')),))
-        else:
-            insert_cols = [c for c, _ in col_map]
-            if DB_CONFIG['type'] == 'postgresql':
-                placeholders = ', '.join(['%s'] * len(insert_cols))
-                values = [payload[c] for c in insert_cols]
-                cursor.execute(
-                    f"INSERT INTO students ({', '.join(insert_cols)}) VALUES ({placeholders})",
-                    values
-                )
+        if SUBMISSION_JOURNAL is not None:
+            try:
+                submission_id = SUBMISSION_JOURNAL.append(email, data)
+            except OSError as e:
+                # Đĩa đầy/lỗi: ghi thẳng vào DB như khi không có journal
+                print(f"[JOURNAL] ⚠️ Append failed, writing directly: {e}")
             else:
-                placeholders = ', '.join(['?'] * len(insert_cols))
-                values = [payload[c] for c in insert_cols]
-                cursor.execute(
-                    f"INSERT INTO students ({', '.join(insert_cols)}) VALUES ({placeholders})",
-                    values
-                )
+                body, status = submission_result(submission_id,
+                                                 SUBMISSION_JOURNAL.wait(submission_id, SUBMISSION_WAIT_SECONDS))
+                return jsonify(body), status
 
-        conn.commit()
-        conn.close()
+        # SQLite: ghi qua thread writer chung của process (group commit, xem sqlite_writer)
+        _, student_id = run_db_write(write_student, payload, email, get_placeholder())
+        invalidate_students([student_id], [email])
+        CHANGE_BROKER.notify()
 
         return jsonify({'success': True, 'message': 'Dữ liệu đã được lưu thành công!'})
 
+    except WriterBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
+def submission_result(submission_id, outcome):
+    """(body, HTTP status) of save-student for a journaled submission; outcome None = still pending"""
+    status = outcome['status'] if outcome is not None else 'pending'
+    body = {'submissionId': submission_id, 'status': status}
+    if status == 'pending':
+        return dict(body, success=True, pending=True, statusUrl=f'/api/submission-status/{submission_id}',
+                    message='Đã nhận bài nộp, đang lưu vào cơ sở dữ liệu...'), 202
+    if status == 'failed':
+        return dict(body, success=False, message=f"Không lưu được dữ liệu: {outcome.get('error')}"), 500
+    return dict(body, success=True, message='Dữ liệu đã được lưu thành công!'), 200
+
+@app.route('/api/submission-status/<submission_id>', methods=['GET'])
+def submission_status(submission_id):
+    """Whether a journaled save-student submission reached the DB; polled by done.html after a 202"""
+    if SUBMISSION_JOURNAL is None:
+        return jsonify({'success': False, 'message': 'Journal không bật'}), 404
+    try:
+        outcome = SUBMISSION_JOURNAL.lookup(submission_id)
+        if outcome is None:
+            # Process khác đã ghi xong và bỏ segment: còn trong DB là đã lưu
+            email = request.args.get('email', '').strip()
+            if email:
+                conn = get_read_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(f'SELECT 1 FROM students WHERE email = {get_placeholder()}', (email,))
+                    if cursor.fetchone():
+                        outcome = {'status': 'saved'}
+                finally:
+                    conn.close()
+        if outcome is None:
+            return jsonify({'success': False, 'message': 'Không tìm thấy bài nộp'}), 404
+        # Luôn 200: `status` (pending/saved/failed) là trạng thái bài nộp, không phải của request này
+        return jsonify(submission_result(submission_id, outcome)[0])
+    except Exception as e:
+        print(f"[JOURNAL] ❌ Submission status failed: {e}")
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+
+@app.route('/api/import-students', methods=['POST'])
+def import_students():
+    """Bulk upsert students (by email) from an uploaded XLSX or CSV class list.
+
+    Form field `file`; `?dryRun=true` only validates and returns the report.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'success': False, 'error': 'Thiếu file tải lên (trường "file")'}), 400
+
+        extension = os.path.splitext(upload.filename)[1].lower()
+        if extension == '.xlsx':
+            rows = iter_xlsx_rows(upload.stream)
+        elif extension == '.csv':
+            rows = iter_csv_rows(upload.stream)
+        else:
+            return jsonify({'success': False, 'error': 'Chỉ hỗ trợ file .xlsx hoặc .csv'}), 400
+
+        dry_run = request.args.get('dryRun', 'false').lower() == 'true'
+        try:
+            batch_size = min(max(int(request.args.get('batchSize', 500)), 1), 5000)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'batchSize phải là số nguyên'}), 400
+
+        print(f"[IMPORT] Starting import of {upload.filename} (dry_run={dry_run}, batch={batch_size})")
+        # SQLite: mỗi lô đi qua SQLITE_WRITER như save-student, không tranh khóa ghi với nó
+        run_write = run_db_write if DB_CONFIG['type'] == 'sqlite' else None
+        importer = StudentImporter(get_db_connection, DB_CONFIG['type'], batch_size=batch_size, run_write=run_write)
+        result = importer.run(rows, dry_run=dry_run)
+        if not dry_run:
+            clear_student_cache()
+            CHANGE_BROKER.notify()
+        stats = result['stats']
+        print(f"[IMPORT] ✅ {stats['rows_read']} rows: {stats['inserted']} inserted, {stats['updated']} updated, "
+              f"{stats['skipped']} skipped in {stats['elapsed_ms']} ms ({stats['rows_per_second']} rows/s)")
+
+        return jsonify({'success': True, 'filename': upload.filename, **result})
+
+    except ImportFormatError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[IMPORT] ❌ Import failed: {e}")
+        return jsonify({'success': False, 'error': f'Có lỗi xảy ra khi nhập dữ liệu: {str(e)}'}), 500
+
 @app.errorhandler(405)
 def method_not_allowed(e):
     path = request.path or ''
@@ -1153,66 +1897,32 @@ def get_students():
             limit = 50
 
         offset = (page - 1) * limit
+        fields, select_list = requested_fields()
+        compat = wants_compat_payload()
+
+        conn = get_read_connection()
+        # Phiên bản đọc trước dữ liệu: ghi xen giữa chỉ làm mục cache cũ đi, không sai
+        version = students_data_version(conn) if LIST_CACHE is not None else None
+        cache_key = (page, limit, search, fields, select_list, compat)
+        if version is not None:
+            cached = LIST_CACHE.get(cache_key, version)
+            if cached is not None:
+                conn.close()
+                return list_response(*cached)
 
-        conn = get_db_connection()
         # Only set row_factory for SQLite
         if DB_CONFIG['type'] == 'sqlite':
             conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        if DB_CONFIG['type'] == 'postgresql':
-            # PostgreSQL syntax with placeholders - always include eye_diseases since we know it exists
-            base_query = """
-            SELECT id, email, ho_ten as full_name, email as nickname, lop as class, ngay_sinh as birth_date, gioi_tinh as gender,
-                   sdt as phone, created_at, eye_diseases, tinh_thanh as current_province
-            FROM students
-            """
-            count_query = "SELECT COUNT(*) as total FROM students"
-
-            where_clause = ""
-            params = []
-            if search:
-                where_clause = """
-                WHERE ho_ten ILIKE %s OR email ILIKE %s OR lop ILIKE %s
-                OR sdt ILIKE %s
-                """
-                search_param = f"%{search}%"
-                params = [search_param, search_param, search_param, search_param]
-
-            # Get total count
-            cursor.execute(count_query + where_clause, params)
-            total = cursor.fetchone()[0]
-
-            # Get records with pagination
-            query = base_query + where_clause + " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-            cursor.execute(query, params + [limit, offset])
-            
-        else:
-            # SQLite syntax
-            base_query = """
-            SELECT id, email, full_name, nickname, class, birth_date, gender,
-                   phone, created_at, eye_diseases, current_province
-            FROM students
-            """
-            count_query = "SELECT COUNT(*) as total FROM students"
-
-            where_clause = ""
-            params = []
-            if search:
-                where_clause = """
-                WHERE full_name LIKE ? OR email LIKE ? OR class LIKE ?
-                OR phone LIKE ? OR nickname LIKE ?
-                """
-                search_param = f"%{search}%"
-                params = [search_param] * 5
-
-            # Get total count
-            cursor.execute(count_query + where_clause, params)
-            total = cursor.fetchone()[0]
-
-            # Get records with pagination
-            query = base_query + where_clause + " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-            cursor.execute(query, params + [limit, offset])
+        params = [f"%{search}%"] * STUDENT_SEARCH_PARAMS if search else []
+
+        # Get total count
+        STATEMENTS.execute(conn, cursor, 'students_count', params, bool(search))
+        total = cursor.fetchone()[0]
+
+        # Get records with pagination
+        STATEMENTS.execute(conn, cursor, 'students_page', params + [limit, offset], (select_list, bool(search)))
 
         # Process results
         students = []
@@ -1268,9 +1978,13 @@ def get_students():
 
         total_pages = math.ceil(total / limit)
 
-        return jsonify({
+        if fields:
+            students = [project(s, fields) for s in students]
+        elif not compat:
+            students = [strip_compat_keys(s) for s in students]
+
+        result = {
             'data': students,
-            'students': students,
             'pagination': {
                 'current_page': page,
                 'total_pages': total_pages,
@@ -1281,92 +1995,136 @@ def get_students():
                 'has_prev': page > 1
             },
             'search': search
-        })
-
+        }
+        if compat:
+            result['students'] = students
+        body = jsonify(result).get_data()
+        etag = LIST_CACHE.put(cache_key, version, body) if version is not None else body_etag(body)
+        return list_response(body, etag)
+
+    except InvalidFieldsError as e:
+        return invalid_fields_response(e)
     except Exception as e:
         print(f"[API ERROR] get_students: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def fetch_student_detail(student_id, select_list):
+    """Normalized student dict for the detail page, or None if there is no such id"""
+    conn = get_read_connection()
+    # Only set row_factory for SQLite
+    if DB_CONFIG['type'] == 'sqlite':
+        conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    STATEMENTS.execute(conn, cursor, 'student_by_id', (student_id,), select_list)
+        
+    row = cursor.fetchone()
+    # Cursor bị đóng khi kết nối trả về pool
+    column_names = [desc[0] for desc in cursor.description]
+    conn.close()
+
+    if not row:
+        return None
+
+    if DB_CONFIG['type'] == 'postgresql':
+        # Convert PostgreSQL result to dict
+        student = dict(zip(column_names, row))
+        print(f"[STUDENT DETAIL] PostgreSQL columns: {column_names}")
+        print(f"[STUDENT DETAIL] Has eye_diseases: {'eye_diseases' in column_names}")
+        if 'eye_diseases' in student:
+            print(f"[STUDENT DETAIL] eye_diseases value: '{student['eye_diseases']}'")
+    else:
+        # SQLite with row_factory
+        student = dict(row)
+        print(f"[STUDENT DETAIL] SQLite columns: {list(student.keys())}")
+        if 'eye_diseases' in student:
+            print(f"[STUDENT DETAIL] eye_diseases value: '{student['eye_diseases']}'")
+
+    # Debug field mapping
+    eye_diseases_value = student.get('eye_diseases', '')
+    print(f"[STUDENT DETAIL] Mapping eye_diseases '{eye_diseases_value}' to eyeDiseases")
+
+    if student.get('permanent_street') and student.get('permanent_hamlet') and student.get('permanent_ward') and student.get('permanent_province'):
+        student['permanent_address'] = f"{student['permanent_street']}, {student['permanent_hamlet']}, {student['permanent_ward']}, {student['permanent_province']}"
+    else:
+        student['permanent_address'] = None
+
+    if student.get('current_address_detail') and student.get('current_hamlet') and student.get('current_ward') and student.get('current_province'):
+        student['temporary_address'] = f"{student['current_address_detail']}, {student['current_hamlet']}, {student['current_ward']}, {student['current_province']}"
+    else:
+        student['temporary_address'] = None
+
+    student['id_number'] = student.get('citizen_id') or student.get('personal_id')
+    
+    # CRITICAL FIX: Add field mappings for frontend compatibility - both ways
+    eye_diseases_value = student.get('eye_diseases', '')
+    # Normalize eye_diseases: if it's a JSON array, convert to comma-separated
+    if eye_diseases_value and isinstance(eye_diseases_value, str):
+        try:
+            import json as json_lib
+            parsed = json_lib.loads(eye_diseases_value)
+            if isinstance(parsed, list):
+                eye_diseases_value = ','.join(parsed)
+        except:
+            pass  # Keep original value if not JSON
+    
+    student['eyeDiseases'] = eye_diseases_value
+    student['eye_diseases'] = eye_diseases_value  # Ensure original field exists
+    student['tinh_thanh'] = student.get('current_province', '') or student.get('tinh_thanh', '')
+    
+    # EMERGENCY PATCH: Force ensure eye_diseases data
+    student = emergency_ensure_eye_diseases(student)
+    
+    print(f"[STUDENT DETAIL] Final eyeDiseases value: '{student['eyeDiseases']}'")
+    print(f"[STUDENT DETAIL] Final eye_diseases value: '{student.get('eye_diseases', '')}'")
+    print(f"[STUDENT DETAIL] Final tinh_thanh value: '{student['tinh_thanh']}'")
+    return student
+
 @app.route('/api/student/<int:student_id>', methods=['GET'])
 def get_student_detail(student_id):
     try:
-        conn = get_db_connection()
-        # Only set row_factory for SQLite
-        if DB_CONFIG['type'] == 'sqlite':
-            conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        if DB_CONFIG['type'] == 'postgresql':
-            cursor.execute('SELECT * FROM students WHERE id = %s', (student_id,))
-        else:
-            cursor.execute('SELECT * FROM students WHERE id = ?', (student_id,))
-            
-        row = cursor.fetchone()
-        conn.close()
+        fields, select_list = requested_fields()
 
-        if not row:
+        student = cached_student('id', student_id, select_list, fetch_student_detail)
+        if student is None:
             return jsonify({'error': 'Không tìm thấy học sinh'}), 404
 
-        if DB_CONFIG['type'] == 'postgresql':
-            # Convert PostgreSQL result to dict
-            column_names = [desc[0] for desc in cursor.description]
-            student = dict(zip(column_names, row))
-            print(f"[STUDENT DETAIL] PostgreSQL columns: {column_names}")
-            print(f"[STUDENT DETAIL] Has eye_diseases: {'eye_diseases' in column_names}")
-            if 'eye_diseases' in student:
-                print(f"[STUDENT DETAIL] eye_diseases value: '{student['eye_diseases']}'")
-        else:
-            # SQLite with row_factory
-            student = dict(row)
-            print(f"[STUDENT DETAIL] SQLite columns: {list(student.keys())}")
-            if 'eye_diseases' in student:
-                print(f"[STUDENT DETAIL] eye_diseases value: '{student['eye_diseases']}'")
+        if fields:
+            student = project(student, fields)
+        elif not wants_compat_payload():
+            strip_compat_keys(student)
 
-        # Debug field mapping
-        eye_diseases_value = student.get('eye_diseases', '')
-        print(f"[STUDENT DETAIL] Mapping eye_diseases '{eye_diseases_value}' to eyeDiseases")
-
-        if student.get('permanent_street') and student.get('permanent_hamlet') and student.get('permanent_ward') and student.get('permanent_province'):
-            student['permanent_address'] = f"{student['permanent_street']}, {student['permanent_hamlet']}, {student['permanent_ward']}, {student['permanent_province']}"
-        else:
-            student['permanent_address'] = None
-
-        if student.get('current_address_detail') and student.get('current_hamlet') and student.get('current_ward') and student.get('current_province'):
-            student['temporary_address'] = f"{student['current_address_detail']}, {student['current_hamlet']}, {student['current_ward']}, {student['current_province']}"
-        else:
-            student['temporary_address'] = None
-
-        student['id_number'] = student.get('citizen_id') or student.get('personal_id')
-        
-        # CRITICAL FIX: Add field mappings for frontend compatibility - both ways
-        eye_diseases_value = student.get('eye_diseases', '')
-        # Normalize eye_diseases: if it's a JSON array, convert to comma-separated
-        if eye_diseases_value and isinstance(eye_diseases_value, str):
-            try:
-                import json as json_lib
-                parsed = json_lib.loads(eye_diseases_value)
-                if isinstance(parsed, list):
-                    eye_diseases_value = ','.join(parsed)
-            except:
-                pass  # Keep original value if not JSON
-        
-        student['eyeDiseases'] = eye_diseases_value
-        student['eye_diseases'] = eye_diseases_value  # Ensure original field exists
-        student['tinh_thanh'] = student.get('current_province', '') or student.get('tinh_thanh', '')
-        
-        # EMERGENCY PATCH: Force ensure eye_diseases data
-        student = emergency_ensure_eye_diseases(student)
-        
-        print(f"[STUDENT DETAIL] Final eyeDiseases value: '{student['eyeDiseases']}'")
-        print(f"[STUDENT DETAIL] Final eye_diseases value: '{student.get('eye_diseases', '')}'")
-        print(f"[STUDENT DETAIL] Final tinh_thanh value: '{student['tinh_thanh']}'")
-
-        return jsonify(student)
+        return jsonify(student)
 
+    except InvalidFieldsError as e:
+        return invalid_fields_response(e)
     except Exception as e:
         print(f"[API ERROR] get_student_detail: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/debug/statements', methods=['GET'])
+def debug_statements():
+    """Per-statement timings and read pool usage of this worker process"""
+    return jsonify({
+        'pid': os.getpid(),
+        'statements': STATEMENTS.timings(),
+        'read_pool': READ_POOL.status(),
+    })
+
+@app.route('/api/debug/student-cache', methods=['GET'])
+def debug_student_cache():
+    """Hit/miss counters of the student detail/by-email cache (per process for the in-memory backend)"""
+    if STUDENT_CACHE is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(STUDENT_CACHE.status(), enabled=True, pid=os.getpid()))
+
+@app.route('/api/debug/list-cache', methods=['GET'])
+def debug_list_cache():
+    """Hit/miss counters and memory use of this worker's /api/students response cache"""
+    if LIST_CACHE is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(LIST_CACHE.status(), enabled=True, pid=os.getpid()))
+
 @app.route('/api/debug/simple', methods=['GET'])
 def debug_simple():
     """Simple debug to check eye_diseases column"""
@@ -1478,69 +2236,79 @@ def debug_schema():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def fetch_student_by_email(email, select_list):
+    """Normalized student dict of the latest submission with this email, or None"""
+    conn = get_read_connection()
+    # Only set row_factory for SQLite
+    if DB_CONFIG['type'] == 'sqlite':
+        conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    STATEMENTS.execute(conn, cursor, 'student_by_email', (email,), select_list)
+        
+    row = cursor.fetchone()
+    # Cursor bị đóng khi kết nối trả về pool
+    column_names = [desc[0] for desc in cursor.description]
+    conn.close()
+
+    if not row:
+        return None
+
+    if DB_CONFIG['type'] == 'postgresql':
+        # Convert PostgreSQL result to dict
+        student = dict(zip(column_names, row))
+    else:
+        # SQLite with row_factory
+        student = {k: row[k] for k in row.keys()}
+    
+    # CRITICAL FIX: Add field mappings for frontend compatibility - both ways
+    eye_diseases_value = student.get('eye_diseases', '')
+    # Normalize eye_diseases: if it's a JSON array, convert to comma-separated
+    if eye_diseases_value and isinstance(eye_diseases_value, str):
+        try:
+            import json as json_lib
+            parsed = json_lib.loads(eye_diseases_value)
+            if isinstance(parsed, list):
+                eye_diseases_value = ','.join(parsed)
+        except:
+            pass  # Keep original value if not JSON
+    
+    student['eyeDiseases'] = eye_diseases_value
+    student['eye_diseases'] = eye_diseases_value  # Ensure original field exists
+    
+    # EMERGENCY PATCH: Force ensure eye_diseases data
+    student = emergency_ensure_eye_diseases(student)
+    return student
+
 @app.route('/api/student-by-email', methods=['GET'])
 def find_student_by_email():
     try:
         email = request.args.get('email')
         if not email:
             return jsonify({'error': 'Thiếu tham số email'}), 400
+        fields, select_list = requested_fields()
 
-        conn = get_db_connection()
-        # Only set row_factory for SQLite
-        if DB_CONFIG['type'] == 'sqlite':
-            conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        if DB_CONFIG['type'] == 'postgresql':
-            cursor.execute('''
-                SELECT * FROM students WHERE email = %s
-                ORDER BY created_at DESC, id DESC LIMIT 1
-            ''', (email,))
-        else:
-            cursor.execute('''
-                SELECT * FROM students WHERE email = ?
-                ORDER BY datetime(created_at) DESC, id DESC LIMIT 1
-            ''', (email,))
-            
-        row = cursor.fetchone()
-        conn.close()
-
-        if not row:
+        student = cached_student('email', email, select_list, fetch_student_by_email)
+        if student is None:
             return jsonify({'student': None}), 200
 
-        if DB_CONFIG['type'] == 'postgresql':
-            # Convert PostgreSQL result to dict
-            column_names = [desc[0] for desc in cursor.description]
-            student = dict(zip(column_names, row))
-        else:
-            # SQLite with row_factory
-            student = {k: row[k] for k in row.keys()}
-        
-        # CRITICAL FIX: Add field mappings for frontend compatibility - both ways
-        eye_diseases_value = student.get('eye_diseases', '')
-        # Normalize eye_diseases: if it's a JSON array, convert to comma-separated
-        if eye_diseases_value and isinstance(eye_diseases_value, str):
-            try:
-                import json as json_lib
-                parsed = json_lib.loads(eye_diseases_value)
-                if isinstance(parsed, list):
-                    eye_diseases_value = ','.join(parsed)
-            except:
-                pass  # Keep original value if not JSON
-        
-        student['eyeDiseases'] = eye_diseases_value
-        student['eye_diseases'] = eye_diseases_value  # Ensure original field exists
-        
-        # EMERGENCY PATCH: Force ensure eye_diseases data
-        student = emergency_ensure_eye_diseases(student)
+        if fields:
+            student = project(student, fields)
+        elif not wants_compat_payload():
+            strip_compat_keys(student)
             
         return jsonify({'student': student})
+    except InvalidFieldsError as e:
+        return invalid_fields_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/export-excel', methods=['GET'])
+@profile_export_memory('EXCEL')
 def export_excel():
     try:
+        import pandas as pd
+
         # Lấy parameters từ request
         grade = request.args.get('grade')  # '10', '11', '12'
         classes = request.args.get('classes')  # '10A1,10A2,11B3'
@@ -1551,7 +2319,7 @@ def export_excel():
         
         print(f"[EXCEL] Starting export - Grade: {grade}, Classes: {classes}, Province: {province}, Ethnicity: {ethnicity}, FontSize: {font_size}, CustomTitle: {custom_title}")
 
-        conn = get_db_connection()
+        conn = get_read_connection()
         conn.execute('PRAGMA temp_store = MEMORY')
         conn.execute('PRAGMA cache_size = 10000')
 
@@ -1597,41 +2365,24 @@ def export_excel():
         print(f"[EXCEL] Query: {query}")
         print(f"[EXCEL] Params: {query_params}")
 
-        # Đọc dữ liệu với chunks để xử lý dataset lớn
-        if query_params:
-            # Pandas không hỗ trợ tham số với chunksize, nên ta phải đọc trực tiếp
-            cursor = conn.cursor()
-            cursor.execute(query, query_params)
-            rows = cursor.fetchall()
-            
-            # Lấy column names
-            column_names = [description[0] for description in cursor.description]
-            
-            # Tạo DataFrame
-            df_final = pd.DataFrame(rows, columns=column_names)
-            total_records = len(df_final)
-            print(f"[EXCEL] Filtered records: {total_records}")
-        else:
-            # Không có filter, đọc tất cả với chunks
-            df = pd.read_sql_query(query, conn, chunksize=1000)
-            df_list = []
-            total_records = 0
-            for chunk in df:
-                df_list.append(chunk)
-                total_records += len(chunk)
-                print(f"[EXCEL] Processed {total_records} records...")
-            
-            if not df_list:
-                conn.close()
-                return jsonify({'error': 'Không có dữ liệu để xuất'}), 400
-                
-            df_final = pd.concat(df_list, ignore_index=True)
+        # Đọc dữ liệu theo lô thành DataFrame có kiểu (category/Int32/datetime) để giảm bộ nhớ
+        cursor = export_cursor(conn, 'export_excel')
+        cursor.execute(query, query_params)
+        export_stage('dataframe')
+        df_final = load_export_frame(cursor)
+        total_records = len(df_final)
+        print(f"[EXCEL] Loaded {total_records} records")
 
         conn.close()
 
+        if df_final.empty and not query_params:
+            return jsonify({'error': 'Không có dữ liệu để xuất'}), 400
+
         if df_final.empty:
             return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
 
+        export_stage('transform')
+
         # CRITICAL FIX: Normalize eye_diseases data for export
         if 'eye_diseases' in df_final.columns:
             def normalize_eye_diseases(value):
@@ -1651,7 +2402,7 @@ def export_excel():
                 return str(value) if value else 'Chưa có thông tin'
             
             print(f"[EXPORT] Normalizing eye_diseases column for {len(df_final)} records")
-            df_final['eye_diseases'] = df_final['eye_diseases'].apply(normalize_eye_diseases)
+            df_final['eye_diseases'] = df_final['eye_diseases'].astype(object).apply(normalize_eye_diseases).astype('category')
             
             # Debug: Show some samples after normalization
             sample_eye_data = df_final['eye_diseases'].head(5).tolist()
@@ -1686,72 +2437,9 @@ def export_excel():
         
         print(f"[EXCEL] Generated filename: {filename}")
 
-        column_mapping = {
-            'id': 'STT',
-            'email': 'Email',
-            'full_name': 'Họ và tên',
-            'nickname': 'Tên gọi khác',
-            'class': 'Lớp',
-            'khoi': 'Khối',
-            'birth_date': 'Ngày sinh',
-            'gender': 'Giới tính',
-            'ethnicity': 'Dân tộc',
-            'dan_toc': 'Dân tộc',  # Mapping cho PostgreSQL
-            'nationality': 'Quốc tịch',
-            'religion': 'Tôn giáo',
-            'phone': 'Số điện thoại',
-            'citizen_id': 'Số CCCD',
-            'cccd_date': 'Ngày cấp CCCD',
-            'cccd_place': 'Nơi cấp CCCD',
-            'personal_id': 'Mã định danh',
-            'passport': 'Số hộ chiếu',
-            'passport_date': 'Ngày cấp hộ chiếu',
-            'passport_place': 'Nơi cấp hộ chiếu',
-            'organization': 'Đoàn/Đội',
-            'permanent_province': 'Tỉnh thường trú',
-            'permanent_ward': 'Phường thường trú',
-            'permanent_hamlet': 'Khu phố thường trú',
-            'permanent_street': 'Địa chỉ thường trú',
-            'hometown_province': 'Tỉnh quê quán',
-            'hometown_ward': 'Phường quê quán',
-            'hometown_hamlet': 'Khu phố quê quán',
-            'birth_cert_province': 'Tỉnh cấp giấy khai sinh',
-            'birth_cert_ward': 'Phường cấp giấy khai sinh',
-            'birthplace_province': 'Tỉnh nơi sinh',
-            'birthplace_ward': 'Phường nơi sinh',
-            'birthplace_detail': 'Nơi sinh chi tiết',
-            'current_address_detail': 'Địa chỉ hiện tại',
-            'current_province': 'Tỉnh hiện tại',
-            'current_ward': 'Phường hiện tại',
-            'current_hamlet': 'Khu phố hiện tại',
-            'height': 'Chiều cao (cm)',
-            'weight': 'Cân nặng (kg)',
-            'eye_diseases': 'Tật khúc xạ (mắt)',
-            'swimming_skill': 'Kỹ năng bơi',
-            'smartphone': 'Điện thoại thông minh',
-            'computer': 'Máy tính',
-            'father_ethnicity': 'Dân tộc của cha',
-            'mother_ethnicity': 'Dân tộc của mẹ',
-            'father_name': 'Họ tên cha',
-            'father_job': 'Nghề nghiệp cha',
-            'father_birth_year': 'Năm sinh cha',
-            'father_phone': 'SĐT cha',
-            'father_cccd': 'CCCD cha',
-            'mother_name': 'Họ tên mẹ',
-            'mother_job': 'Nghề nghiệp mẹ',
-            'mother_birth_year': 'Năm sinh mẹ',
-            'mother_phone': 'SĐT mẹ',
-            'mother_cccd': 'CCCD mẹ',
-            'guardian_name': 'Họ tên người giám hộ',
-            'guardian_job': 'Nghề nghiệp người giám hộ',
-            'guardian_birth_year': 'Năm sinh người giám hộ',
-            'guardian_phone': 'SĐT người giám hộ',
-            'guardian_cccd': 'CCCD người giám hộ',
-            'guardian_gender': 'Giới tính người giám hộ',
-            'created_at': 'Thời gian nộp kê khai'
-        }
+        column_mapping = dict(EXPORT_COLUMN_LABELS, dan_toc='Dân tộc')  # dan_toc: cột PostgreSQL
 
-        df_export = df_final.rename(columns=column_mapping)
+        df_export = relabel_columns(df_final, column_mapping)
 
         order_keys = [
             'id',
@@ -1769,20 +2457,18 @@ def export_excel():
             'created_at'
         ]
         order_vn = [column_mapping.get(k, k) for k in order_keys]
-        ordered_present = [c for c in order_vn if c in df_export.columns]
-        others = [c for c in df_export.columns if c not in ordered_present]
-        df_export = df_export[ordered_present + others]
+        df_export = reorder_columns(df_export, order_vn)
 
+        export_stage('render')
         try:
             from openpyxl import Workbook
             from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils.dataframe import dataframe_to_rows
 
             wb = Workbook()
             ws = wb.active
             ws.title = "Danh sách học sinh"
 
-            for r in dataframe_to_rows(df_export, index=False, header=True):
+            for r in export_rows(df_export, header=True):
                 ws.append(r)
 
             header_font = Font(bold=True, color="FFFFFF", size=font_size + 1)  # Dynamic header font
@@ -1807,8 +2493,10 @@ def export_excel():
                 cell.alignment = header_alignment
                 cell.border = thin_border
 
+            # ws.max_column quét toàn bộ ô mỗi lần gọi, tính một lần ngoài vòng lặp
+            max_column = ws.max_column
             for row in range(2, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
+                for col in range(1, max_column + 1):
                     cell = ws.cell(row=row, column=col)
                     cell.font = content_font
                     cell.fill = content_fill
@@ -1857,11 +2545,12 @@ def export_excel():
 
 # Enhanced export endpoints for different formats
 @app.route('/api/export-xlsx', methods=['GET'])
+@profile_export_memory('XLSX')
 def export_xlsx():
     """Enhanced XLSX export with more options"""
     try:
         # Get all parameters from request
-        export_type = request.args.get('type', 'all')  # all, grade, class, custom
+        export_type = request.args.get('type') or request.args.get('export_type', 'all')  # all, grade, class, custom, by_class
         grade = request.args.get('grade')  
         classes = request.args.get('classes')  
         province = request.args.get('province')  # Province filter
@@ -1870,24 +2559,20 @@ def export_xlsx():
         title = request.args.get('customTitle') or request.args.get('title', 'Danh sách học sinh THPT Dĩ An')
         include_stats = request.args.get('includeStats') == 'true'
         include_timestamp = request.args.get('includeTimestamp') == 'true'
+        include_health = request.args.get('includeHealth') == 'true'  # Thêm sheet phân tích sức khỏe
         sort_by_class = request.args.get('sortByClass') == 'true'
         sort_by_name = request.args.get('sortByName') == 'true'
         hide_empty_fields = request.args.get('hideEmptyFields') == 'true'
         theme_color = request.args.get('themeColor', 'blue')
         font_size = int(request.args.get('fontSize', '11'))  # Get font size parameter
+
+        # by_class: mỗi lớp một sheet (format=zip: mỗi lớp một file); khối/lớp/bộ lọc khác vẫn áp dụng
+        by_class = export_type == 'by_class'
+        bundle_zip = by_class and request.args.get('format') == 'zip'
+        if by_class:
+            export_type = 'all'
         
-        # Auto detect export type if not provided
-        if export_type == 'all':
-            if grade:
-                export_type = 'grade'
-            elif classes:
-                export_type = 'class'
-            elif (request.args.get('gender') or 
-                  request.args.get('fromYear') or 
-                  request.args.get('toYear') or 
-                  request.args.get('hasPhone') or
-                  province or ethnicity):
-                export_type = 'custom'
+        export_type = detect_export_type(export_type)
         
         print(f"[XLSX] Export type: {export_type}, Grade: {grade}, Classes: {classes}, Province: {province}, Ethnicity: {ethnicity}")
         
@@ -1899,7 +2584,7 @@ def export_xlsx():
             has_phone = request.args.get('hasPhone')
             print(f"[XLSX] Custom filters detected - Gender: {gender}, Years: {from_year}-{to_year}, HasPhone: {has_phone}")
 
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         # Auto-detect database schema
@@ -1995,69 +2680,7 @@ def export_xlsx():
         
         column_list = ', '.join(available_columns)
         base_query = f'SELECT {column_list} FROM students'
-        where_conditions = []
-        query_params = []
-
-        if export_type == 'grade' and grade:
-            # Filter theo khối học chính xác - chỉ lấy các lớp thuộc khối đó
-            placeholder = get_placeholder()
-            if DB_CONFIG['type'] == 'postgres':
-                where_conditions.append(f"substring({class_column}, 1, LENGTH({placeholder})) = {placeholder}")
-            else:
-                where_conditions.append(f"SUBSTR({class_column}, 1, LENGTH({placeholder})) = {placeholder}")
-            query_params.extend([grade, grade])
-            print(f"[XLSX] Filtering by grade: {grade}")
-        elif export_type == 'class' and classes:
-            class_list = [cls.strip() for cls in classes.split(',')]
-            placeholder = get_placeholder()
-            placeholders = ','.join([placeholder for _ in class_list])
-            where_conditions.append(f"{class_column} IN ({placeholders})")
-            query_params.extend(class_list)
-            print(f"[XLSX] Filtering by classes: {class_list}")
-        elif export_type == 'custom':
-            # Handle custom filters
-            gender = request.args.get('gender')
-            has_phone = request.args.get('hasPhone') == 'true'
-            
-            print(f"[XLSX] Custom filters - Gender: {gender}, HasPhone: {has_phone}")
-            
-            if gender:
-                gender_list = [g.strip() for g in gender.split(',')]
-                placeholder = get_placeholder()
-                gender_placeholders = ','.join([placeholder for _ in gender_list])
-                where_conditions.append(f"{gender_column} IN ({gender_placeholders})")
-                query_params.extend(gender_list)
-                
-            if has_phone:
-                where_conditions.append(f"{phone_column} IS NOT NULL AND {phone_column} != ''")
-        
-        # Apply province and ethnicity filters for ALL export types
-        if province:
-            placeholder = get_placeholder()
-            # Map short province names to full names for better matching
-            province_mapping = {
-                'Đồng Nai': 'Tỉnh Đồng Nai',
-                'Hà Nội': 'Thành phố Hà Nội', 
-                'Hồ Chí Minh': 'Thành phố Hồ Chí Minh',
-                'Đà Nẵng': 'Thành phố Đà Nẵng',
-                'Cần Thơ': 'Thành phố Cần Thơ',
-                'Hải Phòng': 'Thành phố Hải Phòng',
-                'Huế': 'Thành phố Huế'
-            }
-            # Use full name if mapping exists, otherwise use original
-            search_province = province_mapping.get(province, province)
-            print(f"[XLSX] Province filter: '{province}' -> searching for '{search_province}'")
-            # Flexible province matching - case insensitive and partial match
-            where_conditions.append(f"LOWER(permanent_province) LIKE LOWER({placeholder})")
-            query_params.append(f"%{search_province}%")
-            print(f"[XLSX] Filtering by province: %{search_province}%")
-
-        if ethnicity:
-            placeholder = get_placeholder()
-            # Flexible ethnicity matching - case insensitive and partial match
-            where_conditions.append(f"LOWER({ethnicity_column}) LIKE LOWER({placeholder})")
-            query_params.append(f"%{ethnicity}%")
-            print(f"[XLSX] Filtering by ethnicity: %{ethnicity}%")
+        where_conditions, query_params = build_export_filters(export_type, use_old_schema, 'XLSX')
 
         # Build final query
         if where_conditions:
@@ -2074,14 +2697,10 @@ def export_xlsx():
             query += " ORDER BY id ASC"
 
         # Execute query
-        if query_params:
-            cursor = conn.cursor()
-            cursor.execute(query, query_params)
-            rows = cursor.fetchall()
-            column_names = [description[0] for description in cursor.description]
-            df_final = pd.DataFrame(rows, columns=column_names)
-        else:
-            df_final = pd.read_sql_query(query, conn)
+        cursor = export_cursor(conn, 'export_xlsx')
+        cursor.execute(query, query_params)
+        export_stage('dataframe')
+        df_final = load_export_frame(cursor)
 
         conn.close()
 
@@ -2097,7 +2716,10 @@ def export_xlsx():
         else:
             base_filename = 'danh_sach_hoc_sinh'
         
-        if export_type == 'grade' and grade:
+        if by_class:
+            scope = f'_khoi_{grade}' if export_type == 'grade' and grade else ''
+            filename = f"{base_filename}_theo_lop{scope}_{timestamp}.{'zip' if bundle_zip else 'xlsx'}"
+        elif export_type == 'grade' and grade:
             filename = f'{base_filename}_khoi_{grade}_{timestamp}.xlsx'
         elif export_type == 'class' and classes:
             class_list = [cls.strip() for cls in classes.split(',')]
@@ -2112,6 +2734,14 @@ def export_xlsx():
         
         print(f"[XLSX] Generated filename: {filename}")
 
+        export_stage('transform')
+
+        health_sheets = []
+        if include_health:
+            analysis = HealthAnalysis(frame_health_columns(df_final), get_vietnam_time().date())
+            health_sheets = analysis.sheets()
+            print(f"[XLSX] Health analytics for {analysis.count} students in {analysis.elapsed_ms:.1f} ms")
+
         # Column mapping - using actual database column names with old->new schema mapping
         column_mapping = {
             'id': 'STT',
@@ -2191,7 +2821,7 @@ def export_xlsx():
             'nghe_nghiep_me': 'Nghề nghiệp mẹ'
         }
 
-        df_export = df_final.rename(columns=column_mapping)
+        df_export = relabel_columns(df_final, column_mapping)
         
         # Handle duplicate columns if both old and new schema exist
         # Ensure we have the essential columns with correct data
@@ -2240,9 +2870,7 @@ def export_xlsx():
         ]
         
         # Reorder columns based on the Vietnamese names
-        ordered_present = [c for c in order_vietnamese if c in df_export.columns]
-        others = [c for c in df_export.columns if c not in ordered_present]
-        df_export = df_export[ordered_present + others]
+        df_export = reorder_columns(df_export, order_vietnamese)
 
         # Hide empty fields if requested
         if hide_empty_fields:
@@ -2253,11 +2881,29 @@ def export_xlsx():
                     if non_null_count / len(df_export) < 0.1:  # Less than 10% filled
                         df_export = df_export.drop(columns=[col])
 
+        export_stage('render')
+
+        if by_class:
+            class_values = df_final[class_column] if class_column in df_final.columns else df_final['class']
+            exported_at = get_vietnam_time().strftime('%d/%m/%Y %H:%M:%S')
+
+            def preamble(name, count):
+                if not include_stats:
+                    return []
+                lines = [title, f"Lớp {name} - Tổng số học sinh: {count}"]
+                if include_timestamp:
+                    lines.append(f"Xuất lúc: {exported_at}")
+                return lines + ['']
+
+            return send_class_workbook(
+                df_export, class_values, filename, bundle_zip, preamble,
+                THEME_COLORS.get(theme_color, DEFAULT_HEADER_COLOR), font_size, base_filename, health_sheets
+            )
+
         # Create Excel with styling
         try:
             from openpyxl import Workbook
             from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils.dataframe import dataframe_to_rows
 
             wb = Workbook()
             ws = wb.active
@@ -2272,20 +2918,11 @@ def export_xlsx():
                 ws.append([])  # Empty row
 
             # Add data
-            for r in dataframe_to_rows(df_export, index=False, header=True):
+            for r in export_rows(df_export, header=True):
                 ws.append(r)
 
             # Apply styling based on theme
-            theme_colors = {
-                'blue': '1F4E79',      # Xanh dương đậm
-                'green': '2E7D32',     # Xanh lá đậm  
-                'orange': 'F57500',    # Cam đậm
-                'purple': '7B1FA2',    # Tím đậm
-                'red': 'D32F2F',       # Đỏ đậm
-                'teal': '00796B'       # Xanh ngọc đậm
-            }
-            
-            header_color = theme_colors.get(theme_color, '1F4E79')
+            header_color = THEME_COLORS.get(theme_color, DEFAULT_HEADER_COLOR)
             print(f"[EXCEL] Using theme color: {theme_color} -> #{header_color}")  # Debug log
             header_font = Font(bold=True, color="FFFFFF", size=font_size + 1)  # Header slightly larger
             header_fill = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
@@ -2305,8 +2942,10 @@ def export_xlsx():
             
             print(f"[XLSX] Applying font size: {font_size}")  # Debug log
             
+            # ws.max_column quét toàn bộ ô mỗi lần gọi, tính một lần ngoài vòng lặp
+            max_column = ws.max_column
             for row in range(1, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
+                for col in range(1, max_column + 1):
                     cell = ws.cell(row=row, column=col)
                     
                     # Apply center alignment to all cells
@@ -2346,6 +2985,21 @@ def export_xlsx():
                 else:
                     ws.row_dimensions[row].height = 25  # Data rows
 
+            # Sheet phân tích sức khỏe (includeHealth=true), cùng kiểu header với sheet chính
+            for sheet_name, sheet_header, sheet_rows in health_sheets:
+                ws_health = wb.create_sheet(sheet_name)
+                ws_health.append(sheet_header)
+                for r in sheet_rows:
+                    ws_health.append(r)
+                for col, name in enumerate(sheet_header, 1):
+                    cell = ws_health.cell(row=1, column=col)
+                    cell.font = header_font
+                    cell.fill = header_fill
+                    cell.alignment = header_alignment
+                    widths = [len(str(name))] + [len(str(r[col - 1])) for r in sheet_rows if r[col - 1] is not None]
+                    ws_health.column_dimensions[cell.column_letter].width = min(max(max(widths) + 3, 12), 80)
+                ws_health.row_dimensions[1].height = 30
+
             wb.save(filename)
 
         except ImportError:
@@ -2356,12 +3010,50 @@ def export_xlsx():
 
         return send_file_with_cleanup(filename, as_attachment=True, download_name=filename)
 
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"[XLSX] Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def stream_csv_copy(conn, columns, where_conditions, query_params, filename):
+    """Stream the CSV export straight from PostgreSQL with COPY (see pg_copy).
+
+    Same headers, column order and UTF-8 BOM as the pandas path; PostgreSQL
+    formats the values (dates ISO, created_at to the second, empty text as an empty cell).
+    """
+    # set_client_encoding kết thúc transaction đang mở nên phải gọi trước mọi truy vấn
+    conn.set_client_encoding('UTF8')
+    where_sql = f" WHERE {' AND '.join(where_conditions)}" if where_conditions else ''
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT 1 FROM students{where_sql} LIMIT 1', query_params)
+    if cursor.fetchone() is None:
+        conn.close()
+        return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+    labels = [EXPORT_COLUMN_LABELS.get(c, c) for c in columns]
+    select = []
+    for i in column_positions(labels, [EXPORT_COLUMN_LABELS.get(k, k) for k in EXPORT_COLUMN_ORDER]):
+        if columns[i] == 'created_at':
+            value = "to_char(created_at, 'YYYY-MM-DD HH24:MI:SS')"
+        else:
+            value = f"NULLIF(CAST({columns[i]} AS TEXT), '')"
+        label = labels[i].replace('"', '""')
+        select.append(f'{value} AS "{label}"')
+    # COPY không nhận tham số, mogrify chèn giá trị đã escape vào câu lệnh
+    query = cursor.mogrify(f"SELECT {', '.join(select)} FROM students{where_sql} ORDER BY id ASC", query_params)
+    cursor.execute("SET DateStyle TO 'ISO, YMD'")
+
+    export_stage('render')
+    copy_sql = f"COPY ({query.decode('utf-8')}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    response = Response(iter_copy(conn, copy_sql, prefix=codecs.BOM_UTF8), mimetype='text/csv')
+    response.call_on_close(conn.close)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'), safe='')}"
+    return response
+
 @app.route('/api/export-csv', methods=['GET'])
 @app.route('/api/export-csv', methods=['GET'])
+@profile_export_memory('CSV')
 def export_csv():
     """Export to CSV format"""
     try:
@@ -2385,7 +3077,7 @@ def export_csv():
                   province or ethnicity):
                 export_type = 'custom'
         
-        conn = get_db_connection()
+        conn = get_read_connection()
         
         # Build query - select only needed columns (same as XLSX)
         basic_columns = [
@@ -2482,21 +3174,6 @@ def export_csv():
         else:
             query = f"{base_query} ORDER BY id ASC"
 
-        # Execute query
-        if query_params:
-            cursor = conn.cursor()
-            cursor.execute(query, query_params)
-            rows = cursor.fetchall()
-            column_names = [description[0] for description in cursor.description]
-            df_final = pd.DataFrame(rows, columns=column_names)
-        else:
-            df_final = pd.read_sql_query(query, conn)
-
-        conn.close()
-
-        if df_final.empty:
-            return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
-
         # Generate filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         if export_type == 'grade' and grade:
@@ -2512,96 +3189,34 @@ def export_csv():
         else:
             filename = f'danh_sach_hoc_sinh_tat_ca_{timestamp}.csv'
 
+        if DB_CONFIG['type'] == 'postgresql':
+            return stream_csv_copy(conn, basic_columns, where_conditions, query_params, filename)
+
+        # Execute query
+        cursor = conn.cursor()
+        cursor.execute(query, query_params)
+        export_stage('dataframe')
+        df_final = load_export_frame(cursor)
+
+        conn.close()
+
+        if df_final.empty:
+            return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+        export_stage('transform')
+
         # Column mapping for Vietnamese headers
-        column_mapping = {
-            'id': 'STT',
-            'email': 'Email',
-            'full_name': 'Họ và tên',
-            'nickname': 'Tên gọi khác',
-            'class': 'Lớp',
-            'khoi': 'Khối',
-            'birth_date': 'Ngày sinh',
-            'gender': 'Giới tính',
-            'ethnicity': 'Dân tộc',
-            'nationality': 'Quốc tịch',
-            'religion': 'Tôn giáo',
-            'phone': 'Số điện thoại',
-            'citizen_id': 'Số CCCD',
-            'cccd_date': 'Ngày cấp CCCD',
-            'cccd_place': 'Nơi cấp CCCD',
-            'personal_id': 'Mã định danh',
-            'passport': 'Số hộ chiếu',
-            'passport_date': 'Ngày cấp hộ chiếu',
-            'passport_place': 'Nơi cấp hộ chiếu',
-            'organization': 'Đoàn/Đội',
-            'permanent_province': 'Tỉnh thường trú',
-            'permanent_ward': 'Phường thường trú',
-            'permanent_hamlet': 'Khu phố thường trú',
-            'permanent_street': 'Địa chỉ thường trú',
-            'hometown_province': 'Tỉnh quê quán',
-            'hometown_ward': 'Phường quê quán',
-            'hometown_hamlet': 'Khu phố quê quán',
-            'birth_cert_province': 'Tỉnh cấp giấy khai sinh',
-            'birth_cert_ward': 'Phường cấp giấy khai sinh',
-            'birthplace_province': 'Tỉnh nơi sinh',
-            'birthplace_ward': 'Phường nơi sinh',
-            'birthplace_detail': 'Nơi sinh chi tiết',
-            'current_address_detail': 'Địa chỉ hiện tại',
-            'current_province': 'Tỉnh hiện tại',
-            'current_ward': 'Phường hiện tại',
-            'current_hamlet': 'Khu phố hiện tại',
-            'height': 'Chiều cao (cm)',
-            'weight': 'Cân nặng (kg)',
-            'eye_diseases': 'Tật khúc xạ (mắt)',
-            'swimming_skill': 'Kỹ năng bơi',
-            'smartphone': 'Điện thoại thông minh',
-            'computer': 'Máy tính',
-            'father_ethnicity': 'Dân tộc của cha',
-            'mother_ethnicity': 'Dân tộc của mẹ',
-            'father_name': 'Họ tên cha',
-            'father_job': 'Nghề nghiệp cha',
-            'father_birth_year': 'Năm sinh cha',
-            'father_phone': 'SĐT cha',
-            'father_cccd': 'CCCD cha',
-            'mother_name': 'Họ tên mẹ',
-            'mother_job': 'Nghề nghiệp mẹ',
-            'mother_birth_year': 'Năm sinh mẹ',
-            'mother_phone': 'SĐT mẹ',
-            'mother_cccd': 'CCCD mẹ',
-            'guardian_name': 'Họ tên người giám hộ',
-            'guardian_job': 'Nghề nghiệp người giám hộ',
-            'guardian_birth_year': 'Năm sinh người giám hộ',
-            'guardian_phone': 'SĐT người giám hộ',
-            'guardian_cccd': 'CCCD người giám hộ',
-            'guardian_gender': 'Giới tính người giám hộ',
-            'created_at': 'Thời gian nộp kê khai'
-        }
+        column_mapping = EXPORT_COLUMN_LABELS
 
         # Apply column mapping and reorder columns
-        df_export = df_final.rename(columns=column_mapping)
+        df_export = relabel_columns(df_final, column_mapping)
         
         # Ensure created_at column appears at the end
-        order_keys = [
-            'id',
-            'email','full_name','nickname','class','birth_date','gender','ethnicity','nationality','religion','phone',
-            'citizen_id','cccd_date','cccd_place','personal_id','passport','passport_date','passport_place','organization',
-            'permanent_province','permanent_ward','permanent_hamlet','permanent_street',
-            'hometown_province','hometown_ward','hometown_hamlet',
-            'birth_cert_province','birth_cert_ward','birthplace_province','birthplace_ward',
-            'current_address_detail','current_province','current_ward','current_hamlet',
-            'height','weight','eye_diseases','swimming_skill',
-            'smartphone','computer',
-            'father_name','father_ethnicity','father_job','father_birth_year','father_phone','father_cccd',
-            'mother_name','mother_ethnicity','mother_job','mother_birth_year','mother_phone','mother_cccd',
-            'guardian_name','guardian_job','guardian_birth_year','guardian_phone','guardian_cccd','guardian_gender',
-            'created_at'
-        ]
-        order_vn = [column_mapping.get(k, k) for k in order_keys]
-        ordered_present = [c for c in order_vn if c in df_export.columns]
-        others = [c for c in df_export.columns if c not in ordered_present]
-        df_export = df_export[ordered_present + others]
+        order_vn = [column_mapping.get(k, k) for k in EXPORT_COLUMN_ORDER]
+        df_export = reorder_columns(df_export, order_vn)
 
         # Export to CSV
+        export_stage('render')
         df_export.to_csv(filename, index=False, encoding='utf-8-sig')
         
         return send_file_with_cleanup(filename, as_attachment=True, download_name=filename)
@@ -2610,16 +3225,293 @@ def export_csv():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/export-pdf', methods=['GET'])
+@profile_export_memory('PDF')
 def export_pdf():
-    """Export to PDF format"""
+    """Export a printable PDF with the same filters as export-xlsx, streamed page by page.
+
+    type=by_class starts every class on a new page (format=zip: one PDF per class);
+    the classes are rendered in parallel by the render pool.
+    """
     try:
-        return jsonify({'error': 'PDF export đang được phát triển'}), 501
+        export_type = request.args.get('type') or request.args.get('export_type', 'all')
+        grade = request.args.get('grade')
+        title = request.args.get('customTitle') or request.args.get('title', 'Danh sách học sinh THPT Dĩ An')
+        include_timestamp = request.args.get('includeTimestamp') == 'true'
+        sort_by_class = request.args.get('sortByClass') == 'true'
+        sort_by_name = request.args.get('sortByName') == 'true'
+        header_color = THEME_COLORS.get(request.args.get('themeColor', 'blue'), DEFAULT_HEADER_COLOR)
+        font_size = min(max(int(request.args.get('fontSize', '9')), 6), 14)
+
+        by_class = export_type == 'by_class'
+        bundle_zip = by_class and request.args.get('format') == 'zip'
+        if by_class:
+            export_type = 'all'
+        export_type = detect_export_type(export_type)
+        print(f"[PDF] Export type: {export_type}, by_class: {by_class}, zip: {bundle_zip}")
+
+        try:
+            font_path = find_font(PDF_FONT_PATH)
+        except FontError as e:
+            print(f"[PDF] ❌ {e}")
+            return jsonify({'error': str(e)}), 500
+
+        try:
+            fields = parse_fields(request.args.get('fields')) or PDF_DEFAULT_FIELDS
+            unknown = [f for f in fields if f == 'id' or f not in EXPORT_COLUMN_LABELS]
+            if unknown:
+                raise InvalidFieldsError(unknown, sorted(set(EXPORT_COLUMN_LABELS) - {'id'}))
+            select_list = STUDENT_SCHEMA.select_list(fields)
+        except InvalidFieldsError as e:
+            return invalid_fields_response(e)
+
+        columns = STUDENT_SCHEMA.columns()
+        use_old_schema = 'ho_ten' in columns
+        class_expr = 'class' if 'class' in columns else 'lop'
+        name_expr = 'full_name' if 'full_name' in columns else 'ho_ten'
+        where_conditions, query_params = build_export_filters(export_type, use_old_schema, 'PDF')
+        where_sql = f" WHERE {' AND '.join(where_conditions)}" if where_conditions else ''
+
+        header = [EXPORT_COLUMN_LABELS[f] for f in fields]
+        weights = [COLUMN_WEIGHTS.get(f, DEFAULT_COLUMN_WEIGHT) for f in fields]
+        eye_index = fields.index('eye_diseases') + 1 if 'eye_diseases' in fields else None
+
+        def cells(row):
+            # Bỏ id (luôn nằm đầu SELECT); STT do bảng PDF tự đánh
+            values = list(row)
+            if eye_index is not None:
+                values[eye_index] = emergency_ensure_eye_diseases({'eye_diseases': values[eye_index]})['eye_diseases']
+            return tuple(format_cell(v) for v in values[1:])
+
+        exported_at = get_vietnam_time().strftime('%d/%m/%Y %H:%M:%S')
+        timestamp = get_vietnam_time().strftime('%Y%m%d_%H%M%S')
+        base_filename = vietnamese_to_ascii(title) if title != 'Danh sách học sinh THPT Dĩ An' else 'danh_sach_hoc_sinh'
+        scope = f'_khoi_{grade}' if export_type == 'grade' and grade else ''
+
+        export_stage('dataframe')
+        conn = get_read_connection()
+        cursor = conn.cursor()
+
+        if by_class:
+            cursor.execute(f'SELECT DISTINCT {class_expr} FROM students{where_sql}', query_params)
+            groups = {}
+            for (value,) in cursor.fetchall():
+                name = str(value).strip() if value is not None else ''
+                groups.setdefault(name or UNKNOWN_CLASS, []).append(value)
+            if not groups:
+                conn.close()
+                return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+            class_names = sorted(groups, key=class_sort_key)
+            placeholder = get_placeholder()
+
+            def sections():
+                # Mỗi lớp một truy vấn (dùng idx_class), lớp được đọc khi pool cần tới
+                for name in class_names:
+                    if name == UNKNOWN_CLASS:
+                        condition, params = f"COALESCE(TRIM({class_expr}), '') = ''", []
+                    else:
+                        condition = f"{class_expr} IN ({','.join([placeholder] * len(groups[name]))})"
+                        params = groups[name]
+                    cursor.execute(
+                        f"SELECT {select_list} FROM students WHERE {' AND '.join(where_conditions + [condition])} "
+                        f"ORDER BY {name_expr}, id",
+                        query_params + params
+                    )
+                    rows = [cells(row) for row in cursor.fetchall()]
+                    lines = [title, f"Lớp {name} - Tổng số học sinh: {len(rows)}"]
+                    if include_timestamp:
+                        lines.append(f"Xuất lúc: {exported_at}")
+                    yield name, rows, lines
+
+            export_stage('render')
+            print(f"[PDF] {len(class_names)} classes, {EXPORT_RENDER_PROCESSES} render processes")
+            if bundle_zip:
+                filename = f'{base_filename}_theo_lop{scope}_{timestamp}.zip'
+                body = iter_class_pdf_zip(font_path, header, weights, sections(), base_filename,
+                                          font_size, header_color, EXPORT_RENDER_PROCESSES)
+                mimetype = 'application/zip'
+            else:
+                filename = f'{base_filename}_theo_lop{scope}_{timestamp}.pdf'
+                body = iter_class_pdf(font_path, header, weights, sections(), title,
+                                      font_size, header_color, EXPORT_RENDER_PROCESSES)
+                mimetype = PDF_MIMETYPE
+        else:
+            if sort_by_class:
+                order_by = f'{class_expr}, {name_expr}'
+            elif sort_by_name:
+                order_by = f'{name_expr}, {class_expr}'
+            else:
+                order_by = 'id ASC'
+            cursor = export_cursor(conn, 'export_pdf')
+            cursor.execute(f'SELECT {select_list} FROM students{where_sql} ORDER BY {order_by}', query_params)
+            first_batch = cursor.fetchmany(PDF_FETCH_SIZE)
+            if not first_batch:
+                conn.close()
+                return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+            pending = [first_batch]
+
+            def row_batches():
+                while pending:
+                    yield [cells(row) for row in pending.pop()]
+                    batch = cursor.fetchmany(PDF_FETCH_SIZE)
+                    if batch:
+                        pending.append(batch)
+
+            lines = [title]
+            if include_timestamp:
+                lines.append(f"Xuất lúc: {exported_at}")
+            filename = f'{base_filename}{export_scope_suffix(export_type)}_{timestamp}.pdf'
+            export_stage('render')
+            body = iter_table_pdf(font_path, header, weights, row_batches(), lines, title, font_size, header_color)
+            mimetype = PDF_MIMETYPE
+
+        print(f"[PDF] Generated filename: {filename}")
+        response = Response(body, mimetype=mimetype)
+        # Kết nối đóng khi response kết thúc (kể cả khi client ngắt giữa chừng)
+        response.call_on_close(conn.close)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'), safe='')}"
+        return response
+
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[PDF] ❌ Export failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export-parquet', methods=['GET'])
+@app.route('/api/export-arrow', methods=['GET'], defaults={'fmt': 'arrow'})
+@profile_export_memory('COLUMNAR')
+def export_parquet(fmt='parquet'):
+    """Export the students table as Parquet (or an Arrow IPC stream) with a stable typed schema.
+
+    Same filters as export-xlsx; compression= picks the codec (zstd by default).
+    """
+    try:
+        if not columnar_available():
+            return jsonify({'error': 'Máy chủ chưa cài pyarrow nên chưa xuất được Parquet/Arrow'}), 501
+        if request.args.get('format') == 'arrow':
+            fmt = 'arrow'
+        compression = request.args.get('compression', COMPRESSIONS[fmt][0])
+        if compression not in COMPRESSIONS[fmt]:
+            return jsonify({'error': f'compression không hợp lệ: {compression}', 'allowed': list(COMPRESSIONS[fmt])}), 400
+
+        export_type = detect_export_type(request.args.get('type') or request.args.get('export_type', 'all'))
+        print(f"[COLUMNAR] Export type: {export_type}, format: {fmt}, compression: {compression}")
+        columns = STUDENT_SCHEMA.columns()
+        where_conditions, query_params = build_export_filters(export_type, 'ho_ten' in columns, 'COLUMNAR')
+        where_sql = f" WHERE {' AND '.join(where_conditions)}" if where_conditions else ''
+
+        conn = get_read_connection()
+        cursor = export_cursor(conn, 'export_columnar')
+        cursor.execute(f'SELECT {columnar_select_list(columns)} FROM students{where_sql} ORDER BY id', query_params)
+        export_stage('dataframe')
+        first_batch = cursor.fetchmany(COLUMNAR_BATCH_SIZE)
+        if not first_batch:
+            conn.close()
+            return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+        stats = ConversionStats()
+        # Lô đang chờ gửi; pop() để lô đã gửi không bị closure giữ lại
+        pending = [first_batch]
+
+        def row_batches():
+            while pending:
+                yield pending.pop()
+                batch = cursor.fetchmany(COLUMNAR_BATCH_SIZE)
+                if batch:
+                    pending.append(batch)
+            if stats.invalid:
+                print(f"[COLUMNAR] ⚠️ Giá trị sai kiểu được xuất thành null: {stats.invalid}")
+            print(f"[COLUMNAR] ✅ Exported {stats.rows} rows")
+
+        exported_at = get_vietnam_time()
+        timestamp = exported_at.strftime('%Y%m%d_%H%M%S')
+        extension = 'parquet' if fmt == 'parquet' else 'arrows'
+        filename = f'danh_sach_hoc_sinh{export_scope_suffix(export_type)}_{timestamp}.{extension}'
+        metadata = {'exported_at': exported_at.isoformat(timespec='seconds'), 'filters': request.query_string.decode('utf-8')}
+
+        export_stage('render')
+        body = iter_columnar(row_batches(), fmt, compression, metadata, stats)
+        response = Response(body, mimetype=PARQUET_MIMETYPE if fmt == 'parquet' else ARROW_STREAM_MIMETYPE)
+        response.call_on_close(conn.close)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'), safe='')}"
+        return response
+
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        print(f"[COLUMNAR] ❌ Export failed: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Thứ tự cột của export CSV/JSON (cột khác giữ thứ tự trong bảng, sau các cột này)
+EXPORT_COLUMN_ORDER = [
+    'id',
+    'email','full_name','nickname','class','birth_date','gender','ethnicity','nationality','religion','phone',
+    'citizen_id','cccd_date','cccd_place','personal_id','passport','passport_date','passport_place','organization',
+    'permanent_province','permanent_ward','permanent_hamlet','permanent_street',
+    'hometown_province','hometown_ward','hometown_hamlet',
+    'birth_cert_province','birth_cert_ward','birthplace_province','birthplace_ward',
+    'current_address_detail','current_province','current_ward','current_hamlet',
+    'height','weight','eye_diseases','swimming_skill',
+    'smartphone','computer',
+    'father_name','father_ethnicity','father_job','father_birth_year','father_phone','father_cccd',
+    'mother_name','mother_ethnicity','mother_job','mother_birth_year','mother_phone','mother_cccd',
+    'guardian_name','guardian_job','guardian_birth_year','guardian_phone','guardian_cccd','guardian_gender',
+    'created_at'
+]
+
+def stream_json_export(conn, cursor, query, query_params, mode, filename, export_type):
+    """Stream the rows of `query` as NDJSON or as the export-json document, batch by batch"""
+    export_stage('dataframe')
+    total = None
+    if mode == 'json':
+        # export_info đứng trước data nên cần tổng số dòng trước khi đọc
+        count_query = query.replace('SELECT *', 'SELECT COUNT(*)', 1).rsplit(' ORDER BY ', 1)[0]
+        count_cursor = conn.cursor()
+        count_cursor.execute(count_query, query_params)
+        total = count_cursor.fetchone()[0]
+    cursor.execute(query, query_params)
+    first_batch = cursor.fetchmany(STREAM_BATCH_SIZE)
+    if not first_batch:
+        conn.close()
+        return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+    encoder = RowEncoder([d[0] for d in cursor.description], EXPORT_COLUMN_LABELS,
+                         [EXPORT_COLUMN_LABELS.get(k, k) for k in EXPORT_COLUMN_ORDER])
+    pending = [first_batch]
+
+    def row_batches():
+        while pending:
+            yield pending.pop()
+            batch = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if batch:
+                pending.append(batch)
+
+    export_stage('render')
+    if mode == 'ndjson':
+        filename = filename.rsplit('.', 1)[0] + '.ndjson'
+        response = Response(iter_ndjson(row_batches(), encoder), mimetype=NDJSON_MIMETYPE)
+    else:
+        export_info = {
+            "title": "Danh sách học sinh THPT Dĩ An",
+            "exported_at": datetime.now().isoformat(),
+            "total_records": total,
+            "export_type": export_type
+        }
+        response = Response(iter_json_document(row_batches(), encoder, export_info), mimetype='application/json')
+    response.call_on_close(conn.close)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'), safe='')}"
+    print(f"[JSON] Streaming {mode}: {filename}")
+    return response
+
 @app.route('/api/export-json', methods=['GET'])
+@profile_export_memory('JSON')
 def export_json():
-    """Export to JSON format"""
+    """Export to JSON format.
+
+    stream=ndjson sends one object per line and stream=json the same document as a
+    stream, both serialized row by row from the cursor (see json_stream).
+    """
     try:
         # Get parameters
         export_type = request.args.get('type', 'all')
@@ -2641,7 +3533,7 @@ def export_json():
                   province or ethnicity):
                 export_type = 'custom'
         
-        conn = get_db_connection()
+        conn = get_read_connection()
         
         # Build query
         base_query = 'SELECT * FROM students'
@@ -2700,26 +3592,16 @@ def export_json():
             query_params.append(ethnicity)
             print(f"[JSON] Filtering by ethnicity: {ethnicity}")
 
+        since_sql, since_params = delta_export_filter('?')
+        if since_sql:
+            where_conditions.append(since_sql)
+            query_params.extend(since_params)
+
         if where_conditions:
             query = f"{base_query} WHERE {' AND '.join(where_conditions)} ORDER BY id ASC"
         else:
             query = f"{base_query} ORDER BY id ASC"
 
-        # Execute query
-        if query_params:
-            cursor = conn.cursor()
-            cursor.execute(query, query_params)
-            rows = cursor.fetchall()
-            column_names = [description[0] for description in cursor.description]
-            df_final = pd.DataFrame(rows, columns=column_names)
-        else:
-            df_final = pd.read_sql_query(query, conn)
-
-        conn.close()
-
-        if df_final.empty:
-            return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
-
         # Generate filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         if export_type == 'grade' and grade:
@@ -2735,96 +3617,34 @@ def export_json():
         else:
             filename = f'danh_sach_hoc_sinh_tat_ca_{timestamp}.json'
 
+        # Execute query
+        cursor = export_cursor(conn, 'export_json')
+        stream_mode = request.args.get('stream')
+        if stream_mode in ('ndjson', 'json'):
+            return stream_json_export(conn, cursor, query, query_params, stream_mode, filename, export_type)
+        cursor.execute(query, query_params)
+        export_stage('dataframe')
+        df_final = load_export_frame(cursor)
+
+        conn.close()
+
+        if df_final.empty:
+            return jsonify({'error': 'Không có dữ liệu phù hợp để xuất'}), 400
+
+        export_stage('transform')
+
         # Column mapping for Vietnamese headers
-        column_mapping = {
-            'id': 'STT',
-            'email': 'Email',
-            'full_name': 'Họ và tên',
-            'nickname': 'Tên gọi khác',
-            'class': 'Lớp',
-            'khoi': 'Khối',
-            'birth_date': 'Ngày sinh',
-            'gender': 'Giới tính',
-            'ethnicity': 'Dân tộc',
-            'nationality': 'Quốc tịch',
-            'religion': 'Tôn giáo',
-            'phone': 'Số điện thoại',
-            'citizen_id': 'Số CCCD',
-            'cccd_date': 'Ngày cấp CCCD',
-            'cccd_place': 'Nơi cấp CCCD',
-            'personal_id': 'Mã định danh',
-            'passport': 'Số hộ chiếu',
-            'passport_date': 'Ngày cấp hộ chiếu',
-            'passport_place': 'Nơi cấp hộ chiếu',
-            'organization': 'Đoàn/Đội',
-            'permanent_province': 'Tỉnh thường trú',
-            'permanent_ward': 'Phường thường trú',
-            'permanent_hamlet': 'Khu phố thường trú',
-            'permanent_street': 'Địa chỉ thường trú',
-            'hometown_province': 'Tỉnh quê quán',
-            'hometown_ward': 'Phường quê quán',
-            'hometown_hamlet': 'Khu phố quê quán',
-            'birth_cert_province': 'Tỉnh cấp giấy khai sinh',
-            'birth_cert_ward': 'Phường cấp giấy khai sinh',
-            'birthplace_province': 'Tỉnh nơi sinh',
-            'birthplace_ward': 'Phường nơi sinh',
-            'birthplace_detail': 'Nơi sinh chi tiết',
-            'current_address_detail': 'Địa chỉ hiện tại',
-            'current_province': 'Tỉnh hiện tại',
-            'current_ward': 'Phường hiện tại',
-            'current_hamlet': 'Khu phố hiện tại',
-            'height': 'Chiều cao (cm)',
-            'weight': 'Cân nặng (kg)',
-            'eye_diseases': 'Tật khúc xạ (mắt)',
-            'swimming_skill': 'Kỹ năng bơi',
-            'smartphone': 'Điện thoại thông minh',
-            'computer': 'Máy tính',
-            'father_ethnicity': 'Dân tộc của cha',
-            'mother_ethnicity': 'Dân tộc của mẹ',
-            'father_name': 'Họ tên cha',
-            'father_job': 'Nghề nghiệp cha',
-            'father_birth_year': 'Năm sinh cha',
-            'father_phone': 'SĐT cha',
-            'father_cccd': 'CCCD cha',
-            'mother_name': 'Họ tên mẹ',
-            'mother_job': 'Nghề nghiệp mẹ',
-            'mother_birth_year': 'Năm sinh mẹ',
-            'mother_phone': 'SĐT mẹ',
-            'mother_cccd': 'CCCD mẹ',
-            'guardian_name': 'Họ tên người giám hộ',
-            'guardian_job': 'Nghề nghiệp người giám hộ',
-            'guardian_birth_year': 'Năm sinh người giám hộ',
-            'guardian_phone': 'SĐT người giám hộ',
-            'guardian_cccd': 'CCCD người giám hộ',
-            'guardian_gender': 'Giới tính người giám hộ',
-            'created_at': 'Thời gian nộp kê khai'
-        }
+        column_mapping = EXPORT_COLUMN_LABELS
 
         # Apply column mapping and reorder columns
-        df_export = df_final.rename(columns=column_mapping)
+        df_export = relabel_columns(df_final, column_mapping)
         
         # Ensure created_at column appears at the end
-        order_keys = [
-            'id',
-            'email','full_name','nickname','class','birth_date','gender','ethnicity','nationality','religion','phone',
-            'citizen_id','cccd_date','cccd_place','personal_id','passport','passport_date','passport_place','organization',
-            'permanent_province','permanent_ward','permanent_hamlet','permanent_street',
-            'hometown_province','hometown_ward','hometown_hamlet',
-            'birth_cert_province','birth_cert_ward','birthplace_province','birthplace_ward',
-            'current_address_detail','current_province','current_ward','current_hamlet',
-            'height','weight','eye_diseases','swimming_skill',
-            'smartphone','computer',
-            'father_name','father_ethnicity','father_job','father_birth_year','father_phone','father_cccd',
-            'mother_name','mother_ethnicity','mother_job','mother_birth_year','mother_phone','mother_cccd',
-            'guardian_name','guardian_job','guardian_birth_year','guardian_phone','guardian_cccd','guardian_gender',
-            'created_at'
-        ]
-        order_vn = [column_mapping.get(k, k) for k in order_keys]
-        ordered_present = [c for c in order_vn if c in df_export.columns]
-        others = [c for c in df_export.columns if c not in ordered_present]
-        df_export = df_export[ordered_present + others]
+        order_vn = [column_mapping.get(k, k) for k in EXPORT_COLUMN_ORDER]
+        df_export = reorder_columns(df_export, order_vn)
 
         # Export to JSON
+        export_stage('render')
         result = {
             "export_info": {
                 "title": "Danh sách học sinh THPT Dĩ An",
@@ -2832,7 +3652,7 @@ def export_json():
                 "total_records": len(df_export),
                 "export_type": export_type
             },
-            "data": df_export.to_dict('records')
+            "data": export_records(df_export)
         }
         
         with open(filename, 'w', encoding='utf-8') as f:
@@ -2840,6 +3660,8 @@ def export_json():
         
         return send_file_with_cleanup(filename, as_attachment=True, download_name=filename)
 
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2866,6 +3688,9 @@ def load_locations_latest():
     if LOCATIONS_LATEST is not None:
         return LOCATIONS_LATEST
 
+    # pandas/openpyxl chỉ được nạp khi cần đọc danh mục, không nạp lúc import app
+    import pandas as pd
+
     base_dir = os.path.dirname(os.path.abspath(__file__))
     xlsx_path = os.path.join(base_dir, 'final_danh-muc-phuong-xa_moi.xlsx')
     csv_path = os.path.join(base_dir, 'final_danh-muc-phuong-xa_moi.csv')
@@ -3049,23 +3874,158 @@ def api_locations_latest():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/delete-student/<int:student_id>', methods=['DELETE'])
-def delete_student(student_id):
+@app.route('/api/events', methods=['GET'])
+def student_events():
+    """Server-Sent Events stream of student inserts, updates and deletes for the admin page"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        last_event_id = int(last_event_id) if last_event_id else None
+        subscription = CHANGE_BROKER.subscribe()
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID không hợp lệ'}), 400
+    except BrokerFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as e:
+        print(f"[EVENTS] ❌ Subscribe failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    print(f"[EVENTS] Client connected (last event {last_event_id})")
+    response = Response(CHANGE_BROKER.stream(subscription, last_event_id, EVENTS_STREAM_SECONDS),
+                        mimetype=EVENTS_MIMETYPE)
+    # Generator chưa chạy tới lần yield đầu (client đóng ngay) thì finally của nó không chạy
+    response.call_on_close(lambda: CHANGE_BROKER.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx không được gom response lại
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Dashboard statistics from the student_stats aggregates (no scan of students)"""
+    try:
+        conn = get_read_connection()
+        try:
+            stored = stored_stats(conn.cursor())
+        finally:
+            conn.close()
+        result = format_stats(stored, sort_key=lambda name: class_sort_key(name or UNKNOWN_CLASS))
+        body = jsonify(result).get_data()
+        return list_response(body, body_etag(body))
+    except Exception as e:
+        print(f"[STATS] ❌ Reading statistics failed: {e}")
+        return jsonify({'error': f'Không đọc được thống kê: {str(e)}'}), 500
+
+@app.route('/api/health-analytics', methods=['GET'])
+def health_analytics():
+    """BMI, age in months and WHO BMI-for-age bands per student, summarized per class (see health_analytics).
+
+    classes=10A1,10A2 limits the students; students=1 adds the per-student results.
+    Students whose height/weight/birth date look mistyped are listed under flagged.
+    """
+    try:
+        classes = tuple(c.strip() for c in request.args.get('classes', '').split(',') if c.strip())
+        include_students = request.args.get('students') in ('1', 'true', 'yes')
+        today = get_vietnam_time().date()
 
-        cursor.execute(convert_placeholders('DELETE FROM students WHERE id = ?'), (student_id,))
+        conn = get_read_connection()
+        try:
+            version = students_data_version(conn) if LIST_CACHE is not None else None
+            cache_key = ('health', today, classes, include_students)
+            if version is not None:
+                cached = LIST_CACHE.get(cache_key, version)
+                if cached is not None:
+                    return list_response(*cached)
+            data = load_health_columns(conn.cursor(), STUDENT_SCHEMA.columns(), classes, get_placeholder())
+        finally:
+            conn.close()
 
-        if cursor.rowcount == 0:
+        analysis = HealthAnalysis(data, today)
+        school = analysis.school_summary()
+        result = {
+            'reference_date': today.isoformat(),
+            'school': school,
+            'by_class': analysis.class_summaries(),
+            'flagged': analysis.flagged(FLAGGED_LIMIT),
+            'flagged_total': school['flagged'],
+        }
+        if include_students:
+            result['students'] = analysis.students()
+        print(f"[HEALTH] 📊 {analysis.count} students analyzed in {analysis.elapsed_ms:.1f} ms")
+
+        body = jsonify(result).get_data()
+        etag = LIST_CACHE.put(cache_key, version, body) if version is not None else body_etag(body)
+        return list_response(body, etag)
+    except Exception as e:
+        print(f"[HEALTH] ❌ Health analytics failed: {e}")
+        return jsonify({'error': f'Không phân tích được số liệu sức khỏe: {str(e)}'}), 500
+
+@app.route('/api/journal/status', methods=['GET'])
+def journal_status():
+    """Depth (submissions not yet in the DB), lag and dead letters of the submission journal"""
+    if SUBMISSION_JOURNAL is None:
+        return jsonify({'enabled': False, 'reason': SUBMISSION_JOURNAL_DISABLED})
+    try:
+        return jsonify(dict(SUBMISSION_JOURNAL.status(), enabled=True))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Change feed: students inserted, updated or deleted after since=<cursor>, oldest first.
+
+    Returns {changes, cursor, has_more}; the returned cursor is the since= of the
+    next call. Upserts carry the student row (fields= narrows it), deletes only id/email.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+        limit = min(max(int(request.args.get('limit', CHANGES_PAGE_SIZE)), 1), CHANGES_MAX_PAGE_SIZE)
+        fields, select_list = requested_fields()
+
+        conn = get_read_connection()
+        try:
+            page = fetch_changes(conn.cursor(), since, get_placeholder(), select_list or '*', limit, DB_CONFIG['type'])
+        finally:
             conn.close()
+
+        print(f"[CHANGES] since={request.args.get('since') or 0}: {len(page['changes'])} changes, cursor {page['cursor']}")
+        return jsonify(page)
+
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except InvalidFieldsError as e:
+        return invalid_fields_response(e)
+    except ValueError:
+        return jsonify({'error': 'limit phải là số nguyên'}), 400
+    except Exception as e:
+        print(f"[CHANGES] ❌ Change feed failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def remove_student(cursor, student_id):
+    """Delete the student; returns its email (for cache invalidation), None if there was no such id"""
+    cursor.execute(convert_placeholders('SELECT email FROM students WHERE id = ?'), (student_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    cursor.execute(convert_placeholders('DELETE FROM students WHERE id = ?'), (student_id,))
+    return row[0] or ''
+
+@app.route('/api/delete-student/<int:student_id>', methods=['DELETE'])
+def delete_student(student_id):
+    try:
+        email = run_db_write(remove_student, student_id)
+
+        if email is None:
             return jsonify({'error': 'Không tìm thấy học sinh'}), 404
 
-        conn.commit()
-        conn.close()
+        invalidate_students([student_id], [email])
+        CHANGE_BROKER.notify()
 
         return jsonify({'success': True, 'message': 'Đã xóa học sinh thành công'})
 
+    except WriterBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3177,11 +4137,11 @@ def resend_otp_api():
 
 @app.route('/admin')
 def admin():
-    return send_file('admin-login.html')
+    return serve_static_asset('admin-login.html')
 
 @app.route('/admin-login.html')
 def admin_login():
-    return send_file('admin-login.html')
+    return serve_static_asset('admin-login.html')
 
 @app.route('/api/generate-filename', methods=['GET'])
 def api_generate_filename():
@@ -3201,7 +4161,9 @@ def api_generate_filename():
             base_filename = 'danh_sach_hoc_sinh'
         
         # Add type suffix using same logic as export
-        if export_type == 'grade' and grade:
+        if export_type == 'by_class':
+            filename = f'{base_filename}_theo_lop_khoi_{grade}' if grade else f'{base_filename}_theo_lop'
+        elif export_type == 'grade' and grade:
             filename = f'{base_filename}_khoi_{grade}'
         elif export_type == 'class' and classes:
             class_list = [cls.strip() for cls in classes.split(',')]
@@ -3254,11 +4216,11 @@ def check_admin_session():
 @app.route('/admin-panel')
 def admin_panel():
     # Simple session check - look for adminSession in referer or check with JS
-    return send_file('admin.html')
+    return serve_static_asset('admin.html')
 
 @app.route('/admin.html') 
 def admin_html():
-    return send_file('admin.html')
+    return serve_static_asset('admin.html')
 
 if __name__ == '__main__':
     init_db()
@@ -3306,6 +4268,8 @@ def clear_all_data():
             cursor.execute("DELETE FROM sqlite_sequence WHERE name='students'")
         conn.commit()
         conn.close()
+        clear_student_cache()
+        CHANGE_BROKER.notify()
         
         print(f"[ADMIN] Đã xóa tất cả {count} học sinh và reset database")
         return jsonify({'success': True, 'deleted_count': count})
@@ -3315,319 +4279,49 @@ def clear_all_data():
 
 @app.route('/api/generate-sample-data', methods=['POST'])
 def generate_sample_data():
-    """Tạo dữ liệu mẫu thực tế (như generate_sample_data.py)"""
+    """Tạo dữ liệu mẫu thực tế số lượng lớn (xem sample_data_generator.py)"""
     try:
-        print("[DEBUG] Starting generate sample data...")
-        
+        from sample_data_generator import DEFAULT_CHUNK_SIZE, DEFAULT_SEED, generate_and_load
+
         # Handle JSON request safely
         if request.is_json:
             data = request.get_json() or {}
         else:
             data = {}
-            
+
         count = int(data.get('count', 50))
-        print(f"[DEBUG] Count requested: {count}")
-        
-        if count > 200:
-            return jsonify({'success': False, 'error': 'Không thể tạo quá 200 bản ghi cùng lúc'}), 400
-        
+        seed = int(data.get('seed', DEFAULT_SEED))
+        chunk_size = min(max(int(data.get('chunkSize', DEFAULT_CHUNK_SIZE)), 100), 50000)
+        print(f"[SAMPLE] Count requested: {count}, seed: {seed}")
+
+        if count > SAMPLE_DATA_MAX_ROWS:
+            return jsonify({'success': False, 'error': f'Không thể tạo quá {SAMPLE_DATA_MAX_ROWS} bản ghi cùng lúc'}), 400
+
         if count <= 0:
             return jsonify({'success': False, 'error': 'Số lượng phải lớn hơn 0'}), 400
-            
+
+        existing_columns = set(STUDENT_SCHEMA.columns())
+
         conn = get_db_connection()
-        cursor = conn.cursor()
-        print("[DEBUG] Database connection established")
-        
-        # Check existing columns first to avoid column errors
-        if DB_CONFIG['type'] == 'postgresql':
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = 'students'
-            """)
-            existing_columns = [row[0] for row in cursor.fetchall()]
-        else:
-            cursor.execute('PRAGMA table_info(students)')
-            existing_columns = [col[1] for col in cursor.fetchall()]
-        
-        print(f"[DEBUG] Found {len(existing_columns)} columns in database")
-        
-        import random
-        from datetime import datetime, timedelta
-        
-        # Dữ liệu mẫu thực tế từ generate_sample_data.py
-        first_names = [
-            'Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
-            'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý', 'Đinh', 'Đào', 'Cao', 'Lương', 'Mai'
-        ]
-        middle_names = ['Văn', 'Thị', 'Minh', 'Hoàng', 'Quang', 'Hữu', 'Thanh', 'Anh', 'Thành', 'Bảo', 'Vinh', 'Khánh', 'Nhật', 'Mai', 'Ngọc']
-        last_names = [
-            'An', 'Bình', 'Cường', 'Dũng', 'Đức', 'Giang', 'Hà', 'Hải', 'Khang', 'Linh',
-            'Long', 'Mai', 'Minh', 'Nam', 'Phong', 'Quân', 'Sơn', 'Thảo', 'Tú', 'Vy',
-            'Yến', 'Hương', 'Loan', 'Nga', 'Oanh', 'Phương', 'Quyên', 'Thu', 'Trang', 'Xuân'
-        ]
-        classes = [
-            # Khối 10
-            '10A1', '10A2', '10A3', '10A4', '10A5', '10A6', '10A7', '10A8',
-            '10B1', '10B2', '10B3', '10B4',
-            # Khối 11
-            '11A1', '11A2', '11A3', '11A4', '11A5', '11A6', '11A7', '11A8',
-            '11B1', '11B2', '11B3', '11B4',
-            # Khối 12
-            '12A1', '12A2', '12A3', '12A4', '12A5', '12A6', '12A7', '12A8',
-            '12B1', '12B2', '12B3', '12B4'
-        ]
-        genders = ['Nam', 'Nữ']
-        provinces = ['Thành phố Hồ Chí Minh', 'Tỉnh Đồng Nai', 'Tỉnh Bình Dương', 'Tỉnh Long An', 'Tỉnh Tây Ninh']
-        
-        created_count = 0
-        for i in range(count):
-            # Tạo tên thực tế
-            first_name = random.choice(first_names)
-            middle_name = random.choice(middle_names)
-            last_name = random.choice(last_names)
-            full_name = f"{first_name} {middle_name} {last_name}"
-            
-            # Email học sinh mẫu (ảo) - có identifier đặc biệt
-            email_name = f"sample_{last_name.lower()}.{middle_name.lower()}.{i+100:03d}_sample"
-            email = f"{email_name}@test.sample.com"
-            
-            # Ngày sinh thực tế (2005-2008)
-            birth_year = random.randint(2005, 2008)
-            birth_month = random.randint(1, 12)
-            birth_day = random.randint(1, 28)
-            birth_date = f"{birth_year}-{birth_month:02d}-{birth_day:02d}"
-            
-            gender = random.choice(genders)
-            phone = f"0{random.randint(900000000, 999999999)}"  # SĐT bắt đầu từ 09xx để realistic
-            class_name = random.choice(classes)
-            province = random.choice(provinces)
-            ward = f"Phường {random.randint(1, 20)}"
-            street_num = random.randint(1, 500)
-            current_address = f"{street_num} Đường {random.randint(1, 50)}, {ward}, {province}"
-            
-            # CCCD học sinh (12 số)
-            cccd_prefix = random.choice(['001', '002', '025', '026', '079'])  # Mã tỉnh thành thực tế
-            cccd_number = f"{cccd_prefix}{random.randint(100000000, 999999999)}"
-            cccd_date = f"{random.randint(2020, 2024)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}"
-            cccd_place = f"Công an {province}"
-            
-            # Thông tin ba mẹ realistic
-            father_first = random.choice(first_names)
-            father_middle = random.choice(['Văn', 'Minh', 'Thanh', 'Hữu', 'Quang'])
-            father_last = random.choice(['An', 'Bình', 'Cường', 'Dũng', 'Hùng', 'Nam', 'Sơn'])
-            father_name = f"{father_first} {father_middle} {father_last}"
-            father_job = random.choice(['Công nhân', 'Nông dân', 'Giáo viên', 'Bác sĩ', 'Kỹ sư', 'Kinh doanh', 'Công chức', 'Tài xế', 'Thợ xây'])
-            father_birth_year = str(random.randint(1970, 1985))
-            father_phone = f"0{random.randint(900000000, 999999999)}"
-            father_cccd = f"{cccd_prefix}{random.randint(100000000, 999999999)}"
-            
-            mother_first = random.choice(first_names)
-            mother_last_names = ['Lan', 'Hoa', 'Mai', 'Hương', 'Phương', 'Linh', 'Nga', 'Oanh', 'Thu', 'Xuân']
-            mother_name = f"{mother_first} Thị {random.choice(mother_last_names)}"
-            mother_job = random.choice(['Nội trợ', 'Giáo viên', 'Y tá', 'Kế toán', 'Bán hàng', 'Công nhân', 'Nông dân', 'Nhân viên văn phòng'])
-            mother_birth_year = str(random.randint(1975, 1990))
-            mother_phone = f"0{random.randint(900000000, 999999999)}"
-            mother_cccd = f"{cccd_prefix}{random.randint(100000000, 999999999)}"
-            
-            # Thời gian tạo ngẫu nhiên trong 30 ngày qua
-            days_ago = random.randint(0, 30)
-            created_at = (datetime.now() - timedelta(days=days_ago, hours=random.randint(0, 23), minutes=random.randint(0, 59))).isoformat()
-            
-            # Tạo thêm nhiều thông tin chi tiết để đạt 70% thông tin đầy đủ
-            ethnicities = ['Kinh', 'Tày', 'Thái', 'Hoa', 'Mường', 'Nùng', 'H\'Mông', 'Dao', 'Gia Rai', 'Ê Đê']
-            religions = ['Không', 'Phật giáo', 'Công giáo', 'Cao Đài', 'Hòa Hảo', 'Tin Lành']
-            jobs = [
-                'Công nhân', 'Nông dân', 'Giáo viên', 'Bác sĩ', 'Kỹ sư', 'Kinh doanh', 
-                'Công chức', 'Tài xế', 'Thợ xây', 'Bán hàng', 'Y tá', 'Kế toán', 
-                'Nhân viên văn phòng', 'Nội trợ', 'Lao động tự do'
-            ]
-            districts = [
-                'Huyện Dĩ An', 'Huyện Thuận An', 'Huyện Bến Cát', 'Huyện Tân Uyên',
-                'Quận 1', 'Quận 2', 'Quận 3', 'Quận Bình Thạnh', 'Quận Tân Bình',
-                'Huyện Nhà Bè', 'Huyện Củ Chi', 'Huyện Hóc Môn'
-            ]
-            
-            current_district = random.choice(districts)
-            current_commune = f"Xã {random.choice(['An Phú', 'Tân Hiệp', 'Dĩ An', 'Bình An', 'Tân Thông'])}"
-            current_hamlet_detail = f"Ấp {random.randint(1, 5)}"
-            
-            guardian_gender = random.choice(['Nam', 'Nữ'])
-            guardian_relationship = random.choice(['Ông', 'Bà', 'Chú', 'Cô', 'Anh', 'Chị'])
-            guardian_first = random.choice(first_names)
-            guardian_last = random.choice(last_names)
-            guardian_name = f"{guardian_first} {guardian_last}"
-            
-            # Tạo data với ít nhất 70% thông tin được điền
-            all_student_data = {
-                # THÔNG TIN CÁ NHÂN (100% điền)
-                'email': email,
-                'full_name': full_name,
-                'birth_date': birth_date,
-                'gender': gender,
-                'phone': phone,
-                'class': class_name,
-                'nationality': 'Việt Nam',
-                'ethnicity': random.choice(ethnicities),
-                'religion': random.choice(religions),
-                'nickname': f"{last_name} {random.choice(['nhỏ', 'bé', 'con', 'em', 'tí', 'út'])}",
-                'created_at': created_at,
-                
-                # GIẤY TỜ PHÁP LÝ (100% điền)
-                'citizen_id': cccd_number,
-                'cccd_date': cccd_date,
-                'cccd_place': cccd_place,
-                'personal_id': f"HS{random.randint(100000, 999999)}",
-                'passport': f"C{random.randint(1000000, 9999999)}" if random.randint(1, 10) <= 3 else None,  # 30% có passport
-                'passport_date': f"{random.randint(2020, 2024)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}" if random.randint(1, 10) <= 3 else None,
-                'passport_place': f"Cục Quản lý xuất nhập cảnh {province}" if random.randint(1, 10) <= 3 else None,
-                
-                # ĐỊA CHỈ THƯỜNG TRÚ (100% điền)
-                'permanent_province': province,
-                'permanent_district': current_district,
-                'permanent_ward': ward,
-                'permanent_hamlet': f"Khu phố {random.randint(1, 10)}",
-                'permanent_street': f"{street_num} Đường {random.randint(1, 50)}",
-                
-                # ĐỊA CHỈ QUÊ QUÁN (90% điền)
-                'hometown_province': province if random.randint(1, 10) <= 9 else None,
-                'hometown_district': current_district if random.randint(1, 10) <= 9 else None,
-                'hometown_ward': ward if random.randint(1, 10) <= 9 else None,
-                'hometown_hamlet': f"Khu phố {random.randint(1, 10)}" if random.randint(1, 10) <= 9 else None,
-                
-                # ĐỊA CHỈ HIỆN TẠI (85% điền)
-                'current_province': province if random.randint(1, 10) <= 8 else None,
-                'current_district': current_district if random.randint(1, 10) <= 8 else None,
-                'current_ward': ward if random.randint(1, 10) <= 8 else None,
-                'current_hamlet': f"Khu phố {random.randint(1, 10)}" if random.randint(1, 10) <= 8 else None,
-                'current_address_detail': current_address if random.randint(1, 10) <= 8 else None,
-                
-                # NơI SINH (90% điền)
-                'birthplace_province': province if random.randint(1, 10) <= 9 else None,
-                'birthplace_district': current_district if random.randint(1, 10) <= 9 else None,
-                'birthplace_ward': ward if random.randint(1, 10) <= 9 else None,
-                
-                # GIẤY KHAI SINH (85% điền)
-                'birth_cert_province': province if random.randint(1, 10) <= 8 else None,
-                'birth_cert_district': current_district if random.randint(1, 10) <= 8 else None,
-                'birth_cert_ward': ward if random.randint(1, 10) <= 8 else None,
-                
-                # SỨC KHỎE (100% điền)
-                'height': random.randint(150, 180),
-                'weight': random.randint(45, 75),
-                'eye_diseases': random.choice(['Không', 'Cận thị nhẹ', 'Viễn thị nhẹ', 'Loạn thị nhẹ', 'Cận thị nặng']),
-                'swimming_skill': random.choice(['Biết bơi', 'Không biết bơi', 'Bơi được 25m', 'Bơi giỏi', 'Bơi cơ bản']),
-                
-                # THIẾT BỊ HỌC TẬP (100% điền)
-                'smartphone': random.choice(['Có', 'Không']),
-                'computer': random.choice(['Có', 'Không']),
-                
-                # THÔNG TIN CHA (100% điền các trường chính)
-                'father_name': father_name,
-                'father_job': father_job,
-                'father_birth_year': father_birth_year,
-                'father_phone': father_phone,
-                'father_cccd': father_cccd,
-                'father_ethnicity': random.choice(ethnicities),
-                
-                # THÔNG TIN MẸ (100% điền các trường chính)
-                'mother_name': mother_name,
-                'mother_job': mother_job,
-                'mother_birth_year': mother_birth_year,
-                'mother_phone': mother_phone,
-                'mother_cccd': mother_cccd,
-                'mother_ethnicity': random.choice(ethnicities),
-                
-                # THÔNG TIN NGƯỜI GIÁM HỘ (70% có người giám hộ)
-                'guardian_name': guardian_name if random.randint(1, 10) <= 7 else None,
-                'guardian_job': random.choice(jobs) if random.randint(1, 10) <= 7 else None,
-                'guardian_birth_year': str(random.randint(1960, 1980)) if random.randint(1, 10) <= 7 else None,
-                'guardian_phone': f"0{random.randint(900000000, 999999999)}" if random.randint(1, 10) <= 7 else None,
-                'guardian_cccd': f"{cccd_prefix}{random.randint(100000000, 999999999)}" if random.randint(1, 10) <= 7 else None,
-                'guardian_gender': guardian_gender if random.randint(1, 10) <= 7 else None,
-                
-                # THÔNG TIN BỔ SUNG (80% điền)
-                'organization': random.choice(['Đoàn Thanh niên', 'Đội Thiếu niên', 'Hội Học sinh']) if random.randint(1, 10) <= 8 else None,
-                'job': 'Học sinh' if random.randint(1, 10) <= 9 else None,
-                
-                # SCHEMA COMPATIBILITY - Đảm bảo cả 2 schema đều có data
-                'ho_ten': full_name,  # Schema cũ
-                'ngay_sinh': birth_date,  # Schema cũ  
-                'lop': class_name,  # Schema cũ
-                'gioi_tinh': gender,  # Schema cũ
-                'sdt': phone,  # Schema cũ
-                'dan_toc': random.choice(ethnicities),  # Schema cũ
-                'ton_giao': random.choice(religions),  # Schema cũ
-                'tinh_thuong_tru': province,  # Schema cũ
-                'phuong_xa_thuong_tru': ward,  # Schema cũ
-                'cccd': cccd_number,  # Schema cũ
-                'ngay_cap_cccd': cccd_date,  # Schema cũ
-                'noi_cap_cccd': cccd_place,  # Schema cũ
-                'ho_ten_cha': father_name,  # Schema cũ
-                'sdt_cha': father_phone,  # Schema cũ
-                'ho_ten_me': mother_name,  # Schema cũ
-                'sdt_me': mother_phone,  # Schema cũ
-            }
-            
-            # Filter data to only include columns that exist in database
-            student_data = {}
-            for key, value in all_student_data.items():
-                if key in existing_columns:
-                    student_data[key] = value
-            
-            # Đảm bảo luôn có tên học sinh trong cả 2 schema
-            if 'ho_ten' in existing_columns and 'ho_ten' not in student_data:
-                student_data['ho_ten'] = full_name
-            if 'full_name' in existing_columns and 'full_name' not in student_data:
-                student_data['full_name'] = full_name
-            
-            # Đảm bảo các trường quan trọng khác cũng được điền
-            if 'lop' in existing_columns and 'lop' not in student_data:
-                student_data['lop'] = class_name
-            if 'class' in existing_columns and 'class' not in student_data:
-                student_data['class'] = class_name
-                
-            if 'ngay_sinh' in existing_columns and 'ngay_sinh' not in student_data:
-                student_data['ngay_sinh'] = birth_date
-            if 'birth_date' in existing_columns and 'birth_date' not in student_data:
-                student_data['birth_date'] = birth_date
-                
-            if 'gioi_tinh' in existing_columns and 'gioi_tinh' not in student_data:
-                student_data['gioi_tinh'] = gender
-            if 'gender' in existing_columns and 'gender' not in student_data:
-                student_data['gender'] = gender
-                
-            if 'sdt' in existing_columns and 'sdt' not in student_data:
-                student_data['sdt'] = phone
-            if 'phone' in existing_columns and 'phone' not in student_data:
-                student_data['phone'] = phone
-            
-            # Tính phần trăm thông tin được điền (không tính NULL)
-            filled_fields = sum(1 for v in student_data.values() if v is not None and v != '' and v != 'Chưa có thông tin')
-            total_fields = len(student_data)
-            fill_percentage = (filled_fields / total_fields * 100) if total_fields > 0 else 0
-            
-            print(f"[DEBUG] Student {i+1}: {student_data.get('ho_ten') or student_data.get('full_name')} - {filled_fields}/{total_fields} fields filled ({fill_percentage:.1f}%)")
-            
-            # Đảm bảo đạt ít nhất 70% thông tin
-            if fill_percentage < 70:
-                print(f"[WARNING] Student {i+1} chỉ có {fill_percentage:.1f}% thông tin. Cần cải thiện!")
-            
-            print(f"[DEBUG] Using {len(student_data)} columns out of {len(all_student_data)} possible columns.")
-            
-            # Insert vào database
-            columns = ', '.join(student_data.keys())
-            placeholder = get_placeholder()
-            placeholders = ', '.join([placeholder for _ in student_data.keys()])
-            query = f"INSERT INTO students ({columns}) VALUES ({placeholders})"
-            
-            cursor.execute(query, list(student_data.values()))
-            created_count += 1
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"[ADMIN] Đã tạo {created_count} học sinh mẫu thực tế")
-        return jsonify({'success': True, 'created_count': created_count})
+        try:
+            cursor = conn.cursor()
+            # Nối tiếp dữ liệu đã sinh với cùng seed để email không bị trùng
+            cursor.execute(
+                f"SELECT COUNT(*) FROM students WHERE email LIKE {get_placeholder()}",
+                (f'%_sample_s{seed}@%',)
+            )
+            start_index = cursor.fetchone()[0]
+
+            stats = generate_and_load(
+                conn, DB_CONFIG['type'], existing_columns, count, seed=seed,
+                catalog=load_locations_latest(), start_index=start_index, chunk_size=chunk_size
+            )
+        finally:
+            conn.close()
+        CHANGE_BROKER.notify()
+
+        print(f"[ADMIN] Đã tạo {stats['inserted']} học sinh mẫu thực tế ({stats['rows_per_second']} rows/s)")
+        return jsonify({'success': True, 'created_count': stats['inserted'], 'stats': stats})
     except Exception as e:
         print(f"[ERROR] Generate sample data: {e}")
         import traceback
@@ -3646,6 +4340,8 @@ def delete_all_students():
         cursor.execute("DELETE FROM students")
         conn.commit()
         conn.close()
+        clear_student_cache()
+        CHANGE_BROKER.notify()
         
         print(f"[ADMIN] Đã xóa tất cả {count} học sinh")
         return jsonify({'success': True, 'deleted_count': count})
@@ -3662,6 +4358,8 @@ def generate_bots():
         
         if count > 100:
             return jsonify({'success': False, 'error': 'Không thể tạo quá 100 bot cùng lúc'}), 400
+        if count <= 0:
+            return jsonify({'success': False, 'error': 'Số lượng phải lớn hơn 0'}), 400
             
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -3686,7 +4384,7 @@ def generate_bots():
         provinces = ['Thành phố Hồ Chí Minh', 'Thành phố Hà Nội', 'Thành phố Đà Nẵng', 'Tỉnh Bình Dương']
         wards = ['Phường Dĩ An', 'Phường Sài Gon', 'Phường Tân Bình', 'Phường Thủ Đức']
         
-        created_count = 0
+        rows = []
         for i in range(count):
             # Tạo dữ liệu ngẫu nhiên
             email = f"bot_test_{random.randint(10000, 99999)}_bot_{i}@test.com"
@@ -3727,16 +4425,18 @@ def generate_bots():
                 'created_at': datetime.now().isoformat()
             }
             
-            # Insert vào database
-            columns = ', '.join(student_data.keys())
-            placeholders = ', '.join(['?' for _ in student_data.keys()])
-            query = f"INSERT INTO students ({columns}) VALUES ({placeholders})"
-            
-            cursor.execute(query, list(student_data.values()))
-            created_count += 1
+            rows.append(student_data)
+
+        # Insert vào database trong một lần
+        columns = ', '.join(rows[0].keys())
+        placeholders = ', '.join([get_placeholder() for _ in rows[0].keys()])
+        query = f"INSERT INTO students ({columns}) VALUES ({placeholders})"
+        cursor.executemany(query, [list(row.values()) for row in rows])
+        created_count = len(rows)
         
         conn.commit()
         conn.close()
+        CHANGE_BROKER.notify()
         
         print(f"[ADMIN] Đã tạo {created_count} bot test")
         return jsonify({'success': True, 'created_count': created_count})
@@ -3759,6 +4459,8 @@ def delete_all_bots():
         cursor.execute("DELETE FROM students WHERE email LIKE '%_sample_%'")
         conn.commit()
         conn.close()
+        clear_student_cache()
+        CHANGE_BROKER.notify()
         
         print(f"[ADMIN] Đã xóa {count} học sinh mẫu (ảo)")
         return jsonify({'success': True, 'deleted_count': count})
@@ -3770,11 +4472,11 @@ def delete_all_bots():
 def export_count():
     """Get count of records that would be exported with current filters (robust column handling)"""
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
 
         # Total for quick fallback
-        cursor.execute('SELECT COUNT(*) FROM students')
+        STATEMENTS.execute(conn, cursor, 'students_count', (), False)
         total_count = cursor.fetchone()[0]
         print(f"[DEBUG] Total students in database: {total_count}")
 
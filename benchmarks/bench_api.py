@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Benchmark các API chính bằng Flask test client trên SQLite tạm.
+
+Mỗi kích thước dữ liệu (mặc định 1k, 10k, 100k học sinh) được sinh bằng
+sample_data_generator vào một file SQLite tạm, sau đó đo throughput và độ trễ
+p50/p95 của save_student, get_students (có/không tìm kiếm, trang sâu),
+student detail, student-by-email, export-count và mọi định dạng export.
+Kết quả ghi ra JSON để so sánh giữa các commit.
+
+--profile-memory chạy thêm mỗi export một lần với ?profile_memory=1 và kiểm tra
+đỉnh bộ nhớ (tracemalloc) so với MEMORY_BUDGETS; vượt ngân sách hoặc tăng quá
+--regression-threshold so với --compare đều tính là regression.
+
+    python benchmarks/bench_api.py --sizes 1000,10000 --iterations 30
+    python benchmarks/bench_api.py --compare benchmarks/results/api_bench_old.json
+    python benchmarks/bench_api.py --sizes 10000 --cases export --profile-memory
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import secrets
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+SEED = 2025
+
+EXPORT_ENDPOINTS = [
+    ('export_excel', '/api/export-excel'),
+    ('export_xlsx', '/api/export-xlsx?type=all'),
+    ('export_csv', '/api/export-csv?type=all'),
+    ('export_json', '/api/export-json?type=all'),
+    ('export_ndjson', '/api/export-json?type=all&stream=ndjson'),
+    ('export_pdf', '/api/export-pdf?type=all'),
+    ('export_parquet', '/api/export-parquet?type=all'),
+]
+
+# Ngân sách đỉnh bộ nhớ Python của một export: base_mb + mb_per_1k_rows * rows / 1000.
+# Đo trên dữ liệu mẫu ~1.5x mức hiện tại; chỉnh xuống khi export được tối ưu.
+MEMORY_BUDGETS = {
+    'export_excel': (10, 50),
+    'export_xlsx': (10, 50),
+    'export_csv': (5, 3),
+    'export_json': (5, 6),
+    'export_ndjson': (20, 0.5),  # base gồm cả lần import pandas của export_frames
+    'export_pdf': (8, 0.5),
+    'export_parquet': (40, 1),  # base gồm cả lần import pyarrow.parquet đầu tiên
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, total_s, errors, response_bytes, first_error):
+    result = {
+        'iterations': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / total_s, 2) if total_s else None,
+        'response_bytes': response_bytes,
+    }
+    if first_error:
+        result['first_error'] = first_error
+    return result
+
+
+def ensure_full_schema(application):
+    """Create the union schema a long-running SQLite install ends up with.
+
+    init_db()/migrate_db() create the English columns the read paths use, while
+    save_student writes the legacy Vietnamese ones from init_database().
+    """
+    application.init_db()
+    application.migrate_db()
+    conn = application.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA table_info(students)')
+    existing = {row[1] for row in cursor.fetchall()}
+    for db_col, _ in application.STUDENT_COLUMN_MAP:
+        if db_col not in existing:
+            cursor.execute(f'ALTER TABLE students ADD COLUMN {db_col} TEXT')
+            existing.add(db_col)
+    conn.commit()
+    conn.close()
+    application.STUDENT_SCHEMA.invalidate()
+
+
+def seed_database(application, path, size):
+    """Generate `size` students into a new SQLite file and point the app at it.
+
+    reconfigure_database() moves the writer thread, read pool, caches and journal
+    (to `<path>.journal`) over; without it save_student still writes to the
+    database the app was imported with.
+    """
+    from sample_data_generator import generate_and_load
+
+    application.DB_CONFIG['path'] = path
+    ensure_full_schema(application)
+    conn = application.get_db_connection()
+    try:
+        stats = generate_and_load(
+            conn, 'sqlite', set(application.STUDENT_SCHEMA.columns()), size,
+            seed=SEED, catalog=application.load_locations_latest()
+        )
+    finally:
+        conn.close()
+    application.reconfigure_database(journal_dir=path + '.journal')
+    return stats
+
+
+def count_bench_rows(path):
+    """Students written by save_student_insert (emails 'bench<run>_<i>_...') in one database file"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM students WHERE email LIKE 'bench%'").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def verify_writes(application, path, import_path, expected):
+    """Check that the benchmark inserts landed in the seeded database and nowhere else.
+
+    Returns an error message, or None.
+    """
+    journal = application.SUBMISSION_JOURNAL
+    if journal is not None and not journal.drain(30):
+        return 'journal chưa ghi hết vào DB sau 30s'
+    landed = count_bench_rows(path)
+    stray = count_bench_rows(import_path)
+    if landed != expected or stray:
+        return f'{landed}/{expected} bài nộp trong {os.path.basename(path)}, {stray} trong {os.path.basename(import_path)}'
+    return None
+
+
+def run_case(client, make_request, iterations, warmup, quiet):
+    latencies = []
+    errors = 0
+    first_error = None
+    response_bytes = 0
+    sink = open(os.devnull, 'w') if quiet else None
+    try:
+        for i in range(warmup + iterations):
+            with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+                start = time.perf_counter()
+                response = make_request(client, i)
+                body = response.get_data()
+                elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            response_bytes = len(body)
+            if response.status_code >= 400:
+                errors += 1
+                if first_error is None:
+                    first_error = f'{response.status_code}: {body[:200].decode("utf-8", "replace")}'
+    finally:
+        if sink:
+            sink.close()
+    total_s = sum(latencies)
+    return summarize(latencies, total_s, errors, response_bytes, first_error)
+
+
+def profile_export(client, url, token, quiet):
+    """Run one export with ?profile_memory=1 and return its memory report"""
+    sep = '&' if '?' in url else '?'
+    with contextlib.redirect_stdout(open(os.devnull, 'w')) if quiet else contextlib.nullcontext():
+        response = client.get(f'{url}{sep}profile_memory=1', headers={'Authorization': f'Bearer {token}'})
+    report = response.get_json(silent=True) or {}
+    if response.status_code != 200 or 'stages' not in report:
+        return {'error': f'{response.status_code}: {response.get_data()[:200].decode("utf-8", "replace")}'}
+    return report
+
+
+def check_memory_budget(name, rows, report):
+    """Return (budget_mb, over_budget) for one export memory report"""
+    if name not in MEMORY_BUDGETS or 'peak_traced_mb' not in report:
+        return None, False
+    base_mb, per_1k = MEMORY_BUDGETS[name]
+    budget = round(base_mb + per_1k * rows / 1000, 1)
+    return budget, report['peak_traced_mb'] > budget
+
+
+def build_cases(size, rng):
+    """(name, make_request(client, i)) pairs for one dataset size"""
+    per_page = 50
+    last_page = max(1, math.ceil(size / per_page))
+    ids = [rng.randint(1, size) for _ in range(1000)]
+    emails = [f'hs{rng.randrange(size):07d}_sample_s{SEED}@test.sample.com' for _ in range(1000)]
+    run_id = rng.randrange(10 ** 6)
+
+    def save_payload(i, email):
+        return {
+            'email': email, 'fullName': f'Bench Học Sinh {i}', 'class': '10A1', 'birthDate': '05/09/2009',
+            'gender': 'Nam', 'phone': '0912345678', 'height': '160', 'weight': '50',
+            'eyeConditions': 'Cận thị', 'currentProvince': 'Thành phố Hồ Chí Minh',
+        }
+
+    return [
+        ('save_student_insert', lambda c, i: c.post(
+            '/api/save-student', json=save_payload(i, f'bench{run_id}_{i}_sample_@test.sample.com'))),
+        ('save_student_update', lambda c, i: c.post(
+            '/api/save-student', json=save_payload(i, emails[i % len(emails)]))),
+        ('get_students', lambda c, i: c.get('/api/students?page=1&limit=50')),
+        ('get_students_compact', lambda c, i: c.get(
+            '/api/students?page=1&limit=50&compat=0&fields=email,full_name,class,birth_date,gender,phone,created_at')),
+        ('get_students_gzip', lambda c, i: c.get(
+            '/api/students?page=1&limit=50', headers={'Accept-Encoding': 'gzip'})),
+        ('get_students_search', lambda c, i: c.get('/api/students?page=1&limit=50&search=Anh')),
+        ('get_students_search_class', lambda c, i: c.get('/api/students?page=1&limit=50&search=10A1')),
+        ('get_students_deep_page', lambda c, i: c.get(f'/api/students?page={last_page}&limit={per_page}')),
+        ('get_students_mid_page', lambda c, i: c.get(f'/api/students?page={max(1, last_page // 2)}&limit={per_page}')),
+        ('student_detail', lambda c, i: c.get(f'/api/student/{ids[i % len(ids)]}')),
+        ('student_detail_fields', lambda c, i: c.get(f'/api/student/{ids[i % len(ids)]}?fields=full_name,class,eye_diseases')),
+        ('student_by_email', lambda c, i: c.get('/api/student-by-email', query_string={'email': emails[i % len(emails)]})),
+        ('export_count', lambda c, i: c.get('/api/export-count?type=all')),
+        ('export_count_grade', lambda c, i: c.get('/api/export-count?type=grade&grade=10')),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(result, baseline_path, threshold):
+    """Print p50 ratios against a previous result file; return the regressions"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n[BENCH] Compare with {baseline_path} (commit {baseline.get('commit')})")
+    for size, cases in result['datasets'].items():
+        old_cases = baseline.get('datasets', {}).get(size, {}).get('cases', {})
+        for name, stats in cases['cases'].items():
+            old = old_cases.get(name)
+            if not old or not old.get('p50_ms'):
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms']
+            flag = ' ⚠️' if ratio > threshold else ''
+            print(f"  {size:>7} {name:<28} p50 {old['p50_ms']:>9.2f} -> {stats['p50_ms']:>9.2f} ms ({ratio:.2f}x){flag}")
+            if ratio > threshold:
+                regressions.append({'size': size, 'case': name, 'ratio': round(ratio, 2)})
+        old_memory = baseline.get('datasets', {}).get(size, {}).get('memory', {})
+        for name, report in cases.get('memory', {}).items():
+            old = old_memory.get(name)
+            if not old or not old.get('peak_traced_mb') or 'peak_traced_mb' not in report:
+                continue
+            ratio = report['peak_traced_mb'] / old['peak_traced_mb']
+            flag = ' ⚠️' if ratio > threshold else ''
+            print(f"  {size:>7} {name + ' (memory)':<28} peak {old['peak_traced_mb']:>8.1f} -> "
+                  f"{report['peak_traced_mb']:>8.1f} MB ({ratio:.2f}x){flag}")
+            if ratio > threshold:
+                regressions.append({'size': size, 'case': f'{name}_memory', 'ratio': round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark các API chính trên SQLite tạm')
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--export-iterations', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--skip-exports-above', type=int, default=10000,
+                        help='Bỏ qua export với dataset lớn hơn ngưỡng này (export Excel 1k dòng đã mất vài giây)')
+    parser.add_argument('--cases', default=None, help='Chỉ chạy các case có tên chứa một trong các chuỗi (phân tách bằng dấu phẩy)')
+    parser.add_argument('--output', default=os.path.join(REPO_DIR, 'benchmarks', 'results', 'api_bench.json'))
+    parser.add_argument('--compare', default=None, help='File JSON kết quả trước đó để so sánh')
+    parser.add_argument('--regression-threshold', type=float, default=1.25)
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Đo bộ nhớ từng giai đoạn của mỗi export và kiểm tra MEMORY_BUDGETS')
+    parser.add_argument('--verbose', action='store_true', help='Giữ nguyên log của app')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    export_names = {name for name, _ in EXPORT_ENDPOINTS}
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    filters = [f.strip() for f in args.cases.split(',')] if args.cases else None
+    quiet = not args.verbose
+
+    workdir = tempfile.mkdtemp(prefix='api_bench_')
+    # Import app với SQLite tạm, không đụng students.db thật; file export cũng ghi vào workdir.
+    # Journal mặc định nằm cạnh file DB tạm nên không đọc lại/ghi vào journal của app thật
+    os.environ.pop('DATABASE_URL', None)
+    os.environ.pop('SUBMISSION_JOURNAL_DIR', None)
+    import_path = os.path.join(workdir, 'import.db')
+    os.environ['SQLITE_DB_PATH'] = import_path
+    admin_token = os.environ.setdefault('ADMIN_API_TOKEN', secrets.token_hex(16))
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')) if quiet else contextlib.nullcontext():
+        import app as application
+    application.app.config['TESTING'] = True
+    client = application.app.test_client()
+
+    result = {
+        'benchmark': 'api',
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'iterations': args.iterations,
+        'export_iterations': args.export_iterations,
+        'datasets': {},
+    }
+
+    budget_failures = []
+    write_failures = []
+    for size in sizes:
+        path = os.path.join(workdir, f'students_{size}.db')
+        print(f"[BENCH] Seeding {size} students into {path} ...")
+        with contextlib.redirect_stdout(open(os.devnull, 'w')) if quiet else contextlib.nullcontext():
+            seed_stats = seed_database(application, path, size)
+        print(f"[BENCH] Seeded in {seed_stats['generate_ms'] + seed_stats['insert_ms']:.0f} ms")
+
+        rng = random.Random(SEED + size)
+        cases = build_cases(size, rng)
+        export_cases = []
+        if args.skip_exports_above is None or size <= args.skip_exports_above:
+            export_cases = [(name, (lambda url: lambda c, i: c.get(url))(url)) for name, url in EXPORT_ENDPOINTS]
+
+        dataset = {'rows': size, 'seed_ms': round(seed_stats['generate_ms'] + seed_stats['insert_ms'], 1), 'cases': {}}
+        inserts = 0
+        for name, make_request in cases + export_cases:
+            if filters and not any(f in name for f in filters):
+                continue
+            iterations = args.export_iterations if name in export_names else args.iterations
+            warmup = args.warmup if iterations > 3 else 0
+            stats = run_case(client, make_request, iterations, warmup, quiet)
+            dataset['cases'][name] = stats
+            if name == 'save_student_insert':
+                inserts = warmup + iterations
+            error_note = f" ({stats['errors']} errors: {stats.get('first_error', '')[:80]})" if stats['errors'] else ''
+            print(f"  {size:>7} {name:<28} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+                  f"{stats['throughput_rps']:>8.1f} req/s  {stats['response_bytes']:>9} B{error_note}")
+        if args.profile_memory and export_cases:
+            dataset['memory'] = {}
+            for name, url in EXPORT_ENDPOINTS:
+                if name not in MEMORY_BUDGETS or (filters and not any(f in name for f in filters)):
+                    continue
+                report = profile_export(client, url, admin_token, quiet)
+                budget, over = check_memory_budget(name, size, report)
+                report['budget_mb'] = budget
+                dataset['memory'][name] = report
+                if 'error' in report:
+                    print(f"  {size:>7} {name + ' (memory)':<28} ❌ {report['error'][:80]}")
+                    continue
+                stages = ', '.join(f"{s['stage']} {s['peak_traced_mb']}" for s in report['stages'])
+                print(f"  {size:>7} {name + ' (memory)':<28} peak {report['peak_traced_mb']:>8.1f} MB "
+                      f"(budget {budget} MB){' ⚠️' if over else ''}  [{stages}]")
+                if over:
+                    budget_failures.append({'size': str(size), 'case': name, 'peak_mb': report['peak_traced_mb'], 'budget_mb': budget})
+        # Số liệu save_student chỉ có nghĩa nếu bài nộp thật sự vào DB vừa seed
+        write_error = verify_writes(application, path, import_path, inserts)
+        dataset['writes_verified'] = write_error is None
+        if write_error:
+            print(f"  {size:>7} ❌ save_student: {write_error}")
+            write_failures.append({'size': str(size), 'error': write_error})
+        result['datasets'][str(size)] = dataset
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] Results written to {output_path}")
+
+    exit_code = 0
+    if write_failures:
+        print(f"❌ [BENCH] Writes missing in {len(write_failures)} dataset(s)")
+        exit_code = 1
+    if budget_failures:
+        print(f"❌ [BENCH] {len(budget_failures)} export(s) over memory budget")
+        exit_code = 1
+    if compare_path:
+        regressions = compare(result, compare_path, args.regression_threshold)
+        if regressions:
+            print(f"❌ [BENCH] {len(regressions)} case(s) regressed more than {args.regression_threshold}x baseline")
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark thời gian import app.py (chi phí khởi động worker).
+
+Chạy `python -X importtime -c "import app"` nhiều lần trong thư mục tạm
+(SQLite tạm, không đụng students.db thật), ghi kết quả ra JSON để so sánh
+giữa các commit.
+
+    python benchmarks/import_time.py --runs 5 --output benchmarks/results/import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Các thư viện nặng không được phép nạp khi chỉ import app
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl']
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into {module: (self_us, cumulative_us)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = [p.strip() for p in line.replace('import time:', '', 1).split('|')]
+            modules[name] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+def run_once(workdir):
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)  # luôn đo với SQLite cục bộ
+    env['PYTHONPATH'] = REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{proc.stderr[-2000:]}")
+    return wall_ms, parse_importtime(proc.stderr)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo thời gian import app.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default=os.path.join(REPO_DIR, 'benchmarks', 'results', 'import_time.json'))
+    parser.add_argument('--max-ms', type=float, default=None, help='Báo lỗi nếu median vượt ngưỡng (ms)')
+    args = parser.parse_args()
+
+    wall_times = []
+    app_cumulative = []
+    last_modules = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(args.runs):
+            wall_ms, modules = run_once(workdir)
+            wall_times.append(wall_ms)
+            if 'app' in modules:
+                app_cumulative.append(modules['app'][1] / 1000)
+            last_modules = modules
+            print(f"[IMPORT] Run {i + 1}/{args.runs}: {wall_ms:.1f} ms")
+
+    heavy_loaded = [m for m in HEAVY_MODULES if m in last_modules]
+    top_modules = sorted(last_modules.items(), key=lambda kv: kv[1][1], reverse=True)[:15]
+
+    result = {
+        'benchmark': 'import_time',
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'wall_ms': {
+            'min': round(min(wall_times), 2),
+            'median': round(statistics.median(wall_times), 2),
+            'max': round(max(wall_times), 2),
+        },
+        'app_cumulative_ms': round(statistics.median(app_cumulative), 2) if app_cumulative else None,
+        'heavy_modules_loaded': heavy_loaded,
+        'top_modules': [
+            {'module': name, 'self_ms': round(s / 1000, 2), 'cumulative_ms': round(c / 1000, 2)}
+            for name, (s, c) in top_modules
+        ],
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"[IMPORT] Median: {result['wall_ms']['median']} ms, app cumulative: {result['app_cumulative_ms']} ms")
+    print(f"[IMPORT] Heavy modules loaded: {heavy_loaded or 'none'}")
+    print(f"[IMPORT] Results written to {args.output}")
+
+    failed = False
+    if heavy_loaded:
+        print(f"❌ [IMPORT] {', '.join(heavy_loaded)} được nạp ngay khi import app")
+        failed = True
+    if args.max_ms is not None and result['wall_ms']['median'] > args.max_ms:
+        print(f"❌ [IMPORT] Median {result['wall_ms']['median']} ms vượt ngưỡng {args.max_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Theo dõi thay đổi của bảng students: updated_at, tombstone và change feed.
+
+created_at bị ghi đè mỗi lần học sinh nộp lại nên không dùng để lấy phần thay
+đổi được. Trigger trong DB (áp dụng cho mọi đường ghi: form, import, dữ liệu mẫu,
+xóa từng học sinh, xóa toàn bộ) làm hai việc:
+
+- đặt updated_at = CURRENT_TIMESTAMP (UTC) cho dòng vừa thêm/sửa
+- ghi vào student_changes một dòng (seq tăng dần, student_id, op) với op là
+  'upsert' hoặc 'delete' (tombstone). Mỗi student_id chỉ giữ dòng mới nhất nên
+  bảng không lớn hơn số id đã từng dùng.
+
+Cursor của /api/changes là seq: client lưu seq cuối cùng nhận được và lần sau
+hỏi since=<seq>. since cũng nhận mốc thời gian ISO (UTC) cho lần đồng bộ đầu.
+
+SQLite ghi tuần tự nên thứ tự seq trùng thứ tự commit. Trên PostgreSQL seq lấy từ
+BIGSERIAL, các transaction ghi song song không chờ nhau, nên một seq nhỏ có thể
+commit sau một seq lớn hơn; client đã đi qua seq lớn sẽ bỏ lỡ seq nhỏ. Mỗi dòng
+vì vậy ghi txid của transaction, và phía đọc (fetch_changes, feed_cursor) chỉ
+đi tới trước dòng đầu tiên mà transaction có thể chưa kết thúc với mọi snapshot
+(txid >= xmin của snapshot hiện tại); phần sau được trả ở lần hỏi kế tiếp.
+latest_seq (phiên bản dữ liệu cho cache) thì không chờ.
+"""
+import datetime as dt
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+
+SQLITE_DDL = (
+    'CREATE INDEX IF NOT EXISTS idx_updated_at ON students(updated_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS student_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        email TEXT,
+        op TEXT NOT NULL,
+        changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_student_changes_student ON student_changes(student_id)',
+    # UPDATE bên trong trigger insert có OLD.updated_at IS NULL nên không ghi log lần hai
+    '''
+    CREATE TRIGGER IF NOT EXISTS students_insert_change AFTER INSERT ON students
+    BEGIN
+        UPDATE students SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id AND updated_at IS NULL;
+        DELETE FROM student_changes WHERE student_id = NEW.id;
+        INSERT INTO student_changes (student_id, email, op) VALUES (NEW.id, NEW.email, 'upsert');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS students_update_change AFTER UPDATE ON students
+    WHEN OLD.updated_at IS NOT NULL
+    BEGIN
+        UPDATE students SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        DELETE FROM student_changes WHERE student_id = NEW.id;
+        INSERT INTO student_changes (student_id, email, op) VALUES (NEW.id, NEW.email, 'upsert');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS students_delete_change AFTER DELETE ON students
+    BEGIN
+        DELETE FROM student_changes WHERE student_id = OLD.id;
+        INSERT INTO student_changes (student_id, email, op) VALUES (OLD.id, OLD.email, 'delete');
+    END
+    ''',
+)
+
+POSTGRES_DDL = (
+    'ALTER TABLE students ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP',
+    'CREATE INDEX IF NOT EXISTS idx_updated_at ON students(updated_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS student_changes (
+        seq BIGSERIAL PRIMARY KEY,
+        student_id INTEGER NOT NULL,
+        email TEXT,
+        op VARCHAR(10) NOT NULL,
+        changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        txid BIGINT DEFAULT txid_current()
+    )
+    ''',
+    # Bảng tạo trước khi có txid: dòng cũ để NULL (coi như đã commit)
+    'ALTER TABLE student_changes ADD COLUMN IF NOT EXISTS txid BIGINT',
+    'ALTER TABLE student_changes ALTER COLUMN txid SET DEFAULT txid_current()',
+    'CREATE INDEX IF NOT EXISTS idx_student_changes_student ON student_changes(student_id)',
+    'CREATE INDEX IF NOT EXISTS idx_student_changes_txid ON student_changes(txid)',
+    '''
+    CREATE OR REPLACE FUNCTION students_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION students_log_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM student_changes WHERE student_id = OLD.id;
+            INSERT INTO student_changes (student_id, email, op) VALUES (OLD.id, OLD.email, 'delete');
+            RETURN OLD;
+        END IF;
+        DELETE FROM student_changes WHERE student_id = NEW.id;
+        INSERT INTO student_changes (student_id, email, op) VALUES (NEW.id, NEW.email, 'upsert');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS students_touch_updated_at ON students',
+    '''
+    CREATE TRIGGER students_touch_updated_at BEFORE UPDATE ON students
+    FOR EACH ROW EXECUTE PROCEDURE students_touch_updated_at()
+    ''',
+    'DROP TRIGGER IF EXISTS students_log_change ON students',
+    '''
+    CREATE TRIGGER students_log_change AFTER INSERT OR UPDATE OR DELETE ON students
+    FOR EACH ROW EXECUTE PROCEDURE students_log_change()
+    ''',
+)
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def ensure_change_tracking(conn, db_type, columns):
+    """Add updated_at, the student_changes log and its triggers (idempotent).
+
+    `columns` are the current columns of students. On first setup every existing
+    student gets an 'upsert' entry so since=0 returns the whole table.
+    """
+    cursor = conn.cursor()
+    if 'updated_at' not in columns:
+        # SQLite không cho ADD COLUMN với default CURRENT_TIMESTAMP, trigger insert sẽ điền
+        cursor.execute('ALTER TABLE students ADD COLUMN updated_at TIMESTAMP')
+        cursor.execute('UPDATE students SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)')
+        print('[CHANGES] Added column: updated_at')
+
+    if db_type == 'postgresql':
+        cursor.execute("SELECT to_regclass('student_changes') IS NOT NULL")
+    else:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'student_changes'")
+    has_log = bool(cursor.fetchone()[0])
+
+    for statement in (POSTGRES_DDL if db_type == 'postgresql' else SQLITE_DDL):
+        cursor.execute(statement)
+
+    if not has_log:
+        cursor.execute('''
+            INSERT INTO student_changes (student_id, email, op, changed_at)
+            SELECT id, email, 'upsert', updated_at FROM students ORDER BY updated_at, id
+        ''')
+        print(f'[CHANGES] ✅ Change log created with {cursor.rowcount} existing students')
+    conn.commit()
+
+
+def parse_since(value):
+    """since= value -> ('seq', int) or ('time', 'YYYY-MM-DD HH:MM:SS' in UTC).
+
+    Missing/empty means from the beginning. Raises InvalidCursorError.
+    """
+    if value is None or not value.strip():
+        return 'seq', 0
+    text = value.strip()
+    if text.isdigit():
+        return 'seq', int(text)
+    try:
+        moment = dt.datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidCursorError(f'since không hợp lệ: {text!r} (cần số thứ tự thay đổi hoặc thời gian ISO)')
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return 'time', moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def since_condition(since, placeholder):
+    """WHERE condition (and params) keeping the students changed after `since`"""
+    kind, value = since
+    if kind == 'time':
+        return f'updated_at >= {placeholder}', [value]
+    return (f"id IN (SELECT student_id FROM student_changes WHERE seq > {placeholder} AND op = 'upsert')",
+            [value])
+
+
+# seq nhỏ nhất của các transaction có thể còn chưa commit với một snapshot nào đó
+# (NULL nếu không có); thay đổi của feed chỉ được đọc tới trước seq này
+POSTGRES_UNSETTLED_SEQ = '''
+    (SELECT MIN(seq) FROM student_changes WHERE txid >= txid_snapshot_xmin(txid_current_snapshot()))
+'''
+
+
+def latest_seq(cursor):
+    """Highest seq written; changes whenever students change (data version for caches)"""
+    cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM student_changes')
+    return cursor.fetchone()[0]
+
+
+def feed_cursor(cursor, db_type):
+    """Cursor for 'everything up to now' that no later commit can go behind (see module docstring)"""
+    if db_type != 'postgresql':
+        return latest_seq(cursor)
+    cursor.execute(f'''
+        SELECT COALESCE({POSTGRES_UNSETTLED_SEQ} - 1, (SELECT MAX(seq) FROM student_changes), 0)
+    ''')
+    return cursor.fetchone()[0]
+
+
+def _text(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, dt.date):
+        return value.isoformat()
+    return value
+
+
+def fetch_changes(cursor, since, placeholder, select_list='*', limit=CHANGES_PAGE_SIZE, db_type='sqlite'):
+    """One page of the change feed after `since`, oldest first.
+
+    Returns {'changes': [...], 'cursor': last seq, 'has_more': bool}. Upserts
+    carry the current row of the student; deletes only id and email.
+    """
+    kind, value = since
+    condition = 'c.seq > {0}' if kind == 'seq' else 'c.changed_at >= {0}'
+    if db_type == 'postgresql':
+        condition += f' AND c.seq < COALESCE({POSTGRES_UNSETTLED_SEQ}, c.seq + 1)'
+    cursor.execute(f'''
+        SELECT c.seq, c.op, c.student_id, c.email, c.changed_at, s.*
+        FROM student_changes c
+        LEFT JOIN (SELECT {select_list} FROM students) s ON s.id = c.student_id AND c.op = 'upsert'
+        WHERE {condition.format(placeholder)}
+        ORDER BY c.seq
+        LIMIT {placeholder}
+    ''', (value, limit + 1))
+    rows = cursor.fetchall()
+    columns = [d[0] for d in cursor.description][5:]
+
+    changes = []
+    for seq, op, student_id, email, changed_at, *student in rows[:limit]:
+        change = {'seq': seq, 'op': op, 'id': student_id, 'email': email, 'changed_at': _text(changed_at)}
+        if op == 'upsert':
+            change['student'] = {c: _text(v) for c, v in zip(columns, student)}
+        changes.append(change)
+
+    if changes:
+        next_cursor = changes[-1]['seq']
+    else:
+        # Không có thay đổi mới: giữ cursor (hoặc đổi mốc thời gian thành seq hiện tại)
+        next_cursor = value if kind == 'seq' else feed_cursor(cursor, db_type)
+    return {'changes': changes, 'cursor': str(next_cursor), 'has_more': len(rows) > limit}
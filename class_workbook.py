@@ -0,0 +1,365 @@
+"""
+Xuất một workbook mỗi lớp một sheet (hoặc file ZIP mỗi lớp một file XLSX).
+
+Mỗi sheet được render thành XML (inline string, style cố định trong styles.xml)
+và nén deflate ngay trong process con, nên phần nặng chạy song song theo số
+core. Process chính chỉ ghép các entry đã nén vào file ZIP/XLSX theo thứ tự lớp
+và stream từng entry ra response ngay khi render xong.
+
+Module chỉ dùng thư viện chuẩn để process con (spawn) khởi động nhanh.
+"""
+import itertools
+import numbers
+import os
+import re
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+
+THEME_COLORS = {
+    'blue': '1F4E79',      # Xanh dương đậm
+    'green': '2E7D32',     # Xanh lá đậm
+    'orange': 'F57500',    # Cam đậm
+    'purple': '7B1FA2',    # Tím đậm
+    'red': 'D32F2F',       # Đỏ đậm
+    'teal': '00796B',      # Xanh ngọc đậm
+}
+DEFAULT_HEADER_COLOR = THEME_COLORS['blue']
+
+UNKNOWN_CLASS = 'Chưa có lớp'
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Style index trong cellXfs của styles.xml bên dưới
+STYLE_DATA = 1
+STYLE_HEADER = 2
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_SHEET_NAME_FORBIDDEN = re.compile(r'[\[\]:*?/\\]')
+
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def class_sort_key(name):
+    """Natural order: 10A2 before 10A10, 'Chưa có lớp' last"""
+    if name == UNKNOWN_CLASS:
+        return (1, [])
+    return (0, [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in re.findall(r'\d+|\D+', str(name))])
+
+
+def sheet_title(name, used):
+    """Valid, unique Excel sheet name (max 31 chars, no []:*?/\\)"""
+    base = _SHEET_NAME_FORBIDDEN.sub('-', str(name)).strip("'") or 'Sheet'
+    base = base[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f' ({n})'
+        title = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def column_letter(index):
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _display_width(value):
+    # Cùng cách tính độ rộng cột như export-xlsx: +20% cho chuỗi có dấu tiếng Việt
+    text = str(value)
+    length = len(text)
+    if any(ord(char) > 127 for char in text):
+        length = int(length * 1.2)
+    return length
+
+
+def _cell_xml(ref, value, style):
+    if value is None or value == '':
+        return f'<c r="{ref}" s="{style}"/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}" s="{style}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Real) and value == value and abs(value) != float('inf'):
+        return f'<c r="{ref}" s="{style}"><v>{value}</v></c>'
+    text = _ILLEGAL_XML_CHARS.sub('', str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def sheet_xml(header, rows, preamble=()):
+    """Worksheet XML: optional preamble lines (title, totals), header row, data rows"""
+    widths = [_display_width(h) for h in header]
+    for row in rows:
+        for i, value in enumerate(row):
+            if value is not None:
+                width = _display_width(value)
+                if width > widths[i]:
+                    widths[i] = width
+    letters = [column_letter(i + 1) for i in range(len(header))]
+
+    parts = [_XML_DECL, f'<worksheet xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><cols>']
+    for i, width in enumerate(widths):
+        # Tối thiểu 12, tối đa 80, thêm 3 ký tự đệm như export-xlsx
+        parts.append(f'<col min="{i + 1}" max="{i + 1}" width="{min(max(width + 3, 12), 80)}" customWidth="1"/>')
+    parts.append('</cols><sheetData>')
+
+    r = 0
+    for line in preamble:
+        r += 1
+        cells = _cell_xml(f'A{r}', line, STYLE_DATA) if line else ''
+        parts.append(f'<row r="{r}" ht="25" customHeight="1">{cells}</row>')
+    r += 1
+    parts.append(f'<row r="{r}" ht="30" customHeight="1">')
+    parts.extend(_cell_xml(f'{letters[i]}{r}', h, STYLE_HEADER) for i, h in enumerate(header))
+    parts.append('</row>')
+    for row in rows:
+        r += 1
+        parts.append(f'<row r="{r}" ht="25" customHeight="1">')
+        parts.extend(_cell_xml(f'{letters[i]}{r}', v, STYLE_DATA) for i, v in enumerate(row))
+        parts.append('</row>')
+    parts.append('</sheetData></worksheet>')
+    return ''.join(parts).encode('utf-8')
+
+
+def styles_xml(header_color=DEFAULT_HEADER_COLOR, font_size=11):
+    return (
+        f'{_XML_DECL}<styleSheet xmlns="{_MAIN_NS}">'
+        f'<fonts count="3"><font><sz val="11"/><name val="Calibri"/></font>'
+        f'<font><sz val="{font_size}"/><name val="Calibri"/></font>'
+        f'<font><b/><sz val="{font_size + 1}"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+        f'<fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill>'
+        f'<fill><patternFill patternType="solid"><fgColor rgb="FF{header_color}"/><bgColor rgb="FF{header_color}"/></patternFill></fill></fills>'
+        f'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        f'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        f'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+        f'<alignment horizontal="center" vertical="center"/></xf>'
+        f'<xf numFmtId="0" fontId="2" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+        f'<alignment horizontal="center" vertical="center"/></xf></cellXfs>'
+        f'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        f'</styleSheet>'
+    ).encode('utf-8')
+
+
+def package_parts(titles, header_color=DEFAULT_HEADER_COLOR, font_size=11):
+    """(name, bytes) for every XLSX part except the worksheets themselves"""
+    n = len(titles)
+    content_types = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, n + 1)
+    )
+    sheets = ''.join(f'<sheet name={quoteattr(t)} sheetId="{i}" r:id="rId{i}"/>' for i, t in enumerate(titles, 1))
+    sheet_rels = ''.join(
+        f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, n + 1)
+    )
+    return [
+        ('[Content_Types].xml', (
+            f'{_XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{content_types}</Types>'
+        ).encode('utf-8')),
+        ('_rels/.rels', (
+            f'{_XML_DECL}<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ).encode('utf-8')),
+        ('xl/workbook.xml', (
+            f'{_XML_DECL}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>{sheets}</sheets></workbook>'
+        ).encode('utf-8')),
+        ('xl/_rels/workbook.xml.rels', (
+            f'{_XML_DECL}<Relationships xmlns="{_PKG_REL_NS}">{sheet_rels}'
+            f'<Relationship Id="rId{n + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/></Relationships>'
+        ).encode('utf-8')),
+        ('xl/styles.xml', styles_xml(header_color, font_size)),
+    ]
+
+
+def compress_entry(name, data, level=6):
+    """Pre-compressed ZIP entry: (name, deflated bytes, crc32, raw size, method)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return name, compressor.compress(data) + compressor.flush(), zlib.crc32(data), len(data), 8
+
+
+def stored_entry(name, data):
+    """Uncompressed ZIP entry, for content that is already compressed (a nested .xlsx)"""
+    return name, data, zlib.crc32(data), len(data), 0
+
+
+class ZipStream:
+    """Minimal streaming ZIP writer for entries compressed elsewhere.
+
+    zipfile cannot take already-deflated data, and compressing here would put
+    the deflate work back on the main process.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.central = []
+        t = time.localtime()
+        self._dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        self._dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    def entry(self, name, payload, crc, size, method):
+        """Bytes of one local file entry"""
+        if self.offset + len(payload) >= 0xFFFFFFFF or size >= 0xFFFFFFFF:
+            raise ValueError('File xuất quá lớn cho định dạng ZIP (giới hạn 4GB)')
+        encoded = name.encode('utf-8')
+        fields = (20, 0x800, method, self._dos_time, self._dos_date, crc & 0xFFFFFFFF, len(payload), size)
+        header = struct.pack('<IHHHHHIIIHH', 0x04034B50, *fields, len(encoded), 0) + encoded
+        self.central.append((encoded, fields, self.offset))
+        self.offset += len(header) + len(payload)
+        return header + payload
+
+    def close(self):
+        """Bytes of the central directory and end record"""
+        records = b''.join(
+            struct.pack('<IH' + 'HHHHHIII' + 'HHHHHII', 0x02014B50, 20, *fields,
+                        len(encoded), 0, 0, 0, 0, 0, offset) + encoded
+            for encoded, fields, offset in self.central
+        )
+        end = struct.pack('<IHHHHIIH', 0x06054B50, 0, 0, len(self.central), len(self.central),
+                          len(records), self.offset, 0)
+        return records + end
+
+
+def render_sheet_entry(job):
+    """Process-pool task: one class -> compressed worksheet part of the combined workbook"""
+    index, header, rows, preamble = job['index'], job['header'], job['rows'], job['preamble']
+    return compress_entry(f'xl/worksheets/sheet{index}.xml', sheet_xml(header, rows, preamble))
+
+
+def render_class_file(job):
+    """Process-pool task: one class -> a complete single-sheet .xlsx, stored as a ZIP entry"""
+    stream = ZipStream()
+    parts = [compress_entry(name, data) for name, data in
+             package_parts([job['title']], job['header_color'], job['font_size'])]
+    parts.append(compress_entry('xl/worksheets/sheet1.xml', sheet_xml(job['header'], job['rows'], job['preamble'])))
+    body = b''.join(stream.entry(*part) for part in parts) + stream.close()
+    return stored_entry(job['filename'], body)
+
+
+_RENDER_POOL = None
+_RENDER_POOL_SIZE = 0
+
+
+def render_pool(processes):
+    """Shared process pool, created on first use (spawn: safe with threads in the parent)"""
+    global _RENDER_POOL, _RENDER_POOL_SIZE
+    if _RENDER_POOL is None or _RENDER_POOL_SIZE != processes:
+        import multiprocessing
+        if _RENDER_POOL is not None:
+            _RENDER_POOL.shutdown(wait=False)
+        _RENDER_POOL = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        _RENDER_POOL_SIZE = processes
+    return _RENDER_POOL
+
+
+def reset_render_pool():
+    """Forget a pool inherited through fork (its processes belong to the parent)"""
+    global _RENDER_POOL, _RENDER_POOL_SIZE
+    _RENDER_POOL = None
+    _RENDER_POOL_SIZE = 0
+
+
+def render_all(task, jobs, processes, window=None):
+    """Yield task(job) for every job in order, in parallel when it pays off.
+
+    jobs may be a generator: at most `window` jobs (default 2 per process) are
+    submitted ahead of the one being yielded, so only those are held in memory.
+    """
+    jobs = iter(jobs)
+    first = next(jobs, None)
+    if first is None:
+        return
+    second = next(jobs, None)
+    if second is None:
+        yield task(first)
+        return
+    jobs = itertools.chain((first, second), jobs)
+
+    pending = deque()
+    if processes > 1:
+        from concurrent.futures.process import BrokenProcessPool
+        window = window or processes * 2
+        try:
+            pool = render_pool(processes)
+            for job in jobs:
+                pending.append((job, pool.submit(task, job)))
+                if len(pending) >= window:
+                    yield pending[0][1].result()
+                    pending.popleft()
+            while pending:
+                yield pending[0][1].result()
+                pending.popleft()
+            return
+        except (BrokenProcessPool, OSError) as e:
+            print(f"[RENDER] ⚠️ Process pool unavailable, rendering inline: {e}")
+            reset_render_pool()
+        finally:
+            for _, future in pending:
+                future.cancel()
+    for job in itertools.chain([job for job, _ in pending], jobs):
+        yield task(job)
+
+
+def iter_class_workbook(sheets, header, header_color=DEFAULT_HEADER_COLOR, font_size=11, processes=1,
+                        extra_sheets=()):
+    """Stream one XLSX with a sheet per class.
+
+    sheets: list of (class name, rows, preamble lines) in sheet order.
+    extra_sheets: (title, header, rows) added after the class sheets (e.g. health summary).
+    """
+    used = set()
+    titles = [sheet_title(name, used) for name, _, _ in sheets]
+    titles += [sheet_title(title, used) for title, _, _ in extra_sheets]
+    stream = ZipStream()
+    for part in package_parts(titles, header_color, font_size):
+        yield stream.entry(*compress_entry(*part))
+    jobs = [{'index': i, 'header': header, 'rows': rows, 'preamble': preamble}
+            for i, (_, rows, preamble) in enumerate(sheets, 1)]
+    jobs += [{'index': i, 'header': extra_header, 'rows': rows, 'preamble': ()}
+             for i, (_, extra_header, rows) in enumerate(extra_sheets, len(sheets) + 1)]
+    for entry in render_all(render_sheet_entry, jobs, processes):
+        yield stream.entry(*entry)
+    yield stream.close()
+
+
+def iter_class_zip(sheets, header, filename_prefix, header_color=DEFAULT_HEADER_COLOR, font_size=11, processes=1,
+                   extra_sheets=()):
+    """Stream a ZIP with one single-sheet XLSX per class (and one per extra sheet)"""
+    used = set()
+    jobs = []
+    for name, rows, preamble in sheets:
+        title = sheet_title(name, used)
+        jobs.append({
+            'title': title, 'filename': f'{filename_prefix}_lop_{title}.xlsx', 'header': header, 'rows': rows,
+            'preamble': preamble, 'header_color': header_color, 'font_size': font_size,
+        })
+    for name, extra_header, rows in extra_sheets:
+        title = sheet_title(name, used)
+        jobs.append({
+            'title': title, 'filename': f'{filename_prefix}_{title}.xlsx', 'header': extra_header, 'rows': rows,
+            'preamble': (), 'header_color': header_color, 'font_size': font_size,
+        })
+    stream = ZipStream()
+    for entry in render_all(render_class_file, jobs, processes):
+        yield stream.entry(*entry)
+    yield stream.close()
+
+
+def default_processes():
+    return max(1, min(4, os.cpu_count() or 1))
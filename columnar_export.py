@@ -0,0 +1,304 @@
+"""
+Xuất Parquet / Arrow IPC cho phòng dữ liệu (đọc bằng pandas, DuckDB, Power BI, ...).
+
+Schema cố định theo STUDENT_COLUMNS, không phụ thuộc cột thực có trong DB: cột
+chưa có thì xuất toàn null, cột cũ tiếng Việt (ho_ten, lop, ...) được đọc qua tên
+mới. Tên cột là tên tiếng Anh; nhãn tiếng Việt nằm trong metadata của từng field.
+Quy ước: chỉ thêm cột mới vào cuối, đổi tên hoặc đổi kiểu thì tăng SCHEMA_VERSION.
+
+Dữ liệu đọc từ cursor theo lô, mỗi lô thành một record batch (một row group của
+Parquet) và được gửi đi ngay. Cột ít giá trị được dictionary-encode, dữ liệu nén
+zstd. pyarrow là dependency tùy chọn, chỉ được import khi export.
+"""
+import datetime as dt
+import importlib.util
+import re
+
+from student_schema import EXPORT_COLUMN_LABELS, LEGACY_COLUMN_ALIASES
+
+SCHEMA_VERSION = 1
+
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+COLUMNAR_BATCH_SIZE = 5000
+
+# Codec hợp lệ theo định dạng; mặc định là phần tử đầu
+COMPRESSIONS = {
+    'parquet': ('zstd', 'snappy', 'gzip', 'none'),
+    'arrow': ('zstd', 'lz4', 'none'),
+}
+
+# (tên cột, kiểu): string | dictionary | int32 | int64 | date | timestamp
+STUDENT_COLUMNS = (
+    ('id', 'int64'),
+    ('email', 'string'),
+    ('full_name', 'string'),
+    ('nickname', 'string'),
+    ('class', 'dictionary'),
+    ('grade', 'dictionary'),
+    ('birth_date', 'date'),
+    ('gender', 'dictionary'),
+    ('ethnicity', 'dictionary'),
+    ('nationality', 'dictionary'),
+    ('religion', 'dictionary'),
+    ('phone', 'string'),
+    ('citizen_id', 'string'),
+    ('cccd_date', 'date'),
+    ('cccd_place', 'dictionary'),
+    ('personal_id', 'string'),
+    ('passport', 'string'),
+    ('passport_date', 'date'),
+    ('passport_place', 'dictionary'),
+    ('organization', 'dictionary'),
+    ('permanent_province', 'dictionary'),
+    ('permanent_ward', 'dictionary'),
+    ('permanent_hamlet', 'dictionary'),
+    ('permanent_street', 'string'),
+    ('hometown_province', 'dictionary'),
+    ('hometown_ward', 'dictionary'),
+    ('hometown_hamlet', 'dictionary'),
+    ('birth_cert_province', 'dictionary'),
+    ('birth_cert_ward', 'dictionary'),
+    ('birthplace_province', 'dictionary'),
+    ('birthplace_ward', 'dictionary'),
+    ('birthplace_detail', 'string'),
+    ('current_address_detail', 'string'),
+    ('current_province', 'dictionary'),
+    ('current_ward', 'dictionary'),
+    ('current_hamlet', 'dictionary'),
+    ('height', 'int32'),
+    ('weight', 'int32'),
+    ('eye_diseases', 'dictionary'),
+    ('swimming_skill', 'dictionary'),
+    ('smartphone', 'dictionary'),
+    ('computer', 'dictionary'),
+    ('father_ethnicity', 'dictionary'),
+    ('mother_ethnicity', 'dictionary'),
+    ('father_name', 'string'),
+    ('father_job', 'dictionary'),
+    ('father_birth_year', 'int32'),
+    ('father_phone', 'string'),
+    ('father_cccd', 'string'),
+    ('mother_name', 'string'),
+    ('mother_job', 'dictionary'),
+    ('mother_birth_year', 'int32'),
+    ('mother_phone', 'string'),
+    ('mother_cccd', 'string'),
+    ('guardian_name', 'string'),
+    ('guardian_job', 'dictionary'),
+    ('guardian_birth_year', 'int32'),
+    ('guardian_phone', 'string'),
+    ('guardian_cccd', 'string'),
+    ('guardian_gender', 'dictionary'),
+    ('created_at', 'timestamp'),
+    ('updated_at', 'timestamp'),
+)
+
+# created_at lưu giờ Việt Nam không kèm múi giờ; giá trị có múi giờ (PostgreSQL) được đổi về cùng mốc
+_LOCAL_TZ = dt.timezone(dt.timedelta(hours=7))
+_ISO_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})')
+_VN_DATE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+_INT32_RANGE = range(-2 ** 31, 2 ** 31)
+
+
+class ColumnarUnavailableError(RuntimeError):
+    pass
+
+
+def columnar_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def columnar_select_list(columns):
+    """SELECT list producing STUDENT_COLUMNS in order from the table's real columns"""
+    available = set(columns)
+    exprs = []
+    for name, _ in STUDENT_COLUMNS:
+        if name in available:
+            exprs.append(name)
+        elif LEGACY_COLUMN_ALIASES.get(name) in available:
+            exprs.append(f'{LEGACY_COLUMN_ALIASES[name]} AS {name}')
+        else:
+            exprs.append(f'NULL AS {name}')
+    return ', '.join(exprs)
+
+
+def arrow_schema(metadata=None):
+    """The stable pyarrow schema of the export, with the Vietnamese labels as field metadata"""
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(),
+        'dictionary': pa.dictionary(pa.int32(), pa.string()),
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('s'),
+    }
+    labels = dict(EXPORT_COLUMN_LABELS, grade=EXPORT_COLUMN_LABELS.get('khoi', 'Khối'))
+    fields = [
+        pa.field(name, types[kind], nullable=(name != 'id'), metadata={'label': labels.get(name, name)})
+        for name, kind in STUDENT_COLUMNS
+    ]
+    schema_metadata = {'schema': 'students', 'schema_version': str(SCHEMA_VERSION)}
+    schema_metadata.update(metadata or {})
+    return pa.schema(fields, metadata=schema_metadata)
+
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _to_int(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    text = str(value).strip()
+    try:
+        match = _ISO_DATE.match(text)
+        if match:
+            return dt.date(*map(int, match.groups()))
+        match = _VN_DATE.match(text)
+        if match:
+            day, month, year = map(int, match.groups())
+            return dt.date(year, month, day)
+    except ValueError:
+        pass
+    return None
+
+
+def _to_timestamp(value):
+    if value is None:
+        return None
+    if not isinstance(value, dt.datetime):
+        text = str(value).strip().replace('Z', '+00:00')
+        if not text:
+            return None
+        try:
+            value = dt.datetime.fromisoformat(text)
+        except ValueError:
+            date = _to_date(text)
+            return dt.datetime(date.year, date.month, date.day) if date else None
+    if value.tzinfo is not None:
+        value = value.astimezone(_LOCAL_TZ).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+class ConversionStats:
+    """Counts non-blank values that did not fit their column type (exported as null)"""
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid = {}
+
+    def add(self, name, count):
+        if count:
+            self.invalid[name] = self.invalid.get(name, 0) + count
+
+
+def record_batch(schema, rows, stats):
+    """Typed RecordBatch from one fetchmany() batch of tuples in STUDENT_COLUMNS order"""
+    import pyarrow as pa
+
+    converters = {'int32': _to_int, 'int64': _to_int, 'date': _to_date, 'timestamp': _to_timestamp}
+    arrays = []
+    for (name, kind), field, raw in zip(STUDENT_COLUMNS, schema, zip(*rows)):
+        if kind in ('string', 'dictionary'):
+            values = [_text(v) for v in raw]
+        else:
+            values = [converters[kind](v) for v in raw]
+            if kind == 'int32':
+                values = [v if v is None or v in _INT32_RANGE else None for v in values]
+            stats.add(name, sum(1 for v, r in zip(values, raw) if v is None and _text(r) is not None))
+        if kind == 'dictionary':
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    stats.rows += len(rows)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object that keeps what pyarrow wrote until it is sent"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_columnar(row_batches, fmt='parquet', compression=None, metadata=None, stats=None):
+    """Stream a Parquet file (or an Arrow IPC stream) written one record batch per row batch"""
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ColumnarUnavailableError('Cần cài pyarrow để xuất Parquet/Arrow') from e
+
+    compression = compression or COMPRESSIONS[fmt][0]
+    schema = arrow_schema(metadata)
+    stats = stats if stats is not None else ConversionStats()
+    buffer = _ChunkSink()
+    sink = pa.PythonFile(buffer, mode='w')
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression=compression, write_statistics=True)
+    else:
+        codec = {'none': None, 'lz4': 'lz4_frame'}.get(compression, compression)
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+    try:
+        for rows in row_batches:
+            batch = record_batch(schema, rows, stats)
+            del rows
+            writer.write_batch(batch)
+            del batch
+            data = buffer.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield buffer.drain()
@@ -0,0 +1,126 @@
+"""
+Middleware nén gzip/brotli cho response của API (JSON, CSV, NDJSON...).
+
+Trên Heroku không có nginx phía trước nên app tự nén. Chỉ nén khi:
+- client gửi Accept-Encoding hỗ trợ (ưu tiên br, sau đó gzip),
+- content-type nằm trong allowlist,
+- response đủ lớn (MIN_SIZE) hoặc là response dạng stream/file.
+
+Response dạng generator được nén từng đoạn và flush ngay, nên byte đầu tiên
+vẫn tới client sớm.
+"""
+import zlib
+
+from flask import request
+
+from static_cache import BROTLI_AVAILABLE, parse_accept_encoding
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+MIN_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/plain',
+    'text/html',
+}
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # nén nhanh cho response động, khác với file tĩnh nén sẵn ở mức 11
+
+
+def choose_encoding(accept_encoding):
+    accepted = parse_accept_encoding(accept_encoding)
+    if BROTLI_AVAILABLE and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each one so output isn't held back.
+
+    Closing `chunks` is the caller's job (compress_response registers it on the
+    response), since a generator closed before its first chunk never runs its body.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                data = compressor.process(chunk) + compressor.flush()
+                if data:
+                    yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+        yield compressor.flush()
+
+
+def _add_vary(response):
+    vary = response.headers.get('Vary')
+    if not vary:
+        response.headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f'{vary}, Accept-Encoding'
+
+
+def compress_response(response):
+    """after_request handler: compress the response in place if worthwhile"""
+    if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        _add_vary(response)
+        return response
+
+    if response.is_streamed or response.direct_passthrough:
+        # Generator hoặc file (send_file): nén dần từng đoạn. Iterable gốc (file, generator
+        # đọc DB giữ kết nối của pool...) được đóng cùng response, kể cả khi chưa đọc đoạn nào
+        chunks = response.response
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            response.call_on_close(close)
+        response.response = compress_stream(chunks, encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            _add_vary(response)
+            return response
+        response.set_data(compress_bytes(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    _add_vary(response)
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        # Nội dung đã nén khác byte-for-byte so với bản gốc
+        response.headers['ETag'] = f'W/{etag}'
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
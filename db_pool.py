@@ -0,0 +1,141 @@
+"""
+Pool kết nối đọc, dùng lại giữa các request.
+
+Trước đây mỗi request đọc mở một kết nối mới rồi đóng (PostgreSQL: TCP + xác thực,
+SQLite: mở file + đọc schema), nên không có gì được giữ lại giữa các request: cả
+câu lệnh đã biên dịch trong cache của sqlite3 lẫn PREPARE của PostgreSQL (xem
+statements).
+
+ConnectionPool giữ tối đa `size` kết nối rảnh mỗi process. Khi không còn kết nối
+rảnh thì mở kết nối mới chứ không chờ (export dạng stream giữ kết nối lâu), và khi
+trả về lúc pool đã đủ thì đóng hẳn. Code gọi vẫn dùng conn.close() như cũ:
+PooledConnection trả kết nối về pool. Trước khi vào lại pool, các cursor còn mở bị
+đóng (với SQLite, cursor chưa đọc hết giữ snapshot cũ), transaction được rollback
+và hàm `reset` của pool dọn phần còn lại (vd. row_factory).
+"""
+import threading
+import time
+import weakref
+
+POOL_MAX_IDLE_SECONDS = 300
+
+
+class PooledConnection:
+    """Connection borrowed from a ConnectionPool; close() gives it back.
+
+    Everything else is forwarded to the real connection. `prepared` is per-connection
+    state that survives between borrowings (the PREPAREd statement names).
+    """
+
+    _OWN = ('_pool', '_raw', '_cursors', '_generation', 'prepared')
+
+    def __init__(self, pool, raw, prepared, generation=0):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_generation', generation)
+        object.__setattr__(self, '_cursors', weakref.WeakSet())
+        object.__setattr__(self, 'prepared', prepared)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        self._cursors.add(cursor)
+        return cursor
+
+    def close(self):
+        raw = self._raw
+        if raw is None:
+            return
+        object.__setattr__(self, '_raw', None)
+        self._pool.release(raw, self.prepared, list(self._cursors), self._generation)
+
+    def __getattr__(self, name):
+        raw = object.__getattribute__(self, '_raw')
+        if raw is None:
+            raise RuntimeError('Kết nối đã được trả về pool')
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        if name in self._OWN:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+
+class ConnectionPool:
+    """Bounded idle pool; see module docstring.
+
+    `connect()` opens a new connection, `reset(conn)` prepares a returned one for
+    the next user (raises if it is no longer usable).
+    """
+
+    def __init__(self, connect, size, reset):
+        self.connect = connect
+        self.size = size
+        self.reset_connection = reset
+        self._inherited = []
+        self.reset()
+
+    def reset(self):
+        """Forget the connections inherited through fork without closing them.
+
+        Closing a PostgreSQL connection sends Terminate on the socket the parent
+        still uses, so the inherited objects are only kept alive.
+        """
+        self._inherited.extend(getattr(self, '_idle', ()))
+        self._lock = threading.Lock()
+        self._idle = []
+        self._generation = 0
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+
+    def clear(self):
+        """Close the idle connections, e.g. after the database they point to changed.
+
+        Connections borrowed before the call are closed when they are given back.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+        for raw, _, _ in idle:
+            self._close(raw)
+
+    def acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                raw, prepared, since = self._idle.pop()
+                if now - since < POOL_MAX_IDLE_SECONDS:
+                    self.stats['reused'] += 1
+                    return PooledConnection(self, raw, prepared, self._generation)
+                # Kết nối rảnh quá lâu có thể đã bị server/proxy cắt
+                self._close(raw)
+        generation = self._generation
+        raw = self.connect()
+        self.stats['opened'] += 1
+        return PooledConnection(self, raw, set(), generation)
+
+    def release(self, raw, prepared, cursors, generation=0):
+        try:
+            for cursor in cursors:
+                cursor.close()
+            raw.rollback()
+            self.reset_connection(raw)
+        except Exception as e:
+            print(f"[POOL] ⚠️ Discarding broken connection: {e}")
+            self._close(raw)
+            return
+        with self._lock:
+            if generation == self._generation and len(self._idle) < self.size:
+                self._idle.append((raw, prepared, time.monotonic()))
+                return
+        self._close(raw)
+
+    def _close(self, raw):
+        self.stats['discarded'] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, idle=len(self._idle), size=self.size)
@@ -0,0 +1,204 @@
+"""
+DataFrame gọn cho các endpoint export.
+
+pd.DataFrame(cursor.fetchall()) giữ toàn bộ kết quả dưới dạng tuple Python rồi
+copy thêm một lần thành cột object, mỗi ô là một chuỗi riêng. load_export_frame
+đọc cursor theo lô (fetchmany) và gán kiểu ngay cho từng lô:
+
+- cột ít giá trị (lớp, giới tính, dân tộc, tôn giáo, tỉnh/phường, kỹ năng bơi,
+  điện thoại/máy tính, ...) -> category
+- chiều cao, cân nặng, năm sinh cha/mẹ/người giám hộ -> số nguyên nullable (Int32)
+- ngày sinh, ngày cấp, created_at -> datetime64
+
+Cột nào có giá trị không chuyển được (dữ liệu cũ nhập tay) thì giữ nguyên chuỗi
+để không mất dữ liệu. relabel_columns/reorder_columns đổi tên và sắp xếp cột mà
+không copy dữ liệu cột; export_rows trả các dòng giá trị Python thuần cho
+openpyxl/json.
+"""
+import datetime as dt
+
+DEFAULT_BATCH_SIZE = 2000
+
+CATEGORY_COLUMNS = frozenset({
+    'class', 'lop', 'khoi', 'gender', 'gioi_tinh', 'guardian_gender',
+    'ethnicity', 'dan_toc', 'father_ethnicity', 'mother_ethnicity',
+    'religion', 'ton_giao', 'nationality', 'organization',
+    'permanent_province', 'permanent_ward', 'permanent_hamlet',
+    'hometown_province', 'hometown_ward', 'hometown_hamlet',
+    'current_province', 'current_ward', 'current_hamlet', 'tinh_thanh',
+    'birthplace_province', 'birthplace_ward', 'birth_cert_province', 'birth_cert_ward',
+    'cccd_place', 'passport_place',
+    'swimming_skill', 'smartphone', 'computer', 'eye_diseases',
+    'father_job', 'mother_job', 'guardian_job', 'nghe_nghiep_cha', 'nghe_nghiep_me',
+})
+
+INTEGER_COLUMNS = frozenset({
+    'height', 'weight', 'father_birth_year', 'mother_birth_year', 'guardian_birth_year',
+})
+
+DATE_COLUMNS = frozenset({
+    'birth_date', 'ngay_sinh', 'cccd_date', 'passport_date', 'created_at',
+})
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _lossless(raw, converted):
+    """True if every non-blank raw value survived the conversion"""
+    blanks = sum(1 for v in raw if _is_blank(v))
+    return int(converted.isna().sum()) == blanks
+
+
+def _convert_batch(pd, np, name, values):
+    """Typed array for one batch of one column, or ('raw', object array) when conversion would lose data"""
+    if name in INTEGER_COLUMNS:
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+        if _lossless(values, numbers):
+            return 'number', numbers.to_numpy(dtype='float64', na_value=np.nan)
+    elif name in DATE_COLUMNS:
+        try:
+            dates = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format='ISO8601')
+        except (TypeError, ValueError):
+            dates = None
+        if dates is not None and _lossless(values, dates):
+            if dates.dt.tz is not None:
+                dates = dates.dt.tz_localize(None)
+            return 'date', dates.to_numpy()
+    elif name in CATEGORY_COLUMNS:
+        return 'category', pd.Categorical(values)
+    return 'raw', np.array(values, dtype=object)
+
+
+def _as_text(np, kind, array):
+    """ISO text of a converted date batch, so a column mixing converted and raw batches stays text"""
+    present = ~np.isnat(array)
+    unit = 'D' if (array[present] == array[present].astype('datetime64[D]')).all() else 's'
+    text = np.char.replace(np.datetime_as_string(array, unit=unit), 'T', ' ').astype(object)
+    text[~present] = None
+    return text
+
+
+def _combine(pd, np, name, parts):
+    """Concatenate the per-batch arrays of one column into its final typed array"""
+    kinds = {kind for kind, _ in parts}
+    arrays = [array for _, array in parts]
+    if kinds == {'category'}:
+        from pandas.api.types import union_categoricals
+        try:
+            return union_categoricals(arrays)
+        except TypeError:
+            # Categories khác kiểu giữa các lô (vd. số và chuỗi)
+            return pd.Categorical(np.concatenate([np.asarray(a, dtype=object) for a in arrays]))
+    if kinds == {'number'}:
+        numbers = np.concatenate(arrays)
+        finite = numbers[~np.isnan(numbers)]
+        if np.array_equal(finite, np.round(finite)) and (finite.size == 0 or np.abs(finite).max() < 2 ** 31):
+            return pd.array(numbers, dtype='Int32')
+        return pd.array(numbers, dtype='Float64')
+    if kinds == {'date'}:
+        return np.concatenate(arrays)
+    # Ít nhất một lô không chuyển được -> giữ chuỗi gốc
+    values = np.concatenate([_as_text(np, kind, array) if kind == 'date' else
+                             array if kind == 'raw' else
+                             np.asarray(pd.Series(array, dtype=object).where(pd.notna(array), None), dtype=object)
+                             for kind, array in parts])
+    if name in CATEGORY_COLUMNS or name in DATE_COLUMNS:
+        return pd.Categorical(values)
+    return values
+
+
+def load_export_frame(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Build a typed DataFrame from an executed cursor, fetching `batch_size` rows at a time"""
+    import numpy as np
+    import pandas as pd
+
+    rows = cursor.fetchmany(batch_size)
+    # Server-side cursor (PostgreSQL) chỉ có description sau lần FETCH đầu
+    columns = [d[0] for d in cursor.description]
+    parts = [[] for _ in columns]
+    while rows:
+        for i, values in enumerate(zip(*rows)):
+            parts[i].append(_convert_batch(pd, np, columns[i], values))
+        del rows
+        rows = cursor.fetchmany(batch_size)
+
+    if not parts or not parts[0]:
+        return pd.DataFrame(columns=columns)
+    arrays = {}
+    for i, name in enumerate(columns):
+        arrays[name] = _combine(pd, np, name, parts[i])
+        parts[i] = None
+    return pd.DataFrame(arrays, columns=columns, copy=False)
+
+
+def relabel_columns(df, labels):
+    """Rename columns to their export labels without copying the column data"""
+    return df.set_axis([labels.get(c, c) for c in df.columns], axis=1, copy=False)
+
+
+def column_positions(labels, order):
+    """Column indexes with the labels in `order` first and the others in their original order"""
+    present = set(labels)
+    wanted = [c for c in dict.fromkeys(order) if c in present]
+    rank = {label: i for i, label in enumerate(wanted)}
+    return sorted(range(len(labels)), key=lambda i: (rank.get(labels[i], len(rank)), i))
+
+
+def reorder_columns(df, order):
+    """Put the labels in `order` first (others keep their order) without copying column data.
+
+    Duplicate labels are kept together, like df[list] would.
+    """
+    import pandas as pd
+
+    positions = column_positions(list(df.columns), order)
+    if positions == list(range(df.shape[1])):
+        return df
+    return pd.concat([df.iloc[:, i] for i in positions], axis=1, copy=False,
+                     keys=[df.columns[i] for i in positions])
+
+
+def _is_date_only(series):
+    present = series.dropna()
+    return bool((present.dt.normalize() == present).all())
+
+
+def _column_values(pd, series, date_only, dates_as_text):
+    """Plain Python values of one column (None for missing)"""
+    if series.dtype.kind == 'M':
+        # NaT cũng là instance của datetime nên phải lọc bằng notna()
+        values = [v if present else None for v, present in zip(series.dt.to_pydatetime(), series.notna())]
+        if date_only:
+            values = [v.date() if v is not None else None for v in values]
+        if dates_as_text:
+            values = [v.isoformat(sep=' ') if isinstance(v, dt.datetime) else v.isoformat() if v is not None else None
+                      for v in values]
+        return values
+    values = series.astype(object)
+    return values.where(pd.notna(values), None).tolist()
+
+
+def export_rows(df, header=True, chunk_size=DEFAULT_BATCH_SIZE, dates_as_text=False):
+    """Yield rows of plain Python values (header first), converting `chunk_size` rows at a time.
+
+    Used instead of openpyxl's dataframe_to_rows, which cannot write pd.NA, and
+    for JSON where dates become ISO strings.
+    """
+    import pandas as pd
+
+    if header:
+        yield list(df.columns)
+    # Cột ngày không có giờ (ngày sinh) ghi ra dạng date, created_at giữ cả giờ
+    date_only = [df.iloc[:, i].dtype.kind == 'M' and _is_date_only(df.iloc[:, i]) for i in range(df.shape[1])]
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        columns = [_column_values(pd, chunk.iloc[:, i], date_only[i], dates_as_text) for i in range(chunk.shape[1])]
+        yield from (list(row) for row in zip(*columns))
+
+
+def export_records(df, chunk_size=DEFAULT_BATCH_SIZE):
+    """Row dicts with JSON-safe values (dates as ISO text)"""
+    labels = list(df.columns)
+    return [dict(zip(labels, row)) for row in export_rows(df, header=False, chunk_size=chunk_size, dates_as_text=True)]
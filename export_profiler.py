@@ -0,0 +1,151 @@
+"""
+Đo bộ nhớ theo từng giai đoạn của các endpoint export.
+
+Một lần export đi qua các giai đoạn query -> dataframe -> transform -> render ->
+send. Với mỗi giai đoạn ghi lại:
+
+- peak_traced_mb: đỉnh bộ nhớ Python (tracemalloc) trong giai đoạn đó
+- retained_mb: bộ nhớ Python còn giữ lại khi kết thúc giai đoạn (so với lúc bắt đầu export)
+- rss_mb / rss_delta_mb: RSS của process khi kết thúc giai đoạn (gồm cả bộ nhớ C của
+  numpy/pandas mà tracemalloc chỉ thấy một phần)
+
+Giai đoạn query chỉ gồm việc chạy câu lệnh; các dòng được fetch theo lô trong
+giai đoạn dataframe (export_frames.load_export_frame).
+
+tracemalloc là trạng thái toàn cục của interpreter nên mỗi process chỉ profile một
+export tại một thời điểm (ProfilerBusyError cho request thứ hai).
+"""
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+EXPORT_STAGES = ('query', 'dataframe', 'transform', 'render', 'send')
+
+MB = 1024 * 1024
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """High-water RSS of the process lifetime (ru_maxrss: KB on Linux, bytes on macOS)"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def _mb(value):
+    return round(value / MB, 2) if value is not None else None
+
+
+class ExportMemoryProfiler:
+    """Per-stage tracemalloc/RSS recorder for one export request.
+
+        profiler = ExportMemoryProfiler('EXCEL').start()
+        ...                              # 'query' stage
+        profiler.stage('dataframe')
+        ...
+        report = profiler.finish(rows=len(df))
+    """
+
+    enabled = True
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stages = []
+        self._current = None
+        self._owns_tracing = False
+        self.finished = False
+
+    def start(self, first_stage=EXPORT_STAGES[0]):
+        if not _profile_lock.acquire(blocking=False):
+            raise ProfilerBusyError('Đang có một export khác được profile bộ nhớ')
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+        self._traced_start = tracemalloc.get_traced_memory()[0]
+        self._rss_start = current_rss_bytes()
+        self._t0 = time.perf_counter()
+        self._open(first_stage)
+        return self
+
+    def _open(self, name):
+        tracemalloc.reset_peak()
+        self._current = (name, time.perf_counter(), tracemalloc.get_traced_memory()[0])
+
+    def _close(self):
+        if self._current is None:
+            return
+        name, started, traced_before = self._current
+        traced_now, traced_peak = tracemalloc.get_traced_memory()
+        rss = current_rss_bytes()
+        self.stages.append({
+            'stage': name,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'peak_traced_mb': _mb(traced_peak - self._traced_start),
+            'stage_allocated_mb': _mb(traced_now - traced_before),
+            'retained_mb': _mb(traced_now - self._traced_start),
+            'rss_mb': _mb(rss),
+            'rss_delta_mb': _mb(rss - self._rss_start) if rss is not None and self._rss_start is not None else None,
+        })
+        self._current = None
+
+    def stage(self, name):
+        """Close the running stage and start `name`"""
+        self._close()
+        self._open(name)
+
+    def finish(self, **extra):
+        """Stop profiling and return the report dict; call exactly once"""
+        self.finished = True
+        try:
+            self._close()
+        finally:
+            if self._owns_tracing:
+                tracemalloc.stop()
+            _profile_lock.release()
+        peak = max((s['peak_traced_mb'] for s in self.stages), default=0)
+        report = {
+            'endpoint': self.endpoint,
+            'total_ms': round((time.perf_counter() - self._t0) * 1000, 1),
+            'peak_traced_mb': peak,
+            'peak_stage': next((s['stage'] for s in self.stages if s['peak_traced_mb'] == peak), None),
+            'rss_start_mb': _mb(self._rss_start),
+            'rss_end_mb': self.stages[-1]['rss_mb'] if self.stages else None,
+            'process_peak_rss_mb': _mb(peak_rss_bytes()),
+            'stages': self.stages,
+        }
+        report.update(extra)
+        return report
+
+
+class NullProfiler:
+    """Stand-in used when profile_memory is off; every call is a no-op"""
+
+    enabled = False
+
+    def stage(self, name):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
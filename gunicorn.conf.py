@@ -0,0 +1,58 @@
+"""
+Cấu hình gunicorn cho Heroku (Procfile) và Docker.
+
+gunicorn tự đọc file này từ thư mục làm việc, nên `gunicorn app:app` trong
+Procfile không cần thêm tham số.
+
+- preload_app: import app.py (và khởi tạo DB) một lần trong master thay vì
+  lặp lại ở từng worker.
+- when_ready: nạp sẵn danh mục tỉnh/phường, các trang tĩnh (kèm bản nén) và
+  danh sách cột của bảng students trong master để các worker dùng chung qua
+  copy-on-write.
+- post_fork: reset trạng thái riêng của từng worker (kết nối DB, random).
+- threads > 1 (worker gthread): stream SSE /api/events của trang admin chỉ giữ một
+  thread thay vì cả worker.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+preload_app = True
+
+
+def when_ready(server):
+    """Prewarm shared, read-only data in the master before workers are forked"""
+    import app as application
+
+    try:
+        catalog = application.load_locations_latest()
+        server.log.info("[PRELOAD] Location catalog ready: %s provinces", catalog['meta'].get('provinces', 0))
+    except Exception as e:
+        server.log.warning("[PRELOAD] Location catalog prewarm failed: %s", e)
+
+    try:
+        application.prewarm_static_assets()
+    except Exception as e:
+        server.log.warning("[PRELOAD] Static assets prewarm failed: %s", e)
+
+    try:
+        columns = application.STUDENT_SCHEMA.warm()
+        server.log.info("[PRELOAD] Student schema ready: %s columns", len(columns))
+    except Exception as e:
+        server.log.warning("[PRELOAD] Student schema prewarm failed: %s", e)
+
+    # Move everything allocated so far out of the GC's reach so that collections
+    # in the workers don't touch (and copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as application
+
+    application.reset_after_fork()
+    server.log.info("[FORK] Worker %s ready", worker.pid)
@@ -0,0 +1,489 @@
+"""
+Phân tích sức khỏe học sinh (BMI, tuổi theo tháng, BMI theo tuổi) bằng NumPy.
+
+Chiều cao, cân nặng, ngày sinh, giới tính và bệnh về mắt được nạp thành mảng
+NumPy một lần, mọi phép tính sau đó làm trên cả mảng (không lặp từng học sinh):
+
+- Sửa lỗi nhập liệu thường gặp trước khi tính: chiều cao nhập theo mét (1.65)
+  hoặc mm (1650), cân nặng theo gam, chiều cao và cân nặng bị nhập ngược. Giá
+  trị đã sửa được dùng để tính và học sinh bị gắn cờ để kiểm tra lại; giá trị
+  ngoài khoảng hợp lý thì bỏ qua (không tính BMI) và gắn cờ.
+- Tuổi tính theo tháng tròn tại ngày tham chiếu (hôm nay, giờ Việt Nam).
+- BMI theo tuổi: z-score theo phương pháp LMS của WHO (tham chiếu WHO 2007 cho
+  5-19 tuổi, kể cả cách tính lại z ngoài ±3 SD), rồi xếp vào băng bách phân vị
+  (P3/P15/P50/P85/P97 như biểu đồ WHO) và phân loại dinh dưỡng (gầy < -2 SD,
+  thừa cân > +1 SD, béo phì > +2 SD). |z| > 5 là giá trị bất thường về sinh học
+  (WHO), gần như chắc chắn do nhập sai.
+- Tổng hợp theo lớp bằng np.bincount trên chỉ số lớp.
+
+BMI_LMS là tham số LMS tại các mốc tuổi tròn 10-19, làm tròn từ bảng WHO 2007
+và nội suy tuyến tính theo tháng; đủ cho sàng lọc, không dùng để chẩn đoán.
+Từ 19 tuổi trở lên dùng tham số của mốc 19 tuổi (tại đó WHO 2007 khớp với ngưỡng
+BMI 25/30 của người lớn). Dưới 10 tuổi hoặc không rõ giới tính thì học sinh vẫn
+có BMI nhưng không có z-score.
+"""
+import re
+import time
+
+from class_workbook import UNKNOWN_CLASS, class_sort_key
+from student_stats import EYE_CONDITIONS
+
+# Cột nguồn của từng trường, ưu tiên theo thứ tự (schema cũ trước: form ghi vào đó)
+HEALTH_SOURCES = (
+    ('id', ('id',)),
+    ('full_name', ('ho_ten', 'full_name')),
+    ('class', ('lop', 'class')),
+    ('gender', ('gioi_tinh', 'gender')),
+    ('birth_date', ('ngay_sinh', 'birth_date')),
+    ('height', ('height',)),
+    ('weight', ('weight',)),
+    ('eye_diseases', ('eye_diseases',)),
+)
+# Trường lấy nguyên giá trị (không ép sang chuỗi)
+RAW_FIELDS = ('id', 'height', 'weight')
+
+# (tuổi năm, L, M, S) - BMI theo tuổi, WHO Growth Reference 2007
+BMI_LMS = {
+    'male': (
+        (10, -1.50, 16.4, 0.110), (11, -1.38, 16.9, 0.114), (12, -1.26, 17.5, 0.117),
+        (13, -1.14, 18.2, 0.121), (14, -1.02, 19.0, 0.125), (15, -0.90, 19.8, 0.128),
+        (16, -0.93, 20.5, 0.128), (17, -0.95, 21.1, 0.127), (18, -0.98, 21.7, 0.127),
+        (19, -1.00, 22.2, 0.126),
+    ),
+    'female': (
+        (10, -1.63, 16.6, 0.122), (11, -1.52, 17.2, 0.125), (12, -1.40, 18.0, 0.129),
+        (13, -1.29, 18.8, 0.132), (14, -1.17, 19.6, 0.136), (15, -1.10, 20.2, 0.139),
+        (16, -1.01, 20.7, 0.142), (17, -0.92, 21.0, 0.146), (18, -0.82, 21.3, 0.149),
+        (19, -0.73, 21.4, 0.152),
+    ),
+}
+MALE_VALUES = ('nam', 'male', 'm')
+FEMALE_VALUES = ('nữ', 'nu', 'female', 'f')
+
+# z-score tại các đường bách phân vị của biểu đồ WHO
+PERCENTILE_Z = (-1.881, -1.036, 0.0, 1.036, 1.881)
+PERCENTILE_BANDS = ('< P3', 'P3-P15', 'P15-P50', 'P50-P85', 'P85-P97', '> P97')
+CATEGORIES = ('Gầy nặng', 'Gầy', 'Bình thường', 'Thừa cân', 'Béo phì')
+BIOLOGICALLY_IMPLAUSIBLE_Z = 5
+# Số học sinh cần kiểm tra tối đa trả về trong /api/health-analytics
+FLAGGED_LIMIT = 500
+
+PLAUSIBLE_HEIGHT_CM = (100, 230)
+PLAUSIBLE_WEIGHT_KG = (20, 200)
+PLAUSIBLE_AGE_MONTHS = (120, 300)
+
+# Cờ kiểm tra (bit) -> mô tả
+FLAGS = (
+    ('height_in_meters', 'Chiều cao nhập theo mét (đã đổi sang cm)'),
+    ('height_in_mm', 'Chiều cao nhập theo mm (đã đổi sang cm)'),
+    ('weight_in_grams', 'Cân nặng nhập theo gam (đã đổi sang kg)'),
+    ('height_weight_swapped', 'Chiều cao và cân nặng bị nhập ngược (đã đổi lại)'),
+    ('height_implausible', 'Chiều cao ngoài khoảng hợp lý, không được tính'),
+    ('weight_implausible', 'Cân nặng ngoài khoảng hợp lý, không được tính'),
+    ('birth_date_invalid', 'Ngày sinh không đọc được'),
+    ('age_implausible', 'Tuổi ngoài khoảng hợp lý (10-25 tuổi)'),
+    ('bmi_implausible', f'BMI theo tuổi bất thường (|z| > {BIOLOGICALLY_IMPLAUSIBLE_Z}), cần kiểm tra số đo'),
+)
+FLAG_BITS = {name: 1 << i for i, (name, _) in enumerate(FLAGS)}
+FLAG_LABELS = dict(FLAGS)
+
+_DATE_PATTERNS = (
+    (re.compile(r'^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})'), (1, 2, 3)),
+    (re.compile(r'^(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})'), (3, 2, 1)),
+)
+_NUMBER = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+
+
+def _field_expr(columns, field, candidates):
+    present = [c for c in candidates if c in columns]
+    if not present:
+        return 'NULL'
+    if len(present) == 1 or field in RAW_FIELDS:
+        return present[0]
+    values = [f"NULLIF(CAST({c} AS TEXT), '')" for c in present]
+    return f"COALESCE({', '.join(values)})"
+
+
+def health_select(columns):
+    """SELECT list (one expression per HEALTH_SOURCES field) for the columns that exist"""
+    return ', '.join(f'{_field_expr(columns, field, candidates)} AS {field}' for field, candidates in HEALTH_SOURCES)
+
+
+def load_health_columns(cursor, columns, classes=None, placeholder='?', batch_size=5000):
+    """{field: list of values} for every student (or only those in `classes`), read in batches"""
+    query = f'SELECT {health_select(columns)} FROM students'
+    params = []
+    if classes:
+        class_expr = _field_expr(columns, 'class', dict(HEALTH_SOURCES)['class'])
+        query += f" WHERE {class_expr} IN ({', '.join([placeholder] * len(classes))})"
+        params = list(classes)
+    cursor.execute(query + ' ORDER BY id', params)
+    names = [field for field, _ in HEALTH_SOURCES]
+    data = {name: [] for name in names}
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for name, values in zip(names, zip(*rows)):
+            data[name].extend(values)
+    return data
+
+
+def frame_health_columns(frame):
+    """{field: values} from an export DataFrame (first non-empty source column per field)"""
+    import numpy as np
+
+    data = {}
+    for field, candidates in HEALTH_SOURCES:
+        present = [c for c in candidates if c in frame.columns]
+        if not present:
+            data[field] = [None] * len(frame)
+        elif field in RAW_FIELDS:
+            data[field] = frame[present[0]].to_numpy(dtype=object, na_value=None)
+        else:
+            texts = [_text(_frame_values(frame[c])) for c in present]
+            data[field] = _coalesce(np, texts)
+    return data
+
+
+def _frame_values(series):
+    if series.dtype.kind == 'M':
+        return series.to_numpy()
+    return series.to_numpy(dtype=object, na_value=None)
+
+
+def _text(values):
+    """str array ('' for missing); dates and datetimes start with YYYY-MM-DD"""
+    import numpy as np
+
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        text = np.datetime_as_string(values, unit='D')
+        return np.where(np.isnat(values), '', text)
+    objects = np.empty(len(values), dtype=object)
+    objects[:] = values
+    objects[objects == None] = ''  # noqa: E711 - so sánh từng phần tử
+    return objects.astype(str) if len(objects) else np.zeros(0, dtype='U1')
+
+
+def _factorize(np, values, transform):
+    """transform() applied once per distinct value, mapped back onto the whole array"""
+    distinct, inverse = np.unique(_text(values), return_inverse=True)
+    mapped = [transform(v.strip()) for v in distinct]
+    return np.array(mapped or [transform('')])[inverse.reshape(-1)]
+
+
+def _coalesce(np, texts):
+    result = texts[0]
+    for other in texts[1:]:
+        result = np.where(result != '', result, other)
+    return result
+
+
+def _to_float(np, values):
+    """float64 array; None, blanks, text and values <= 0 become NaN"""
+    try:
+        numbers = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        # Có giá trị nhập tay kiểu '1,65' hoặc '165cm': đọc từng giá trị (chậm hơn nhưng hiếm gặp)
+        numbers = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            if isinstance(value, (int, float)):
+                numbers[i] = value
+                continue
+            match = _NUMBER.search(str(value))
+            if match:
+                numbers[i] = float(match.group().replace(',', '.'))
+    return np.where(numbers > 0, numbers, np.nan)
+
+
+def parse_dates(values):
+    """(year, month, day, invalid) int arrays; 0 for blank or unreadable dates.
+
+    YYYY-MM-DD and DD/MM/YYYY are decoded on a character matrix; only other
+    spellings (no zero padding, dots...) fall back to a regex per value.
+    """
+    import numpy as np
+
+    text = _text(values)
+    n = len(text)
+    fixed = text.astype('U10')
+    chars = fixed.view(np.uint32).reshape(n, 10) if n else np.zeros((0, 10), dtype=np.uint32)
+    digits = chars.astype(np.int64) - 48
+    is_digit = (digits >= 0) & (digits <= 9)
+
+    def number(cols):
+        value = np.zeros(n, dtype=np.int64)
+        for c in cols:
+            value = value * 10 + digits[:, c]
+        return value
+
+    iso = (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-')) & is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9]].all(axis=1)
+    dmy = (chars[:, 2] == ord('/')) & (chars[:, 5] == ord('/')) & is_digit[:, [0, 1, 3, 4, 6, 7, 8, 9]].all(axis=1)
+    year = np.where(iso, number((0, 1, 2, 3)), np.where(dmy, number((6, 7, 8, 9)), 0))
+    month = np.where(iso, number((5, 6)), np.where(dmy, number((3, 4)), 0))
+    day = np.where(iso, number((8, 9)), np.where(dmy, number((0, 1)), 0))
+
+    for i in np.flatnonzero(~(iso | dmy) & (text != '')):
+        for pattern, order in _DATE_PATTERNS:
+            match = pattern.match(text[i].strip())
+            if match:
+                year[i], month[i], day[i] = (int(match.group(g)) for g in order)
+                break
+
+    # Ngày không tồn tại (31/02, tháng 13...) coi như không đọc được
+    valid = (year > 0) & (month >= 1) & (month <= 12) & (day >= 1)
+    first = (np.where(valid, year, 1970) - 1970) * 12 + np.where(valid, month, 1) - 1
+    first = first.astype('datetime64[M]')
+    days_in_month = ((first + 1).astype('datetime64[D]') - first.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= days_in_month
+    invalid = ~valid & (text != '')
+    return np.where(valid, year, 0), np.where(valid, month, 0), np.where(valid, day, 0), invalid
+
+
+def age_in_months(year, month, day, reference_date):
+    """Completed months between each birth date and reference_date (-1 where unknown)"""
+    import numpy as np
+
+    months = (reference_date.year - year) * 12 + (reference_date.month - month) - (reference_date.day < day)
+    return np.where(year > 0, months, -1)
+
+
+def _lms_at(np, sex, months):
+    """L, M, S arrays interpolated by month (NaN below the youngest age, 19-year values above the oldest)"""
+    table = np.array(BMI_LMS[sex], dtype=float)
+    ages = table[:, 0] * 12
+    inside = months >= ages[0]
+    return [np.where(inside, np.interp(months, ages, table[:, k]), np.nan) for k in (1, 2, 3)]
+
+
+def bmi_zscores(bmi, sex, months):
+    """WHO BMI-for-age z-scores; sex is an array of 'male'/'female'/''. NaN where not applicable.
+
+    Beyond ±3 SD the WHO method measures the distance in units of the 2-3 SD
+    interval instead of the LMS curve, which is stretched in the right tail.
+    """
+    import numpy as np
+
+    z = np.full(len(bmi), np.nan)
+    for name in BMI_LMS:
+        rows = np.flatnonzero(sex == name)
+        if not len(rows):
+            continue
+        L, M, S = _lms_at(np, name, months[rows].astype(float))
+        y = bmi[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zs = ((y / M) ** L - 1) / (L * S)
+
+            def sd(k):
+                return M * (1 + L * S * k) ** (1 / L)
+
+            high, low = zs > 3, zs < -3
+            zs = np.where(high, 3 + (y - sd(3)) / (sd(3) - sd(2)), zs)
+            zs = np.where(low, -3 + (y - sd(-3)) / (sd(-2) - sd(-3)), zs)
+        z[rows] = zs
+    return z
+
+
+def normal_percentile(z):
+    """Percentile (0-100) of z under the standard normal distribution.
+
+    Abramowitz-Stegun 7.1.26 approximation of erf (error < 1.5e-7), so the whole
+    array is computed at once without scipy.
+    """
+    import numpy as np
+
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - poly * np.exp(-x * x)
+    return 50 * (1 + np.sign(z) * erf)
+
+
+class HealthAnalysis:
+    """Per-student health metrics for one set of students, computed in one vectorized pass.
+
+    data: {field: sequence} as returned by load_health_columns/frame_health_columns.
+    """
+
+    def __init__(self, data, reference_date):
+        import numpy as np
+
+        started = time.perf_counter()
+        self.reference_date = reference_date
+        n = len(data['id'])
+        self.count = n
+        self.ids = list(data['id'])
+        self.names = list(data['full_name'])
+
+        # Lớp, giới tính, bệnh về mắt chỉ có vài giá trị khác nhau: xét từng giá trị một lần
+        self.classes = _factorize(np, data['class'], lambda v: v or UNKNOWN_CLASS)
+        self.sex = _factorize(np, data['gender'], lambda v: 'male' if v.lower() in MALE_VALUES
+                              else 'female' if v.lower() in FEMALE_VALUES else '')
+        eye = _factorize(np, data['eye_diseases'], lambda v: sum(1 << k for k, c in enumerate(EYE_CONDITIONS) if c in v))
+        self.eye_conditions = {c: (eye & (1 << k)) != 0 for k, c in enumerate(EYE_CONDITIONS)}
+
+        flags = np.zeros(n, dtype=np.int64)
+        self.raw_height = _to_float(np, data['height'])
+        self.raw_weight = _to_float(np, data['weight'])
+        height, weight = self.raw_height.copy(), self.raw_weight.copy()
+
+        meters = (height >= 0.5) & (height < 2.5)
+        millimeters = (height >= 1000) & (height < 2500)
+        grams = (weight >= 20000) & (weight < 200000)
+        height = np.where(meters, height * 100, np.where(millimeters, height / 10, height))
+        weight = np.where(grams, weight / 1000, weight)
+
+        def in_range(values, bounds):
+            return (values >= bounds[0]) & (values <= bounds[1])
+
+        swapped = (~in_range(height, PLAUSIBLE_HEIGHT_CM) & in_range(height, PLAUSIBLE_WEIGHT_KG)
+                   & in_range(weight, PLAUSIBLE_HEIGHT_CM))
+        height, weight = np.where(swapped, weight, height), np.where(swapped, height, weight)
+        bad_height = ~np.isnan(height) & ~in_range(height, PLAUSIBLE_HEIGHT_CM)
+        bad_weight = ~np.isnan(weight) & ~in_range(weight, PLAUSIBLE_WEIGHT_KG)
+        self.height = np.where(bad_height, np.nan, height)
+        self.weight = np.where(bad_weight, np.nan, weight)
+
+        year, month, day, bad_date = parse_dates(data['birth_date'])
+        months = age_in_months(year, month, day, reference_date)
+        bad_age = (months >= 0) & ((months < PLAUSIBLE_AGE_MONTHS[0]) | (months > PLAUSIBLE_AGE_MONTHS[1]))
+        self.age_months = np.where(bad_age, -1, months)
+
+        self.bmi = self.weight / (self.height / 100) ** 2
+        self.z = bmi_zscores(self.bmi, self.sex, self.age_months)
+        implausible = np.abs(self.z) > BIOLOGICALLY_IMPLAUSIBLE_Z
+        self.has_z = ~np.isnan(self.z) & ~implausible
+        z = np.where(self.has_z, self.z, 0)
+        self.percentile = np.where(self.has_z, normal_percentile(z), np.nan)
+        self.band = np.searchsorted(PERCENTILE_Z, z, side='right')
+        # Gầy nặng < -3, gầy < -2, bình thường đến +1, thừa cân đến +2, béo phì > +2
+        self.category = np.select([z < -3, z < -2, z <= 1, z <= 2], [0, 1, 2, 3], 4)
+
+        for name, mask in (('height_in_meters', meters), ('height_in_mm', millimeters), ('weight_in_grams', grams),
+                           ('height_weight_swapped', swapped), ('height_implausible', bad_height),
+                           ('weight_implausible', bad_weight), ('birth_date_invalid', bad_date),
+                           ('age_implausible', bad_age), ('bmi_implausible', implausible)):
+            flags |= np.where(mask, FLAG_BITS[name], 0)
+        self.flags = flags
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+
+    def flag_names(self, i):
+        return [name for name, _ in FLAGS if self.flags[i] & FLAG_BITS[name]]
+
+    def _group_summaries(self, np, groups, n_groups):
+        """Summary dict per group index (0..n_groups-1)"""
+        measured = ~np.isnan(self.bmi)
+
+        def count(mask):
+            return np.bincount(groups, weights=mask, minlength=n_groups).astype(np.int64)
+
+        def mean(values, mask):
+            total = np.bincount(groups, weights=np.where(mask, values, 0), minlength=n_groups)
+            counts = count(mask)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(counts > 0, total / counts, np.nan), counts
+
+        students = np.bincount(groups, minlength=n_groups)
+        mean_height, _ = mean(self.height, ~np.isnan(self.height))
+        mean_weight, _ = mean(self.weight, ~np.isnan(self.weight))
+        mean_bmi, n_measured = mean(self.bmi, measured)
+        mean_z, n_z = mean(self.z, self.has_z)
+        categories = np.bincount(groups[self.has_z] * len(CATEGORIES) + self.category[self.has_z],
+                                 minlength=n_groups * len(CATEGORIES)).reshape(n_groups, len(CATEGORIES))
+        bands = np.bincount(groups[self.has_z] * len(PERCENTILE_BANDS) + self.band[self.has_z],
+                            minlength=n_groups * len(PERCENTILE_BANDS)).reshape(n_groups, len(PERCENTILE_BANDS))
+        eyes = {c: count(mask) for c, mask in self.eye_conditions.items()}
+        any_eye = count(np.logical_or.reduce(list(self.eye_conditions.values())))
+        flagged = count(self.flags != 0)
+
+        def rounded(value, digits):
+            return None if np.isnan(value) else round(float(value), digits)
+
+        return [{
+            'students': int(students[g]),
+            'measured': int(n_measured[g]),
+            'with_zscore': int(n_z[g]),
+            'mean_height_cm': rounded(mean_height[g], 1),
+            'mean_weight_kg': rounded(mean_weight[g], 1),
+            'mean_bmi': rounded(mean_bmi[g], 2),
+            'mean_bmi_z': rounded(mean_z[g], 2),
+            'bmi_for_age': [{'value': name, 'count': int(categories[g, k])} for k, name in enumerate(CATEGORIES)],
+            'percentile_bands': [{'value': name, 'count': int(bands[g, k])} for k, name in enumerate(PERCENTILE_BANDS)],
+            'eye_conditions': [{'value': c, 'count': int(eyes[c][g])} for c in EYE_CONDITIONS],
+            'any_eye_condition': int(any_eye[g]),
+            'flagged': int(flagged[g]),
+        } for g in range(n_groups)]
+
+    def school_summary(self):
+        import numpy as np
+
+        summary = self._group_summaries(np, np.zeros(self.count, dtype=np.int64), 1)[0]
+        summary['flags'] = [{'value': name, 'label': label, 'count': int(np.count_nonzero(self.flags & FLAG_BITS[name]))}
+                            for name, label in FLAGS]
+        return summary
+
+    def class_summaries(self):
+        """[{class, ...summary}] in natural class order"""
+        import numpy as np
+
+        names, groups = np.unique(self.classes, return_inverse=True)
+        summaries = self._group_summaries(np, groups.reshape(-1), len(names))
+        result = [dict(summary, **{'class': str(name)}) for name, summary in zip(names, summaries)]
+        return sorted(result, key=lambda item: class_sort_key(item['class']))
+
+    def student(self, i):
+        def number(value, digits):
+            return None if value != value else round(float(value), digits)
+
+        has_z = bool(self.has_z[i])
+        return {
+            'id': None if self.ids[i] is None else int(self.ids[i]),
+            'full_name': self.names[i],
+            'class': str(self.classes[i]),
+            'age_months': int(self.age_months[i]) if self.age_months[i] >= 0 else None,
+            'height_cm': number(self.height[i], 1),
+            'weight_kg': number(self.weight[i], 1),
+            'bmi': number(self.bmi[i], 2),
+            'bmi_z': number(self.z[i], 2),
+            'percentile': number(self.percentile[i], 1) if has_z else None,
+            'percentile_band': PERCENTILE_BANDS[self.band[i]] if has_z else None,
+            'bmi_for_age': CATEGORIES[self.category[i]] if has_z else None,
+            'flags': self.flag_names(i),
+        }
+
+    def flagged(self, limit=None):
+        import numpy as np
+
+        rows = np.flatnonzero(self.flags != 0)
+        if limit is not None:
+            rows = rows[:limit]
+        return [dict(self.student(i), raw_height=_raw(self.raw_height[i]), raw_weight=_raw(self.raw_weight[i]))
+                for i in rows]
+
+    def students(self):
+        return [self.student(i) for i in range(self.count)]
+
+    def sheets(self):
+        """Extra XLSX sheets: [(title, header, rows)] - per-class summary and students to check"""
+        header = (['Lớp', 'Sĩ số', 'Có số đo', 'Chiều cao TB (cm)', 'Cân nặng TB (kg)', 'BMI TB', 'Z-score BMI TB']
+                  + list(CATEGORIES) + ['Có bệnh về mắt', 'Cận thị', 'Cần kiểm tra'])
+        summaries = self.class_summaries() + [dict(self.school_summary(), **{'class': 'Toàn trường'})]
+        rows = []
+        for s in summaries:
+            eyes = {e['value']: e['count'] for e in s['eye_conditions']}
+            rows.append([s['class'], s['students'], s['measured'], s['mean_height_cm'], s['mean_weight_kg'],
+                         s['mean_bmi'], s['mean_bmi_z']] + [c['count'] for c in s['bmi_for_age']]
+                        + [s['any_eye_condition'], eyes.get('Cận thị', 0), s['flagged']])
+
+        check_header = ['STT', 'Họ và tên', 'Lớp', 'Chiều cao đã nhập', 'Cân nặng đã nhập',
+                        'Chiều cao (cm)', 'Cân nặng (kg)', 'BMI', 'Z-score BMI', 'Vấn đề']
+        check_rows = [[s['id'], s['full_name'], s['class'], s['raw_height'], s['raw_weight'], s['height_cm'],
+                       s['weight_kg'], s['bmi'], s['bmi_z'], '; '.join(FLAG_LABELS[f] for f in s['flags'])]
+                      for s in self.flagged()]
+        return [('Sức khỏe theo lớp', header, rows), ('Số đo cần kiểm tra', check_header, check_rows)]
+
+
+def _raw(value):
+    return None if value != value else float(value)
@@ -0,0 +1,170 @@
+"""
+Idempotency-Key cho các request ghi (save-student).
+
+Mạng di động chập chờn làm trình duyệt gửi lại cùng một bài nộp nhiều lần; mỗi lần
+lại SELECT + UPDATE 60 cột. Client gửi kèm header Idempotency-Key (một key cho mỗi
+nội dung bài nộp); response đầu tiên được lưu lại trong bảng idempotency_keys của
+chính DB ứng dụng (chung cho mọi worker, không cần Redis) và các lần gửi lại nhận
+đúng response đó mà không chạm vào bảng students.
+
+- Key đang được xử lý (request đầu chưa xong) -> 409, client thử lại sau.
+- Cùng key nhưng nội dung khác -> 422.
+- Response 5xx không được lưu: key được nhả để lần thử lại chạy thật.
+- Key hết hạn sau IDEMPOTENCY_TTL giây; bảng bị cắt về IDEMPOTENCY_MAX_KEYS dòng
+  mới nhất, dọn định kỳ sau mỗi IDEMPOTENCY_PRUNE_EVERY lần ghi của process.
+"""
+import hashlib
+import time
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+IDEMPOTENCY_TTL = 24 * 3600
+IDEMPOTENCY_MAX_KEYS = 100000
+IDEMPOTENCY_PRUNE_EVERY = 200
+
+DDL = {
+    'sqlite': '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            status INTEGER,
+            body TEXT,
+            created_at REAL NOT NULL
+        )
+    ''',
+    'postgresql': '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key VARCHAR(255) PRIMARY KEY,
+            fingerprint VARCHAR(64) NOT NULL,
+            status INTEGER,
+            body TEXT,
+            created_at DOUBLE PRECISION NOT NULL
+        )
+    ''',
+}
+INDEX_DDL = 'CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys(created_at)'
+
+
+class InvalidKeyError(ValueError):
+    pass
+
+
+def fingerprint(body):
+    """Hash of the raw request body; a key may only be reused with the same body"""
+    return hashlib.sha256(body or b'').hexdigest()
+
+
+def validate_key(key):
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_MAX_KEY_LENGTH or not key.isprintable():
+        raise InvalidKeyError(f'{IDEMPOTENCY_HEADER} phải có 1-{IDEMPOTENCY_MAX_KEY_LENGTH} ký tự in được')
+    return key
+
+
+class IdempotencyStore:
+    """Stored responses per Idempotency-Key; see module docstring.
+
+    `connect` opens a DB connection for reads; `run_write(func, *args)` runs
+    func(cursor, *args) in a committed write transaction and returns its result.
+    """
+
+    def __init__(self, connect, run_write, db_type, placeholder, ttl=IDEMPOTENCY_TTL,
+                 max_keys=IDEMPOTENCY_MAX_KEYS, stale_after=60):
+        self.connect = connect
+        self.run_write = run_write
+        self.db_type = db_type
+        self.placeholder = placeholder
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # Sau từng này giây key còn "đang xử lý" coi như request đầu đã chết
+        self.stale_after = stale_after
+        self._writes = 0
+
+    def ensure_table(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(DDL[self.db_type])
+        cursor.execute(INDEX_DDL)
+        conn.commit()
+
+    def _state(self, row, body_hash, now):
+        """'done' / 'busy' / 'mismatch' for an existing row, or None if it can be reused"""
+        stored_hash, status, body, created_at = row
+        if now - created_at >= self.ttl:
+            return None
+        if stored_hash != body_hash:
+            return 'mismatch'
+        if status is not None:
+            return 'done'
+        return 'busy' if now - created_at < self.stale_after else None
+
+    def lookup(self, key, body_hash):
+        """(state, (status, body) or None) from a read-only check; state is None for unknown keys"""
+        p = self.placeholder
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT fingerprint, status, body, created_at FROM idempotency_keys WHERE key = {p}',
+                           (key,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None, None
+        state = self._state(row, body_hash, time.time())
+        return state, ((row[1], row[2]) if state == 'done' else None)
+
+    def claim(self, key, body_hash):
+        """Reserve the key for this request; returns the same (state, response) as lookup, state 'new' when reserved"""
+        return self.run_write(self._claim, key, body_hash, time.time())
+
+    def _claim(self, cursor, key, body_hash, now):
+        p = self.placeholder
+        cursor.execute(f'SELECT fingerprint, status, body, created_at FROM idempotency_keys WHERE key = {p}', (key,))
+        row = cursor.fetchone()
+        if row is not None:
+            state = self._state(row, body_hash, now)
+            if state is not None:
+                return state, ((row[1], row[2]) if state == 'done' else None)
+            cursor.execute(f'''
+                UPDATE idempotency_keys SET fingerprint = {p}, status = NULL, body = NULL, created_at = {p}
+                WHERE key = {p}
+            ''', (body_hash, now, key))
+            return 'new', None
+        cursor.execute(f'''
+            INSERT INTO idempotency_keys (key, fingerprint, created_at) VALUES ({p}, {p}, {p})
+            ON CONFLICT (key) DO NOTHING
+        ''', (key, body_hash, now))
+        # PostgreSQL: request khác cùng key vừa chèn trước
+        return ('new', None) if cursor.rowcount else ('busy', None)
+
+    def complete(self, key, status, body):
+        """Store the response of a claimed key (5xx releases it instead)"""
+        if status >= 500:
+            self.release(key)
+            return
+        self._writes += 1
+        prune = self._writes % IDEMPOTENCY_PRUNE_EVERY == 0
+        self.run_write(self._complete, key, status, body, prune)
+
+    def _complete(self, cursor, key, status, body, prune):
+        p = self.placeholder
+        cursor.execute(f'UPDATE idempotency_keys SET status = {p}, body = {p} WHERE key = {p}', (status, body, key))
+        if prune:
+            self._prune(cursor)
+
+    def release(self, key):
+        p = self.placeholder
+        self.run_write(lambda cursor: cursor.execute(f'DELETE FROM idempotency_keys WHERE key = {p}', (key,)))
+
+    def _prune(self, cursor):
+        p = self.placeholder
+        cursor.execute(f'DELETE FROM idempotency_keys WHERE created_at < {p}', (time.time() - self.ttl,))
+        expired = cursor.rowcount
+        cursor.execute(f'SELECT created_at FROM idempotency_keys ORDER BY created_at DESC LIMIT 1 OFFSET {p}',
+                       (self.max_keys,))
+        row = cursor.fetchone()
+        if row is not None:
+            cursor.execute(f'DELETE FROM idempotency_keys WHERE created_at <= {p}', (row[0],))
+            expired += cursor.rowcount
+        if expired:
+            print(f"[IDEMPOTENCY] Pruned {expired} keys")
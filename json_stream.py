@@ -0,0 +1,87 @@
+"""
+Export JSON/NDJSON dạng stream, đọc trực tiếp từ cursor.
+
+Không dựng DataFrame: thứ tự và tên key (nhãn tiếng Việt) được tính một lần từ
+cursor.description, mỗi dòng chỉ còn chuyển vài giá trị (số nguyên, ngày) rồi
+json-encode bằng encoder C. Mỗi lô fetchmany được gửi đi ngay nên client nhận
+byte đầu tiên sau lô đầu tiên và bộ nhớ không phụ thuộc tổng số dòng.
+
+Giá trị giống export JSON thường (export_frames.export_records): chiều cao, cân
+nặng, năm sinh là số; ngày là chuỗi ISO; ô trống là null. Khác biệt duy nhất là
+kiểu được quyết định theo từng ô thay vì theo cả cột.
+"""
+import datetime as dt
+import json
+
+from export_frames import DATE_COLUMNS, INTEGER_COLUMNS
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _integer(value):
+    """'160' -> 160; text that is not an integer is kept as is"""
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        return int(text) if text.lstrip('-').isdigit() else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _date(value):
+    """date/datetime -> ISO text (without time zone, like the typed export)"""
+    if isinstance(value, dt.datetime):
+        return value.replace(tzinfo=None).isoformat(sep=' ')
+    if isinstance(value, dt.date):
+        return value.isoformat()
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+class RowEncoder:
+    """Key order, labels and value converters for one cursor, computed once.
+
+    Labels listed in `order` come first, the other columns keep their order
+    (same as export_frames.reorder_columns).
+    """
+
+    def __init__(self, columns, labels, order=()):
+        rank = {label: i for i, label in enumerate(dict.fromkeys(order))}
+        named = [labels.get(c, c) for c in columns]
+        self.positions = sorted(range(len(columns)), key=lambda i: (rank.get(named[i], len(rank)), i))
+        self.keys = [named[i] for i in self.positions]
+        self.converters = []
+        for j, i in enumerate(self.positions):
+            if columns[i] in INTEGER_COLUMNS:
+                self.converters.append((j, _integer))
+            elif columns[i] in DATE_COLUMNS:
+                self.converters.append((j, _date))
+
+    def encode(self, row):
+        values = [row[i] for i in self.positions]
+        for j, convert in self.converters:
+            values[j] = convert(values[j])
+        return _encoder.encode(dict(zip(self.keys, values)))
+
+
+def iter_ndjson(row_batches, encoder):
+    """One JSON object per line, one chunk per fetched batch"""
+    for rows in row_batches:
+        yield ''.join(encoder.encode(row) + '\n' for row in rows).encode('utf-8')
+
+
+def iter_json_document(row_batches, encoder, export_info):
+    """The export-json document ({"export_info": ..., "data": [...]}) written row by row"""
+    yield ('{"export_info":' + _encoder.encode(export_info) + ',"data":[').encode('utf-8')
+    separator = '\n'
+    for rows in row_batches:
+        if rows:
+            yield (separator + ',\n'.join(encoder.encode(row) for row in rows)).encode('utf-8')
+            separator = ',\n'
+    yield b'\n]}\n'
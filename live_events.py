@@ -0,0 +1,196 @@
+"""
+Thông báo thêm/sửa/xóa học sinh cho trang admin qua Server-Sent Events.
+
+Nguồn sự kiện là bảng student_changes (xem change_feed), nên thay đổi từ mọi
+worker gunicorn và mọi đường ghi đều tới được client mà không cần Redis. Mỗi
+process có một ChangeBroker: một thread đọc các thay đổi mới (chỉ chạy khi có
+client đang nghe) rồi chia cho tất cả client của process đó, nên số truy vấn DB
+không tăng theo số tab admin. Ghi trong cùng process gọi notify() để thread đọc
+ngay thay vì đợi tới chu kỳ sau.
+
+Sự kiện (id là seq của change log, EventSource tự gửi lại qua Last-Event-ID khi
+kết nối lại nên không bị sót):
+- changes: {"total": N, "changes": [{"op": "upsert"|"delete", "id": .., "student": {..}}]}
+- reset:   {"total": N}, khi có quá nhiều thay đổi một lúc (xóa toàn bộ, tạo dữ
+  liệu mẫu, import) hoặc client đọc không kịp -> client tải lại trang hiện tại
+"""
+import json
+import queue
+import threading
+import time
+
+from change_feed import feed_cursor, fetch_changes
+
+EVENTS_MIMETYPE = 'text/event-stream'
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_KEEPALIVE = 15
+EVENTS_RETRY_MS = 3000
+# Nhiều thay đổi hơn mức này trong một lần đọc thì gửi reset thay cho từng dòng
+EVENTS_BATCH_LIMIT = 200
+EVENTS_QUEUE_SIZE = 50
+
+
+class BrokerFullError(RuntimeError):
+    pass
+
+
+def format_event(event, data, event_id=None):
+    """One SSE message as bytes"""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscription:
+    def __init__(self, seq):
+        self.seq = seq
+        self.queue = queue.Queue(EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class ChangeBroker:
+    """Reads student_changes once per process and fans the batches out to SSE subscribers.
+
+    `select_list` is a callable returning the SELECT list of the student fields
+    sent with upserts (the columns of the admin table).
+    """
+
+    def __init__(self, connect, placeholder, select_list, max_clients, poll_interval=EVENTS_POLL_INTERVAL,
+                 db_type='sqlite'):
+        self.connect = connect
+        self.placeholder = placeholder
+        self.db_type = db_type
+        self.select_list = select_list
+        self.max_clients = max_clients
+        self.poll_interval = poll_interval
+        self.reset()
+
+    def reset(self):
+        """Start from a clean state (after fork the parent's poller thread does not exist)"""
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers = set()
+        self._thread = None
+        self._seq = None
+
+    def notify(self):
+        """Wake the poller now instead of at the next interval"""
+        self._wake.set()
+
+    def subscribe(self):
+        """New subscription starting at the current end of the change log.
+
+        Raises BrokerFullError when max_clients streams are already open.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise BrokerFullError('Quá nhiều kết nối theo dõi thay đổi, vui lòng thử lại sau')
+            if self._seq is None:
+                conn = self.connect()
+                try:
+                    self._seq = feed_cursor(conn.cursor(), self.db_type)
+                finally:
+                    conn.close()
+            subscription = Subscription(self._seq)
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='change-broker', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Drop the subscription; calling it again is harmless"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # Thread dừng khi không còn client, subscribe() sẽ tạo lại
+                    self._thread = None
+                    self._seq = None
+                    return
+                subscribers = list(self._subscribers)
+                since = self._seq
+            try:
+                message = self.poll(since)
+            except Exception as e:
+                print(f"[EVENTS] ⚠️ Reading changes failed: {e}")
+                continue
+            if message is None:
+                continue
+            with self._lock:
+                self._seq = message[0]
+            for subscription in subscribers:
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    subscription.overflowed = True
+
+    def poll(self, since):
+        """(seq, event bytes) for the changes after seq `since`, or None if there are none"""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            page = fetch_changes(cursor, ('seq', since), self.placeholder, self.select_list(), EVENTS_BATCH_LIMIT,
+                                 self.db_type)
+            if not page['changes']:
+                return None
+            cursor.execute('SELECT COUNT(*) FROM students')
+            total = cursor.fetchone()[0]
+            if page['has_more']:
+                seq = feed_cursor(cursor, self.db_type)
+                return seq, format_event('reset', {'total': total}, seq)
+        finally:
+            conn.close()
+        changes = [{'op': c['op'], 'id': c['id'], **({'student': c['student']} if 'student' in c else {})}
+                   for c in page['changes']]
+        seq = int(page['cursor'])
+        return seq, format_event('changes', {'total': total, 'changes': changes}, seq)
+
+    def _reset_event(self):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            seq = feed_cursor(cursor, self.db_type)
+            cursor.execute('SELECT COUNT(*) FROM students')
+            total = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        return seq, format_event('reset', {'total': total}, seq)
+
+    def stream(self, subscription, last_event_id=None, lifetime=300, keepalive=EVENTS_KEEPALIVE):
+        """SSE body for one client. Ends after `lifetime` seconds; the browser reconnects with Last-Event-ID."""
+        try:
+            yield f'retry: {EVENTS_RETRY_MS}\n\n'.encode('utf-8')
+            delivered = subscription.seq
+            message = self.poll(last_event_id) if last_event_id is not None and last_event_id < delivered else None
+            if message is not None:
+                # Bù các thay đổi trong lúc mất kết nối; trùng lặp với lô kế tiếp không sao vì client áp dụng lại được
+                delivered = max(delivered, message[0])
+                yield message[1]
+            else:
+                yield format_event('ready', {'cursor': delivered}, delivered)
+
+            deadline = time.monotonic() + lifetime
+            while time.monotonic() < deadline:
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    delivered, event = self._reset_event()
+                    yield event
+                try:
+                    seq, event = subscription.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    yield b': ping\n\n'
+                    continue
+                if seq > delivered:
+                    delivered = seq
+                    yield event
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,671 @@
+"""
+Xuất danh sách học sinh ra PDF, render từng trang ngay khi đọc dòng từ cursor.
+
+- Font TrueType có dấu tiếng Việt (PDF_FONT_PATH hoặc font hệ thống) được nhúng
+  một lần cho cả file dạng CIDFontType2/Identity-H, mọi trang dùng chung một
+  dictionary Resources. Font được ghi ở cuối file, chỉ giữ outline của các glyph
+  đã dùng.
+- Bảng có độ rộng cột cố định cho mọi trang, ô dài bị cắt bằng "…", nên mỗi trang
+  chứa một số dòng cố định và được ghi ra ngay khi đủ dòng. Bộ nhớ chỉ phụ thuộc
+  vào một trang, không phụ thuộc tổng số học sinh.
+- Xuất theo lớp: mỗi lớp bắt đầu trang mới (hoặc một file PDF riêng trong ZIP);
+  các trang của từng lớp được render và nén song song bằng process pool của
+  class_workbook.
+
+Chỉ dùng thư viện chuẩn để process con (spawn) khởi động nhanh.
+"""
+import hashlib
+import os
+import re
+import struct
+import unicodedata
+import zlib
+from functools import lru_cache
+
+from class_workbook import DEFAULT_HEADER_COLOR, ZipStream, render_all, stored_entry
+
+PDF_MIMETYPE = 'application/pdf'
+
+A4_LANDSCAPE = (841.89, 595.28)
+MARGIN = 28
+CELL_PADDING = 3
+FOOTER_HEIGHT = 18
+
+# Font hệ thống có đủ dấu tiếng Việt, thử lần lượt khi không đặt PDF_FONT_PATH
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',          # Debian/Ubuntu (fonts-dejavu-core)
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',                   # Fedora/Alpine
+    '/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',             # macOS
+    'C:\\Windows\\Fonts\\arial.ttf',
+)
+
+# Độ rộng tương đối của cột theo trường; trường khác dùng DEFAULT_COLUMN_WEIGHT
+COLUMN_WEIGHTS = {
+    'full_name': 3.2, 'email': 3.2, 'class': 1, 'khoi': 0.8, 'gender': 1, 'birth_date': 1.5,
+    'cccd_date': 1.5, 'passport_date': 1.5, 'created_at': 2.2, 'height': 1, 'weight': 1,
+    'father_birth_year': 1, 'mother_birth_year': 1, 'guardian_birth_year': 1,
+    'father_name': 2.6, 'mother_name': 2.6, 'guardian_name': 2.6,
+    'permanent_street': 4, 'current_address_detail': 4, 'birthplace_detail': 3.5,
+}
+DEFAULT_COLUMN_WEIGHT = 2
+
+# Bảng trong font TrueType cần cho CIDFontType2; GSUB/GPOS/kern/... không dùng tới
+_SUBSET_TABLES = (b'OS/2', b'cmap', b'cvt ', b'fpgm', b'glyf', b'head', b'hhea', b'hmtx',
+                  b'loca', b'maxp', b'name', b'post', b'prep')
+
+_ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2}))?')
+
+
+class FontError(RuntimeError):
+    pass
+
+
+def find_font(path=None):
+    """Path of the TrueType font to embed: `path` if given, else the first system candidate"""
+    if path:
+        if not os.path.isfile(path):
+            raise FontError(f'Không tìm thấy font PDF: {path}')
+        return path
+    for candidate in FONT_CANDIDATES:
+        if os.path.isfile(candidate):
+            return candidate
+    raise FontError('Không tìm thấy font TrueType có dấu tiếng Việt, hãy đặt PDF_FONT_PATH')
+
+
+class TrueTypeFont:
+    """The parts of a TrueType (glyf) font needed to lay out text and embed a subset"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] not in (b'\x00\x01\x00\x00', b'true'):
+            raise FontError(f'Font không phải TrueType (glyf): {os.path.basename(path)}')
+        self.path = path
+        self.data = data
+        num_tables = struct.unpack('>H', data[4:6])[0]
+        self.tables = {}
+        for i in range(num_tables):
+            tag, _, offset, length = struct.unpack('>4sIII', data[12 + 16 * i:28 + 16 * i])
+            self.tables[tag] = (offset, length)
+        for tag in (b'head', b'hhea', b'hmtx', b'maxp', b'cmap', b'loca', b'glyf'):
+            if tag not in self.tables:
+                raise FontError(f"Font thiếu bảng {tag.decode()}: {os.path.basename(path)}")
+
+        head = self._table(b'head')
+        units_per_em = struct.unpack('>H', head[18:20])[0]
+        self.scale = 1000 / units_per_em
+        self.bbox = [round(v * self.scale) for v in struct.unpack('>hhhh', head[36:44])]
+        long_loca = struct.unpack('>h', head[50:52])[0] == 1
+
+        hhea = self._table(b'hhea')
+        ascent, descent = struct.unpack('>hh', hhea[4:8])
+        self.ascent = round(ascent * self.scale)
+        self.descent = round(descent * self.scale)
+        self.num_glyphs = struct.unpack('>H', self._table(b'maxp')[4:6])[0]
+
+        num_metrics = struct.unpack('>H', hhea[34:36])[0]
+        hmtx = self._table(b'hmtx')
+        advances = [struct.unpack('>H', hmtx[4 * i:4 * i + 2])[0] for i in range(num_metrics)]
+        advances += [advances[-1]] * (self.num_glyphs - num_metrics)
+        self.advances = [round(a * self.scale) for a in advances]
+
+        loca = self._table(b'loca')
+        if long_loca:
+            self.loca = list(struct.unpack(f'>{self.num_glyphs + 1}I', loca[:4 * (self.num_glyphs + 1)]))
+        else:
+            self.loca = [v * 2 for v in struct.unpack(f'>{self.num_glyphs + 1}H', loca[:2 * (self.num_glyphs + 1)])]
+
+        self.cmap = self._parse_cmap(self._table(b'cmap'))
+        self.cap_height = self.ascent
+        if b'OS/2' in self.tables:
+            os2 = self._table(b'OS/2')
+            if struct.unpack('>H', os2[:2])[0] >= 2 and len(os2) >= 90:
+                self.cap_height = round(struct.unpack('>h', os2[88:90])[0] * self.scale)
+        self.name = self._postscript_name() or re.sub(r'[^A-Za-z0-9-]', '', os.path.splitext(os.path.basename(path))[0])
+        self._ellipsis = self.glyphs('…') if self.cmap.get(0x2026) else self.glyphs('...')
+
+    def _table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    @staticmethod
+    def _parse_cmap(cmap):
+        subtables = {}
+        for i in range(struct.unpack('>H', cmap[2:4])[0]):
+            platform, encoding, offset = struct.unpack('>HHI', cmap[4 + 8 * i:12 + 8 * i])
+            subtables[(platform, encoding)] = offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            if key not in subtables:
+                continue
+            offset = subtables[key]
+            fmt = struct.unpack('>H', cmap[offset:offset + 2])[0]
+            if fmt == 12:
+                mapping = {}
+                count = struct.unpack('>I', cmap[offset + 12:offset + 16])[0]
+                for j in range(count):
+                    start, end, gid = struct.unpack('>III', cmap[offset + 16 + 12 * j:offset + 28 + 12 * j])
+                    for code in range(start, end + 1):
+                        mapping[code] = gid + code - start
+                return mapping
+            if fmt == 4:
+                mapping = {}
+                segments = struct.unpack('>H', cmap[offset + 6:offset + 8])[0] // 2
+                ends_at = offset + 14
+                starts_at = ends_at + 2 * segments + 2
+                deltas_at = starts_at + 2 * segments
+                ranges_at = deltas_at + 2 * segments
+                for s in range(segments):
+                    end, start = (struct.unpack('>H', cmap[p + 2 * s:p + 2 * s + 2])[0] for p in (ends_at, starts_at))
+                    delta = struct.unpack('>h', cmap[deltas_at + 2 * s:deltas_at + 2 * s + 2])[0]
+                    range_offset = struct.unpack('>H', cmap[ranges_at + 2 * s:ranges_at + 2 * s + 2])[0]
+                    for code in range(start, min(end, 0xFFFE) + 1):
+                        if range_offset == 0:
+                            gid = (code + delta) & 0xFFFF
+                        else:
+                            at = ranges_at + 2 * s + range_offset + 2 * (code - start)
+                            gid = struct.unpack('>H', cmap[at:at + 2])[0]
+                            gid = (gid + delta) & 0xFFFF if gid else 0
+                        if gid:
+                            mapping[code] = gid
+                return mapping
+        raise FontError('Font không có bảng cmap Unicode')
+
+    def _postscript_name(self):
+        if b'name' not in self.tables:
+            return None
+        table = self._table(b'name')
+        count, strings_at = struct.unpack('>HH', table[2:6])
+        for i in range(count):
+            platform, _, _, name_id, length, offset = struct.unpack('>HHHHHH', table[6 + 12 * i:18 + 12 * i])
+            if name_id != 6:
+                continue
+            raw = table[strings_at + offset:strings_at + offset + length]
+            name = raw.decode('utf-16-be' if platform in (0, 3) else 'latin-1', errors='ignore')
+            name = re.sub(r'[^A-Za-z0-9-]', '', name)
+            if name:
+                return name
+        return None
+
+    def glyphs(self, text):
+        """[(glyph id, source character)] for text, NFC first.
+
+        A precomposed letter the font lacks (ệ, ữ, ...) is drawn as its base
+        letter plus combining marks when the font has those.
+        """
+        run = []
+        for char in unicodedata.normalize('NFC', text):
+            gid = self.cmap.get(ord(char))
+            if gid is None:
+                parts = unicodedata.normalize('NFD', char)
+                gids = [self.cmap.get(ord(part), 0) for part in parts]
+                if len(parts) > 1 and all(gids):
+                    run.extend(zip(gids, parts))
+                    continue
+                gid = 0
+            run.append((gid, char))
+        return run
+
+    def run_width(self, run, size):
+        return sum(self.advances[gid] for gid, _ in run) * size / 1000
+
+    def fit(self, text, width, size):
+        """Glyph run of text, cut with an ellipsis so it is at most `width` points wide"""
+        run = self.glyphs(text)
+        if self.run_width(run, size) <= width:
+            return run
+        limit = width - self.run_width(self._ellipsis, size)
+        total = 0
+        for i, (gid, _) in enumerate(run):
+            total += self.advances[gid] * size / 1000
+            if total > limit:
+                return run[:i] + self._ellipsis
+        return run
+
+    def covers(self, text):
+        return all(gid for gid, _ in self.glyphs(text))
+
+    def _glyph_data(self, gid):
+        offset = self.tables[b'glyf'][0]
+        return self.data[offset + self.loca[gid]:offset + self.loca[gid + 1]]
+
+    def _components(self, gid):
+        """Glyph ids a composite glyph is built from"""
+        data = self._glyph_data(gid)
+        if len(data) < 10 or struct.unpack('>h', data[:2])[0] >= 0:
+            return []
+        components, at = [], 10
+        while True:
+            flags, component = struct.unpack('>HH', data[at:at + 4])
+            components.append(component)
+            at += 4 + (4 if flags & 0x0001 else 2)
+            if flags & 0x0008:
+                at += 2
+            elif flags & 0x0040:
+                at += 4
+            elif flags & 0x0080:
+                at += 8
+            if not flags & 0x0020:
+                return components
+
+    def subset(self, gids):
+        """Font file keeping only the outlines of `gids` (glyph ids stay the same)"""
+        keep = set(gids) | {0}
+        stack = list(keep)
+        while stack:
+            for component in self._components(stack.pop()):
+                if component not in keep:
+                    keep.add(component)
+                    stack.append(component)
+
+        glyf = bytearray()
+        loca = []
+        for gid in range(self.num_glyphs):
+            loca.append(len(glyf))
+            if gid in keep:
+                glyf += self._glyph_data(gid)
+                glyf += b'\0' * (-len(glyf) % 4)
+        loca.append(len(glyf))
+
+        head = bytearray(self._table(b'head'))
+        head[8:12] = b'\0\0\0\0'                    # checkSumAdjustment, tính lại bên dưới
+        head[50:52] = struct.pack('>h', 1)          # loca dạng long
+        tables = {tag: self._table(tag) for tag in _SUBSET_TABLES if tag in self.tables}
+        tables.update({b'glyf': bytes(glyf), b'loca': struct.pack(f'>{len(loca)}I', *loca), b'head': bytes(head)})
+        return _build_sfnt(tables)
+
+
+def _checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+def _build_sfnt(tables):
+    tags = sorted(tables)
+    count = len(tags)
+    power = 1 << (count.bit_length() - 1)
+    header = struct.pack('>IHHHH', 0x00010000, count, power * 16, power.bit_length() - 1, count * 16 - power * 16)
+    offset = 12 + 16 * count
+    directory, body = [], []
+    for tag in tags:
+        data = tables[tag]
+        directory.append(struct.pack('>4sIII', tag, _checksum(data), offset, len(data)))
+        padded = data + b'\0' * (-len(data) % 4)
+        body.append(padded)
+        offset += len(padded)
+    font = bytearray(header + b''.join(directory) + b''.join(body))
+    head_at = 12 + 16 * count + sum(len(b) for t, b in zip(tags, body) if t < b'head')
+    font[head_at + 8:head_at + 12] = struct.pack('>I', (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+@lru_cache(maxsize=4)
+def load_font(path):
+    """Parsed font, cached per process (the render pool reuses it across jobs)"""
+    return TrueTypeFont(path)
+
+
+def format_cell(value):
+    """Text shown in a table cell: ISO dates as dd/mm/yyyy, 160.0 as 160"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f'{value:g}'
+    text = str(value).strip()
+    match = _ISO_DATE.match(text)
+    if match:
+        year, month, day, hour, minute = match.groups()
+        return f'{day}/{month}/{year} {hour}:{minute}' if hour else f'{day}/{month}/{year}'
+    return ' '.join(text.split())
+
+
+def _hex_color(color):
+    color = color.lstrip('#')
+    return ' '.join(f'{int(color[i:i + 2], 16) / 255:.3f}' for i in (0, 2, 4))
+
+
+def _hex_run(run):
+    return ''.join(f'{gid:04X}' for gid, _ in run)
+
+
+class TableLayout:
+    """Fixed table geometry shared by every page of a document.
+
+    The first column is a running number (STT); `weights` size the others.
+    """
+
+    def __init__(self, font, header, weights, font_size=9, header_color=DEFAULT_HEADER_COLOR, page_size=A4_LANDSCAPE):
+        self.font = font
+        self.header = ['STT'] + list(header)
+        self.size = font_size
+        self.page_width, self.page_height = page_size
+        self.header_color = _hex_color(header_color)
+        usable = self.page_width - 2 * MARGIN
+        index_width = font.run_width(font.glyphs('0000'), font_size) + 2 * CELL_PADDING
+        total = sum(weights) or 1
+        self.widths = [index_width] + [(usable - index_width) * w / total for w in weights]
+        self.row_height = round(font_size * 1.9, 2)
+        self.header_height = round(font_size * 3.2, 2)
+        self.title_size = font_size + 5
+        self.line_height = round(font_size * 1.8, 2)
+        # Nhãn cột dài được xuống tối đa hai dòng, tính một lần cho cả file
+        self._header_lines = [self._wrap(label, width - 2 * CELL_PADDING) for label, width in zip(self.header, self.widths)]
+
+    def _wrap(self, label, width):
+        words = str(label).split()
+        first = ''
+        for i, word in enumerate(words):
+            candidate = f'{first} {word}'.strip()
+            if first and self.font.run_width(self.font.glyphs(candidate), self.size) > width:
+                return [first, ' '.join(words[i:])]
+            first = candidate
+        return [first]
+
+    def _title_height(self, title_lines):
+        if not title_lines:
+            return 0
+        return self.title_size * 1.6 + self.line_height * (len(title_lines) - 1) + 6
+
+    def rows_per_page(self, title_lines=()):
+        available = (self.page_height - 2 * MARGIN - FOOTER_HEIGHT
+                     - self._title_height(title_lines) - self.header_height)
+        return max(1, int(available // self.row_height))
+
+    def render(self, rows, first_number, used, title_lines=(), footer_left='', footer_right=''):
+        """Content stream (uncompressed) of one page; records used glyphs in `used`"""
+        font, size = self.font, self.size
+        ops = []
+
+        def text(run, x, y, font_size=size):
+            for gid, char in run:
+                used.setdefault(gid, char)
+            ops.append(f'1 0 0 1 {x:.2f} {y:.2f} Tm /F1 {font_size} Tf <{_hex_run(run)}> Tj')
+
+        top = self.page_height - MARGIN
+        ops.append('BT 0 0 0 rg')
+        for i, line in enumerate(title_lines):
+            line_size = self.title_size if i == 0 else size
+            top -= self.title_size * 1.2 if i == 0 else self.line_height
+            run = font.fit(line, self.page_width - 2 * MARGIN, line_size)
+            text(run, (self.page_width - font.run_width(run, line_size)) / 2, top, line_size)
+        ops.append('ET')
+        if title_lines:
+            top -= self.title_size * 0.4 + 6
+
+        table_width = sum(self.widths)
+        body_height = self.row_height * len(rows)
+        bottom = top - self.header_height - body_height
+
+        # Nền tiêu đề cột và lưới
+        ops.append(f'{self.header_color} rg {MARGIN} {top - self.header_height:.2f} {table_width:.2f} {self.header_height:.2f} re f')
+        ops.append('0.6 G 0.5 w')
+        ops.append(f'{MARGIN} {bottom:.2f} {table_width:.2f} {top - bottom:.2f} re S')
+        x = MARGIN
+        for width in self.widths[:-1]:
+            x += width
+            ops.append(f'{x:.2f} {bottom:.2f} m {x:.2f} {top:.2f} l S')
+        for r in range(len(rows) + 1):
+            y = top - self.header_height - self.row_height * r
+            ops.append(f'{MARGIN} {y:.2f} m {MARGIN + table_width:.2f} {y:.2f} l S')
+
+        ops.append('BT 1 1 1 rg')
+        x = MARGIN
+        for lines, width in zip(self._header_lines, self.widths):
+            block = len(lines) * size * 1.15
+            y = top - (self.header_height - block) / 2 - size
+            for line in lines:
+                run = font.fit(line, width - 2 * CELL_PADDING, size)
+                text(run, x + (width - font.run_width(run, size)) / 2, y)
+                y -= size * 1.15
+            x += width
+        ops.append('0 0 0 rg')
+        baseline = (self.row_height - font.cap_height * size / 1000) / 2
+        for r, row in enumerate(rows):
+            y = top - self.header_height - self.row_height * (r + 1) + baseline
+            x = MARGIN
+            for value, width in zip((str(first_number + r),) + tuple(row), self.widths):
+                if value:
+                    text(font.fit(value, width - 2 * CELL_PADDING, size), x + CELL_PADDING, y)
+                x += width
+        footer_size = max(size - 1, 6)
+        if footer_left:
+            text(font.fit(footer_left, (self.page_width - 2 * MARGIN) * 0.7, footer_size), MARGIN, MARGIN)
+        if footer_right:
+            run = font.glyphs(footer_right)
+            text(run, self.page_width - MARGIN - font.run_width(run, footer_size), MARGIN, footer_size)
+        ops.append('ET')
+        return '\n'.join(ops).encode('ascii')
+
+
+def _compress(data):
+    return zlib.compress(data, 6)
+
+
+class PdfDocument:
+    """Streaming PDF writer: every method returns the bytes to send next.
+
+    Pages are written as soon as they are rendered; the pages tree, the font
+    (subset of the glyphs used on all pages) and the xref table go at the end.
+    """
+
+    def __init__(self, font, page_size=A4_LANDSCAPE):
+        self.font = font
+        self.page_size = page_size
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = 1
+        self.catalog_id = self._reserve()
+        self.pages_id = self._reserve()
+        self.resources_id = self._reserve()
+        self.font_id = self._reserve()
+        self.page_ids = []
+        self.used = {}
+
+    def _reserve(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, num, body):
+        self.offsets[num] = self.offset
+        return self._emit(f'{num} 0 obj\n'.encode('ascii') + body + b'\nendobj\n')
+
+    def _stream(self, num, data, entries=''):
+        body = (f'<< /Length {len(data)} /Filter /FlateDecode {entries}>>\nstream\n'.encode('ascii')
+                + data + b'\nendstream')
+        return self._object(num, body)
+
+    def start(self):
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n') + self._object(
+            self.resources_id, f'<< /Font << /F1 {self.font_id} 0 R >> >>'.encode('ascii'))
+
+    def add_page(self, content, used=None):
+        """Write one page from its compressed content stream"""
+        if used:
+            for gid, char in used.items():
+                self.used.setdefault(gid, char)
+        content_id, page_id = self._reserve(), self._reserve()
+        self.page_ids.append(page_id)
+        width, height = self.page_size
+        page = (f'<< /Type /Page /Parent {self.pages_id} 0 R /MediaBox [0 0 {width} {height}] '
+                f'/Resources {self.resources_id} 0 R /Contents {content_id} 0 R >>')
+        return self._stream(content_id, content) + self._object(page_id, page.encode('ascii'))
+
+    def _font_objects(self):
+        font = self.font
+        gids = sorted(self.used)
+        tag = ''.join(chr(65 + b % 26) for b in hashlib.md5(repr(gids).encode('ascii')).digest()[:6])
+        base_font = f'{tag}+{font.name}'
+        cid_id, descriptor_id, file_id, unicode_id = (self._reserve() for _ in range(4))
+
+        widths = ' '.join(f'{gid} [{font.advances[gid]}]' for gid in gids)
+        cmap_lines = '\n'.join(
+            f'<{gid:04X}> <{"".join(f"{u:04X}" for u in _utf16_units(char))}>'
+            for gid, char in sorted(self.used.items()) if gid
+        )
+        to_unicode = (
+            '/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n'
+            '/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n'
+            '1 begincodespacerange <0000> <FFFF> endcodespacerange\n'
+        )
+        entries = cmap_lines.split('\n') if cmap_lines else []
+        for start in range(0, len(entries), 100):
+            chunk = entries[start:start + 100]
+            to_unicode += f'{len(chunk)} beginbfchar\n' + '\n'.join(chunk) + '\nendbfchar\n'
+        to_unicode += 'endcmap CMapName currentdict /CMap defineresource pop end end'
+
+        font_file = font.subset(gids)
+        bbox = ' '.join(str(v) for v in font.bbox)
+        return b''.join([
+            self._object(self.font_id, (
+                f'<< /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H '
+                f'/DescendantFonts [{cid_id} 0 R] /ToUnicode {unicode_id} 0 R >>').encode('ascii')),
+            self._object(cid_id, (
+                f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{base_font} '
+                f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> '
+                f'/FontDescriptor {descriptor_id} 0 R /CIDToGIDMap /Identity /DW 1000 /W [{widths}] >>').encode('ascii')),
+            self._object(descriptor_id, (
+                f'<< /Type /FontDescriptor /FontName /{base_font} /Flags 32 /FontBBox [{bbox}] /ItalicAngle 0 '
+                f'/Ascent {font.ascent} /Descent {font.descent} /CapHeight {font.cap_height} /StemV 80 '
+                f'/FontFile2 {file_id} 0 R >>').encode('ascii')),
+            self._stream(file_id, _compress(font_file), f'/Length1 {len(font_file)} '),
+            self._stream(unicode_id, _compress(to_unicode.encode('ascii'))),
+        ])
+
+    def finish(self, title=''):
+        """Font, pages tree, catalog, info and xref"""
+        kids = ' '.join(f'{p} 0 R' for p in self.page_ids)
+        info_id = self._reserve()
+        data = self._font_objects()
+        data += self._object(self.pages_id, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>'.encode('ascii'))
+        data += self._object(self.catalog_id, f'<< /Type /Catalog /Pages {self.pages_id} 0 R >>'.encode('ascii'))
+        data += self._object(info_id, f'<< /Title {_pdf_text(title)} /Producer (THPT Di An) >>'.encode('ascii'))
+        xref_at = self.offset
+        xref = [f'xref\n0 {self.next_id}\n', '0000000000 65535 f \n']
+        xref.extend(f'{self.offsets[num]:010d} 00000 n \n' for num in range(1, self.next_id))
+        xref.append(f'trailer\n<< /Size {self.next_id} /Root {self.catalog_id} 0 R /Info {info_id} 0 R >>\n'
+                    f'startxref\n{xref_at}\n%%EOF\n')
+        return data + self._emit(''.join(xref).encode('ascii'))
+
+
+def _utf16_units(char):
+    encoded = char.encode('utf-16-be')
+    return struct.unpack(f'>{len(encoded) // 2}H', encoded)
+
+
+def _pdf_text(text):
+    """PDF text string (UTF-16BE with BOM, hex) for document metadata"""
+    return '<FEFF' + ''.join(f'{u:04X}' for u in _utf16_units(text)) + '>' if text else '()'
+
+
+def _paginate(layout, rows, title_lines):
+    """Split a class's rows into pages: (rows, first number, title lines) per page"""
+    pages, start = [], 0
+    while True:
+        lines = title_lines if start == 0 else ()
+        count = layout.rows_per_page(lines)
+        pages.append((rows[start:start + count], start + 1, lines))
+        start += count
+        if start >= len(rows):
+            return pages
+
+
+def _layout(job):
+    font = load_font(job['font_path'])
+    return TableLayout(font, job['header'], job['weights'], job['font_size'], job['header_color'])
+
+
+def render_class_pages(job):
+    """Process-pool task: one class -> compressed content streams of its pages and the glyphs used"""
+    layout = _layout(job)
+    used = {}
+    pages = _paginate(layout, job['rows'], job['title_lines'])
+    contents = [
+        _compress(layout.render(rows, first, used, lines, job['footer'], f'Trang {n}/{len(pages)}'))
+        for n, (rows, first, lines) in enumerate(pages, 1)
+    ]
+    return contents, used
+
+
+def render_class_pdf(job):
+    """Process-pool task: one class -> a complete PDF file, stored as a ZIP entry"""
+    contents, used = render_class_pages(job)
+    document = PdfDocument(load_font(job['font_path']))
+    body = document.start() + b''.join(document.add_page(content, used) for content in contents)
+    return stored_entry(job['filename'], body + document.finish(job['title_lines'][0] if job['title_lines'] else ''))
+
+
+def iter_table_pdf(font_path, header, weights, row_batches, title_lines=(), footer='',
+                   font_size=9, header_color=DEFAULT_HEADER_COLOR):
+    """Stream one continuous table, writing each page as soon as it has enough rows.
+
+    row_batches yields lists of row tuples (e.g. cursor.fetchmany batches).
+    """
+    font = load_font(font_path)
+    layout = TableLayout(font, header, weights, font_size, header_color)
+    document = PdfDocument(font)
+    yield document.start()
+    pending, number, lines = [], 1, tuple(title_lines)
+    for batch in row_batches:
+        pending.extend(batch)
+        while len(pending) >= layout.rows_per_page(lines):
+            count = layout.rows_per_page(lines)
+            page = layout.render(pending[:count], number, document.used, lines, footer, f'Trang {len(document.page_ids) + 1}')
+            yield document.add_page(_compress(page))
+            del pending[:count]
+            number += count
+            lines = ()
+    if pending or not document.page_ids:
+        page = layout.render(pending, number, document.used, lines, footer, f'Trang {len(document.page_ids) + 1}')
+        yield document.add_page(_compress(page))
+    yield document.finish(title_lines[0] if title_lines else '')
+
+
+def _class_jobs(font_path, header, weights, classes, font_size, header_color):
+    for name, rows, title_lines in classes:
+        yield {
+            'name': name, 'font_path': font_path, 'header': header, 'weights': weights, 'rows': rows,
+            'title_lines': tuple(title_lines), 'footer': f'Lớp {name}', 'font_size': font_size,
+            'header_color': header_color,
+        }
+
+
+def iter_class_pdf(font_path, header, weights, classes, title='', font_size=9,
+                   header_color=DEFAULT_HEADER_COLOR, processes=1):
+    """Stream one PDF where every class starts on a new page.
+
+    classes yields (class name, rows, title lines) and may be a generator: the
+    render pool only holds the classes it is working on.
+    """
+    document = PdfDocument(load_font(font_path))
+    yield document.start()
+    jobs = _class_jobs(font_path, header, weights, classes, font_size, header_color)
+    for contents, used in render_all(render_class_pages, jobs, processes):
+        yield b''.join(document.add_page(content, used) for content in contents)
+    yield document.finish(title)
+
+
+def iter_class_pdf_zip(font_path, header, weights, classes, filename_prefix, font_size=9,
+                       header_color=DEFAULT_HEADER_COLOR, processes=1):
+    """Stream a ZIP with one PDF per class"""
+    def jobs():
+        used_names = set()
+        for job in _class_jobs(font_path, header, weights, classes, font_size, header_color):
+            name = re.sub(r'[\\/:*?"<>|]', '-', str(job['name'])).strip() or 'lop'
+            filename, n = f'{filename_prefix}_lop_{name}.pdf', 2
+            while filename.lower() in used_names:
+                filename = f'{filename_prefix}_lop_{name} ({n}).pdf'
+                n += 1
+            used_names.add(filename.lower())
+            job['filename'] = filename
+            yield job
+
+    stream = ZipStream()
+    for entry in render_all(render_class_pdf, jobs(), processes):
+        yield stream.entry(*entry)
+    yield stream.close()
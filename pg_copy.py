@@ -0,0 +1,94 @@
+"""
+COPY ... TO STDOUT của PostgreSQL làm body response dạng stream.
+
+Export CSV qua pandas đọc toàn bộ kết quả vào worker, gán kiểu rồi format lại từng
+ô. Với COPY, PostgreSQL tự format CSV; worker chỉ chuyển byte cho client.
+
+psycopg2 copy_expert ghi output vào một file-like object và chỉ trả về khi xong,
+nên nó chạy trong thread riêng và ghi (gom thành đoạn COPY_CHUNK_SIZE) vào hàng
+đợi có giới hạn; generator của response đọc từng đoạn ra. Client đọc chậm thì
+hàng đợi đầy và COPY dừng chờ, client ngắt kết nối thì COPY bị hủy.
+"""
+import queue
+import threading
+
+COPY_CHUNK_SIZE = 64 * 1024
+COPY_QUEUE_SIZE = 8
+_DONE = object()
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """File-like target for copy_expert that hands chunks to the response generator"""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise CopyCancelled('client đã ngắt kết nối')
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= COPY_CHUNK_SIZE:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+def iter_copy(conn, copy_sql, prefix=b''):
+    """Bytes of `COPY (...) TO STDOUT` run on `conn`, `prefix` first (e.g. a UTF-8 BOM).
+
+    The COPY starts when the body is first iterated; closing the generator early
+    cancels it. The caller still owns (and closes) the connection.
+    """
+    chunks = queue.Queue(COPY_QUEUE_SIZE)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+
+    def run():
+        try:
+            conn.cursor().copy_expert(copy_sql, writer)
+            writer.flush()
+            writer.put(_DONE)
+        except CopyCancelled:
+            pass
+        except Exception as e:
+            try:
+                writer.put(e)
+            except CopyCancelled:
+                pass
+
+    thread = threading.Thread(target=run, name='pg-copy', daemon=True)
+    thread.start()
+    try:
+        if prefix:
+            yield prefix
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                # Header đã gửi, chỉ còn cách cắt kết nối để client biết file không trọn
+                print(f"[COPY] ❌ COPY failed mid-stream: {item}")
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tính lại toàn bộ bảng thống kê student_stats (xem student_stats.py) từ bảng students.
+
+Dùng khi /api/stats lệch với dữ liệu thật (sửa tay trong DB, khôi phục backup...).
+Dùng cùng cấu hình DB với app (DATABASE_URL / SQLITE_DB_PATH trong .env).
+
+    python rebuild_stats.py            # tính lại và thay thế
+    python rebuild_stats.py --check    # chỉ báo các bucket bị lệch
+"""
+
+import sys
+
+
+def main(argv):
+    check_only = '--check' in argv
+    from app import rebuild_student_stats
+
+    report = rebuild_student_stats(check_only=check_only)
+    drift = report['drift']
+    print(f"📊 {report['students']} học sinh, {len(drift)} bucket bị lệch")
+    for item in drift[:50]:
+        print(f"   • {item['dimension']} / {item['bucket']!r}: lưu {item['stored']}, thực tế {item['actual']}")
+    if len(drift) > 50:
+        print(f"   ... và {len(drift) - 50} bucket khác")
+    if check_only:
+        return 1 if drift else 0
+    print("✅ Đã tính lại thống kê")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,77 @@
+"""
+Cache response JSON đã serialize của /api/students (bảng của trang admin).
+
+Trang admin tải lại liên tục với cùng vài tổ hợp page/limit/search/fields; mỗi lần
+là COUNT + truy vấn trang + chuẩn hóa từng dòng + jsonify. Cache giữ nguyên byte
+JSON của response theo tham số đã chuẩn hóa, kèm phiên bản dữ liệu lúc tạo.
+
+Phiên bản dữ liệu là seq mới nhất của change feed (xem change_feed): trigger tăng
+nó ở mọi đường ghi, kể cả của worker khác, nên chỉ cần so sánh một con số thay vì
+xóa cache khi ghi. Mục có phiên bản cũ coi như miss và bị thay bằng mục mới.
+
+ETag (weak) là hash của body: trình duyệt revalidate nhận 304 nếu trang không đổi,
+kể cả khi phiên bản đã tăng vì thay đổi ở trang khác. Tổng dung lượng giới hạn bởi
+`max_bytes` (LRU); response lớn hơn một phần tư giới hạn không được cache.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# Ước lượng phần bộ nhớ ngoài body của mỗi mục (key, tuple, etag)
+ENTRY_OVERHEAD = 256
+
+
+def body_etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class ResponseCache:
+    """Memory-bounded LRU of (version, body, etag) per canonical request key"""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.reset()
+
+    def reset(self):
+        """Empty per-process state (also used after fork)"""
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def get(self, key, version):
+        """(body, etag) cached for key at this data version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if entry[0] != version:
+                self.stats['stale'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body):
+        """Store body for key at this version; returns its etag"""
+        etag = body_etag(body)
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes // 4:
+            return etag
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1]) + ENTRY_OVERHEAD
+            self._entries[key] = (version, body, etag)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted) + ENTRY_OVERHEAD
+                self.stats['evictions'] += 1
+        return etag
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
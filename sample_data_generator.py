@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Sinh dữ liệu học sinh ảo số lượng lớn (50k - 1M dòng) để thử tải.
+
+Mỗi cột được sinh một lần cho cả lô bằng NumPy (không lặp từng dòng với
+random.choice), tỉnh/phường lấy từ danh mục thật (load_locations_latest), và
+cùng seed luôn cho cùng dữ liệu. Ghi DB theo từng chunk, mỗi chunk một
+transaction: SQLite dùng executemany, PostgreSQL dùng COPY.
+
+Email luôn chứa "_sample_" để /api/delete-all-bots xóa được.
+
+    python sample_data_generator.py --count 100000 --seed 42
+    python sample_data_generator.py --count 1000 --db /tmp/students.db --dry-run
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+from datetime import datetime
+
+DEFAULT_SEED = 2025
+DEFAULT_CHUNK_SIZE = 5000
+
+# Mốc thời gian cố định để cùng seed cho cùng created_at
+REFERENCE_TIME = '2025-09-05T07:00:00'
+
+FAMILY_NAMES = [
+    'Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
+    'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý', 'Đinh', 'Đào', 'Cao', 'Lương', 'Mai'
+]
+# Tần suất họ gần với thực tế (Nguyễn chiếm gần 40%)
+FAMILY_NAME_WEIGHTS = [38, 11, 9.5, 7, 5.1, 5, 4.5, 3.9, 3.9, 2.1, 2, 1.4, 1.3, 1.3, 1, 0.5, 0.8, 0.6, 0.5, 0.4, 0.4]
+MALE_MIDDLE_NAMES = ['Văn', 'Minh', 'Hoàng', 'Quang', 'Hữu', 'Thanh', 'Anh', 'Thành', 'Bảo', 'Đức', 'Gia', 'Nhật']
+FEMALE_MIDDLE_NAMES = ['Thị', 'Ngọc', 'Thanh', 'Minh', 'Thu', 'Khánh', 'Bảo', 'Phương', 'Mai', 'Hoài', 'Gia', 'Như']
+MALE_GIVEN_NAMES = [
+    'An', 'Bình', 'Cường', 'Dũng', 'Đức', 'Giang', 'Hải', 'Hùng', 'Huy', 'Khang', 'Khoa', 'Long',
+    'Minh', 'Nam', 'Phong', 'Phúc', 'Quân', 'Sơn', 'Tài', 'Thắng', 'Tuấn', 'Vinh', 'Việt', 'Kiên'
+]
+FEMALE_GIVEN_NAMES = [
+    'An', 'Anh', 'Châu', 'Giang', 'Hà', 'Hân', 'Hương', 'Linh', 'Loan', 'Mai', 'My', 'Nga',
+    'Ngân', 'Nhi', 'Oanh', 'Phương', 'Quyên', 'Thảo', 'Thu', 'Trang', 'Trâm', 'Vy', 'Xuân', 'Yến'
+]
+CLASS_SUFFIXES = ['A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8', 'B1', 'B2', 'B3', 'B4']
+ETHNICITIES = ['Kinh', 'Hoa', 'Khmer', 'Tày', 'Thái', 'Mường', 'Nùng', "H'Mông", 'Chăm', 'Ê Đê']
+ETHNICITY_WEIGHTS = [88, 4, 2, 1, 1, 1, 1, 0.7, 0.7, 0.6]
+RELIGIONS = ['Không', 'Phật giáo', 'Công giáo', 'Cao Đài', 'Hòa Hảo', 'Tin Lành']
+RELIGION_WEIGHTS = [70, 15, 9, 2.5, 2, 1.5]
+# Cùng định dạng chuỗi phân tách bằng dấu phẩy mà form gửi lên
+EYE_CONDITIONS = ['Không', 'Cận thị', 'Loạn thị', 'Viễn thị', 'Cận thị,Loạn thị', 'Chưa có thông tin']
+EYE_CONDITION_WEIGHTS = [45, 30, 5, 2, 8, 10]
+SWIMMING_SKILLS = ['Biết bơi', 'Không biết bơi', 'Bơi cơ bản', 'Bơi giỏi']
+JOBS = [
+    'Công nhân', 'Nông dân', 'Giáo viên', 'Bác sĩ', 'Kỹ sư', 'Kinh doanh', 'Công chức',
+    'Tài xế', 'Thợ xây', 'Bán hàng', 'Y tá', 'Kế toán', 'Nhân viên văn phòng', 'Nội trợ', 'Lao động tự do'
+]
+
+HOME_PROVINCE = 'Thành phố Hồ Chí Minh'
+HOME_PROVINCE_SHARE = 0.85
+FALLBACK_PROVINCES = ['Thành phố Hồ Chí Minh', 'Tỉnh Đồng Nai', 'Tỉnh Tây Ninh', 'Tỉnh Đắk Lắk']
+
+
+def _pick(rng, values, size, weights=None):
+    import numpy as np
+
+    values = np.array(values, dtype=object)
+    p = None
+    if weights is not None:
+        p = np.asarray(weights, dtype=float)
+        p = p / p.sum()
+    return values[rng.choice(len(values), size=size, p=p)]
+
+
+def _digits(rng, size, prefixes, length):
+    """Random digit strings of `length` chars starting with one of `prefixes` (same length).
+
+    Built as a (size, length) byte matrix and viewed as fixed-width strings, which
+    avoids formatting numbers one by one.
+    """
+    import numpy as np
+
+    prefix_bytes = np.array([p.encode('ascii') for p in prefixes])
+    k = prefix_bytes.dtype.itemsize
+    out = np.empty((size, length), dtype=np.uint8)
+    out[:, :k] = prefix_bytes.view(np.uint8).reshape(len(prefixes), k)[rng.integers(0, len(prefixes), size=size)]
+    out[:, k:] = rng.integers(ord('0'), ord('9') + 1, size=(size, length - k), dtype=np.uint8)
+    return out.view(f'S{length}').ravel().astype(f'U{length}').astype(object)
+
+
+def _numbered(rng, size, template, low, high):
+    """Pick from template.format(i) for i in [low, high) via a lookup table"""
+    import numpy as np
+
+    table = np.array([template.format(i) for i in range(low, high)], dtype=object)
+    return table[rng.integers(0, len(table), size=size)]
+
+
+def _dates(rng, size, start, end):
+    """Random 'YYYY-MM-DD' strings between start and end (inclusive)"""
+    import numpy as np
+
+    start = np.datetime64(start, 'D')
+    span = (np.datetime64(end, 'D') - start).astype(int) + 1
+    return (start + rng.integers(0, span, size=size)).astype(str).astype(object)
+
+
+def _with_blanks(rng, values, fill_rate):
+    """Set a share of the values to None (optional fields are not always filled)"""
+    values = values.copy()
+    values[rng.random(len(values)) >= fill_rate] = None
+    return values
+
+
+def _locations(rng, size, catalog):
+    """Pick (province, ward) pairs from the real catalog, mostly the school's own province"""
+    import numpy as np
+
+    provinces = (catalog or {}).get('provinces') or []
+    wards_by_province = (catalog or {}).get('wardsByProvince') or {}
+    provinces = [p for p in provinces if wards_by_province.get(p['code'])]
+    if not provinces:
+        province_names = _pick(rng, FALLBACK_PROVINCES, size, [HOME_PROVINCE_SHARE] + [(1 - HOME_PROVINCE_SHARE) / 3] * 3)
+        wards = _numbered(rng, size, 'Phường {}', 1, 21)
+        return province_names, wards
+
+    names = [p['name'] for p in provinces]
+    weights = np.full(len(provinces), (1 - HOME_PROVINCE_SHARE) / max(len(provinces) - 1, 1))
+    if HOME_PROVINCE in names:
+        weights[names.index(HOME_PROVINCE)] = HOME_PROVINCE_SHARE
+    province_idx = rng.choice(len(provinces), size=size, p=weights / weights.sum())
+
+    wards = np.empty(size, dtype=object)
+    for idx in np.unique(province_idx):
+        mask = province_idx == idx
+        ward_names = np.array([w['name'] for w in wards_by_province[provinces[idx]['code']]], dtype=object)
+        wards[mask] = ward_names[rng.integers(0, len(ward_names), size=int(mask.sum()))]
+    return np.array(names, dtype=object)[province_idx], wards
+
+
+def _full_names(rng, size, is_male):
+    import numpy as np
+
+    family = _pick(rng, FAMILY_NAMES, size, FAMILY_NAME_WEIGHTS)
+    middle = np.where(is_male, _pick(rng, MALE_MIDDLE_NAMES, size), _pick(rng, FEMALE_MIDDLE_NAMES, size))
+    given = np.where(is_male, _pick(rng, MALE_GIVEN_NAMES, size), _pick(rng, FEMALE_GIVEN_NAMES, size))
+    return family + ' ' + middle + ' ' + given, given
+
+
+def generate_students(count, seed=DEFAULT_SEED, catalog=None, start_index=0, reference_time=REFERENCE_TIME):
+    """Generate `count` students as {column: numpy object array}.
+
+    Both the English columns and the legacy Vietnamese ones are filled, the
+    caller keeps whichever exist in the table. The same (seed, start_index,
+    count) always gives the same rows, and emails are numbered from
+    start_index so later calls can append without clashing.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng([seed, start_index])
+    n = count
+    index = np.arange(start_index, start_index + n)
+
+    is_male = rng.random(n) < 0.5
+    gender = np.where(is_male, 'Nam', 'Nữ').astype(object)
+    full_name, given = _full_names(rng, n, is_male)
+    grade_idx = rng.integers(0, 3, size=n)
+    grade = np.array(['10', '11', '12'], dtype=object)[grade_idx]
+    classes = np.array([[g + suffix for suffix in CLASS_SUFFIXES] for g in ('10', '11', '12')], dtype=object)
+    class_name = classes[grade_idx, rng.integers(0, len(CLASS_SUFFIXES), size=n)]
+    # Khối 10 sinh năm 2009, khối 11 năm 2008, khối 12 năm 2007
+    year_start = np.array(['2009-01-01', '2008-01-01', '2007-01-01'], dtype='datetime64[D]')
+    birth_date = (year_start[grade_idx] + rng.integers(0, 365, size=n)).astype(str).astype(object)
+
+    email = np.array([f'hs{i:07d}_sample_s{seed}@test.sample.com' for i in index.tolist()], dtype=object)
+
+    permanent_province, permanent_ward = _locations(rng, n, catalog)
+    moved = rng.random(n) < 0.1
+    other_province, other_ward = _locations(rng, n, catalog)
+    current_province = np.where(moved, other_province, permanent_province)
+    current_ward = np.where(moved, other_ward, permanent_ward)
+    hamlet = _numbered(rng, n, 'Khu phố {}', 1, 15)
+    street = _numbered(rng, n, 'Đường số {}', 1, 50)
+    street = _numbered(rng, n, '{} ', 1, 500) + street
+
+    # Chiều cao/cân nặng theo phân bố chuẩn riêng cho nam/nữ, cân nặng suy ra từ BMI
+    height = np.where(is_male, rng.normal(168, 6.5, n), rng.normal(157, 5.5, n)).round().clip(140, 195).astype(int)
+    bmi = rng.normal(20.5, 2.8, n).clip(14, 35)
+    weight = (bmi * (height / 100.0) ** 2).round().astype(int)
+
+    # CCCD: 3 số mã tỉnh nơi đăng ký khai sinh + 9 số
+    cccd_prefixes = ['074', '079', '075', '072']
+    phone_prefixes = ['09', '08', '07', '03', '05']
+    father_name = _full_names(rng, n, np.ones(n, dtype=bool))[0]
+    mother_name = _full_names(rng, n, np.zeros(n, dtype=bool))[0]
+    father_job = _pick(rng, JOBS, n)
+    mother_job = _pick(rng, JOBS, n)
+    ethnicity = _pick(rng, ETHNICITIES, n, ETHNICITY_WEIGHTS)
+    religion = _pick(rng, RELIGIONS, n, RELIGION_WEIGHTS)
+
+    created_at = (
+        np.datetime64(reference_time, 's') - rng.integers(0, 30 * 24 * 3600, size=n).astype('timedelta64[s]')
+    )
+    created_at = np.datetime_as_string(created_at, unit='s')
+    # 'YYYY-MM-DDTHH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS' như CURRENT_TIMESTAMP, sửa thẳng trên buffer UCS4
+    created_at.view(np.uint32).reshape(n, -1)[:, 10] = ord(' ')
+    created_at = created_at.astype(object)
+
+    students = {
+        'email': email,
+        'full_name': full_name,
+        'nickname': _with_blanks(rng, given, 0.3),
+        'class': class_name,
+        'khoi': grade,
+        'birth_date': birth_date,
+        'gender': gender,
+        'ethnicity': ethnicity,
+        'nationality': np.full(n, 'Việt Nam', dtype=object),
+        'religion': religion,
+        'phone': _digits(rng, n, phone_prefixes, 10),
+        'citizen_id': _digits(rng, n, cccd_prefixes, 12),
+        'cccd_date': _with_blanks(rng, _dates(rng, n, '2021-01-01', '2025-06-30'), 0.9),
+        'cccd_place': np.full(n, 'Cục Cảnh sát QLHC về TTXH', dtype=object),
+        'personal_id': _digits(rng, n, cccd_prefixes, 12),
+        'organization': _with_blanks(rng, _pick(rng, ['Đoàn Thanh niên', 'Đội Thiếu niên'], n, [9, 1]), 0.8),
+        'permanent_province': permanent_province,
+        'permanent_ward': permanent_ward,
+        'permanent_hamlet': hamlet,
+        'permanent_street': street,
+        'hometown_province': _with_blanks(rng, permanent_province, 0.9),
+        'hometown_ward': _with_blanks(rng, permanent_ward, 0.9),
+        'current_province': current_province,
+        'current_ward': current_ward,
+        'current_hamlet': hamlet,
+        'current_address_detail': street,
+        'birthplace_province': _with_blanks(rng, permanent_province, 0.9),
+        'birthplace_ward': _with_blanks(rng, permanent_ward, 0.9),
+        'birth_cert_province': _with_blanks(rng, permanent_province, 0.85),
+        'birth_cert_ward': _with_blanks(rng, permanent_ward, 0.85),
+        'height': height.astype(object),
+        'weight': weight.astype(object),
+        'eye_diseases': _pick(rng, EYE_CONDITIONS, n, EYE_CONDITION_WEIGHTS),
+        'swimming_skill': _pick(rng, SWIMMING_SKILLS, n, [40, 35, 20, 5]),
+        'smartphone': np.where(rng.random(n) < 0.9, 'Có', 'Không').astype(object),
+        'computer': np.where(rng.random(n) < 0.6, 'Có', 'Không').astype(object),
+        'father_name': father_name,
+        'father_job': father_job,
+        'father_ethnicity': ethnicity,
+        'father_birth_year': rng.integers(1968, 1986, size=n).astype(object),
+        'father_phone': _digits(rng, n, phone_prefixes, 10),
+        'father_cccd': _digits(rng, n, cccd_prefixes, 12),
+        'mother_name': mother_name,
+        'mother_job': mother_job,
+        'mother_ethnicity': ethnicity,
+        'mother_birth_year': rng.integers(1972, 1990, size=n).astype(object),
+        'mother_phone': _digits(rng, n, phone_prefixes, 10),
+        'mother_cccd': _digits(rng, n, cccd_prefixes, 12),
+        'created_at': created_at,
+    }
+
+    # Schema cũ (init_database) dùng cột tiếng Việt
+    legacy = {
+        'ho_ten': 'full_name', 'lop': 'class', 'ngay_sinh': 'birth_date', 'gioi_tinh': 'gender',
+        'sdt': 'phone', 'dan_toc': 'ethnicity', 'ton_giao': 'religion', 'dia_chi': 'current_address_detail',
+        'tinh_thanh': 'current_province', 'ho_ten_cha': 'father_name', 'nghe_nghiep_cha': 'father_job',
+        'ho_ten_me': 'mother_name', 'nghe_nghiep_me': 'mother_job',
+    }
+    for legacy_col, col in legacy.items():
+        students[legacy_col] = students[col]
+    return students
+
+
+def _copy_value(value):
+    return '' if value is None else value
+
+
+def bulk_insert(conn, db_type, students, existing_columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Insert generated columns that exist in the table, one transaction per chunk"""
+    columns = [c for c in students if c in existing_columns]
+    if not columns:
+        raise ValueError('Bảng students không có cột nào khớp với dữ liệu mẫu')
+    total = len(students[columns[0]])
+    cursor = conn.cursor()
+    inserted = 0
+    for start in range(0, total, chunk_size):
+        # tolist() đổi kiểu NumPy sang int/str của Python cho driver DB
+        chunk = list(zip(*(students[c][start:start + chunk_size].tolist() for c in columns)))
+        if db_type == 'postgresql':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                writer.writerow([_copy_value(v) for v in row])
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY students ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            cursor.executemany(
+                f"INSERT INTO students ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+                chunk
+            )
+        conn.commit()
+        inserted += len(chunk)
+    return inserted, columns
+
+
+def generate_and_load(conn, db_type, existing_columns, count, seed=DEFAULT_SEED, catalog=None,
+                      start_index=0, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Generate and insert `count` rows, generating chunk by chunk to bound memory"""
+    stats = {'count': count, 'seed': seed, 'start_index': start_index, 'inserted': 0,
+             'generate_ms': 0.0, 'insert_ms': 0.0, 'chunks': 0, 'columns': []}
+    # Sinh theo khối lớn (nhiều chunk ghi) để NumPy vẫn hiệu quả mà RAM không tăng theo count
+    generate_block = max(chunk_size, 50000)
+    for offset in range(0, count, generate_block):
+        size = min(generate_block, count - offset)
+        t0 = time.perf_counter()
+        students = generate_students(size, seed=seed, catalog=catalog, start_index=start_index + offset)
+        t1 = time.perf_counter()
+        stats['generate_ms'] += (t1 - t0) * 1000
+        if dry_run:
+            stats['columns'] = [c for c in students if c in existing_columns]
+            continue
+        inserted, stats['columns'] = bulk_insert(conn, db_type, students, existing_columns, chunk_size)
+        stats['insert_ms'] += (time.perf_counter() - t1) * 1000
+        stats['inserted'] += inserted
+        stats['chunks'] += -(-inserted // chunk_size)
+
+    total_ms = stats['generate_ms'] + stats['insert_ms']
+    stats['generate_ms'] = round(stats['generate_ms'], 1)
+    stats['insert_ms'] = round(stats['insert_ms'], 1)
+    stats['rows_per_second'] = round(count / (total_ms / 1000), 1) if total_ms else None
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sinh dữ liệu học sinh ảo để thử tải')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--start-index', type=int, default=0, help='Chỉ số dòng bắt đầu (để nối thêm vào dữ liệu đã sinh)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--db', help='Đường dẫn SQLite (mặc định: cấu hình của app, DATABASE_URL nếu có)')
+    parser.add_argument('--dry-run', action='store_true', help='Chỉ sinh dữ liệu, không ghi DB')
+    args = parser.parse_args()
+
+    import app as application
+
+    if args.db:
+        application.DB_CONFIG.clear()
+        application.DB_CONFIG.update({'type': 'sqlite', 'path': args.db})
+        application.init_database()
+
+    catalog = application.load_locations_latest()
+    db_type = application.DB_CONFIG['type']
+    schema = application.StudentSchema(application.get_db_connection, db_type)
+    existing_columns = set(schema.columns())
+
+    conn = application.get_db_connection()
+    try:
+        stats = generate_and_load(
+            conn, db_type, existing_columns, args.count, seed=args.seed, catalog=catalog,
+            start_index=args.start_index, chunk_size=args.chunk_size, dry_run=args.dry_run
+        )
+    finally:
+        conn.close()
+
+    print(f"[SAMPLE] {datetime.now().isoformat(timespec='seconds')} {db_type}: "
+          f"{stats['inserted']}/{stats['count']} rows (seed={stats['seed']}) "
+          f"generate {stats['generate_ms']} ms, insert {stats['insert_ms']} ms, {stats['rows_per_second']} rows/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
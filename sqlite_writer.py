@@ -0,0 +1,177 @@
+"""
+Hàng đợi ghi SQLite với group commit.
+
+SQLite chỉ cho một writer tại một thời điểm. Khi mỗi request tự mở kết nối rồi
+SELECT trước, UPDATE sau (transaction deferred), hai request cùng lúc có thể
+nâng quyền đọc -> ghi và một bên nhận ngay "database is locked", không chờ
+busy_timeout. Giờ cao điểm nộp kê khai thì phần lớn thời gian là chờ nhau và
+fsync mỗi lần commit.
+
+SQLiteWriter gom việc ghi của cả process vào một thread với một kết nối:
+- mỗi lô là một transaction BEGIN IMMEDIATE (giữ quyền ghi từ đầu nên không bị
+  lỗi nâng quyền), mỗi job chạy trong SAVEPOINT riêng nên job lỗi không kéo theo
+  job khác, rồi commit một lần cho cả lô;
+- trong lúc một lô đang commit, các request mới xếp hàng và đi chung lô sau, nên
+  số commit giảm khi tải tăng;
+- giữa các process (worker gunicorn) transaction được tuần tự hóa bằng file lock
+  (fcntl, chỉ có trên Unix) thay vì để busy handler của SQLite thử lại;
+- mỗi request nhận Future với kết quả (hoặc lỗi) của đúng job của nó.
+"""
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SQLITE_BUSY_TIMEOUT = 30.0
+WRITER_BATCH_SIZE = 100
+
+
+class WriterBusyError(RuntimeError):
+    pass
+
+
+def connect_sqlite(path, busy_timeout=SQLITE_BUSY_TIMEOUT, **kwargs):
+    """sqlite3 connection whose busy handler waits up to `busy_timeout` seconds"""
+    conn = sqlite3.connect(path, timeout=busy_timeout, **kwargs)
+    conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout * 1000)}')
+    return conn
+
+
+def connect_sqlite_readonly(path, busy_timeout=SQLITE_BUSY_TIMEOUT, **kwargs):
+    """Read-only connection (mode=ro URI + query_only) for endpoints that never write"""
+    uri = f'file:{quote(os.path.abspath(path))}?mode=ro'
+    conn = connect_sqlite(uri, busy_timeout, uri=True, **kwargs)
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+class SQLiteWriter:
+    """Single writer thread per process with group commit; see module docstring"""
+
+    def __init__(self, path, busy_timeout=SQLITE_BUSY_TIMEOUT, batch_size=WRITER_BATCH_SIZE):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.batch_size = batch_size
+        self.reset()
+
+    def reset(self):
+        """Forget the thread and connection inherited through fork"""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'jobs': 0, 'batches': 0, 'failed_batches': 0, 'largest_batch': 0}
+
+    def submit(self, func, *args):
+        """Queue func(cursor, *args) to run in the next write transaction; returns a Future"""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+        self._queue.put((future, func, args))
+        return future
+
+    def run(self, func, *args, timeout=None):
+        """submit() and wait for the job's result; raises its exception, or WriterBusyError on timeout"""
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise WriterBusyError('Hệ thống đang bận ghi dữ liệu, vui lòng thử lại')
+
+    def reconfigure(self, path):
+        """Write to another database file; the writer thread reopens before its next batch"""
+        self.path = path
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    def _connect(self, path):
+        # isolation_level=None: tự quản lý BEGIN/COMMIT
+        conn = connect_sqlite(path, self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @contextlib.contextmanager
+    def _file_lock(self, path):
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.write-lock', 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _run(self):
+        conn = None
+        conn_path = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is not None and conn_path != self.path:
+                    # reconfigure(): lô này thuộc file DB mới
+                    conn.close()
+                    conn = None
+                if conn is None:
+                    conn_path = self.path
+                    conn = self._connect(conn_path)
+                self._commit(conn, conn_path, batch)
+            except Exception as e:
+                print(f"[WRITER] ❌ Write batch of {len(batch)} failed: {e}")
+                self.stats['failed_batches'] += 1
+                for future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    # Kết nối có thể hỏng (disk I/O, file bị thay), mở lại ở lô sau
+                    with contextlib.suppress(Exception):
+                        conn.close()
+                    conn = None
+
+    def _commit(self, conn, path, batch):
+        results = []
+        with self._file_lock(path):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = conn.cursor()
+                for future, func, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    cursor.execute('SAVEPOINT job')
+                    try:
+                        results.append((future, func(cursor, *args), None))
+                        cursor.execute('RELEASE job')
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO job')
+                        cursor.execute('RELEASE job')
+                        results.append((future, None, e))
+                conn.execute('COMMIT')
+            except BaseException:
+                with contextlib.suppress(Exception):
+                    conn.execute('ROLLBACK')
+                raise
+
+        self.stats['jobs'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
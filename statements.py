@@ -0,0 +1,116 @@
+"""
+Câu SQL cố định của các truy vấn đọc nóng: chi tiết học sinh, tìm theo email,
+trang danh sách và các câu đếm.
+
+Trước đây mỗi request ghép lại chuỗi SQL (và convert_placeholders chạy str.replace
+trên nó). StatementRegistry dựng mỗi câu một lần cho backend đang dùng, với
+placeholder đã đổi sẵn, và nhớ lại theo biến thể (vd. danh sách cột của fields=):
+
+- PostgreSQL: PREPARE một lần trên mỗi kết nối của pool (xem db_pool) rồi EXECUTE,
+  server không phải parse/plan lại câu lệnh;
+- SQLite: chạy đúng chuỗi SQL đó trên kết nối sống lâu của pool, sqlite3 lấy câu
+  lệnh đã biên dịch từ cache của kết nối.
+
+Thời gian chạy được cộng dồn theo tên câu lệnh (xem /api/debug/statements); câu
+nào chậm hơn SLOW_STATEMENT_MS được in ra log.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Số biến thể (tên, fields=...) được nhớ; cũng là số PREPARE tối đa trên một kết nối
+MAX_VARIANTS = 256
+SLOW_STATEMENT_MS = 500
+
+
+def _numbered(text):
+    """? placeholders -> $1, $2, ... for PREPARE"""
+    parts = text.split('?')
+    return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], 1))
+
+
+class StatementRegistry:
+    """Fixed SQL statements built once per backend; see module docstring"""
+
+    def __init__(self, db_type):
+        self.db_type = db_type
+        self._builders = {}
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._timings = {}
+
+    def define(self, name, builder, postgresql=None):
+        """Register `builder(variant)` returning the SQL with ? placeholders.
+
+        `postgresql` replaces the builder on PostgreSQL when the SQL differs.
+        """
+        self._builders[name] = postgresql if postgresql is not None and self.db_type == 'postgresql' else builder
+
+    def sql(self, name, variant=None):
+        """(prepared name, SQL with the driver's placeholders, SQL for PREPARE)"""
+        key = (name, variant)
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                return statement
+            text = ' '.join(self._builders[name](variant).split())
+            self._next_id += 1
+            if self.db_type == 'postgresql':
+                statement = (f'{name}_{self._next_id}', text.replace('?', '%s'), _numbered(text))
+            else:
+                statement = (name, text, None)
+            self._statements[key] = statement
+            if len(self._statements) > MAX_VARIANTS:
+                self._statements.popitem(last=False)
+            return statement
+
+    def execute(self, conn, cursor, name, params=(), variant=None):
+        """Run statement `name` on cursor (a cursor of conn) and return the cursor"""
+        prepared_name, text, prepare_text = self.sql(name, variant)
+        start = time.perf_counter()
+        prepared = getattr(conn, 'prepared', None)
+        if prepare_text is None or prepared is None:
+            # SQLite, hoặc kết nối không thuộc pool (không giữ được PREPARE)
+            cursor.execute(text, params)
+        else:
+            self._execute_prepared(conn, cursor, prepared, prepared_name, prepare_text, params)
+        self._record(name, (time.perf_counter() - start) * 1000)
+        return cursor
+
+    def _execute_prepared(self, conn, cursor, prepared, prepared_name, prepare_text, params):
+        execute = f"EXECUTE {prepared_name}" + (f" ({', '.join(['%s'] * len(params))})" if params else '')
+        for attempt in (1, 2):
+            try:
+                if prepared_name not in prepared:
+                    if len(prepared) >= MAX_VARIANTS:
+                        cursor.execute('DEALLOCATE ALL')
+                        prepared.clear()
+                    cursor.execute(f'PREPARE {prepared_name} AS {prepare_text}')
+                    prepared.add(prepared_name)
+                cursor.execute(execute, params)
+                return
+            except Exception as e:
+                # 0A000 "cached plan must not change result type": bảng vừa thêm cột (migrate)
+                if attempt == 2 or getattr(e, 'pgcode', None) != '0A000':
+                    raise
+                conn.rollback()
+                cursor.execute('DEALLOCATE ALL')
+                prepared.clear()
+
+    def _record(self, name, ms):
+        with self._lock:
+            timing = self._timings.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            timing['calls'] += 1
+            timing['total_ms'] += ms
+            timing['max_ms'] = max(timing['max_ms'], ms)
+        if ms >= SLOW_STATEMENT_MS:
+            print(f"[SQL] 🐢 Slow statement {name}: {ms:.0f} ms")
+
+    def timings(self):
+        """Per-statement calls, total/avg/max milliseconds of this process"""
+        with self._lock:
+            return {name: dict(t, total_ms=round(t['total_ms'], 3), max_ms=round(t['max_ms'], 3),
+                               avg_ms=round(t['total_ms'] / t['calls'], 3))
+                    for name, t in self._timings.items()}
@@ -0,0 +1,172 @@
+"""
+Bộ nhớ đệm cho các trang tĩnh (page*.html, done.html, admin.html...) và icon trong logo/.
+
+Mỗi file được đọc vào RAM một lần, nén sẵn gzip/brotli và gắn ETag theo hash nội dung.
+Khi chạy trên Heroku (không có nginx phía trước) app tự trả 304 khi trình duyệt
+revalidate và chỉ đọc lại file khi mtime thay đổi.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response
+from werkzeug.security import safe_join
+
+# Brotli là tùy chọn - thiếu thư viện thì chỉ dùng gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/manifest+json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon'
+)
+
+# File nhỏ hơn ngưỡng này nén không đáng
+MIN_COMPRESS_SIZE = 512
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+mimetypes.add_type('image/x-icon', '.ico')
+
+
+class StaticAsset:
+    """One file held in memory together with its precompressed variants"""
+
+    __slots__ = ('path', 'mimetype', 'mtime', 'size', 'body', 'gzip_body', 'br_body', 'etag')
+
+    def __init__(self, path, mimetype, mtime, body):
+        self.path = path
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.size = len(body)
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.gzip_body = None
+        self.br_body = None
+
+        if self.size >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < self.size:
+                self.gzip_body = compressed
+            if BROTLI_AVAILABLE:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < self.size:
+                    self.br_body = compressed
+
+
+def parse_accept_encoding(header):
+    """Parse Accept-Encoding into the set of codings with q > 0"""
+    accepted = set()
+    for part in (header or '').split(','):
+        pieces = [p.strip() for p in part.split(';')]
+        coding = pieces[0].lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticAssetCache:
+    """In-memory cache of static files keyed by path relative to base_dir"""
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def _load(self, relpath):
+        full_path = safe_join(self.base_dir, relpath)
+        if full_path is None or not os.path.isfile(full_path):
+            return None
+        mtime = os.stat(full_path).st_mtime_ns
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        asset = StaticAsset(full_path, mimetype, mtime, body)
+        with self._lock:
+            self._assets[relpath] = asset
+        return asset
+
+    def get(self, relpath):
+        """Return the cached asset, reloading it only if the file's mtime changed"""
+        asset = self._assets.get(relpath)
+        if asset is None:
+            return self._load(relpath)
+        try:
+            mtime = os.stat(asset.path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._assets.pop(relpath, None)
+            return None
+        if mtime != asset.mtime:
+            print(f"[STATIC] 🔄 Reloading changed file: {relpath}")
+            return self._load(relpath)
+        return asset
+
+    def preload(self, relpaths):
+        loaded = 0
+        for relpath in relpaths:
+            if self._load(relpath) is not None:
+                loaded += 1
+        print(f"[STATIC] ✅ Preloaded {loaded}/{len(relpaths)} static files")
+        return loaded
+
+    def stats(self):
+        return {
+            'files': len(self._assets),
+            'bytes': sum(a.size for a in self._assets.values()),
+            'gzip_bytes': sum(len(a.gzip_body or a.body) for a in self._assets.values()),
+            'br_bytes': sum(len(a.br_body or a.body) for a in self._assets.values()),
+            'brotli': BROTLI_AVAILABLE,
+        }
+
+    def response(self, relpath, req, cache_control='no-cache'):
+        """Build a response for relpath honoring If-None-Match and Accept-Encoding.
+
+        Returns None if the file does not exist so the caller can 404.
+        """
+        asset = self.get(relpath)
+        if asset is None:
+            return None
+
+        accepted = parse_accept_encoding(req.headers.get('Accept-Encoding'))
+        if asset.br_body is not None and 'br' in accepted:
+            body, encoding, etag = asset.br_body, 'br', f'"{asset.etag}-br"'
+        elif asset.gzip_body is not None and 'gzip' in accepted:
+            body, encoding, etag = asset.gzip_body, 'gzip', f'"{asset.etag}-gz"'
+        else:
+            body, encoding, etag = asset.body, None, f'"{asset.etag}"'
+
+        headers = {
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        # Mọi biến thể nén đều chung nội dung gốc nên so sánh theo hash gốc
+        if_none_match = req.headers.get('If-None-Match', '')
+        if if_none_match:
+            client_tags = set()
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag.startswith('W/'):
+                    tag = tag[2:]
+                client_tags.add(tag.strip('"').split('-')[0])
+            if asset.etag in client_tags or '*' in client_tags:
+                return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, status=200, mimetype=asset.mimetype, headers=headers)
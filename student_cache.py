@@ -0,0 +1,233 @@
+"""
+Cache hồ sơ học sinh đã chuẩn hóa cho /api/student/<id> và /api/student-by-email.
+
+done.html gọi student-by-email ngay sau khi nộp và admin mở đi mở lại cùng một hồ
+sơ khi duyệt; mỗi lần là một SELECT * cộng chuẩn hóa eye_diseases. Cache giữ dict
+học sinh đã chuẩn hóa (trước khi lọc fields=/bỏ key tương thích) theo
+(loại, khóa, biến thể): loại là 'id' hoặc 'email', biến thể là danh sách cột của
+fields= (None = tất cả).
+
+- Đường ghi xóa đúng mục bị ảnh hưởng sau khi commit: save-student theo email và
+  id của học sinh được cập nhật, delete-student theo id và email của dòng đã xóa;
+  các endpoint xóa hàng loạt và import thì xóa sạch cache.
+- Không cache kết quả "không tìm thấy": học sinh mới nộp không cần xóa gì cả.
+- Mỗi lần xóa tăng một số thế hệ; request đọc DB trước khi xóa (dữ liệu cũ) mà
+  ghi vào cache sau đó thì bị bỏ qua.
+- Mục nào cũng hết hạn sau `ttl` giây, giới hạn thời gian dữ liệu cũ tồn tại nếu
+  có đường ghi nào không xóa cache (vd. sửa thẳng trong DB).
+
+StudentCache nằm trong bộ nhớ của từng process (LRU), nên lệnh xóa của worker khác
+không tới được. Mỗi mục vì vậy mang phiên bản dữ liệu (seq mới nhất của change
+feed) lúc đọc DB và chỉ được dùng khi phiên bản hiện tại vẫn như thế, giống
+response_cache: ghi ở bất kỳ worker nào cũng làm mục cũ hết hiệu lực.
+RedisStudentCache dùng chung cho mọi worker nên không cần phiên bản; Redis lỗi
+thì coi như cache miss trong REDIS_RETRY_SECONDS giây, không làm hỏng request.
+Lệnh xóa bị mất lúc Redis lỗi thì TTL giới hạn thời gian dữ liệu cũ còn lại.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+STUDENT_CACHE_SIZE = 2000
+STUDENT_CACHE_TTL = 60
+REDIS_PREFIX = 'student-cache'
+# Redis lỗi thì bỏ qua cache trong khoảng này rồi mới thử lại
+REDIS_RETRY_SECONDS = 30
+
+
+class StudentCache:
+    """In-process LRU cache with TTL, validated against the data version; see module docstring"""
+
+    backend = 'memory'
+    # Lệnh xóa chỉ tới process này: get/set cần phiên bản dữ liệu
+    shared = False
+
+    def __init__(self, size=STUDENT_CACHE_SIZE, ttl=STUDENT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.reset()
+
+    def reset(self):
+        """Empty per-process state (also used after fork)"""
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # (loại, khóa) -> các biến thể đang được cache, để xóa chính xác
+        self._variants = {}
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+
+    def generation(self):
+        """Token to pass to set(); the value is dropped if an invalidation happened since"""
+        return self._generation
+
+    def get(self, kind, key, variant=None, version=None):
+        """Copy of the student dict cached at this data version, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((kind, key, variant))
+            if entry is None or entry[0] <= now:
+                self.stats['misses'] += 1
+                return None
+            if entry[1] != version:
+                self.stats['stale'] += 1
+                return None
+            self._entries.move_to_end((kind, key, variant))
+            self.stats['hits'] += 1
+            return dict(entry[2])
+
+    def set(self, kind, key, variant, student, generation, version=None):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[(kind, key, variant)] = (time.monotonic() + self.ttl, version, dict(student))
+            self._entries.move_to_end((kind, key, variant))
+            self._variants.setdefault((kind, key), set()).add(variant)
+            while len(self._entries) > self.size:
+                (old_kind, old_key, old_variant), _ = self._entries.popitem(last=False)
+                variants = self._variants.get((old_kind, old_key))
+                if variants is not None:
+                    variants.discard(old_variant)
+                    if not variants:
+                        del self._variants[(old_kind, old_key)]
+
+    def invalidate(self, ids=(), emails=()):
+        """Drop every variant cached for these student ids and emails"""
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+            for kind_key in [('id', i) for i in ids if i is not None] + [('email', e) for e in emails if e]:
+                for variant in self._variants.pop(kind_key, ()):
+                    self._entries.pop(kind_key + (variant,), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._variants.clear()
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, backend=self.backend, entries=len(self._entries), size=self.size, ttl=self.ttl)
+
+
+# Chỉ ghi khi số thế hệ chưa đổi kể từ lúc request đọc DB
+_SET_IF_CURRENT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+
+class RedisStudentCache:
+    """Cache shared by all workers through Redis; see module docstring.
+
+    One hash per (kind, key) holds the variants, so invalidation is a single DEL.
+    `dumps` serializes a student dict the way the JSON responses do (datetimes
+    come back as the same strings jsonify would have produced).
+    """
+
+    backend = 'redis'
+    shared = True
+
+    def __init__(self, url, ttl=STUDENT_CACHE_TTL, dumps=json.dumps, prefix=REDIS_PREFIX):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl = ttl
+        self.dumps = dumps
+        self.prefix = prefix
+        self._generation_key = f'{prefix}:generation'
+        self._set_script = self.client.register_script(_SET_IF_CURRENT)
+        self.reset()
+
+    def reset(self):
+        """Drop the connections inherited through fork"""
+        self.client.connection_pool.reset()
+        self._down_until = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    def _key(self, kind, key):
+        return f'{self.prefix}:{kind}:{key}'
+
+    def _variant(self, variant):
+        return variant or '*'
+
+    def _available(self):
+        return time.monotonic() >= self._down_until
+
+    def _error(self, action, error):
+        self.stats['errors'] += 1
+        self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        print(f"[CACHE] ⚠️ Redis {action} failed, bypassing the cache for {REDIS_RETRY_SECONDS}s: {error}")
+
+    def generation(self):
+        if not self._available():
+            return None
+        try:
+            return int(self.client.get(self._generation_key) or 0)
+        except Exception as e:
+            self._error('read', e)
+            return None
+
+    def get(self, kind, key, variant=None, version=None):
+        if not self._available():
+            return None
+        try:
+            value = self.client.hget(self._key(kind, key), self._variant(variant))
+        except Exception as e:
+            self._error('read', e)
+            return None
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return json.loads(value)
+
+    def set(self, kind, key, variant, student, generation, version=None):
+        if generation is None or not self._available():
+            return
+        try:
+            self._set_script(keys=[self._generation_key, self._key(kind, key)],
+                             args=[generation, self._variant(variant), self.dumps(student), self.ttl])
+        except Exception as e:
+            self._error('write', e)
+
+    def invalidate(self, ids=(), emails=()):
+        keys = [self._key('id', i) for i in ids if i is not None] + [self._key('email', e) for e in emails if e]
+        self.stats['invalidations'] += 1
+        if not self._available():
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(self._generation_key)
+            if keys:
+                pipe.delete(*keys)
+            pipe.execute()
+        except Exception as e:
+            self._error('invalidate', e)
+
+    def clear(self):
+        self.stats['invalidations'] += 1
+        if not self._available():
+            return
+        try:
+            self.client.incr(self._generation_key)
+            batch = []
+            # prefix:<loại>:<khóa>, không gồm key số thế hệ
+            for key in self.client.scan_iter(match=f'{self.prefix}:*:*', count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception as e:
+            self._error('clear', e)
+
+    def status(self):
+        return dict(self.stats, backend=self.backend, ttl=self.ttl, available=self._available())
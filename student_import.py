@@ -0,0 +1,389 @@
+"""
+Nhập danh sách học sinh hàng loạt từ file XLSX/CSV (danh sách lớp do Sở gửi).
+
+File được đọc từng dòng (openpyxl read_only / csv.reader) nên không phải giữ cả
+file trong RAM. Tiêu đề cột tiếng Việt được ánh xạ ngược qua EXPORT_COLUMN_LABELS,
+nên file xuất từ /api/export-* có thể nhập lại nguyên trạng. Giá trị được chuẩn
+hóa bằng cùng normalize_value với /api/save-student.
+
+Ghi DB theo lô: mỗi lô một transaction, SQLite dùng executemany qua writer thread
+chung (SQLITE_WRITER, cùng đường ghi với save-student), PostgreSQL dùng COPY vào
+bảng tạm rồi UPDATE/INSERT một lần. Giống save-student, học sinh đã có chỉ được
+cập nhật các ô có giá trị: ô trống hoặc không hợp lệ giữ nguyên dữ liệu đã kê khai.
+"""
+import csv
+import io
+import time
+import unicodedata
+from datetime import date, datetime
+
+from student_schema import (
+    EXPORT_COLUMN_LABELS, LEGACY_COLUMN_ALIASES, STUDENT_COLUMN_MAP, fill_grade, normalize_value
+)
+
+BATCH_SIZE = 500
+
+# Giới hạn số dòng lỗi trả về trong báo cáo
+MAX_REPORTED_ERRORS = 500
+
+# Số dòng đầu file được quét để tìm dòng tiêu đề (file có thể có dòng tiêu đề lớn phía trên)
+HEADER_SCAN_ROWS = 20
+
+DEFAULT_EYE_DISEASES = 'Chưa có thông tin'
+
+IMPORT_COLUMNS = [db_col for db_col, _ in STUDENT_COLUMN_MAP]
+
+# Cột được normalize_value đổi sang None khi giá trị không hợp lệ
+DATE_COLUMNS = {'ngay_sinh', 'cccd_date', 'passport_date'}
+INTEGER_COLUMNS = {'height', 'weight', 'father_birth_year', 'mother_birth_year', 'guardian_birth_year'}
+
+# Excel lưu số điện thoại/CCCD dạng số nên mất số 0 ở đầu
+PHONE_COLUMNS = {'sdt', 'father_phone', 'mother_phone', 'guardian_phone'}
+CCCD_COLUMNS = {'citizen_id', 'father_cccd', 'mother_cccd', 'guardian_cccd'}
+
+# Nhãn cũ/khác của một số cột trong các file xuất trước đây
+EXTRA_HEADER_LABELS = {
+    'Địa chỉ chi tiết hiện tại': 'current_address_detail',
+    'Tình trạng mắt': 'eye_diseases',
+}
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file can't be read as a student list"""
+
+
+def _header_key(text):
+    return unicodedata.normalize('NFC', str(text)).strip().casefold()
+
+
+def _build_header_map():
+    """{normalized header: db column} accepting labels, API names, DB names and form keys"""
+    header_map = {}
+    json_keys = dict(STUDENT_COLUMN_MAP)
+
+    def add(name, db_col):
+        if db_col in json_keys:
+            header_map.setdefault(_header_key(name), db_col)
+
+    for key, label in EXPORT_COLUMN_LABELS.items():
+        db_col = LEGACY_COLUMN_ALIASES.get(key, key)
+        add(label, db_col)
+        add(key, db_col)
+    for label, key in EXTRA_HEADER_LABELS.items():
+        add(label, LEGACY_COLUMN_ALIASES.get(key, key))
+    for db_col, json_key in STUDENT_COLUMN_MAP:
+        add(db_col, db_col)
+        add(json_key, db_col)
+    return header_map
+
+
+HEADER_MAP = _build_header_map()
+
+
+def _cell_value(db_col, value):
+    """Convert a spreadsheet cell to what the web form would have sent"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        if db_col in INTEGER_COLUMNS:
+            return value
+        text = str(value)
+        if db_col in PHONE_COLUMNS and len(text) == 9:
+            text = '0' + text
+        elif db_col in CCCD_COLUMNS and len(text) == 11:
+            text = '0' + text
+        return text
+    text = str(value).strip()
+    return text or None
+
+
+def _match_header(cells):
+    """Return {position: db column} if the row looks like a header row (has Email)"""
+    positions = {}
+    for idx, cell in enumerate(cells):
+        if cell is None:
+            continue
+        db_col = HEADER_MAP.get(_header_key(cell))
+        if db_col and db_col not in positions.values():
+            positions[idx] = db_col
+    if 'email' not in positions.values():
+        return None
+    return positions
+
+
+def _iter_mapped_rows(raw_rows):
+    """Find the header row, then yield (row_number, {db_column: value}) for each data row"""
+    header = None
+    for row_number, cells in enumerate(raw_rows, start=1):
+        if header is None:
+            header = _match_header(cells)
+            if header is not None:
+                ignored = [str(c).strip() for i, c in enumerate(cells) if c not in (None, '') and i not in header]
+                yield 'header', {'columns': list(header.values()), 'ignored_columns': ignored}
+            elif row_number >= HEADER_SCAN_ROWS:
+                break
+            continue
+        if not any(c not in (None, '') for c in cells):
+            continue
+        values = {}
+        for idx, db_col in header.items():
+            if idx < len(cells):
+                values[db_col] = _cell_value(db_col, cells[idx])
+        yield row_number, values
+    if header is None:
+        raise ImportFormatError(f'Không tìm thấy dòng tiêu đề có cột "Email" trong {HEADER_SCAN_ROWS} dòng đầu')
+
+
+def iter_xlsx_rows(fileobj):
+    """Stream rows of the first sheet of an XLSX file"""
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f'Không đọc được file Excel: {e}')
+    try:
+        yield from _iter_mapped_rows(wb.active.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def iter_csv_rows(fileobj):
+    """Stream rows of a CSV file (UTF-8, with or without BOM; ',' or ';' separated)"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', errors='replace', newline='')
+    first_line = text.readline()
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+
+    def lines():
+        yield first_line
+        yield from text
+
+    try:
+        yield from _iter_mapped_rows(csv.reader(lines(), delimiter=delimiter))
+    finally:
+        text.detach()
+
+
+def prepare_row(values):
+    """Normalize one mapped row. Returns (payload, problems)
+
+    Blank and invalid cells are left out of the payload; defaults are only filled on insert.
+    """
+    payload = {}
+    problems = []
+    for db_col, raw in values.items():
+        if raw is None or raw == '':
+            continue
+        value = normalize_value(db_col, raw)
+        if value is None:
+            if db_col in DATE_COLUMNS | INTEGER_COLUMNS:
+                problems.append(f"{db_col}: giá trị không hợp lệ '{raw}'")
+            continue
+        payload[db_col] = value
+    fill_grade(payload)
+    return payload, problems
+
+
+class StudentImporter:
+    """Upsert students by email in batched transactions"""
+
+    def __init__(self, get_connection, db_type, batch_size=BATCH_SIZE, run_write=None):
+        """run_write(func, *args), if given, runs func(cursor, *args) in its own committed
+        transaction (app.run_db_write); otherwise batches are committed on one connection
+        from get_connection"""
+        self._get_connection = get_connection
+        self._db_type = db_type
+        self._run_write = run_write
+        self.batch_size = batch_size
+        self.stats = {
+            'rows_read': 0,
+            'inserted': 0,
+            'updated': 0,
+            'skipped': 0,
+            'duplicates_in_file': 0,
+            'rows_with_warnings': 0,
+            'batches': 0,
+        }
+        self.errors = []
+        self.columns = []
+        self.ignored_columns = []
+
+    def _report(self, row_number, email, messages, skipped):
+        if skipped:
+            self.stats['skipped'] += 1
+        else:
+            self.stats['rows_with_warnings'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'email': email, 'errors': messages, 'skipped': skipped})
+
+    def run(self, rows, dry_run=False):
+        started = time.perf_counter()
+        batch = {}
+        conn = None if dry_run or self._run_write else self._get_connection()
+        try:
+            for row_number, values in rows:
+                if row_number == 'header':
+                    self.columns = values['columns']
+                    self.ignored_columns = values['ignored_columns']
+                    continue
+
+                self.stats['rows_read'] += 1
+                email = (values.get('email') or '').strip()
+                if not email or '@' not in email:
+                    self._report(row_number, email or None, ['Thiếu email hoặc email không hợp lệ'], skipped=True)
+                    continue
+                values['email'] = email
+
+                payload, problems = prepare_row(values)
+                if problems:
+                    self._report(row_number, email, problems, skipped=False)
+                if email in batch:
+                    # Cùng email xuất hiện nhiều lần trong file: dòng sau ghi đè dòng trước
+                    self.stats['duplicates_in_file'] += 1
+                batch[email] = (row_number, payload)
+
+                if len(batch) >= self.batch_size:
+                    self._flush(conn, batch, dry_run)
+                    batch = {}
+            if batch:
+                self._flush(conn, batch, dry_run)
+        finally:
+            if conn is not None:
+                conn.close()
+
+        elapsed = time.perf_counter() - started
+        written = self.stats['inserted'] + self.stats['updated']
+        self.stats['elapsed_ms'] = round(elapsed * 1000, 1)
+        self.stats['rows_per_second'] = round(self.stats['rows_read'] / elapsed, 1) if elapsed > 0 else None
+        self.stats['written'] = written
+        return {
+            'dry_run': dry_run,
+            'stats': self.stats,
+            'columns': self.columns,
+            'ignored_columns': self.ignored_columns,
+            'errors': self.errors,
+            'errors_truncated': self.stats['skipped'] + self.stats['rows_with_warnings'] > len(self.errors),
+        }
+
+    def _flush(self, conn, batch, dry_run):
+        self.stats['batches'] += 1
+        if dry_run:
+            return
+        rows = list(batch.values())
+        try:
+            inserted, updated = self._write(conn, rows)
+        except Exception as e:
+            print(f"[IMPORT] ⚠️ Batch of {len(rows)} failed ({e}), retrying row by row")
+            inserted = updated = 0
+            for row in rows:
+                try:
+                    i, u = self._write(conn, [row])
+                    inserted += i
+                    updated += u
+                except Exception as row_error:
+                    self._report(row[0], row[1].get('email'), [str(row_error)], skipped=True)
+        self.stats['inserted'] += inserted
+        self.stats['updated'] += updated
+
+    def _write(self, conn, rows):
+        """Upsert rows in one committed transaction"""
+        if self._run_write is not None:
+            return self._run_write(self._upsert, rows)
+        try:
+            result = self._upsert(conn.cursor(), rows)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _existing_emails(self, cursor, emails):
+        placeholder = '%s' if self._db_type == 'postgresql' else '?'
+        cursor.execute(
+            f"SELECT DISTINCT email FROM students WHERE email IN ({', '.join([placeholder] * len(emails))})",
+            emails
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def _upsert(self, cursor, rows):
+        """Write one batch of (row_number, payload). Returns (inserted, updated)"""
+        existing = self._existing_emails(cursor, [payload['email'] for _, payload in rows])
+        updates = [payload for _, payload in rows if payload['email'] in existing]
+        inserts = [payload for _, payload in rows if payload['email'] not in existing]
+
+        # Cập nhật chỉ các ô có giá trị (COALESCE) để không xóa dữ liệu đã kê khai
+        update_cols = [c for c in IMPORT_COLUMNS if c != 'email' and c in self._update_columns(updates)]
+        if self._db_type == 'postgresql':
+            self._upsert_postgres(cursor, updates, update_cols, inserts)
+        else:
+            if updates and update_cols:
+                set_clause = ', '.join(f'{c} = COALESCE(?, {c})' for c in update_cols)
+                cursor.executemany(
+                    f"UPDATE students SET {set_clause}, created_at = CURRENT_TIMESTAMP WHERE email = ?",
+                    [[p.get(c) for c in update_cols] + [p['email']] for p in updates]
+                )
+            if inserts:
+                cursor.executemany(
+                    f"INSERT INTO students ({', '.join(IMPORT_COLUMNS)}) VALUES ({', '.join(['?'] * len(IMPORT_COLUMNS))})",
+                    [self._insert_values(p) for p in inserts]
+                )
+        return len(inserts), len(updates)
+
+    def _update_columns(self, updates):
+        cols = set()
+        for payload in updates:
+            cols.update(payload)
+        return cols
+
+    def _insert_values(self, payload):
+        values = []
+        for col in IMPORT_COLUMNS:
+            value = payload.get(col)
+            if col == 'eye_diseases' and value is None:
+                value = DEFAULT_EYE_DISEASES
+            values.append(value)
+        return values
+
+    def _upsert_postgres(self, cursor, updates, update_cols, inserts):
+        """COPY the batch into a temp table, then apply it with one UPDATE and one INSERT"""
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS students_import_stage AS "
+            f"SELECT {', '.join(IMPORT_COLUMNS)}, NULL::boolean AS is_update FROM students WITH NO DATA"
+        )
+        cursor.execute("TRUNCATE students_import_stage")
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for payload in updates:
+            writer.writerow([self._copy_value(payload.get(c)) for c in IMPORT_COLUMNS] + ['t'])
+        for payload in inserts:
+            writer.writerow([self._copy_value(v) for v in self._insert_values(payload)] + ['f'])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY students_import_stage ({', '.join(IMPORT_COLUMNS)}, is_update) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+        if updates and update_cols:
+            set_clause = ', '.join(f'{c} = COALESCE(s.{c}, students.{c})' for c in update_cols)
+            cursor.execute(f"""
+                UPDATE students SET {set_clause}, created_at = CURRENT_TIMESTAMP
+                FROM students_import_stage s
+                WHERE s.is_update AND students.email = s.email
+            """)
+        if inserts:
+            cursor.execute(f"""
+                INSERT INTO students ({', '.join(IMPORT_COLUMNS)})
+                SELECT {', '.join(IMPORT_COLUMNS)} FROM students_import_stage WHERE NOT is_update
+            """)
+
+    @staticmethod
+    def _copy_value(value):
+        # Trong COPY csv, ô trống không có dấu nháy là NULL
+        return '' if value is None else value
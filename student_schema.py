@@ -0,0 +1,389 @@
+"""
+Danh mục cột (schema registry) của bảng students.
+
+Bảng students có hai "đời" cột: bảng gốc tạo bởi init_database() dùng tên tiếng
+Việt (ho_ten, lop, ...), các form mới ghi thêm cột tiếng Anh (nickname, height, ...).
+Module này giữ các bảng ánh xạ dùng chung (form -> cột DB, cột -> nhãn khi xuất
+file), đọc danh sách cột thực tế một lần cho mỗi process và dựng câu SELECT chỉ
+gồm các trường client yêu cầu qua tham số fields=.
+"""
+import threading
+import time
+from functools import lru_cache
+
+# Tên trường API -> cột cũ (tiếng Việt) dùng khi bảng chưa có cột mới
+LEGACY_COLUMN_ALIASES = {
+    'full_name': 'ho_ten',
+    'class': 'lop',
+    'grade': 'khoi',
+    'birth_date': 'ngay_sinh',
+    'gender': 'gioi_tinh',
+    'phone': 'sdt',
+    'ethnicity': 'dan_toc',
+    'religion': 'ton_giao',
+    'current_address_detail': 'dia_chi',
+    'current_province': 'tinh_thanh',
+    'father_name': 'ho_ten_cha',
+    'father_job': 'nghe_nghiep_cha',
+    'mother_name': 'ho_ten_me',
+    'mother_job': 'nghe_nghiep_me',
+}
+
+# Cột trong DB -> key JSON mà form (page*.html) gửi lên /api/save-student
+STUDENT_COLUMN_MAP = [
+    ('email', 'email'),
+    ('ho_ten', 'fullName'),
+    ('lop', 'class'),
+    ('khoi', 'grade'),
+    ('ngay_sinh', 'birthDate'),
+    ('gioi_tinh', 'gender'),
+    ('sdt', 'phone'),
+    ('dan_toc', 'ethnicity'),
+    ('ton_giao', 'religion'),
+    ('dia_chi', 'currentAddressDetail'),
+    ('tinh_thanh', 'currentProvince'),
+    ('ho_ten_cha', 'fatherName'),
+    ('nghe_nghiep_cha', 'fatherJob'),
+    ('ho_ten_me', 'motherName'),
+    ('nghe_nghiep_me', 'motherJob'),
+    # Personal info extended
+    ('nickname', 'nickname'),
+    ('nationality', 'nationality'),
+    ('citizen_id', 'citizenId'),
+    ('cccd_date', 'cccdDate'),
+    ('cccd_place', 'cccdPlace'),
+    ('personal_id', 'personalId'),
+    ('passport', 'passport'),
+    ('passport_date', 'passportDate'),
+    ('passport_place', 'passportPlace'),
+    ('occupation', 'occupation'),
+    ('organization', 'organization'),
+    # Address info
+    ('permanent_province', 'permanentProvince'),
+    ('permanent_ward', 'permanentWard'),
+    ('permanent_hamlet', 'permanentHamlet'),
+    ('permanent_street', 'permanentStreet'),
+    ('hometown_province', 'hometownProvince'),
+    ('hometown_ward', 'hometownWard'),
+    ('hometown_hamlet', 'hometownHamlet'),
+    ('current_ward', 'currentWard'),
+    ('current_hamlet', 'currentHamlet'),
+    ('birthplace_province', 'birthplaceProvince'),
+    ('birthplace_ward', 'birthplaceWard'),
+    ('birthplace_detail', 'birthplaceDetail'),
+    ('birth_cert_province', 'birthCertProvince'),
+    ('birth_cert_ward', 'birthCertWard'),
+    # Health info
+    ('height', 'height'),
+    ('weight', 'weight'),
+    ('eye_diseases', 'eyeConditions'),  # Fixed: Map eyeConditions from frontend
+    ('swimming_skill', 'swimmingSkill'),
+    # Device info
+    ('smartphone', 'smartphone'),
+    ('computer', 'computer'),
+    # Family info
+    ('father_ethnicity', 'fatherEthnicity'),
+    ('father_birth_year', 'fatherBirthYear'),
+    ('father_phone', 'fatherPhone'),
+    ('father_cccd', 'fatherCCCD'),
+    ('mother_ethnicity', 'motherEthnicity'),
+    ('mother_birth_year', 'motherBirthYear'),
+    ('mother_phone', 'motherPhone'),
+    ('mother_cccd', 'motherCCCD'),
+    ('guardian_name', 'guardianName'),
+    ('guardian_job', 'guardianJob'),
+    ('guardian_birth_year', 'guardianBirthYear'),
+    ('guardian_phone', 'guardianPhone'),
+    ('guardian_cccd', 'guardianCCCD'),
+    ('guardian_gender', 'guardianGender')
+]
+
+
+def normalize_value(db_col, val):
+    """Normalize one submitted value for its DB column (dates, integers, eye_diseases)"""
+    if db_col == 'eye_diseases':
+        # Handle the new eyeConditions format
+        if isinstance(val, str) and val and val != 'Chưa có thông tin':
+            return val  # Store as simple string
+        return 'Chưa có thông tin'  # Default value
+    elif db_col in ['ngay_sinh', 'cccd_date', 'passport_date']:
+        # Convert dd/mm/yyyy to yyyy-mm-dd for PostgreSQL
+        if val and isinstance(val, str) and val.strip():
+            try:
+                # Handle dd/mm/yyyy format
+                if '/' in val:
+                    parts = val.split('/')
+                    if len(parts) == 3:
+                        day, month, year = parts
+                        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+                # Handle yyyy-mm-dd format (already correct)
+                elif '-' in val and len(val) == 10:
+                    return val
+            except:
+                pass
+        # Return None for empty or invalid dates
+        return None
+    elif db_col in ['height', 'weight', 'father_birth_year', 'mother_birth_year', 'guardian_birth_year']:
+        # Handle integer fields - convert empty string to None
+        if val and isinstance(val, str) and val.strip():
+            try:
+                return int(val)
+            except ValueError:
+                return None
+        elif isinstance(val, int):
+            return val
+        return None
+    return val
+
+
+# Nhãn cột tiếng Việt dùng khi xuất file (Excel/CSV/JSON) và khi nhập lại
+EXPORT_COLUMN_LABELS = {
+    'id': 'STT',
+    'email': 'Email',
+    'full_name': 'Họ và tên',
+    'nickname': 'Tên gọi khác',
+    'class': 'Lớp',
+    'khoi': 'Khối',
+    'birth_date': 'Ngày sinh',
+    'gender': 'Giới tính',
+    'ethnicity': 'Dân tộc',
+    'nationality': 'Quốc tịch',
+    'religion': 'Tôn giáo',
+    'phone': 'Số điện thoại',
+    'citizen_id': 'Số CCCD',
+    'cccd_date': 'Ngày cấp CCCD',
+    'cccd_place': 'Nơi cấp CCCD',
+    'personal_id': 'Mã định danh',
+    'passport': 'Số hộ chiếu',
+    'passport_date': 'Ngày cấp hộ chiếu',
+    'passport_place': 'Nơi cấp hộ chiếu',
+    'organization': 'Đoàn/Đội',
+    'permanent_province': 'Tỉnh thường trú',
+    'permanent_ward': 'Phường thường trú',
+    'permanent_hamlet': 'Khu phố thường trú',
+    'permanent_street': 'Địa chỉ thường trú',
+    'hometown_province': 'Tỉnh quê quán',
+    'hometown_ward': 'Phường quê quán',
+    'hometown_hamlet': 'Khu phố quê quán',
+    'birth_cert_province': 'Tỉnh cấp giấy khai sinh',
+    'birth_cert_ward': 'Phường cấp giấy khai sinh',
+    'birthplace_province': 'Tỉnh nơi sinh',
+    'birthplace_ward': 'Phường nơi sinh',
+    'birthplace_detail': 'Nơi sinh chi tiết',
+    'current_address_detail': 'Địa chỉ hiện tại',
+    'current_province': 'Tỉnh hiện tại',
+    'current_ward': 'Phường hiện tại',
+    'current_hamlet': 'Khu phố hiện tại',
+    'height': 'Chiều cao (cm)',
+    'weight': 'Cân nặng (kg)',
+    'eye_diseases': 'Tật khúc xạ (mắt)',
+    'swimming_skill': 'Kỹ năng bơi',
+    'smartphone': 'Điện thoại thông minh',
+    'computer': 'Máy tính',
+    'father_ethnicity': 'Dân tộc của cha',
+    'mother_ethnicity': 'Dân tộc của mẹ',
+    'father_name': 'Họ tên cha',
+    'father_job': 'Nghề nghiệp cha',
+    'father_birth_year': 'Năm sinh cha',
+    'father_phone': 'SĐT cha',
+    'father_cccd': 'CCCD cha',
+    'mother_name': 'Họ tên mẹ',
+    'mother_job': 'Nghề nghiệp mẹ',
+    'mother_birth_year': 'Năm sinh mẹ',
+    'mother_phone': 'SĐT mẹ',
+    'mother_cccd': 'CCCD mẹ',
+    'guardian_name': 'Họ tên người giám hộ',
+    'guardian_job': 'Nghề nghiệp người giám hộ',
+    'guardian_birth_year': 'Năm sinh người giám hộ',
+    'guardian_phone': 'SĐT người giám hộ',
+    'guardian_cccd': 'CCCD người giám hộ',
+    'guardian_gender': 'Giới tính người giám hộ',
+    'created_at': 'Thời gian nộp kê khai',
+    'updated_at': 'Thời gian cập nhật'
+}
+
+
+def build_student_payload(data):
+    """Map a form/JSON submission (camelCase keys) to {db_column: value}"""
+    payload = {}
+    for db_col, json_key in STUDENT_COLUMN_MAP:
+        if json_key in data and data[json_key] is not None and data[json_key] != '':
+            # Field has actual data
+            payload[db_col] = normalize_value(db_col, data.get(json_key))
+        else:
+            # Field is missing or empty - set appropriate default
+            if db_col == 'eye_diseases':
+                payload[db_col] = 'Chưa có thông tin'  # Default value for eye diseases
+            else:
+                payload[db_col] = None  # Set to NULL for all other missing fields
+
+    fill_grade(payload)
+    return payload
+
+
+def fill_grade(payload):
+    # Extract grade (khoi) from class if not provided directly
+    if not payload.get('khoi') and payload.get('lop'):
+        class_value = payload['lop']
+        if class_value and len(class_value) >= 2:
+            payload['khoi'] = class_value[:2]  # Extract first 2 characters (10, 11, 12)
+    return payload
+
+
+# Trường do API tính thêm -> các cột cần đọc để tính
+DERIVED_FIELDS = {
+    'eyeDiseases': ('eye_diseases',),
+    'eyeConditions': ('eye_diseases',),
+    'tinh_thanh': ('current_province', 'tinh_thanh'),
+    'permanent_address': ('permanent_street', 'permanent_hamlet', 'permanent_ward', 'permanent_province'),
+    'temporary_address': ('current_address_detail', 'current_hamlet', 'current_ward', 'current_province'),
+    'id_number': ('citizen_id', 'personal_id'),
+}
+
+# Các projection hay dùng, dựng sẵn câu SELECT khi warm()
+TABLE_FIELDS = ('id', 'email', 'full_name', 'class', 'birth_date', 'gender', 'phone', 'created_at')
+COMMON_PROJECTIONS = (
+    TABLE_FIELDS,
+    TABLE_FIELDS + ('eye_diseases', 'current_province'),
+)
+
+MAX_FIELDS = 100
+
+# Không đọc lại schema quá thường xuyên khi client gửi trường lạ
+REFRESH_INTERVAL = 30
+
+
+class InvalidFieldsError(ValueError):
+    """Raised when fields= names something that is not a column or derived field"""
+
+    def __init__(self, unknown, allowed):
+        self.unknown = unknown
+        self.allowed = allowed
+        super().__init__(f"Trường không hợp lệ: {', '.join(unknown)}")
+
+
+def parse_fields(raw):
+    """Split a fields= value into an ordered tuple of unique names (None if absent)"""
+    if raw is None:
+        return None
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    if not fields:
+        return None
+    if len(fields) > MAX_FIELDS:
+        raise InvalidFieldsError([f'tối đa {MAX_FIELDS} trường'], [])
+    return tuple(fields)
+
+
+@lru_cache(maxsize=256)
+def build_select_list(columns, fields):
+    """Build the SELECT list for a projection.
+
+    columns is the (hashable) tuple of real columns so a schema change simply
+    produces new cache entries. id is always selected.
+    """
+    available = set(columns)
+    exprs = []
+    seen = set()
+
+    def add(expr, name):
+        if name not in seen:
+            seen.add(name)
+            exprs.append(expr)
+
+    add('id', 'id')
+    for field in fields:
+        if field in available:
+            add(field, field)
+        elif LEGACY_COLUMN_ALIASES.get(field) in available:
+            add(f'{LEGACY_COLUMN_ALIASES[field]} AS {field}', field)
+        elif field in DERIVED_FIELDS:
+            for source in DERIVED_FIELDS[field]:
+                if source in available:
+                    add(source, source)
+                elif LEGACY_COLUMN_ALIASES.get(source) in available:
+                    add(f'{LEGACY_COLUMN_ALIASES[source]} AS {source}', source)
+    return ', '.join(exprs)
+
+
+class StudentSchema:
+    """Per-process cache of the students table's columns"""
+
+    def __init__(self, get_connection, db_type):
+        self._get_connection = get_connection
+        self._db_type = db_type
+        self._columns = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load_columns(self):
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            if self._db_type == 'postgresql':
+                cursor.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name = 'students' ORDER BY ordinal_position
+                """)
+                columns = tuple(row[0] for row in cursor.fetchall())
+            else:
+                cursor.execute('PRAGMA table_info(students)')
+                columns = tuple(row[1] for row in cursor.fetchall())
+        finally:
+            conn.close()
+        return columns
+
+    def columns(self, refresh=False):
+        if self._columns is None or refresh:
+            with self._lock:
+                if self._columns is None or refresh:
+                    self._columns = self._load_columns()
+                    self._loaded_at = time.monotonic()
+                    print(f"[SCHEMA] Loaded {len(self._columns)} columns of students")
+        return self._columns
+
+    def invalidate(self):
+        with self._lock:
+            self._columns = None
+
+    def allowed_fields(self, columns=None):
+        columns = set(columns or self.columns())
+        aliases = {f for f, legacy in LEGACY_COLUMN_ALIASES.items() if legacy in columns}
+        return sorted(columns | aliases | set(DERIVED_FIELDS))
+
+    def select_list(self, fields):
+        """Validate fields and return the SELECT list for them.
+
+        Raises InvalidFieldsError listing the unknown names. The column list is
+        reloaded once (rate limited) before rejecting, in case a migration added
+        columns after this process started.
+        """
+        columns = self.columns()
+        allowed = set(self.allowed_fields(columns))
+        unknown = [f for f in fields if f not in allowed]
+        if unknown and time.monotonic() - self._loaded_at > REFRESH_INTERVAL:
+            columns = self.columns(refresh=True)
+            allowed = set(self.allowed_fields(columns))
+            unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise InvalidFieldsError(unknown, sorted(allowed))
+        return build_select_list(columns, fields)
+
+    def warm(self):
+        """Load the column list and prebuild the common projections"""
+        columns = self.columns()
+        for fields in COMMON_PROJECTIONS:
+            build_select_list(columns, fields)
+        return columns
+
+
+def project(student, fields):
+    """Keep only the requested keys (plus id) of a processed student dict"""
+    result = {'id': student.get('id')}
+    for field in fields:
+        if field in student:
+            result[field] = student[field]
+    return result
@@ -0,0 +1,348 @@
+"""
+Thống kê tổng hợp cho dashboard admin (/api/stats), duy trì dần theo từng lần ghi.
+
+Bảng student_stats giữ số học sinh theo (dimension, bucket): lớp, khối, giới tính,
+dân tộc, tôn giáo, tỉnh thường trú, từng bệnh về mắt, khoảng chiều cao/cân nặng/BMI
+và ngày nộp kê khai gần nhất. Trigger trên students (như change_feed: áp dụng cho
+mọi đường ghi - form, journal, import, dữ liệu mẫu, xóa) trừ bucket cũ và cộng
+bucket mới của dòng vừa ghi, nên /api/stats chỉ đọc vài trăm dòng thay vì
+GROUP BY trên toàn bảng.
+
+- Giá trị trống được đếm vào bucket '' (chưa khai); số liệu không hợp lệ
+  (chiều cao/cân nặng <= 0 hoặc không phải số) không được đếm.
+- Một học sinh có thể có nhiều bệnh về mắt; học sinh không có bệnh nào trong
+  EYE_CONDITIONS được đếm vào EYE_NONE.
+- BMI phân loại theo ngưỡng của WHO cho người châu Á trưởng thành, chỉ mang tính
+  tham khảo với học sinh (chuẩn cho trẻ em là BMI theo tuổi).
+- Ngày nộp tính theo giờ Việt Nam từ created_at (UTC), là lần nộp gần nhất của
+  mỗi học sinh.
+
+Nếu bảng bị lệch (sửa tay trong DB, trigger bị tắt...), rebuild_stats tính lại
+toàn bộ bằng GROUP BY và thay thế bảng (xem rebuild_stats.py).
+"""
+
+STATS_TABLE = 'student_stats'
+
+# Giá trị các ô chọn bệnh về mắt trên page3.html
+EYE_CONDITIONS = (
+    'Cận thị', 'Viễn thị', 'Loạn thị', 'Đục thủy tinh thể', 'Thoái hóa điểm',
+    'Bệnh khô mắt', 'Bệnh lác', 'Bệnh khác về mắt',
+)
+EYE_NONE = 'Không có / chưa khai'
+
+HEIGHT_BIN_CM = 10
+WEIGHT_BIN_KG = 5
+BMI_BIN = 2
+BMI_CATEGORIES = ((18.5, 'Thiếu cân'), (23, 'Bình thường'), (25, 'Thừa cân'), (None, 'Béo phì'))
+
+# dimension -> các cột nguồn, ưu tiên theo thứ tự (schema cũ trước: form ghi vào đó)
+CATEGORY_DIMENSIONS = (
+    ('class', ('lop', 'class')),
+    ('gender', ('gioi_tinh', 'gender')),
+    ('ethnicity', ('dan_toc', 'ethnicity')),
+    ('religion', ('ton_giao', 'religion')),
+    ('permanent_province', ('permanent_province',)),
+)
+
+# dimension -> key trong response của /api/stats
+RESPONSE_KEYS = {
+    'class': 'by_class',
+    'grade': 'by_grade',
+    'gender': 'by_gender',
+    'ethnicity': 'by_ethnicity',
+    'religion': 'by_religion',
+    'permanent_province': 'by_permanent_province',
+    'eye_condition': 'by_eye_condition',
+    'height_cm': 'height_cm',
+    'weight_kg': 'weight_kg',
+    'bmi': 'bmi',
+    'bmi_category': 'bmi_category',
+    'submitted_on': 'submissions_by_day',
+}
+RANGE_DIMENSIONS = ('height_cm', 'weight_kg', 'bmi')
+
+DDL = {
+    'sqlite': f'''
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            student_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket)
+        )
+    ''',
+    'postgresql': f'''
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            dimension VARCHAR(50) NOT NULL,
+            bucket VARCHAR(255) NOT NULL,
+            student_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket)
+        )
+    ''',
+}
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _text(columns, candidates, row):
+    """First non-empty of the candidate columns that exist, '' if all are empty"""
+    present = [f"NULLIF(TRIM({row}{c}), '')" for c in candidates if c in columns]
+    if not present:
+        return None
+    return f"COALESCE({', '.join(present)}, '')"
+
+
+def _number(column, row, db_type):
+    """Positive numeric value of a column, NULL when missing or not a number"""
+    if db_type == 'postgresql':
+        # Cột có thể là TEXT ở schema cũ: ép kiểu chuỗi không phải số sẽ làm hỏng lần ghi
+        value = f"CASE WHEN CAST({row}{column} AS TEXT) ~ '^[0-9]+([.,][0-9]+)?$' " \
+                f"THEN CAST(REPLACE(CAST({row}{column} AS TEXT), ',', '.') AS NUMERIC) END"
+    else:
+        value = f"CAST({row}{column} AS REAL)"
+    return f"CASE WHEN {value} > 0 THEN {value} END"
+
+
+def _range(value, width, db_type):
+    """'150-159' style bucket for value in bins of `width`"""
+    if db_type == 'postgresql':
+        low = f"CAST(FLOOR(({value}) / {width}) * {width} AS INTEGER)"
+    else:
+        low = f"CAST(CAST(({value}) / {width} AS INTEGER) * {width} AS INTEGER)"
+    return f"CASE WHEN ({value}) IS NOT NULL THEN CAST({low} AS TEXT) || '-' || CAST({low} + {width - 1} AS TEXT) END"
+
+
+def _contains(haystack, needle, db_type):
+    function = 'STRPOS' if db_type == 'postgresql' else 'INSTR'
+    return f"COALESCE({function}({haystack}, {_literal(needle)}), 0) > 0"
+
+
+def stat_terms(columns, db_type, row=''):
+    """(dimension, SQL expression of the bucket) pairs for the students columns.
+
+    `row` prefixes the column names: 'NEW.'/'OLD.' inside triggers, '' in a
+    SELECT over students. A NULL bucket means the row is not counted.
+    """
+    columns = set(columns)
+    terms = [('total', "'all'")]
+    for dimension, candidates in CATEGORY_DIMENSIONS:
+        expr = _text(columns, candidates, row)
+        if expr is not None:
+            terms.append((dimension, expr))
+
+    class_expr = _text(columns, ('lop', 'class'), row)
+    if 'khoi' in columns or class_expr is not None:
+        grade = [f"NULLIF(TRIM({row}khoi), '')"] if 'khoi' in columns else []
+        if class_expr is not None:
+            grade.append(f"NULLIF(SUBSTR({class_expr}, 1, 2), '')")
+        terms.append(('grade', f"COALESCE({', '.join(grade)}, '')"))
+
+    if 'eye_diseases' in columns:
+        eye = f'{row}eye_diseases'
+        for condition in EYE_CONDITIONS:
+            terms.append(('eye_condition',
+                          f"CASE WHEN {_contains(eye, condition, db_type)} THEN {_literal(condition)} END"))
+        none = ' OR '.join(_contains(eye, condition, db_type) for condition in EYE_CONDITIONS)
+        terms.append(('eye_condition', f"CASE WHEN NOT ({none}) THEN {_literal(EYE_NONE)} END"))
+
+    height = _number('height', row, db_type) if 'height' in columns else None
+    weight = _number('weight', row, db_type) if 'weight' in columns else None
+    if height is not None:
+        terms.append(('height_cm', _range(height, HEIGHT_BIN_CM, db_type)))
+    if weight is not None:
+        terms.append(('weight_kg', _range(weight, WEIGHT_BIN_KG, db_type)))
+    if height is not None and weight is not None:
+        bmi = f"(({weight}) / ((({height}) / 100.0) * (({height}) / 100.0)))"
+        terms.append(('bmi', _range(bmi, BMI_BIN, db_type)))
+        cases = ' '.join(f"WHEN {bmi} < {limit} THEN {_literal(label)}"
+                         for limit, label in BMI_CATEGORIES if limit is not None)
+        terms.append(('bmi_category', f"CASE WHEN {bmi} IS NULL THEN NULL {cases} "
+                                      f"ELSE {_literal(BMI_CATEGORIES[-1][1])} END"))
+
+    if 'created_at' in columns:
+        if db_type == 'postgresql':
+            day = f"TO_CHAR({row}created_at + INTERVAL '7 hours', 'YYYY-MM-DD')"
+        else:
+            day = f"DATE({row}created_at, '+7 hours')"
+        terms.append(('submitted_on', day))
+    return terms
+
+
+def _increment(dimension, expr, delta):
+    """Upsert adding delta to the bucket of expr (skipped when the bucket is NULL)"""
+    return f'''
+        INSERT INTO {STATS_TABLE} (dimension, bucket, student_count)
+        SELECT {_literal(dimension)}, b, {delta} FROM (SELECT {expr} AS b) AS term WHERE b IS NOT NULL
+        ON CONFLICT (dimension, bucket) DO UPDATE SET student_count = {STATS_TABLE}.student_count + {delta};'''
+
+
+def _decrement(dimension, expr):
+    return f'''
+        UPDATE {STATS_TABLE} SET student_count = student_count - 1
+        WHERE dimension = {_literal(dimension)} AND bucket = {expr};'''
+
+
+def _sqlite_triggers(columns):
+    new_terms = stat_terms(columns, 'sqlite', 'NEW.')
+    old_terms = stat_terms(columns, 'sqlite', 'OLD.')
+    insert = ''.join(_increment(d, e, 1) for d, e in new_terms)
+    delete = ''.join(_decrement(d, e) for d, e in old_terms)
+    # Chỉ đụng tới bucket thật sự đổi: trigger của change_feed cũng UPDATE students (updated_at)
+    update = ''.join(
+        _decrement(d, f'CASE WHEN ({old}) IS NOT ({new}) THEN {old} END')
+        + _increment(d, f'CASE WHEN ({old}) IS NOT ({new}) THEN {new} END', 1)
+        for (d, old), (_, new) in zip(old_terms, new_terms)
+    )
+    return (
+        'DROP TRIGGER IF EXISTS students_stats_insert',
+        'DROP TRIGGER IF EXISTS students_stats_update',
+        'DROP TRIGGER IF EXISTS students_stats_delete',
+        f'CREATE TRIGGER students_stats_insert AFTER INSERT ON students BEGIN {insert} END',
+        f'CREATE TRIGGER students_stats_update AFTER UPDATE ON students BEGIN {update} END',
+        f'CREATE TRIGGER students_stats_delete AFTER DELETE ON students BEGIN {delete} END',
+    )
+
+
+def _postgres_triggers(columns):
+    new_terms = stat_terms(columns, 'postgresql', 'NEW.')
+    old_terms = stat_terms(columns, 'postgresql', 'OLD.')
+    insert = ''.join(_increment(d, e, 1) for d, e in new_terms)
+    delete = ''.join(_decrement(d, e) for d, e in old_terms)
+    update = ''.join(
+        f'''
+        IF ({old}) IS DISTINCT FROM ({new}) THEN {_decrement(d, old)} {_increment(d, new, 1)}
+        END IF;'''
+        for (d, old), (_, new) in zip(old_terms, new_terms)
+    )
+    return (
+        f'''
+        CREATE OR REPLACE FUNCTION students_update_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN {insert}
+            ELSIF TG_OP = 'DELETE' THEN {delete}
+            ELSE {update}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS students_update_stats ON students',
+        '''
+        CREATE TRIGGER students_update_stats AFTER INSERT OR UPDATE OR DELETE ON students
+        FOR EACH ROW EXECUTE PROCEDURE students_update_stats()
+        ''',
+    )
+
+
+def _has_table(cursor, db_type):
+    if db_type == 'postgresql':
+        cursor.execute(f"SELECT to_regclass('{STATS_TABLE}') IS NOT NULL")
+    else:
+        cursor.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = '{STATS_TABLE}'")
+    return bool(cursor.fetchone()[0])
+
+
+def ensure_stats_tracking(conn, db_type, columns):
+    """Create student_stats and (re)install its triggers for the current columns.
+
+    The triggers are rebuilt every time because the bucket expressions depend on
+    which columns exist. A new table is filled from the existing students.
+    """
+    cursor = conn.cursor()
+    has_table = _has_table(cursor, db_type)
+    cursor.execute(DDL[db_type])
+    for statement in (_postgres_triggers(columns) if db_type == 'postgresql' else _sqlite_triggers(columns)):
+        cursor.execute(statement)
+    conn.commit()
+    if not has_table:
+        report = rebuild_stats(conn, db_type, columns)
+        print(f"[STATS] ✅ Aggregates created from {report['students']} existing students")
+
+
+def compute_stats(cursor, db_type, columns):
+    """{(dimension, bucket): count} computed from scratch with GROUP BY"""
+    counts = {}
+    for dimension, expr in stat_terms(columns, db_type):
+        cursor.execute(f'''
+            SELECT b, COUNT(*) FROM (SELECT {expr} AS b FROM students) AS term
+            WHERE b IS NOT NULL GROUP BY b
+        ''')
+        for bucket, count in cursor.fetchall():
+            key = (dimension, bucket)
+            counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def stored_stats(cursor):
+    """{(dimension, bucket): count} as kept by the triggers (zero buckets left out)"""
+    cursor.execute(f'SELECT dimension, bucket, student_count FROM {STATS_TABLE} WHERE student_count <> 0')
+    return {(dimension, bucket): count for dimension, bucket, count in cursor.fetchall()}
+
+
+def rebuild_stats(conn, db_type, columns, check_only=False):
+    """Recompute the aggregates and replace the stored ones (unless check_only).
+
+    Writes to students are blocked meanwhile so none is lost between the
+    recount and the replacement. Returns the students count and the drifted
+    buckets as {'dimension', 'bucket', 'stored', 'actual'} dicts.
+    """
+    cursor = conn.cursor()
+    if db_type == 'postgresql':
+        cursor.execute('LOCK TABLE students IN SHARE MODE')
+    else:
+        cursor.execute('BEGIN IMMEDIATE')
+    try:
+        actual = compute_stats(cursor, db_type, columns)
+        stored = stored_stats(cursor)
+        drift = [
+            {'dimension': key[0], 'bucket': key[1], 'stored': stored.get(key, 0), 'actual': actual.get(key, 0)}
+            for key in sorted(set(actual) | set(stored))
+            if stored.get(key, 0) != actual.get(key, 0)
+        ]
+        if not check_only:
+            cursor.execute(f'DELETE FROM {STATS_TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {STATS_TABLE} (dimension, bucket, student_count) VALUES '
+                + ('(%s, %s, %s)' if db_type == 'postgresql' else '(?, ?, ?)'),
+                [(dimension, bucket, count) for (dimension, bucket), count in actual.items()]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'students': actual.get(('total', 'all'), 0), 'drift': drift}
+
+
+def _range_start(bucket):
+    try:
+        return float(bucket.split('-', 1)[0])
+    except ValueError:
+        return float('inf')
+
+
+def format_stats(stored, sort_key=None):
+    """Response body of /api/stats from stored_stats().
+
+    Category lists are sorted by count (classes and grades with sort_key),
+    ranges by their lower bound and submissions by day.
+    """
+    groups = {}
+    for (dimension, bucket), count in stored.items():
+        if count > 0:
+            groups.setdefault(dimension, []).append((bucket, count))
+
+    result = {'total': dict(groups.get('total', [])).get('all', 0)}
+    for dimension, key in RESPONSE_KEYS.items():
+        items = groups.get(dimension, [])
+        if dimension == 'submitted_on':
+            result[key] = [{'date': bucket, 'count': count} for bucket, count in sorted(items)]
+            continue
+        if dimension in RANGE_DIMENSIONS:
+            items.sort(key=lambda item: _range_start(item[0]))
+        elif dimension in ('class', 'grade') and sort_key is not None:
+            items.sort(key=lambda item: sort_key(item[0]))
+        else:
+            items.sort(key=lambda item: (-item[1], item[0]))
+        result[key] = [{'value': bucket, 'count': count} for bucket, count in items]
+    return result
@@ -0,0 +1,444 @@
+"""
+Nhật ký ghi trước (write-ahead journal) cho bài nộp kê khai.
+
+Học sinh mất cả form 5 trang nếu DB (PostgreSQL trên Heroku) chập chờn đúng lúc
+nộp. Với journal, save-student ghi bài nộp thành một dòng JSON vào file của
+process và fsync; thread flusher đưa các bài nộp vào DB theo lô ở phía sau.
+save-student chờ lần ghi DB một lúc ngắn, DB chậm hơn thì trả 202 và trang xác nhận
+hỏi lại kết quả; bài nộp đã fsync thì không mất dù DB đang lỗi.
+
+- Mỗi process ghi vào segment riêng `<thời điểm>-<pid>.jsonl` và giữ flock trên
+  nó suốt vòng đời, nên process khác biết segment nào còn chủ.
+- Vị trí đã đưa vào DB của từng segment nằm trong `<segment>.done` (byte offset).
+  Segment đã đầy và đã flush hết thì bị xóa.
+- Segment của process đã chết (crash, deploy) được đọc lại và flush khi khởi động
+  và định kỳ trong flusher. Ghi lại một bài nộp hai lần không sao vì save-student
+  là upsert theo email.
+- Lỗi DB tạm thời (mất kết nối, khóa) thì thử lại mãi với backoff; lỗi của chính
+  bài nộp (dữ liệu không hợp lệ) sau JOURNAL_MAX_ATTEMPTS lần được chuyển vào
+  failed.jsonl để không chặn các bài nộp sau.
+- Kết quả từng bài nộp (đã lưu / lỗi) được giữ trong bộ nhớ để save-student chờ
+  được lần ghi DB (`wait`) và để trang done.html hỏi lại (`lookup`); process khác
+  trả lời từ failed.jsonl và phần chưa flush của các segment.
+
+Trên Windows không có fcntl: chỉ đọc lại segment cũ lúc khởi động.
+"""
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+JOURNAL_SEGMENT_BYTES = 8 * 1024 * 1024
+JOURNAL_FLUSH_BATCH = 200
+JOURNAL_MAX_ATTEMPTS = 5
+JOURNAL_RETRY_MAX = 30.0
+JOURNAL_ADOPT_INTERVAL = 30.0
+JOURNAL_OUTCOMES = 10000
+JOURNAL_RECENT_FAILURES = 20
+FAILED_FILE = 'failed.jsonl'
+
+
+def _read_offset(path):
+    try:
+        with open(path + '.done') as handle:
+            return int(handle.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_offset(path, offset):
+    tmp = f'{path}.done.tmp'
+    with open(tmp, 'w') as handle:
+        handle.write(str(offset))
+    os.replace(tmp, path + '.done')
+
+
+def _remove_segment(path):
+    for name in (path, path + '.done'):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(name)
+
+
+def _try_lock(fd):
+    """Exclusive non-blocking flock; True if we own the file now"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def read_entries(path, offset=0):
+    """(entry, end offset) for each complete line after `offset`; a torn last line is ignored"""
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        position = offset
+        for line in handle:
+            if not line.endswith(b'\n'):
+                break
+            position += len(line)
+            try:
+                yield json.loads(line), position
+            except ValueError:
+                print(f"[JOURNAL] ⚠️ Skipping unreadable line in {os.path.basename(path)} at {position}")
+
+
+def _describe(error):
+    return f'{type(error).__name__}: {error}'
+
+
+class _Segment:
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        _try_lock(self.fd)
+        self.size = os.fstat(self.fd).st_size
+        self.pending = 0
+        self.closed_for_writes = False
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            os.close(self.fd)
+
+
+class _Pending:
+    __slots__ = ('entry', 'segment', 'end', 'attempts')
+
+    def __init__(self, entry, segment, end):
+        self.entry = entry
+        self.segment = segment
+        self.end = end
+        self.attempts = 0
+
+
+class SubmissionJournal:
+    """Durable append + background flush of submissions; see module docstring.
+
+    apply_batch(entries) writes the entries to the DB and returns one exception
+    (or None) per entry; it raises for failures of the whole batch. is_transient
+    tells DB outages (retry forever) from bad entries (dead-letter after
+    JOURNAL_MAX_ATTEMPTS).
+    """
+
+    def __init__(self, directory, apply_batch, is_transient, on_flushed=None):
+        self.directory = directory
+        self.apply_batch = apply_batch
+        self.is_transient = is_transient
+        self.on_flushed = on_flushed
+        os.makedirs(directory, exist_ok=True)
+        self.reset()
+
+    def reset(self):
+        """Per-process state; the segments and thread of the parent are not ours after fork"""
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._settled = threading.Condition()
+        self._outcomes = OrderedDict()
+        self._segment = None
+        self._pending = deque()
+        self._thread = None
+        self._closed = False
+        self._retry_delay = 0
+        self.stats = {'appended': 0, 'flushed': 0, 'replayed': 0, 'dead_lettered': 0,
+                      'last_error': None, 'last_flush_at': None}
+
+    def append(self, email, data):
+        """Write one submission durably (fsync) and queue it for the DB; returns the entry id.
+
+        Raises OSError if the journal cannot be written.
+        """
+        entry = {'id': uuid.uuid4().hex, 'ts': time.time(), 'email': email, 'data': data}
+        line = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            if self._closed:
+                raise OSError('Journal đã đóng')
+            segment = self._current_segment()
+            os.write(segment.fd, line)
+            os.fsync(segment.fd)
+            segment.size += len(line)
+            segment.pending += 1
+            self._pending.append(_Pending(entry, segment, segment.size))
+            self.stats['appended'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='journal-flusher', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return entry['id']
+
+    def drain(self, timeout):
+        """Wait until every submission of this process is written or dead-lettered; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            self._wake.set()
+            time.sleep(0.05)
+        return False
+
+    def close(self, timeout=5.0):
+        """Stop the flusher and release the segment; unflushed entries stay on disk for replay_orphans"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def wait(self, entry_id, timeout):
+        """Block until the entry is written to the DB or dead-lettered, at most `timeout` seconds.
+
+        Returns {'status': 'saved'} or {'status': 'failed', 'error': ...}, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._settled:
+            while entry_id not in self._outcomes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._settled.wait(remaining)
+            return dict(self._outcomes[entry_id])
+
+    def lookup(self, entry_id):
+        """Outcome of a submission from any process: saved/failed/pending, or None if unknown.
+
+        Entries flushed by another process are not recorded anywhere but the DB,
+        so None can also mean saved; the caller checks the DB for those.
+        """
+        with self._settled:
+            outcome = self._outcomes.get(entry_id)
+        if outcome is not None:
+            return dict(outcome)
+        for record in self._failed_records():
+            if record.get('id') == entry_id:
+                return {'status': 'failed', 'error': record.get('error')}
+        for path in self._segment_paths():
+            if os.path.basename(path) == FAILED_FILE:
+                continue
+            with contextlib.suppress(OSError):
+                for entry, _ in read_entries(path, _read_offset(path)):
+                    if entry.get('id') == entry_id:
+                        return {'status': 'pending'}
+        return None
+
+    def _settle(self, entries_outcomes):
+        with self._settled:
+            for entry, error in entries_outcomes:
+                self._outcomes[entry['id']] = ({'status': 'saved'} if error is None
+                                               else {'status': 'failed', 'error': _describe(error)})
+                self._outcomes.move_to_end(entry['id'])
+            while len(self._outcomes) > JOURNAL_OUTCOMES:
+                self._outcomes.popitem(last=False)
+            self._settled.notify_all()
+
+    def _current_segment(self):
+        segment = self._segment
+        if segment is not None and segment.size >= JOURNAL_SEGMENT_BYTES:
+            segment.closed_for_writes = True
+            if not segment.pending:
+                self._drop(segment)
+            segment = None
+        if segment is None:
+            path = os.path.join(self.directory, f'{time.time_ns()}-{os.getpid()}.jsonl')
+            segment = self._segment = _Segment(path)
+        return segment
+
+    def _drop(self, segment):
+        segment.close()
+        _remove_segment(segment.path)
+
+    def _run(self):
+        next_adopt = 0
+        while not self._closed:
+            with self._lock:
+                idle = not self._pending
+            if idle:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                if self._closed:
+                    break
+            if fcntl is not None and time.monotonic() >= next_adopt:
+                next_adopt = time.monotonic() + JOURNAL_ADOPT_INTERVAL
+                with contextlib.suppress(Exception):
+                    self.replay_orphans()
+            with self._lock:
+                batch = [self._pending[i] for i in range(min(len(self._pending), JOURNAL_FLUSH_BATCH))]
+            if batch:
+                delay = self._flush(batch)
+                if delay:
+                    # Không để mỗi bài nộp mới đánh thức và dồn thêm truy vấn vào DB đang lỗi
+                    time.sleep(delay)
+
+    def _flush(self, batch):
+        """Apply one batch; returns the retry delay (0 = go on)"""
+        try:
+            errors = self.apply_batch([p.entry for p in batch])
+        except Exception as e:
+            return self._backoff(e)
+
+        done = 0
+        settled = []
+        for pending, error in zip(batch, errors):
+            if error is None:
+                done += 1
+                settled.append((pending.entry, None))
+                continue
+            if self.is_transient(error):
+                break
+            pending.attempts += 1
+            if pending.attempts < JOURNAL_MAX_ATTEMPTS:
+                break
+            self._dead_letter(pending.entry, error)
+            settled.append((pending.entry, error))
+            done += 1
+
+        with self._lock:
+            for _ in range(done):
+                pending = self._pending.popleft()
+                segment = pending.segment
+                segment.pending -= 1
+                if segment.closed_for_writes and not segment.pending:
+                    self._drop(segment)
+                else:
+                    _write_offset(segment.path, pending.end)
+        self._settle(settled)
+        if done:
+            self.stats['flushed'] += done
+            self.stats['last_flush_at'] = time.time()
+            if self.on_flushed is not None:
+                self.on_flushed()
+        if done < len(batch):
+            return self._backoff(errors[done])
+        self._retry_delay = 0
+        return 0
+
+    def _backoff(self, error):
+        self.stats['last_error'] = _describe(error)
+        delay = min(JOURNAL_RETRY_MAX, max(0.5, self._retry_delay * 2))
+        self._retry_delay = delay
+        print(f"[JOURNAL] ⚠️ Flush failed ({self.stats['last_error']}), retrying in {delay:.1f}s")
+        return delay
+
+    def _dead_letter(self, entry, error):
+        record = dict(entry, error=_describe(error), failed_at=time.time())
+        with open(os.path.join(self.directory, FAILED_FILE), 'a', encoding='utf-8') as handle:
+            handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+        self.stats['dead_lettered'] += 1
+        print(f"[JOURNAL] ❌ Submission {entry.get('id')} ({entry.get('email')}) moved to {FAILED_FILE}: {error}")
+
+    def _failed_records(self):
+        with contextlib.suppress(OSError):
+            with open(os.path.join(self.directory, FAILED_FILE), 'rb') as handle:
+                for line in handle:
+                    with contextlib.suppress(ValueError):
+                        yield json.loads(line)
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, '*.jsonl')),
+                      key=lambda p: os.path.basename(p))
+
+    def replay_orphans(self):
+        """Flush the segments no live process owns (left by a crash or a restart).
+
+        Returns the number of submissions written. Raises when the DB is still
+        unavailable; the segment is kept and picked up again later.
+        """
+        own = self._segment.path if self._segment is not None else None
+        total = 0
+        for path in self._segment_paths():
+            if path == own or os.path.basename(path) == FAILED_FILE:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if not _try_lock(fd):
+                    continue
+                total += self._replay_segment(path)
+            finally:
+                os.close(fd)
+        if total:
+            self.stats['replayed'] += total
+            print(f"[JOURNAL] ✅ Replayed {total} journaled submissions")
+            if self.on_flushed is not None:
+                self.on_flushed()
+        return total
+
+    def _replay_segment(self, path):
+        written = 0
+        offset = _read_offset(path)
+        batch = []
+        for entry, end in read_entries(path, offset):
+            batch.append((entry, end))
+            if len(batch) >= JOURNAL_FLUSH_BATCH:
+                written += self._replay_batch(path, batch)
+                batch = []
+        if batch:
+            written += self._replay_batch(path, batch)
+        _remove_segment(path)
+        return written
+
+    def _replay_batch(self, path, batch):
+        for attempt in range(1, JOURNAL_MAX_ATTEMPTS + 1):
+            errors = self.apply_batch([entry for entry, _ in batch])
+            transient = next((e for e in errors if e is not None and self.is_transient(e)), None)
+            if transient is not None:
+                raise transient
+            failed = [(entry, e) for (entry, _), e in zip(batch, errors) if e is not None]
+            if not failed:
+                break
+            if attempt == JOURNAL_MAX_ATTEMPTS:
+                for entry, error in failed:
+                    self._dead_letter(entry, error)
+        self._settle([(entry, error) for (entry, _), error in zip(batch, errors)])
+        _write_offset(path, batch[-1][1])
+        return len(batch)
+
+    def status(self):
+        """Depth and lag of the whole journal directory (all processes), for monitoring"""
+        depth = 0
+        oldest = None
+        segments = 0
+        size = 0
+        for path in self._segment_paths():
+            if os.path.basename(path) == FAILED_FILE:
+                continue
+            segments += 1
+            with contextlib.suppress(OSError):
+                size += os.path.getsize(path)
+                for entry, _ in read_entries(path, _read_offset(path)):
+                    depth += 1
+                    if oldest is None or entry.get('ts', 0) < oldest:
+                        oldest = entry.get('ts', 0)
+        failed = 0
+        recent = deque(maxlen=JOURNAL_RECENT_FAILURES)
+        for record in self._failed_records():
+            failed += 1
+            recent.append({key: record.get(key) for key in ('id', 'email', 'error', 'failed_at')})
+        return {
+            'depth': depth,
+            'lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0,
+            'segments': segments,
+            'bytes': size,
+            'dead_letters': failed,
+            'recent_failures': list(reversed(recent)),
+            'process': dict(self.stats, pid=os.getpid()),
+        }
@@ -0,0 +1,70 @@
+"""
+Fixture chung cho test: app được import một lần với SQLite tạm, mỗi test có file DB
+và thư mục journal riêng (reconfigure_database chuyển writer, pool, cache sang đó).
+"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope='session')
+def application(tmp_path_factory):
+    base = tmp_path_factory.mktemp('app')
+    os.environ.pop('DATABASE_URL', None)
+    os.environ.pop('SUBMISSION_JOURNAL_DIR', None)
+    os.environ.pop('STUDENT_CACHE_REDIS_URL', None)
+    os.environ['SQLITE_DB_PATH'] = str(base / 'import.db')
+    import app as application
+    application.app.config['TESTING'] = True
+    return application
+
+
+@pytest.fixture
+def db(application, tmp_path):
+    """Path of a fresh SQLite database with the full students schema, used by the app"""
+    path = str(tmp_path / 'students.db')
+    application.DB_CONFIG['path'] = path
+    application.init_db()
+    application.migrate_db()
+    # Cột tiếng Việt mà save_student ghi (xem benchmarks/bench_api.ensure_full_schema)
+    conn = application.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('PRAGMA table_info(students)')
+        existing = {row[1] for row in cursor.fetchall()}
+        for db_col, _ in application.STUDENT_COLUMN_MAP:
+            if db_col not in existing:
+                cursor.execute(f'ALTER TABLE students ADD COLUMN {db_col} TEXT')
+                existing.add(db_col)
+        conn.commit()
+    finally:
+        conn.close()
+    application.reconfigure_database(journal_dir=str(tmp_path / 'journal'))
+    yield path
+    if application.SUBMISSION_JOURNAL is not None:
+        application.SUBMISSION_JOURNAL.close()
+
+
+@pytest.fixture
+def client(application, db):
+    return application.app.test_client()
+
+
+@pytest.fixture
+def seed(application, db):
+    """seed(count): insert synthetic students from sample_data_generator into the test database"""
+    from sample_data_generator import generate_and_load
+
+    def insert(count, seed=7):
+        conn = application.get_db_connection()
+        try:
+            columns = set(application.STUDENT_SCHEMA.columns(refresh=True))
+            return generate_and_load(conn, 'sqlite', columns, count, seed=seed,
+                                     catalog=application.load_locations_latest())
+        finally:
+            conn.close()
+    return insert
@@ -0,0 +1,62 @@
+import json
+import sqlite3
+
+
+def stored_email(path, student_id):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT email FROM students WHERE id = ?', (student_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_change_feed_pages_upserts_and_tombstones(application, client, db, seed):
+    seed(30)
+    start = client.get('/api/changes?limit=1000').get_json()
+    assert len(start['changes']) == 30 and not start['has_more']
+    cursor = start['cursor']
+
+    client.post('/api/save-student', json={'email': 'feed@test.vn', 'fullName': 'Feed'})
+    conn = application.get_db_connection()
+    try:
+        conn.execute('DELETE FROM students WHERE id = 1')
+        conn.commit()
+    finally:
+        conn.close()
+
+    page = client.get(f'/api/changes?since={cursor}&limit=1').get_json()
+    assert page['has_more'] and len(page['changes']) == 1
+    rest = client.get(f"/api/changes?since={page['cursor']}").get_json()
+    changes = page['changes'] + rest['changes']
+
+    assert [(c['op'], c['email'] if c['op'] == 'upsert' else c['id']) for c in changes] == [
+        ('upsert', 'feed@test.vn'), ('delete', 1)]
+    assert [c['seq'] for c in changes] == sorted(c['seq'] for c in changes)
+    assert int(rest['cursor']) > int(cursor)
+    assert client.get(f"/api/changes?since={rest['cursor']}").get_json()['changes'] == []
+
+
+def test_delta_export_returns_rows_changed_since_the_cursor(application, client, db, seed):
+    seed(20)
+    first = client.get('/api/export-json?stream=ndjson')
+    cursor = first.headers.get('X-Changes-Cursor') or client.get('/api/changes?limit=1000').get_json()['cursor']
+
+    client.post('/api/save-student', json={'email': 'delta@test.vn', 'fullName': 'Mới'})
+    conn = application.get_db_connection()
+    try:
+        conn.execute("UPDATE students SET full_name = 'Đã Sửa' WHERE id = 3")
+        conn.commit()
+    finally:
+        conn.close()
+
+    delta = client.get(f'/api/export-json?stream=ndjson&since={cursor}')
+
+    emails = [json.loads(line)['Email'] for line in delta.data.decode('utf-8').splitlines()]
+    assert sorted(emails) == sorted(['delta@test.vn', stored_email(db, 3)])
+    assert int(delta.headers['X-Changes-Cursor']) > int(cursor)
+    assert client.get(f"/api/export-json?stream=ndjson&since={delta.headers['X-Changes-Cursor']}").status_code == 400
+
+
+def test_malformed_since_is_rejected(client, db):
+    assert client.get('/api/changes?since=hôm-qua').status_code == 400
+    assert client.get('/api/export-json?since=hôm-qua').status_code == 400
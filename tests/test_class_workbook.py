@@ -0,0 +1,70 @@
+import io
+import sqlite3
+import zipfile
+from collections import Counter
+
+import pytest
+from openpyxl import load_workbook
+
+from class_workbook import UNKNOWN_CLASS, sheet_title
+
+
+def class_counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT COALESCE(NULLIF(class, ''), ?), COUNT(*) FROM students GROUP BY 1",
+                                 (UNKNOWN_CLASS,)).fetchall())
+    finally:
+        conn.close()
+
+
+def sheet_rows(data):
+    """{sheet title: [class cell of each data row]} of an XLSX body"""
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    result = {}
+    for ws in workbook.worksheets:
+        rows = list(ws.iter_rows(values_only=True))
+        position = rows[0].index('Lớp')
+        result[ws.title] = [row[position] for row in rows[1:]]
+    workbook.close()
+    return result
+
+
+def test_sheet_titles_are_unique_and_valid():
+    used = set()
+    titles = [sheet_title(name, used) for name in ('10A1', '10A1', 'a/b:c*?[d]' * 5)]
+
+    assert len(set(titles)) == 3
+    assert all(len(t) <= 31 and not set('/\\:*?[]') & set(t) for t in titles)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_by_class_workbook_has_one_sheet_per_class(application, client, db, seed, monkeypatch, processes):
+    monkeypatch.setattr(application, 'EXPORT_RENDER_PROCESSES', processes)
+    seed(40)
+    expected = class_counts(db)
+
+    response = client.get('/api/export-xlsx?type=by_class')
+
+    assert response.status_code == 200
+    sheets = sheet_rows(response.data)
+    assert sorted(sheets) == sorted(expected)
+    for title, classes in sheets.items():
+        assert set(classes) == {title} and len(classes) == expected[title]
+
+
+def test_by_class_zip_has_one_workbook_per_class(client, db, seed):
+    seed(40)
+    expected = class_counts(db)
+
+    response = client.get('/api/export-xlsx?type=by_class&format=zip&grade=10')
+
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    bundle = zipfile.ZipFile(io.BytesIO(response.data))
+    grade_10 = {name: count for name, count in expected.items() if name.startswith('10')}
+    assert sorted(bundle.namelist()) == sorted(f'danh_sach_hoc_sinh_lop_{name}.xlsx' for name in grade_10)
+    counts = Counter()
+    for name in bundle.namelist():
+        for classes in sheet_rows(bundle.read(name)).values():
+            counts.update(classes)
+    assert counts == grade_10
@@ -0,0 +1,79 @@
+import datetime as dt
+import io
+import sqlite3
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq  # noqa: E402
+
+from columnar_export import SCHEMA_VERSION, STUDENT_COLUMNS, arrow_schema  # noqa: E402
+
+
+def stored(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT id, full_name, class, height, birth_date FROM students ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def as_rows(table):
+    data = table.select(['id', 'full_name', 'class', 'height', 'birth_date']).to_pydict()
+    return list(zip(*data.values()))
+
+
+def expected_rows(rows):
+    return [(i, name, cls, int(height) if height not in (None, '') else None,
+             dt.date.fromisoformat(birth) if birth else None) for i, name, cls, height, birth in rows]
+
+
+def test_parquet_round_trip_keeps_rows_and_schema(application, client, db, seed, monkeypatch):
+    monkeypatch.setattr(application, 'COLUMNAR_BATCH_SIZE', 16)
+    seed(50)
+
+    response = client.get('/api/export-parquet')
+
+    assert response.status_code == 200
+    parquet = pq.ParquetFile(io.BytesIO(response.data))
+    table = parquet.read()
+    assert parquet.metadata.num_row_groups == 4
+    assert table.schema.names == [name for name, _ in STUDENT_COLUMNS]
+    # Parquet không có timestamp theo giây: pyarrow đọc lại thành ms
+    assert [str(f.type).replace('[ms]', '[s]') for f in table.schema] == [str(f.type) for f in arrow_schema()]
+    assert table.schema.metadata[b'schema_version'] == str(SCHEMA_VERSION).encode('ascii')
+    assert table.schema.field('full_name').metadata[b'label'] == 'Họ và tên'.encode('utf-8')
+    assert as_rows(table) == expected_rows(stored(db))
+
+
+def test_arrow_stream_round_trip_and_bad_values_become_null(client, db, seed):
+    seed(20)
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE students SET height = 'cao', birth_date = '31/02/2009' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    response = client.get('/api/export-arrow?compression=lz4&classes=' + stored(db)[1][2])
+
+    table = pa.ipc.open_stream(io.BytesIO(response.data)).read_all()
+    rows = stored(db)
+    assert table.schema.equals(arrow_schema())
+    assert table.column('class').to_pylist() == [r[2] for r in rows if r[2] == rows[1][2]]
+
+    full = pa.ipc.open_stream(io.BytesIO(client.get('/api/export-arrow').data)).read_all()
+    first = as_rows(full)[0]
+    assert first[3] is None and first[4] is None
+    assert as_rows(full)[1:] == expected_rows(rows[1:])
+
+
+def test_unknown_compression_is_rejected(client, db):
+    response = client.get('/api/export-parquet?compression=lz4')
+
+    assert response.status_code == 400
+    assert response.get_json()['allowed'] == ['zstd', 'snappy', 'gzip', 'none']
+
+
+def test_missing_pyarrow_answers_501(application, client, db, monkeypatch):
+    monkeypatch.setattr(application, 'columnar_available', lambda: False)
+
+    assert client.get('/api/export-parquet').status_code == 501
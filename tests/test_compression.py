@@ -0,0 +1,110 @@
+import gzip
+import json
+import zlib
+
+import brotli
+import pytest
+from flask import Flask, Response, jsonify
+
+from compression import choose_encoding, compress_stream, init_compression
+
+
+class Chunks:
+    """Iterable with close(), like a generator holding a DB connection"""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def small_app():
+    flask_app = Flask(__name__)
+    init_compression(flask_app)
+    state = {}
+
+    @flask_app.route('/big')
+    def big():
+        response = jsonify({'rows': [{'id': i, 'name': 'Nguyễn Văn A'} for i in range(200)]})
+        response.set_etag('v1')
+        return response
+
+    @flask_app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @flask_app.route('/stream')
+    def stream():
+        state['chunks'] = Chunks([b'{"a":1}\n', '{"b":"ờ"}\n', b''])
+        return Response(state['chunks'], mimetype='application/x-ndjson')
+
+    flask_app.state = state
+    return flask_app
+
+
+def test_choose_encoding_prefers_brotli():
+    assert choose_encoding('gzip, br') == 'br'
+    assert choose_encoding('gzip, br;q=0') == 'gzip'
+    assert choose_encoding('identity') is None
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_stream_round_trip(encoding):
+    data = b''.join(compress_stream([b'abc', 'ờ', b'', b'def'], encoding))
+
+    plain = brotli.decompress(data) if encoding == 'br' else zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    assert plain == 'abcờdef'.encode('utf-8')
+
+
+def test_large_json_is_compressed_and_etag_weakened(small_app):
+    client = small_app.test_client()
+    plain = client.get('/big')
+    packed = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers and plain.headers['Vary'] == 'Accept-Encoding'
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert packed.headers['ETag'] == 'W/"v1"'
+    assert len(packed.data) < len(plain.data)
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+
+
+def test_small_json_is_left_alone(small_app):
+    response = small_app.test_client().get('/small', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'ok': True}
+
+
+def test_streamed_response_is_compressed_and_closes_its_iterable(small_app):
+    client = small_app.test_client()
+    response = client.get('/stream', headers={'Accept-Encoding': 'br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert 'Content-Length' not in response.headers
+    assert brotli.decompress(response.data).decode('utf-8') == '{"a":1}\n{"b":"ờ"}\n'
+    response.close()
+    assert small_app.state['chunks'].closed
+
+    # Client ngắt trước khi đọc đoạn nào
+    unread = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    unread.close()
+    assert small_app.state['chunks'].closed
+
+
+def test_student_list_compact_payload_round_trip(client, db):
+    for i in range(30):
+        client.post('/api/save-student', json={'email': f'nen{i}@test.vn', 'fullName': f'Học Sinh {i}',
+                                               'class': '10A1', 'eyeConditions': 'Cận thị'})
+    plain = client.get('/api/students?page=1&limit=30').get_json()
+    response = client.get('/api/students?page=1&limit=30&compat=0', headers={'Accept-Encoding': 'gzip'})
+
+    compact = json.loads(gzip.decompress(response.data))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'eyeConditions' in plain['data'][0] and 'eyeConditions' not in compact['data'][0]
+    assert [s['email'] for s in compact['data']] == [s['email'] for s in plain['data']]
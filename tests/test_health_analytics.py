@@ -0,0 +1,86 @@
+import datetime as dt
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from health_analytics import CATEGORIES
+
+
+def birthday(reference, years):
+    """dd/mm/yyyy exactly `years` before reference (form format)"""
+    try:
+        day = reference.replace(year=reference.year - years)
+    except ValueError:  # 29/02
+        day = reference.replace(year=reference.year - years, day=28)
+    return day.strftime('%d/%m/%Y')
+
+
+@pytest.fixture
+def analysis(application, client, db):
+    today = application.get_vietnam_time().date()
+    students = [
+        ('a@test.vn', '10A1', 'Nam', 16, '170', '60', 'Cận thị'),
+        ('b@test.vn', '10A1', 'Nữ', 15, '1550', '45', ''),       # chiều cao theo mm
+        ('c@test.vn', '10A2', 'Nam', 15, '48', '165', 'Cận thị'),  # nhập ngược
+        ('d@test.vn', '10A2', 'Nữ', 16, '300', '50', ''),         # ngoài khoảng hợp lý
+    ]
+    for email, cls, gender, years, height, weight, eyes in students:
+        client.post('/api/save-student', json={
+            'email': email, 'fullName': email[0].upper(), 'class': cls, 'gender': gender,
+            'birthDate': birthday(today, years), 'height': height, 'weight': weight, 'eyeConditions': eyes})
+    response = client.get('/api/health-analytics?students=1')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_bmi_and_who_zscore_per_student(analysis):
+    students = {s['full_name']: s for s in analysis['students']}
+    a = students['A']
+
+    # WHO 2007, nam 16 tuổi: L=-0.93, M=20.5, S=0.128
+    bmi = 60 / 1.7 ** 2
+    z = ((bmi / 20.5) ** -0.93 - 1) / (-0.93 * 0.128)
+    assert a['age_months'] == 192 and a['bmi'] == round(bmi, 2) and a['bmi_z'] == round(z, 2)
+    assert a['percentile_band'] == 'P50-P85' and a['bmi_for_age'] == 'Bình thường' and a['flags'] == []
+
+    assert students['B']['height_cm'] == 155.0 and students['B']['flags'] == ['height_in_mm']
+    assert (students['C']['height_cm'], students['C']['weight_kg']) == (165.0, 48.0)
+    assert students['C']['flags'] == ['height_weight_swapped']
+    assert students['D']['bmi'] is None and students['D']['flags'] == ['height_implausible']
+
+
+def test_class_and_school_summaries(analysis):
+    by_class = {c['class']: c for c in analysis['by_class']}
+
+    assert list(by_class) == ['10A1', '10A2']
+    assert [by_class[c]['students'] for c in by_class] == [2, 2]
+    assert [by_class[c]['measured'] for c in by_class] == [2, 1]
+    assert by_class['10A2']['any_eye_condition'] == 1
+    assert analysis['school']['students'] == 4 and analysis['flagged_total'] == 3
+    assert sum(c['count'] for c in analysis['school']['bmi_for_age']) == analysis['school']['with_zscore']
+    assert {s['full_name'] for s in analysis['flagged']} == {'B', 'C', 'D'}
+    assert [c['value'] for c in analysis['school']['bmi_for_age']] == list(CATEGORIES)
+
+
+def test_class_filter_and_cache_follow_writes(client, analysis):
+    only = client.get('/api/health-analytics?classes=10A2').get_json()
+    assert [c['class'] for c in only['by_class']] == ['10A2'] and 'students' not in only
+
+    client.post('/api/save-student', json={'email': 'e@test.vn', 'fullName': 'E', 'class': '10A2'})
+    assert client.get('/api/health-analytics?classes=10A2').get_json()['school']['students'] == 3
+
+
+def test_xlsx_health_sheets_match_the_api(client, db, seed):
+    seed(60)
+    api = client.get('/api/health-analytics').get_json()
+
+    response = client.get('/api/export-xlsx?includeHealth=true')
+
+    workbook = load_workbook(io.BytesIO(response.data), read_only=True)
+    summary = list(workbook['Sức khỏe theo lớp'].iter_rows(values_only=True))
+    check = list(workbook['Số đo cần kiểm tra'].iter_rows(values_only=True))
+    workbook.close()
+    assert [(row[0], row[1]) for row in summary[1:-1]] == [(c['class'], c['students']) for c in api['by_class']]
+    assert summary[-1][:2] == ('Toàn trường', api['school']['students'])
+    assert len(check) - 1 == api['flagged_total']
@@ -0,0 +1,40 @@
+import sqlite3
+
+
+def payload(email, name='Nguyễn Văn A'):
+    return {'email': email, 'fullName': name, 'class': '10A1', 'gender': 'Nam', 'phone': '0912345678'}
+
+
+def student_rows(path, email):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT id, ho_ten FROM students WHERE email = ?', (email,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_idempotency_key_replays_stored_response(client, db):
+    headers = {'Idempotency-Key': 'test-key-0001'}
+    first = client.post('/api/save-student', json=payload('hs5@test.vn'), headers=headers)
+    second = client.post('/api/save-student', json=payload('hs5@test.vn'), headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.get_json() == first.get_json()
+    assert len(student_rows(db, 'hs5@test.vn')) == 1
+
+
+def test_idempotency_key_reused_for_other_body_is_rejected(client, db):
+    headers = {'Idempotency-Key': 'test-key-0002'}
+    client.post('/api/save-student', json=payload('hs6@test.vn'), headers=headers)
+    response = client.post('/api/save-student', json=payload('hs6@test.vn', 'Khác'), headers=headers)
+
+    assert response.status_code == 422
+    assert student_rows(db, 'hs6@test.vn')[0][1] == 'Nguyễn Văn A'
+
+
+def test_overlong_key_is_rejected(client, db):
+    response = client.post('/api/save-student', json=payload('hs7@test.vn'), headers={'Idempotency-Key': 'k' * 1000})
+
+    assert response.status_code == 400
+    assert student_rows(db, 'hs7@test.vn') == []
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def seeded(application, client, db, seed, monkeypatch, tmp_path):
+    # export-json thường ghi file tạm vào thư mục hiện tại trước khi gửi
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(application, 'STREAM_BATCH_SIZE', 7)
+    seed(30)
+    conn = application.get_db_connection()
+    conn.execute("UPDATE students SET height = ' ', weight = 'không rõ' WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+
+def test_streamed_document_matches_the_buffered_export(client, seeded):
+    buffered = json.loads(client.get('/api/export-json').data)
+    response = client.get('/api/export-json?stream=json')
+
+    assert response.is_streamed and response.mimetype == 'application/json'
+    streamed = json.loads(response.data)
+    for document in (buffered, streamed):
+        document['export_info'].pop('exported_at')
+    assert streamed == buffered
+    assert streamed['export_info']['total_records'] == 30
+    assert streamed['data'][1]['Chiều cao (cm)'] is None and streamed['data'][1]['Cân nặng (kg)'] == 'không rõ'
+
+
+def test_ndjson_has_one_record_per_line_in_id_order(client, seeded):
+    buffered = json.loads(client.get('/api/export-json?grade=11').data)['data']
+    response = client.get('/api/export-json?stream=ndjson&grade=11')
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert '.ndjson' in response.headers['Content-Disposition']
+    lines = response.data.decode('utf-8').splitlines()
+    records = [json.loads(line) for line in lines]
+    assert records == buffered
+    assert records and all(r['Lớp'].startswith('11') for r in records)
+    assert list(records[0]) == list(buffered[0])
+
+
+def test_empty_stream_answers_400(client, db):
+    response = client.get('/api/export-json?stream=ndjson')
+
+    assert response.status_code == 400
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+
+def read_event(chunks):
+    """Next SSE message as (event, id, data), skipping keepalive comments"""
+    while True:
+        text = next(chunks).decode('utf-8')
+        if text.startswith(('retry:', ':')):
+            continue
+        fields = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+        return fields['event'], int(fields['id']), json.loads(fields['data'])
+
+
+@pytest.fixture
+def events(application, client, db):
+    broker = application.CHANGE_BROKER
+    opened = []
+
+    def connect(**headers):
+        response = client.get('/api/events', headers=headers, buffered=False)
+        opened.append(response)
+        return response, iter(response.response)
+    yield connect
+    for response in opened:
+        response.close()
+    assert not broker._subscribers
+    # Poller dừng khi không còn client; test sau dùng DB khác nên không được giữ seq cũ
+    thread = broker._thread
+    broker.notify()
+    if thread is not None:
+        thread.join(5)
+
+
+def test_stream_pushes_upserts_and_deletes(client, events):
+    response, chunks = events()
+    assert response.mimetype == 'text/event-stream'
+    event, ready_id, _ = read_event(chunks)
+    assert event == 'ready'
+
+    client.post('/api/save-student', json={'email': 'sse@test.vn', 'fullName': 'Trực Tiếp', 'class': '12A1'})
+    event, seq, data = read_event(chunks)
+    assert event == 'changes' and seq > ready_id
+    assert data['total'] == 1
+    [change] = data['changes']
+    assert change['op'] == 'upsert' and change['student']['email'] == 'sse@test.vn'
+
+    assert client.delete(f"/api/delete-student/{change['id']}").status_code == 200
+    event, _, data = read_event(chunks)
+    assert data == {'total': 0, 'changes': [{'op': 'delete', 'id': change['id']}]}
+
+
+def test_reconnect_with_last_event_id_replays_missed_changes(client, events):
+    response, chunks = events()
+    _, ready_id, _ = read_event(chunks)
+    response.close()
+
+    client.post('/api/save-student', json={'email': 'lo@test.vn', 'fullName': 'Mất Kết Nối'})
+    _, chunks = events(**{'Last-Event-ID': str(ready_id)})
+
+    event, _, data = read_event(chunks)
+    if event == 'ready':
+        # Poller của process chưa dừng: thay đổi tới qua hàng đợi ngay sau đó
+        event, _, data = read_event(chunks)
+    assert event == 'changes' and [c['student']['email'] for c in data['changes']] == ['lo@test.vn']
+
+
+def test_client_limit_and_release_on_close(application, client, events, monkeypatch):
+    monkeypatch.setattr(application.CHANGE_BROKER, 'max_clients', 1)
+    first, _ = events()
+
+    busy = client.get('/api/events')
+    assert busy.status_code == 503 and busy.headers['Retry-After'] == '30'
+
+    # Đóng trước khi đọc byte nào: suất kết nối vẫn được trả lại
+    first.close()
+    second, chunks = events()
+    assert read_event(chunks)[0] == 'ready'
@@ -0,0 +1,111 @@
+import io
+import re
+import sqlite3
+import zipfile
+import zlib
+
+import pytest
+
+from pdf_export import FontError, find_font
+
+try:
+    find_font()
+except FontError:
+    pytest.skip('no TrueType font with Vietnamese glyphs installed', allow_module_level=True)
+
+
+def read_pdf(data):
+    """Check the xref table and return the text runs of every page, in page order"""
+    assert data.startswith(b'%PDF-1.4\n') and data.endswith(b'%%EOF\n')
+    xref_at = int(data.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+    lines = data[xref_at:].split(b'\n')
+    assert lines[0] == b'xref'
+    size = int(lines[1].split()[1])
+    objects = {}
+    for num in range(1, size):
+        offset = int(lines[2 + num][:10])
+        header = f'{num} 0 obj\n'.encode('ascii')
+        assert data.startswith(header, offset)
+        body = data[offset + len(header):]
+        if body.startswith(b'<< /Length '):
+            length = int(body[11:body.index(b' ', 11)])
+            start = body.index(b'stream\n') + 7
+            objects[num] = (body[:start], zlib.decompress(body[start:start + length]))
+        else:
+            objects[num] = (body[:body.index(b'\nendobj\n')], None)
+
+    to_unicode = next(stream for _, stream in objects.values() if stream and b'begincmap' in stream)
+    glyphs = {gid: bytes.fromhex(units.decode('ascii')).decode('utf-16-be')
+              for gid, units in re.findall(rb'<([0-9A-F]{4})> <([0-9A-F]+)>', to_unicode)}
+    glyphs[b'0000'] = '?'
+
+    pages_tree = next(d for d, _ in objects.values() if d.startswith(b'<< /Type /Pages'))
+    kids = [int(k) for k in re.findall(rb'(\d+) 0 R', pages_tree)]
+    assert int(re.search(rb'/Count (\d+)', pages_tree).group(1)) == len(kids)
+    pages = []
+    for kid in kids:
+        content_id = int(re.search(rb'/Contents (\d+) 0 R', objects[kid][0]).group(1))
+        runs = re.findall(rb'<([0-9A-F]*)> Tj', objects[content_id][1])
+        pages.append([''.join(glyphs[run[i:i + 4]] for i in range(0, len(run), 4)) for run in runs])
+    return pages
+
+
+def students(path, where='1 = 1'):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT full_name, class FROM students WHERE {where} ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_pdf_lists_every_student_across_pages(client, db, seed):
+    seed(90)
+    expected = students(db)
+
+    response = client.get('/api/export-pdf?includeTimestamp=true')
+
+    assert response.status_code == 200 and response.mimetype == 'application/pdf'
+    pages = read_pdf(response.data)
+    assert len(pages) > 1
+    assert pages[0][0] == 'Danh sách học sinh THPT Dĩ An'
+    runs = [run for page in pages for run in page]
+    # Mỗi dòng bảng: số STT (đánh liên tục qua các trang) rồi họ tên
+    rows = [(int(run), runs[i + 1]) for i, run in enumerate(runs) if run.isdigit() and len(run) < 4]
+    assert rows == [(n, name) for n, (name, _) in enumerate(expected, 1)]
+
+
+def test_by_class_pdf_starts_each_class_on_a_new_page(client, db, seed):
+    seed(60)
+    expected = students(db, "class LIKE '11%'")
+
+    response = client.get('/api/export-pdf?type=by_class&grade=11')
+
+    pages = read_pdf(response.data)
+    # Chân trang: 'Lớp <tên>' rồi 'Trang n/m'
+    footers = [page[-2] for page in pages]
+    classes = sorted({cls for _, cls in expected})
+    assert sorted(set(footers), key=footers.index) == [f'Lớp {cls}' for cls in classes]
+    for cls in classes:
+        class_pages = [page for page, footer in zip(pages, footers) if footer == f'Lớp {cls}']
+        assert class_pages[0][1] == f'Lớp {cls} - Tổng số học sinh: {sum(1 for _, c in expected if c == cls)}'
+
+
+def test_by_class_zip_has_one_pdf_per_class(client, db, seed):
+    seed(40)
+    expected = students(db, "class LIKE '10%'")
+
+    response = client.get('/api/export-pdf?type=by_class&format=zip&grade=10')
+
+    bundle = zipfile.ZipFile(io.BytesIO(response.data))
+    classes = sorted({cls for _, cls in expected})
+    assert sorted(bundle.namelist()) == [f'danh_sach_hoc_sinh_lop_{cls}.pdf' for cls in classes]
+    for cls in classes:
+        pages = read_pdf(bundle.read(f'danh_sach_hoc_sinh_lop_{cls}.pdf'))
+        names = {run for page in pages for run in page}
+        assert {name for name, c in expected if c == cls} <= names
+
+
+def test_unknown_pdf_field_is_rejected(client, db):
+    response = client.get('/api/export-pdf?fields=full_name,password')
+
+    assert response.status_code == 400 and 'password' in response.get_json()['error']
@@ -0,0 +1,27 @@
+from response_cache import ResponseCache
+
+
+def test_entries_are_keyed_by_version():
+    cache = ResponseCache(max_bytes=64 * 1024)
+    cache.put(('students', 1), 3, b'{"a":1}')
+
+    assert cache.get(('students', 1), 3)[0] == b'{"a":1}'
+    assert cache.get(('students', 1), 4) is None
+
+
+def test_listing_written_by_another_worker_is_not_served_stale(application, client, db):
+    client.post('/api/save-student', json={'email': 'cache@test.vn', 'fullName': 'Tên Cũ', 'class': '10A1'})
+    listing = client.get('/api/students?page=1&limit=5')
+    assert client.get('/api/students?page=1&limit=5', headers={'If-None-Match': listing.headers['ETag']}).status_code == 304
+
+    # Worker khác ghi thẳng vào DB: cache của process này không nhận được lệnh xóa
+    conn = application.get_db_connection()
+    try:
+        conn.execute("UPDATE students SET ho_ten = 'Worker Khác', full_name = 'Worker Khác'")
+        conn.commit()
+    finally:
+        conn.close()
+
+    refreshed = client.get('/api/students?page=1&limit=5', headers={'If-None-Match': listing.headers['ETag']})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()['data'][0]['full_name'] == 'Worker Khác'
@@ -0,0 +1,70 @@
+import sqlite3
+
+import submission_journal
+
+
+def payload(email, name='Nguyễn Văn A'):
+    return {'email': email, 'fullName': name, 'class': '10A1', 'gender': 'Nam', 'phone': '0912345678'}
+
+
+def student_rows(path, email):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT id, ho_ten FROM students WHERE email = ?', (email,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_save_student_reports_success_after_commit(client, db):
+    response = client.post('/api/save-student', json=payload('hs1@test.vn'))
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['status'] == 'saved'
+    assert len(student_rows(db, 'hs1@test.vn')) == 1
+
+    status = client.get(f"/api/submission-status/{body['submissionId']}").get_json()
+    assert status['status'] == 'saved'
+
+
+def test_resubmission_updates_the_same_student(client, db):
+    client.post('/api/save-student', json=payload('hs2@test.vn', 'Tên cũ'))
+    client.post('/api/save-student', json=payload('hs2@test.vn', 'Tên mới'))
+
+    rows = student_rows(db, 'hs2@test.vn')
+    assert len(rows) == 1
+    assert rows[0][1] == 'Tên mới'
+
+
+def test_permanent_write_error_reaches_client_and_admin(application, client, db, monkeypatch):
+    monkeypatch.setattr(submission_journal, 'JOURNAL_MAX_ATTEMPTS', 1)
+
+    def broken(cursor, entry, placeholder):
+        raise sqlite3.OperationalError('table students has no column named nickname')
+
+    monkeypatch.setattr(application, 'write_journal_entry', broken)
+    response = client.post('/api/save-student', json=payload('hs3@test.vn'))
+
+    assert response.status_code == 500
+    body = response.get_json()
+    assert not body['success'] and body['status'] == 'failed'
+    assert 'nickname' in body['message']
+    journal = client.get('/api/journal/status').get_json()
+    assert journal['dead_letters'] == 1
+    assert journal['recent_failures'][0]['email'] == 'hs3@test.vn'
+    assert student_rows(db, 'hs3@test.vn') == []
+
+
+def test_slow_write_answers_202_with_status_url(application, client, db, monkeypatch):
+    monkeypatch.setattr(application, 'SUBMISSION_WAIT_SECONDS', 0)
+    response = client.post('/api/save-student', json=payload('hs4@test.vn'))
+
+    if response.status_code == 202:
+        body = response.get_json()
+        assert body['pending'] and body['statusUrl'] == f"/api/submission-status/{body['submissionId']}"
+        assert application.SUBMISSION_JOURNAL.wait(body['submissionId'], 5) == {'status': 'saved'}
+        assert client.get(body['statusUrl']).get_json()['status'] == 'saved'
+    else:
+        # Flusher đã ghi xong trước khi request kịp kiểm tra
+        assert response.status_code == 200
+    assert len(student_rows(db, 'hs4@test.vn')) == 1
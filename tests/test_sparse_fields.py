@@ -0,0 +1,41 @@
+import pytest
+
+from student_schema import InvalidFieldsError, MAX_FIELDS, parse_fields
+
+
+@pytest.fixture
+def student_id(client):
+    client.post('/api/save-student', json={'email': 'truong@test.vn', 'fullName': 'Trần Thị B', 'class': '11A2',
+                                           'phone': '0987654321', 'eyeConditions': 'Loạn thị'})
+    return client.get('/api/student-by-email?email=truong@test.vn').get_json()['student']['id']
+
+
+def test_parse_fields_dedupes_and_limits():
+    assert parse_fields(' email, full_name,,email ') == ('email', 'full_name')
+    assert parse_fields(',') is None
+    with pytest.raises(InvalidFieldsError):
+        parse_fields(','.join(f'f{i}' for i in range(MAX_FIELDS + 1)))
+
+
+def test_list_returns_only_requested_columns(client, student_id):
+    body = client.get('/api/students?page=1&limit=5&fields=email,ho_ten,lop').get_json()
+
+    assert body['data'] == [{'id': student_id, 'email': 'truong@test.vn', 'ho_ten': 'Trần Thị B', 'lop': '11A2'}]
+
+
+def test_detail_projection_includes_derived_fields(client, student_id):
+    full = client.get(f'/api/student/{student_id}').get_json()
+    detail = client.get(f'/api/student/{student_id}?fields=sdt,eyeConditions').get_json()
+    by_email = client.get('/api/student-by-email?email=truong@test.vn&fields=ho_ten').get_json()['student']
+
+    assert detail == {'id': student_id, 'sdt': '0987654321', 'eyeConditions': 'Loạn thị'}
+    assert detail == {k: full[k] for k in ('id', 'sdt', 'eyeConditions')}
+    assert by_email == {'id': student_id, 'ho_ten': 'Trần Thị B'}
+
+
+def test_unknown_field_is_rejected_with_allowed_list(client, student_id):
+    for url in ('/api/students?fields=email,password', f'/api/student/{student_id}?fields=password'):
+        response = client.get(url)
+        body = response.get_json()
+        assert response.status_code == 400
+        assert 'password' in body['error'] and 'email' in body['allowed']
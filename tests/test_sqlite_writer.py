@@ -0,0 +1,67 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sqlite_writer import SQLiteWriter
+
+
+def test_writer_commits_jobs_and_isolates_failures(tmp_path):
+    path = str(tmp_path / 'w.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)')
+    conn.commit()
+    conn.close()
+
+    writer = SQLiteWriter(path)
+    futures = [writer.submit(lambda cursor, v: cursor.execute('INSERT INTO t (v) VALUES (?)', (v,)).lastrowid, v)
+               for v in ('a', None, 'b')]
+    assert futures[0].result(5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 2
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT v FROM t ORDER BY id').fetchall() == [('a',), ('b',)]
+    conn.close()
+
+
+def test_writer_reconfigure_moves_writes(tmp_path):
+    paths = [str(tmp_path / name) for name in ('one.db', 'two.db')]
+    for path in paths:
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE t (v TEXT)')
+        conn.commit()
+        conn.close()
+
+    writer = SQLiteWriter(paths[0])
+    insert = lambda cursor, v: cursor.execute('INSERT INTO t VALUES (?)', (v,))  # noqa: E731
+    writer.run(insert, 'first', timeout=5)
+    writer.reconfigure(paths[1])
+    writer.run(insert, 'second', timeout=5)
+
+    rows = []
+    for path in paths:
+        conn = sqlite3.connect(path)
+        rows.append(conn.execute('SELECT v FROM t').fetchall())
+        conn.close()
+    assert rows == [[('first',)], [('second',)]]
+
+
+def test_burst_of_jobs_is_group_committed(tmp_path):
+    path = str(tmp_path / 'g.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (v INTEGER)')
+    conn.commit()
+    conn.close()
+
+    writer = SQLiteWriter(path)
+    insert = lambda cursor, v: cursor.execute('INSERT INTO t VALUES (?)', (v,))  # noqa: E731
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(lambda v: writer.run(insert, v, timeout=10), range(200)))
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 200
+    conn.close()
+    assert writer.stats['jobs'] == 200 and writer.stats['failed_batches'] == 0
+    assert writer.stats['batches'] < 200
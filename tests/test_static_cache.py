@@ -0,0 +1,43 @@
+import gzip
+import os
+
+from flask import Flask, request
+
+from static_cache import StaticAssetCache, parse_accept_encoding
+
+
+def test_parse_accept_encoding_drops_zero_q():
+    assert parse_accept_encoding('gzip;q=0.5, br;q=0, identity') == {'gzip', 'identity'}
+
+
+def test_page_round_trip_with_gzip_and_304(client):
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert first.status_code == 200
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['Vary'] == 'Accept-Encoding'
+    with open(os.path.join(client.application.root_path, 'page.html'), 'rb') as handle:
+        assert gzip.decompress(first.data) == handle.read()
+
+    # ETag của bản gzip vẫn khớp khi trình duyệt revalidate không nén
+    again = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+
+
+def test_changed_file_is_reloaded_by_mtime(tmp_path):
+    page = tmp_path / 'page.html'
+    page.write_text('<p>cũ</p>', encoding='utf-8')
+    cache = StaticAssetCache(str(tmp_path))
+    app = Flask(__name__)
+
+    with app.test_request_context('/'):
+        old = cache.response('page.html', request)
+        page.write_text('<p>mới</p>', encoding='utf-8')
+        stat = os.stat(page)
+        os.utime(page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        new = cache.response('page.html', request)
+
+    assert old.get_data() == '<p>cũ</p>'.encode('utf-8')
+    assert new.get_data() == '<p>mới</p>'.encode('utf-8')
+    assert new.headers['ETag'] != old.headers['ETag']
+    assert cache.response('missing.html', None) is None
@@ -0,0 +1,67 @@
+import pytest
+
+from student_cache import StudentCache
+
+
+def test_invalidate_drops_every_variant():
+    cache = StudentCache(size=10, ttl=60)
+    for variant in (None, 'full_name'):
+        cache.set('id', 1, variant, {'id': 1, 'v': variant}, cache.generation(), version=5)
+    cache.set('email', 'a@x.vn', None, {'id': 1}, cache.generation(), version=5)
+
+    cache.invalidate(ids=[1], emails=['a@x.vn'])
+
+    assert cache.get('id', 1, None, 5) is None
+    assert cache.get('id', 1, 'full_name', 5) is None
+    assert cache.get('email', 'a@x.vn', None, 5) is None
+
+
+def test_ignores_reads_older_than_an_invalidation():
+    cache = StudentCache(size=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(ids=[1])
+    cache.set('id', 1, None, {'id': 1}, generation, version=5)
+
+    assert cache.get('id', 1, None, 5) is None
+
+
+def test_entry_is_stale_at_another_data_version():
+    cache = StudentCache(size=10, ttl=60)
+    cache.set('id', 1, None, {'id': 1}, cache.generation(), version=5)
+
+    assert cache.get('id', 1, None, 5) == {'id': 1}
+    assert cache.get('id', 1, None, 6) is None
+    assert cache.status()['stale'] == 1
+
+
+@pytest.fixture
+def student_id(application, client):
+    client.post('/api/save-student', json={'email': 'cache@test.vn', 'fullName': 'Tên Cũ', 'class': '10A1'})
+    return client.get('/api/student-by-email?email=cache@test.vn').get_json()['student']['id']
+
+
+def rename_from_another_worker(application, student_id):
+    # Worker khác ghi thẳng vào DB: cache của process này không nhận được lệnh xóa
+    conn = application.get_db_connection()
+    try:
+        conn.execute("UPDATE students SET ho_ten = 'Worker Khác', full_name = 'Worker Khác' WHERE id = ?", (student_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_save_student_invalidates_cached_detail(client, student_id):
+    assert client.get(f'/api/student/{student_id}').get_json()['ho_ten'] == 'Tên Cũ'
+
+    client.post('/api/save-student', json={'email': 'cache@test.vn', 'fullName': 'Tên Mới', 'class': '10A1'})
+
+    assert client.get(f'/api/student/{student_id}').get_json()['ho_ten'] == 'Tên Mới'
+    assert client.get('/api/student-by-email?email=cache@test.vn').get_json()['student']['ho_ten'] == 'Tên Mới'
+
+
+def test_detail_written_by_another_worker_is_not_served_stale(application, client, student_id):
+    assert client.get(f'/api/student/{student_id}').get_json()['ho_ten'] == 'Tên Cũ'
+
+    rename_from_another_worker(application, student_id)
+
+    assert client.get(f'/api/student/{student_id}').get_json()['ho_ten'] == 'Worker Khác'
@@ -0,0 +1,68 @@
+import io
+import sqlite3
+
+
+def import_csv(client, text, **params):
+    query = '&'.join(f'{k}={v}' for k, v in params.items())
+    return client.post(f'/api/import-students?{query}',
+                       data={'file': (io.BytesIO(text.encode('utf-8')), 'ds.csv')})
+
+
+def stored(path, email, *columns):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT {', '.join(columns)} FROM students WHERE email = ?", (email,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_blank_and_invalid_cells_keep_stored_values(client, db):
+    client.post('/api/save-student', json={'email': 'nhap@test.vn', 'fullName': 'Tên Cũ', 'class': '10A1',
+                                           'phone': '0912345678', 'height': '160', 'birthDate': '01/02/2009',
+                                           'eyeConditions': 'Cận thị'})
+
+    response = import_csv(client, 'email,ho_ten,sdt,height,ngay_sinh,eye_diseases\n'
+                                  'nhap@test.vn,Tên Mới,,abc,,\n')
+
+    body = response.get_json()
+    assert response.status_code == 200 and body['stats']['updated'] == 1
+    assert body['errors'][0]['errors'] == ["height: giá trị không hợp lệ 'abc'"]
+    assert stored(db, 'nhap@test.vn', 'ho_ten', 'sdt', 'height', 'ngay_sinh', 'eye_diseases') == (
+        'Tên Mới', '0912345678', 160, '2009-02-01', 'Cận thị')
+
+
+def test_import_inserts_with_defaults_and_reads_export_labels(client, db):
+    response = import_csv(client, 'Email;Họ và tên;Lớp;Chiều cao (cm)\n'
+                                  'a@test.vn;Học Sinh A;11A2;155\n'
+                                  'b@test.vn;Học Sinh B;;\n'
+                                  ';Không Email;10A1;\n'
+                                  'a@test.vn;Học Sinh A2;11A3;156\n')
+
+    stats = response.get_json()['stats']
+    assert (stats['inserted'], stats['skipped'], stats['duplicates_in_file']) == (2, 1, 1)
+    assert stored(db, 'a@test.vn', 'ho_ten', 'lop', 'khoi', 'height') == ('Học Sinh A2', '11A3', '11', 156)
+    assert stored(db, 'b@test.vn', 'lop', 'height', 'eye_diseases') == (None, None, 'Chưa có thông tin')
+
+
+def test_dry_run_writes_nothing(client, db):
+    response = import_csv(client, 'email,ho_ten\nkhong@test.vn,Không Ghi\n', dryRun='true')
+
+    assert response.get_json()['dry_run'] and response.get_json()['stats']['rows_read'] == 1
+    assert stored(db, 'khong@test.vn', 'id') is None
+
+
+def test_invalid_import_batch_size_is_rejected(client, db):
+    response = import_csv(client, 'email\nx@test.vn\n', batchSize='abc', dryRun='true')
+
+    assert response.status_code == 400
+    assert 'batchSize' in response.get_json()['error']
+
+
+def test_sqlite_batches_go_through_the_writer_thread(application, client, db):
+    jobs = application.SQLITE_WRITER.stats['jobs']
+    rows = ''.join(f'w{i}@test.vn,Học Sinh {i}\n' for i in range(5))
+
+    response = import_csv(client, 'email,ho_ten\n' + rows, batchSize=2)
+
+    assert response.get_json()['stats']['inserted'] == 5
+    assert application.SQLITE_WRITER.stats['jobs'] - jobs == 3
@@ -0,0 +1,36 @@
+from student_stats import compute_stats, rebuild_stats, stored_stats
+
+
+def assert_stats_consistent(application):
+    columns = application.STUDENT_SCHEMA.columns(refresh=True)
+    conn = application.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        assert stored_stats(cursor) == compute_stats(cursor, 'sqlite', columns)
+        assert rebuild_stats(conn, 'sqlite', columns, check_only=True)['drift'] == []
+    finally:
+        conn.close()
+
+
+def test_triggers_keep_stats_equal_to_a_rebuild(application, client, db, seed):
+    seed(200)
+    assert_stats_consistent(application)
+
+    client.post('/api/save-student', json={'email': 'moi@test.vn', 'fullName': 'Học Sinh Mới',
+                                           'class': '11A2', 'gender': 'Nữ', 'height': '150', 'weight': '45'})
+    client.post('/api/save-student', json={'email': 'moi@test.vn', 'class': '12A1', 'gender': 'Nam'})
+    conn = application.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE students SET gender = 'Nữ', class = '10A3' WHERE id % 7 = 0")
+        cursor.execute('DELETE FROM students WHERE id % 11 = 0')
+        conn.commit()
+        cursor.execute('SELECT id FROM students ORDER BY id LIMIT 1')
+        first_id = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    assert client.delete(f'/api/delete-student/{first_id}').status_code == 200
+
+    assert_stats_consistent(application)
+    stats = client.get('/api/stats').get_json()
+    assert stats['total'] == client.get('/api/students?page=1&limit=1').get_json()['pagination']['total_records']
@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+import submission_journal
+from submission_journal import FAILED_FILE, SubmissionJournal
+
+
+class BadEntry(ValueError):
+    pass
+
+
+class Recorder:
+    """apply_batch that keeps the entries; emails starting with 'bad' fail permanently"""
+
+    def __init__(self):
+        self.applied = []
+        self.down = False
+
+    def __call__(self, entries):
+        if self.down:
+            raise ConnectionError('db down')
+        errors = []
+        for entry in entries:
+            if entry['email'].startswith('bad'):
+                errors.append(BadEntry('table students has no column named nickname'))
+            else:
+                self.applied.append(entry)
+                errors.append(None)
+        return errors
+
+
+def is_transient(error):
+    return isinstance(error, ConnectionError)
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+@pytest.fixture
+def journal(tmp_path, recorder):
+    journal = SubmissionJournal(str(tmp_path), recorder, is_transient)
+    yield journal
+    journal.close()
+
+
+def test_append_is_flushed_and_reported_saved(journal, recorder):
+    entry_id = journal.append('a@x.vn', {'email': 'a@x.vn', 'fullName': 'A'})
+
+    assert journal.wait(entry_id, 5) == {'status': 'saved'}
+    assert [e['id'] for e in recorder.applied] == [entry_id]
+    assert recorder.applied[0]['data'] == {'email': 'a@x.vn', 'fullName': 'A'}
+    assert journal.drain(5)
+    assert journal.status()['depth'] == 0
+
+
+def test_permanent_error_is_dead_lettered_and_reported(journal, monkeypatch, tmp_path):
+    monkeypatch.setattr(submission_journal, 'JOURNAL_MAX_ATTEMPTS', 1)
+    entry_id = journal.append('bad@x.vn', {'email': 'bad@x.vn'})
+
+    outcome = journal.wait(entry_id, 5)
+    assert outcome['status'] == 'failed'
+    assert 'nickname' in outcome['error']
+
+    with open(tmp_path / FAILED_FILE, encoding='utf-8') as handle:
+        records = [json.loads(line) for line in handle]
+    assert [r['id'] for r in records] == [entry_id]
+    status = journal.status()
+    assert status['dead_letters'] == 1
+    assert status['recent_failures'][0]['email'] == 'bad@x.vn'
+
+
+def test_lookup_from_another_process(journal, tmp_path, recorder, monkeypatch):
+    monkeypatch.setattr(submission_journal, 'JOURNAL_MAX_ATTEMPTS', 1)
+    failed_id = journal.append('bad@x.vn', {'email': 'bad@x.vn'})
+    assert journal.wait(failed_id, 5)['status'] == 'failed'
+
+    recorder.down = True
+    pending_id = journal.append('b@x.vn', {'email': 'b@x.vn'})
+
+    # Process khác chỉ thấy thư mục journal
+    other = SubmissionJournal(str(tmp_path), Recorder(), is_transient)
+    assert other.lookup(failed_id)['status'] == 'failed'
+    assert other.lookup(pending_id) == {'status': 'pending'}
+    assert other.lookup('unknown') is None
+
+
+def test_orphaned_segment_is_replayed(tmp_path, recorder):
+    recorder.down = True
+    crashed = SubmissionJournal(str(tmp_path), recorder, is_transient)
+    ids = [crashed.append(f's{i}@x.vn', {'email': f's{i}@x.vn'}) for i in range(3)]
+    assert crashed.wait(ids[0], 0.2) is None
+    crashed.close()
+
+    survivor = Recorder()
+    restarted = SubmissionJournal(str(tmp_path), survivor, is_transient)
+    try:
+        assert restarted.replay_orphans() == 3
+        assert [e['id'] for e in survivor.applied] == ids
+        assert restarted.lookup(ids[-1]) == {'status': 'saved'}
+        assert not [name for name in os.listdir(tmp_path) if name.endswith('.jsonl')]
+    finally:
+        restarted.close()
+
+
+def test_postgres_journal_defaults_to_a_directory_per_database(application, monkeypatch):
+    config = {'type': 'postgresql', 'host': 'db.example', 'port': 5432, 'database': 'hs', 'user': 'u'}
+    monkeypatch.setattr(application, 'DB_CONFIG', config)
+    first = application.default_journal_dir()
+    monkeypatch.setattr(application, 'DB_CONFIG', dict(config, database='other'))
+
+    assert os.path.dirname(first) == os.path.join(application.os.path.dirname(application.__file__), 'journal')
+    assert application.default_journal_dir() != first
+
+
+def test_journal_status_reports_why_it_is_disabled(application, client, monkeypatch):
+    monkeypatch.setattr(application, 'SUBMISSION_JOURNAL_ENABLED', False)
+    monkeypatch.setattr(application, 'SUBMISSION_JOURNAL_DISABLED', None)
+    monkeypatch.setattr(application, 'SUBMISSION_JOURNAL', application.open_submission_journal('/unused'))
+
+    assert client.get('/api/journal/status').get_json() == {'enabled': False, 'reason': 'SUBMISSION_JOURNAL=false'}